@@ -0,0 +1,397 @@
+"""
+Инкрементальный rollup продуктовой активации: день × landing page × этап.
+
+Вместо того чтобы на каждый отчёт заново сканировать user_event за всё
+окно и искать первые события каждого атлета, инструмент ведёт в той же БД
+таблицы, которые дополняются только событиями новее watermark:
+
+- activation_athletes — первая органическая регистрация атлета
+  (landing page, signup_at);
+- activation_first_events — первое событие каждого этапа после регистрации;
+- activation_rollup — число атлетов по (signup_day, reached_day,
+  landing_page, stage); signups — этап с reached_day = signup_day;
+- activation_watermark — created_at последнего обработанного события.
+
+Воронка за любое окно — сумма rollup по signup_day в окне и reached_day
+не позже конца окна: ровно то, что считал полный запрос (этап засчитан,
+если первое событие после регистрации случилось до конца окна).
+
+Каждый проход перечитывает LATE_EVENT_DAYS дней до watermark: опоздавшие
+события попадают в свои корзины, а повторно прочитанные ничего не меняют
+(состояние атлета хранит минимумы, вклад в rollup пересчитывается как
+разница «до/после»).
+
+Работает с psycopg (PostgreSQL) и sqlite3 — последний нужен для локальной
+проверки без сервера. Время хранится текстом ISO, поэтому сравнения
+одинаковы в обеих БД.
+
+Коммит update_rollup — за вызывающим: отчёт дочитывает хвост внутри своей
+транзакции под statement_timeout. Первичное построение (нет watermark) —
+build_rollup, отдельная команда activation-rollup: окна по
+BOOTSTRAP_DAYS дней, коммит и watermark после каждого окна, без таймаута
+отчёта; прерванный bootstrap продолжается с сохранённого watermark.
+"""
+
+from __future__ import annotations
+
+import json
+import sqlite3
+from collections import Counter
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from app.seo_activation_funnel import PRODUCT_EVENT_FIELDS, normalize_landing_page
+
+LATE_EVENT_DAYS = 1
+BOOTSTRAP_DAYS = 7
+BATCH_SIZE = 5_000
+CURSOR_ITERSIZE = 2_000
+WATERMARK_NAME = "user_event"
+
+SIGNUP_EVENT = "signup"
+STAGE_BY_EVENT = {
+    "oauth_start": "oauth_start",
+    "intervals_connected": "intervals_connected",
+    "gpt_connected": "gpt_connected",
+    "claude_connected": "claude_connected",
+    "gpt_data_requested": "first_data_request",
+    "claude_data_requested": "first_data_request",
+    "training_processed": "training_processed",
+}
+
+SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS activation_athletes (
+        athlete_id TEXT PRIMARY KEY,
+        landing_page TEXT NOT NULL,
+        signup_at TEXT NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS activation_first_events (
+        athlete_id TEXT NOT NULL,
+        stage TEXT NOT NULL,
+        reached_at TEXT NOT NULL,
+        PRIMARY KEY (athlete_id, stage)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS activation_rollup (
+        signup_day TEXT NOT NULL,
+        reached_day TEXT NOT NULL,
+        landing_page TEXT NOT NULL,
+        stage TEXT NOT NULL,
+        athletes INTEGER NOT NULL,
+        PRIMARY KEY (signup_day, reached_day, landing_page, stage)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS activation_watermark (
+        name TEXT PRIMARY KEY,
+        processed_until TEXT NOT NULL
+    )
+    """,
+]
+
+# Корзина rollup: (signup_day, reached_day, landing_page, stage).
+Bucket = Tuple[str, str, str, str]
+
+
+def _is_sqlite(conn: Any) -> bool:
+    return isinstance(conn, sqlite3.Connection)
+
+
+def _sql(conn: Any, query: str) -> str:
+    """Запросы пишутся с %s (psycopg); для sqlite3 — ?."""
+    return query.replace("%s", "?") if _is_sqlite(conn) else query
+
+
+def _values(row: Any) -> Tuple[Any, ...]:
+    return tuple(row.values()) if isinstance(row, dict) else tuple(row)
+
+
+def _iso(value: Any) -> str:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+def _metadata(value: Any) -> Dict[str, Any]:
+    if isinstance(value, dict):
+        return value
+    try:
+        parsed = json.loads(value or "{}")
+    except (TypeError, ValueError):
+        return {}
+    return parsed if isinstance(parsed, dict) else {}
+
+
+def is_organic_signup(metadata: Dict[str, Any]) -> bool:
+    """Те же условия, что в запросе воронки (firstTouchSource / signupSource / source)."""
+    return (
+        metadata.get("firstTouchSource") == "organic"
+        or metadata.get("signupSource") == "en_organic"
+        or metadata.get("source") == "organic"
+    )
+
+
+def ensure_schema(conn: Any) -> None:
+    cur = conn.cursor()
+    for statement in SCHEMA:
+        cur.execute(statement)
+
+
+def read_watermark(conn: Any) -> Optional[str]:
+    cur = conn.cursor()
+    cur.execute(_sql(conn, "SELECT processed_until FROM activation_watermark WHERE name = %s"), [WATERMARK_NAME])
+    row = cur.fetchone()
+    return str(_values(row)[0]) if row else None
+
+
+def _event_filter() -> Tuple[str, List[Any]]:
+    event_types = [SIGNUP_EVENT, *STAGE_BY_EVENT]
+    return "event_type IN ({types})".format(types=", ".join(["%s"] * len(event_types))), list(event_types)
+
+
+def _stream_events(conn: Any, since: Optional[str], until: Optional[str] = None) -> Iterable[Tuple[Any, ...]]:
+    """События этапов воронки в [since, until), по времени; у psycopg — серверный курсор."""
+    condition, params = _event_filter()
+    query = f"SELECT athlete_id, event_type, created_at, metadata FROM user_event WHERE {condition}"
+    if since is not None:
+        query += " AND created_at >= %s"
+        params.append(since)
+    if until is not None:
+        query += " AND created_at < %s"
+        params.append(until)
+    query += " ORDER BY created_at"
+    if _is_sqlite(conn):
+        cur = conn.cursor()
+    else:
+        cur = conn.cursor(name="activation_rollup_events")
+        cur.itersize = CURSOR_ITERSIZE
+    try:
+        cur.execute(_sql(conn, query), params)
+        for row in cur:
+            yield _values(row)
+    finally:
+        cur.close()
+
+
+def first_event_day(conn: Any) -> Optional[str]:
+    """День самого раннего события воронки (начало bootstrap) или None, если событий нет."""
+    condition, params = _event_filter()
+    cur = conn.cursor()
+    cur.execute(_sql(conn, f"SELECT MIN(created_at) FROM user_event WHERE {condition}"), params)
+    row = cur.fetchone()
+    value = _values(row)[0] if row else None
+    return _iso(value)[:10] if value is not None else None
+
+
+def _load_states(conn: Any, athlete_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    states: Dict[str, Dict[str, Any]] = {}
+    if not athlete_ids:
+        return states
+    placeholders = ", ".join(["%s"] * len(athlete_ids))
+    cur = conn.cursor()
+    cur.execute(
+        _sql(conn, f"SELECT athlete_id, landing_page, signup_at FROM activation_athletes WHERE athlete_id IN ({placeholders})"),
+        athlete_ids,
+    )
+    for athlete_id, landing_page, signup_at in map(_values, cur.fetchall()):
+        states[str(athlete_id)] = {"landing_page": landing_page, "signup_at": signup_at, "stages": {}}
+    cur.execute(
+        _sql(conn, f"SELECT athlete_id, stage, reached_at FROM activation_first_events WHERE athlete_id IN ({placeholders})"),
+        athlete_ids,
+    )
+    for athlete_id, stage, reached_at in map(_values, cur.fetchall()):
+        if str(athlete_id) in states:
+            states[str(athlete_id)]["stages"][stage] = reached_at
+    return states
+
+
+def _buckets(state: Optional[Dict[str, Any]]) -> List[Bucket]:
+    if state is None:
+        return []
+    signup_day = state["signup_at"][:10]
+    buckets = [(signup_day, signup_day, state["landing_page"], "signups")]
+    buckets.extend((signup_day, reached_at[:10], state["landing_page"], stage) for stage, reached_at in state["stages"].items())
+    return buckets
+
+
+def _apply_event(states: Dict[str, Dict[str, Any]], athlete_id: str, event_type: str, created_at: str, metadata: Any) -> None:
+    state = states.get(athlete_id)
+    if event_type == SIGNUP_EVENT:
+        meta = _metadata(metadata)
+        if not is_organic_signup(meta) or (state is not None and state["signup_at"] <= created_at):
+            return
+        landing_page = normalize_landing_page(str(meta.get("landingPage") or "(unknown)"))
+        stages = state["stages"] if state is not None else {}
+        states[athlete_id] = {"landing_page": landing_page, "signup_at": created_at, "stages": stages}
+        return
+    stage = STAGE_BY_EVENT[event_type]
+    if state is None or created_at < state["signup_at"]:
+        return
+    reached_at = state["stages"].get(stage)
+    if reached_at is None or created_at < reached_at:
+        state["stages"][stage] = created_at
+
+
+def _process_batch(conn: Any, events: List[Tuple[Any, ...]]) -> List[str]:
+    """Применяет пачку событий; возвращает атлетов, у которых изменилось состояние."""
+    athlete_ids = sorted({str(event[0]) for event in events})
+    states = _load_states(conn, athlete_ids)
+    before = {athlete_id: json.dumps(state, sort_keys=True) for athlete_id, state in states.items()}
+    old_buckets = Counter(bucket for state in states.values() for bucket in _buckets(state))
+    for athlete_id, event_type, created_at, metadata in events:
+        _apply_event(states, str(athlete_id), str(event_type), _iso(created_at), metadata)
+    changed = [athlete_id for athlete_id, state in states.items() if before.get(athlete_id) != json.dumps(state, sort_keys=True)]
+    if not changed:
+        return changed
+
+    new_buckets = Counter(bucket for state in states.values() for bucket in _buckets(state))
+    deltas = {bucket: new_buckets[bucket] - old_buckets[bucket] for bucket in old_buckets.keys() | new_buckets.keys()}
+    placeholders = ", ".join(["%s"] * len(changed))
+    cur = conn.cursor()
+    cur.execute(_sql(conn, f"DELETE FROM activation_first_events WHERE athlete_id IN ({placeholders})"), changed)
+    cur.execute(_sql(conn, f"DELETE FROM activation_athletes WHERE athlete_id IN ({placeholders})"), changed)
+    cur.executemany(
+        _sql(conn, "INSERT INTO activation_athletes (athlete_id, landing_page, signup_at) VALUES (%s, %s, %s)"),
+        [(athlete_id, states[athlete_id]["landing_page"], states[athlete_id]["signup_at"]) for athlete_id in changed],
+    )
+    first_events = [
+        (athlete_id, stage, reached_at) for athlete_id in changed for stage, reached_at in states[athlete_id]["stages"].items()
+    ]
+    if first_events:
+        cur.executemany(
+            _sql(conn, "INSERT INTO activation_first_events (athlete_id, stage, reached_at) VALUES (%s, %s, %s)"),
+            first_events,
+        )
+    upserts = [(*bucket, delta) for bucket, delta in sorted(deltas.items()) if delta]
+    if upserts:
+        cur.executemany(
+            _sql(
+                conn,
+                """
+                INSERT INTO activation_rollup (signup_day, reached_day, landing_page, stage, athletes)
+                VALUES (%s, %s, %s, %s, %s)
+                ON CONFLICT (signup_day, reached_day, landing_page, stage)
+                DO UPDATE SET athletes = activation_rollup.athletes + excluded.athletes
+                """,
+            ),
+            upserts,
+        )
+        emptied = [bucket for bucket, delta in sorted(deltas.items()) if delta < 0]
+        if emptied:
+            cur.executemany(
+                _sql(
+                    conn,
+                    """
+                    DELETE FROM activation_rollup
+                    WHERE signup_day = %s AND reached_day = %s AND landing_page = %s AND stage = %s AND athletes = 0
+                    """,
+                ),
+                emptied,
+            )
+    return changed
+
+
+def update_rollup(conn: Any, batch_size: int = BATCH_SIZE, until: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Дочитывает user_event с (watermark − LATE_EVENT_DAYS) до until (не включая) и обновляет rollup.
+
+    Returns: {"events": прочитано, "athletes": изменено, "since", "watermark"}.
+    """
+    ensure_schema(conn)
+    watermark = read_watermark(conn)
+    since = (date.fromisoformat(watermark[:10]) - timedelta(days=LATE_EVENT_DAYS)).isoformat() if watermark else None
+
+    events_seen = 0
+    athletes_changed: Set[str] = set()
+    latest = watermark or ""
+    batch: List[Tuple[Any, ...]] = []
+    for event in _stream_events(conn, since, until):
+        batch.append(event)
+        latest = max(latest, _iso(event[2]))
+        if len(batch) >= batch_size:
+            athletes_changed.update(_process_batch(conn, batch))
+            events_seen += len(batch)
+            batch = []
+    if batch:
+        athletes_changed.update(_process_batch(conn, batch))
+        events_seen += len(batch)
+
+    if latest and latest != watermark:
+        cur = conn.cursor()
+        cur.execute(
+            _sql(
+                conn,
+                """
+                INSERT INTO activation_watermark (name, processed_until) VALUES (%s, %s)
+                ON CONFLICT (name) DO UPDATE SET processed_until = excluded.processed_until
+                """,
+            ),
+            [WATERMARK_NAME, latest],
+        )
+    return {"events": events_seen, "athletes": len(athletes_changed), "since": since, "watermark": latest or None}
+
+
+def build_rollup(
+    conn: Any,
+    days_per_batch: int = BOOTSTRAP_DAYS,
+    batch_size: int = BATCH_SIZE,
+    today: Optional[date] = None,
+) -> Dict[str, Any]:
+    """
+    Первичное построение (или догонка) rollup окнами по days_per_batch дней.
+
+    Каждое окно — отдельная транзакция: update_rollup до конца окна, коммит,
+    watermark сдвигается. Последнее окно открыто справа (до конца user_event).
+    Returns: {"events", "athletes" (сумма по окнам), "batches", "watermark"}.
+    """
+    ensure_schema(conn)
+    conn.commit()
+    watermark = read_watermark(conn)
+    start = watermark[:10] if watermark else first_event_day(conn)
+    stats: Dict[str, Any] = {"events": 0, "athletes": 0, "batches": 0, "watermark": watermark}
+    if start is None:
+        return stats
+
+    end = today or date.today()
+    window_end = date.fromisoformat(start)
+    while True:
+        window_end += timedelta(days=max(1, days_per_batch))
+        until = window_end.isoformat() if window_end <= end else None
+        batch = update_rollup(conn, batch_size=batch_size, until=until)
+        conn.commit()
+        stats["events"] += batch["events"]
+        stats["athletes"] += batch["athletes"]
+        stats["batches"] += 1
+        stats["watermark"] = batch["watermark"]
+        if until is None:
+            return stats
+
+
+def query_rollup(conn: Any, date1: str, date2: str) -> List[Dict[str, Any]]:
+    """
+    Воронка по landing page для регистраций в [date1, date2] — строки того
+    же вида, что у полного запроса (landingPage + PRODUCT_EVENT_FIELDS).
+    """
+    cur = conn.cursor()
+    cur.execute(
+        _sql(
+            conn,
+            """
+            SELECT landing_page, stage, SUM(athletes)
+            FROM activation_rollup
+            WHERE signup_day >= %s AND signup_day <= %s AND reached_day <= %s
+            GROUP BY landing_page, stage
+            """,
+        ),
+        [date1, date2, date2],
+    )
+    grouped: Dict[str, Dict[str, Any]] = {}
+    for landing_page, stage, athletes in map(_values, cur.fetchall()):
+        row = grouped.setdefault(landing_page, {"landingPage": landing_page, **{field: 0 for field in PRODUCT_EVENT_FIELDS}})
+        if stage in row:
+            row[stage] += int(athletes or 0)
+    return sorted(grouped.values(), key=lambda row: (-row["signups"], row["landingPage"]))
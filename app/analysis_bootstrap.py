@@ -0,0 +1,172 @@
+from __future__ import annotations
+
+import math
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+DEFAULT_REPLICATES = 500
+DEFAULT_CONFIDENCE = 0.95
+# С какого числа ключей имеет смысл платить за запуск process pool.
+PARALLEL_THRESHOLD = 2000
+CHUNK_SIZE = 1000
+
+# Порог, после которого Пуассон аппроксимируется нормальным распределением.
+_POISSON_NORMAL_CUTOFF = 30.0
+
+
+def _poisson_draws(rng: random.Random, lam: float, size: int) -> List[float]:
+    if lam <= 0:
+        return [0.0] * size
+    if lam >= _POISSON_NORMAL_CUTOFF:
+        gauss = rng.gauss
+        sd = math.sqrt(lam)
+        return [float(max(0, round(gauss(lam, sd)))) for _ in range(size)]
+    # Knuth
+    uniform = rng.random
+    threshold = math.exp(-lam)
+    out = [0.0] * size
+    for r in range(size):
+        k = 0
+        p = uniform()
+        while p > threshold:
+            k += 1
+            p *= uniform()
+        out[r] = float(k)
+    return out
+
+
+def _key_rng(seed: int, index: int) -> random.Random:
+    # Отдельный поток случайных чисел на ключ: результат не зависит от нарезки на чанки.
+    return random.Random(seed * 1_000_003 + index)
+
+
+def _draw_key(x1: float, x2: float, rng: random.Random, replicates: int) -> Tuple[List[float], List[float]]:
+    return _poisson_draws(rng, x1, replicates), _poisson_draws(rng, x2, replicates)
+
+
+def _percentile(sorted_values: Sequence[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    pos = q * (len(sorted_values) - 1)
+    lower = int(math.floor(pos))
+    upper = min(lower + 1, len(sorted_values) - 1)
+    weight = pos - lower
+    return sorted_values[lower] * (1.0 - weight) + sorted_values[upper] * weight
+
+
+def _chunk_totals(args: Tuple[List[Tuple[int, float, float]], int, int]) -> Tuple[List[float], List[float]]:
+    """Фаза 1: суммы p1 и delta по репликам для чанка ключей."""
+    items, replicates, seed = args
+    sum_p1 = [0.0] * replicates
+    sum_delta = [0.0] * replicates
+    for index, x1, x2 in items:
+        p1, p2 = _draw_key(x1, x2, _key_rng(seed, index), replicates)
+        sum_p1 = [a + b for a, b in zip(sum_p1, p1)]
+        sum_delta = [a + b - c for a, b, c in zip(sum_delta, p2, p1)]
+    return sum_p1, sum_delta
+
+
+def _chunk_intervals(
+    args: Tuple[List[Tuple[int, float, float]], int, int, List[float], float],
+) -> List[Tuple[float, float]]:
+    """Фаза 2: интервалы вклада для чанка ключей при известных суммах по репликам."""
+    items, replicates, seed, total_deltas, confidence = args
+    tail = (1.0 - confidence) / 2.0
+    out: List[Tuple[float, float]] = []
+    for index, x1, x2 in items:
+        p1, p2 = _draw_key(x1, x2, _key_rng(seed, index), replicates)
+        contributions = sorted(
+            ((b - a) / total) * 100.0 for a, b, total in zip(p1, p2, total_deltas) if total != 0
+        )
+        out.append((_percentile(contributions, tail), _percentile(contributions, 1.0 - tail)))
+    return out
+
+
+def _chunks(items: List[Tuple[int, float, float]], size: int) -> List[List[Tuple[int, float, float]]]:
+    return [items[i : i + size] for i in range(0, len(items), size)]
+
+
+def bootstrap_contributions(
+    rows: List[Dict[str, Any]],
+    *,
+    value_field: str,
+    replicates: int = DEFAULT_REPLICATES,
+    confidence: float = DEFAULT_CONFIDENCE,
+    seed: int = 0,
+    workers: Optional[int] = None,
+    parallel_threshold: int = PARALLEL_THRESHOLD,
+) -> Dict[str, Any]:
+    """
+    Параметрический bootstrap для contribution_pct и итоговой дельты.
+
+    Значения `<value_field>_p1/_p2` каждой строки перевыбираются как Пуассон,
+    вклад пересчитывается относительно суммарной дельты той же реплики.
+    Строки получают contribution_ci_low / contribution_ci_high и
+    contribution_is_noise (интервал накрывает 0). Большие наборы ключей
+    считаются чанками в process pool.
+
+    Returns:
+        Сводка для workbook["bootstrap"]: параметры и интервалы итоговой дельты.
+    """
+    replicates = max(int(replicates), 1)
+    items = [
+        (index, float(row.get(f"{value_field}_p1", 0.0) or 0.0), float(row.get(f"{value_field}_p2", 0.0) or 0.0))
+        for index, row in enumerate(rows)
+    ]
+    chunks = _chunks(items, CHUNK_SIZE)
+    use_pool = len(items) >= parallel_threshold and workers != 1 and len(chunks) > 1
+
+    if use_pool:
+        max_workers = workers or min(len(chunks), os.cpu_count() or 1)
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            partials = list(pool.map(_chunk_totals, [(chunk, replicates, seed) for chunk in chunks]))
+            sum_p1, total_deltas = _merge_totals(partials, replicates)
+            intervals = [
+                interval
+                for part in pool.map(
+                    _chunk_intervals,
+                    [(chunk, replicates, seed, total_deltas, confidence) for chunk in chunks],
+                )
+                for interval in part
+            ]
+    else:
+        partials = [_chunk_totals((chunk, replicates, seed)) for chunk in chunks]
+        sum_p1, total_deltas = _merge_totals(partials, replicates)
+        intervals = [
+            interval
+            for chunk in chunks
+            for interval in _chunk_intervals((chunk, replicates, seed, total_deltas, confidence))
+        ]
+
+    for row, (low, high) in zip(rows, intervals):
+        row["contribution_ci_low"] = low
+        row["contribution_ci_high"] = high
+        row["contribution_is_noise"] = bool(low <= 0.0 <= high)
+
+    tail = (1.0 - confidence) / 2.0
+    sorted_deltas = sorted(total_deltas)
+    sorted_pcts = sorted((delta / max(p1, 1.0)) * 100.0 for delta, p1 in zip(total_deltas, sum_p1))
+    return {
+        "method": "poisson_parametric",
+        "value_field": value_field,
+        "replicates": replicates,
+        "confidence": confidence,
+        "seed": seed,
+        "parallel": use_pool,
+        "total_delta_ci_low": _percentile(sorted_deltas, tail),
+        "total_delta_ci_high": _percentile(sorted_deltas, 1.0 - tail),
+        "total_delta_pct_ci_low": _percentile(sorted_pcts, tail),
+        "total_delta_pct_ci_high": _percentile(sorted_pcts, 1.0 - tail),
+    }
+
+
+def _merge_totals(partials: List[Tuple[List[float], List[float]]], replicates: int) -> Tuple[List[float], List[float]]:
+    sum_p1 = [0.0] * replicates
+    sum_delta = [0.0] * replicates
+    for part_p1, part_delta in partials:
+        for r in range(replicates):
+            sum_p1[r] += part_p1[r]
+            sum_delta[r] += part_delta[r]
+    return sum_p1, sum_delta
@@ -0,0 +1,269 @@
+from __future__ import annotations
+
+import math
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.cache_io import read_json, write_json
+from app.defaults import CHANGEPOINT_KINDS, DEFAULT_PENALTY_FACTOR
+from app.gsc_client import GSCClient, normalize_gsc_rows
+from app.metrika_client import MetrikaClient, normalize_daily_visits
+
+DEFAULT_MIN_SEGMENT = 3
+DEFAULT_MAX_CHANGEPOINTS = 3
+# Ряды с меньшей суммой за весь интервал не анализируем: там только шум.
+DEFAULT_MIN_TOTAL = 20.0
+
+
+def load_or_fetch_daily(
+    client: str,
+    kind: str,
+    date1: str,
+    date2: str,
+    limit: int,
+    refresh: bool,
+    metrika_client: Optional[MetrikaClient] = None,
+    gsc_client: Optional[GSCClient] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Загружает дневные строки {date, <key>, <value>} из кэша или API.
+
+    kind: pages | sources (Метрика), gsc_queries | gsc_pages (GSC).
+    limit — размер страницы API: ряд выгружается постранично целиком.
+    """
+    if kind not in CHANGEPOINT_KINDS:
+        raise ValueError(f"kind must be one of: {', '.join(CHANGEPOINT_KINDS)}")
+    source, dimension, key_field, _ = CHANGEPOINT_KINDS[kind]
+
+    cache_dir = Path("data_cache") / client
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    prefix = "metrika" if source == "metrika" else "gsc"
+    raw_file = cache_dir / f"{prefix}_daily_{kind}_raw_{date1}_{date2}.json"
+    norm_file = cache_dir / f"{prefix}_daily_{kind}_norm_{date1}_{date2}.json"
+
+    if not refresh and norm_file.exists():
+        return read_json(norm_file)
+
+    if source == "metrika":
+        if metrika_client is None:
+            raise ValueError("metrika_client is required for Metrika series")
+        raw = metrika_client.daily_visits(date1, date2, dimension, limit)
+        received = len(raw.get("data") or [])
+        total_rows = raw.get("total_rows")
+        if isinstance(total_rows, (int, float)) and received < total_rows:
+            # Обрезанный ряд дал бы ложные провалы в конце периода — в кэш его не пишем.
+            raise RuntimeError(f"Метрика отдала {received} строк из {int(total_rows)}: дневной ряд неполный")
+        norm = normalize_daily_visits(raw, key_field)
+    else:
+        if gsc_client is None:
+            raise ValueError("gsc_client is required for GSC series")
+        raw = gsc_client.search_analytics_all(date1=date1, date2=date2, dimensions=["date", dimension], page_size=int(limit))
+        norm = normalize_gsc_rows(raw, ["date", dimension])
+
+    write_json(raw_file, raw)
+    write_json(norm_file, norm)
+    return norm
+
+
+def date_range(date1: str, date2: str) -> List[str]:
+    start = datetime.strptime(date1, "%Y-%m-%d").date()
+    end = datetime.strptime(date2, "%Y-%m-%d").date()
+    return [(start + timedelta(days=i)).isoformat() for i in range((end - start).days + 1)]
+
+
+def build_series(
+    rows: List[Dict[str, Any]],
+    key_field: str,
+    value_field: str,
+    dates: List[str],
+) -> Dict[str, List[float]]:
+    """Плотные дневные ряды по ключам; пропущенные дни = 0."""
+    index = {day: i for i, day in enumerate(dates)}
+    series: Dict[str, List[float]] = {}
+    for row in rows:
+        pos = index.get(str(row.get("date", ""))[:10])
+        if pos is None:
+            continue
+        key = str(row.get(key_field, ""))
+        values = series.get(key)
+        if values is None:
+            values = series[key] = [0.0] * len(dates)
+        values[pos] += float(row.get(value_field, 0.0) or 0.0)
+    return series
+
+
+def _prefix_sums(values: List[float]) -> Tuple[List[float], List[float]]:
+    prefix = [0.0] * (len(values) + 1)
+    prefix_sq = [0.0] * (len(values) + 1)
+    for i, v in enumerate(values):
+        prefix[i + 1] = prefix[i] + v
+        prefix_sq[i + 1] = prefix_sq[i] + v * v
+    return prefix, prefix_sq
+
+
+def _cost(prefix: List[float], prefix_sq: List[float], start: int, end: int) -> float:
+    """Сумма квадратов отклонений от среднего на [start, end)."""
+    n = end - start
+    if n <= 0:
+        return 0.0
+    s = prefix[end] - prefix[start]
+    return (prefix_sq[end] - prefix_sq[start]) - s * s / n
+
+
+def _best_split(prefix: List[float], prefix_sq: List[float], start: int, end: int, min_segment: int) -> Tuple[float, int]:
+    total = _cost(prefix, prefix_sq, start, end)
+    best_gain, best_k = 0.0, -1
+    for k in range(start + min_segment, end - min_segment + 1):
+        gain = total - _cost(prefix, prefix_sq, start, k) - _cost(prefix, prefix_sq, k, end)
+        if gain > best_gain:
+            best_gain, best_k = gain, k
+    return best_gain, best_k
+
+
+def _noise_variance(values: List[float]) -> float:
+    """Оценка дисперсии шума по MAD первых разностей (устойчива к самим сдвигам)."""
+    if len(values) < 3:
+        return 0.0
+    diffs = sorted(abs(values[i + 1] - values[i]) for i in range(len(values) - 1))
+    mid = len(diffs) // 2
+    mad = diffs[mid] if len(diffs) % 2 else (diffs[mid - 1] + diffs[mid]) / 2.0
+    sigma = 1.4826 * mad / math.sqrt(2.0)
+    return sigma * sigma
+
+
+def binary_segmentation(
+    values: List[float],
+    penalty_factor: float = DEFAULT_PENALTY_FACTOR,
+    min_segment: int = DEFAULT_MIN_SEGMENT,
+    max_changepoints: int = DEFAULT_MAX_CHANGEPOINTS,
+) -> List[int]:
+    """
+    Индексы точек смены среднего (начало нового сегмента).
+
+    Жадная бинарная сегментация по SSE с prefix sums: на каждом шаге делим
+    сегмент с максимальным выигрышем, пока выигрыш больше штрафа
+    penalty_factor * sigma^2 * log(n).
+    """
+    n = len(values)
+    if n < 2 * min_segment:
+        return []
+    prefix, prefix_sq = _prefix_sums(values)
+    # Пол для sigma^2: пуассоновский шум среднего уровня, чтобы гладкие ряды не резались на каждом шаге.
+    mean = prefix[n] / n
+    sigma2 = max(_noise_variance(values), 0.25 * mean, 1e-9)
+    penalty = penalty_factor * sigma2 * math.log(n)
+
+    segments = [(0, n)]
+    candidates = {(0, n): _best_split(prefix, prefix_sq, 0, n, min_segment)}
+    changepoints: List[int] = []
+    while len(changepoints) < max_changepoints:
+        segment = max(segments, key=lambda seg: candidates[seg][0])
+        gain, k = candidates[segment]
+        if k < 0 or gain <= penalty:
+            break
+        changepoints.append(k)
+        segments.remove(segment)
+        for part in ((segment[0], k), (k, segment[1])):
+            segments.append(part)
+            candidates[part] = _best_split(prefix, prefix_sq, part[0], part[1], min_segment)
+    return sorted(changepoints)
+
+
+def _describe(values: List[float], dates: List[str], changepoints: List[int]) -> List[Dict[str, Any]]:
+    bounds = [0] + changepoints + [len(values)]
+    means = [sum(values[a:b]) / (b - a) for a, b in zip(bounds, bounds[1:])]
+    out: List[Dict[str, Any]] = []
+    for i, k in enumerate(changepoints):
+        before, after = means[i], means[i + 1]
+        delta = after - before
+        out.append(
+            {
+                "date": dates[k],
+                "mean_before": before,
+                "mean_after": after,
+                "delta": delta,
+                "delta_pct": (delta / max(before, 1.0)) * 100.0,
+                # Сколько единиц метрики изменение даёт за дни до следующего сдвига.
+                "impact": delta * (bounds[i + 2] - k),
+            }
+        )
+    return out
+
+
+def detect_changepoints(
+    series: Dict[str, List[float]],
+    dates: List[str],
+    key_field: str,
+    penalty_factor: float = DEFAULT_PENALTY_FACTOR,
+    min_segment: int = DEFAULT_MIN_SEGMENT,
+    max_changepoints: int = DEFAULT_MAX_CHANGEPOINTS,
+    min_total: float = DEFAULT_MIN_TOTAL,
+) -> List[Dict[str, Any]]:
+    """
+    Точки смены уровня для всех рядов; строки отсортированы по abs(change_impact).
+
+    Для каждого ключа с найденными сдвигами: changepoints (все даты) и
+    change_date / change_delta / change_impact самого весомого сдвига.
+    """
+    rows: List[Dict[str, Any]] = []
+    for key, values in series.items():
+        total = sum(values)
+        if total < min_total:
+            continue
+        cps = binary_segmentation(values, penalty_factor, min_segment, max_changepoints)
+        if not cps:
+            continue
+        described = _describe(values, dates, cps)
+        main = max(described, key=lambda cp: abs(cp["impact"]))
+        rows.append(
+            {
+                key_field: key,
+                "total": total,
+                "change_date": main["date"],
+                "change_delta": main["delta"],
+                "change_delta_pct": main["delta_pct"],
+                "change_impact": main["impact"],
+                "changepoints": described,
+            }
+        )
+    return sorted(rows, key=lambda r: (-abs(r["change_impact"]), str(r.get(key_field, ""))))
+
+
+def create_workbook(
+    client: str,
+    kind: str,
+    date1: str,
+    date2: str,
+    top: int,
+    refresh_used: bool,
+    series_count: int,
+    days: int,
+    rows: List[Dict[str, Any]],
+    penalty_factor: float = DEFAULT_PENALTY_FACTOR,
+) -> Dict[str, Any]:
+    _, _, key_field, value_field = CHANGEPOINT_KINDS[kind]
+    return {
+        "meta": {
+            "client": client,
+            "kind": kind,
+            "date1": date1,
+            "date2": date2,
+            "key_field": key_field,
+            "value_field": value_field,
+            "penalty_factor": penalty_factor,
+            "generated_at": datetime.now(timezone.utc).isoformat().replace("+00:00", "Z"),
+            "top": top,
+            "refresh_used": refresh_used,
+        },
+        "totals": {
+            "series": series_count,
+            "series_with_changes": len(rows),
+            "days": days,
+        },
+        "rows": rows[:top] if top > 0 else rows,
+    }
+
+
+def workbook_filename(kind: str, date1: str, date2: str) -> str:
+    return f"analysis_changepoints_{kind}_{date1.replace('-', '')}__{date2.replace('-', '')}.json"
@@ -1,10 +1,10 @@
 from __future__ import annotations
 
-import json
 from datetime import datetime, timezone
 from pathlib import Path
 from typing import Any, Dict, List, Tuple
 
+from app.cache_io import read_json, write_json
 from app.metrika_client import (
     MetrikaClient,
     normalize_goals_by_page,
@@ -42,7 +42,7 @@ def load_or_fetch_goals_by_source(
 
     if not refresh and norm_file.exists():
         try:
-            cached = json.loads(norm_file.read_text(encoding="utf-8"))
+            cached = read_json(norm_file)
             if isinstance(cached, list) and len(cached) >= max(1, min(fetch_limit, 50)):
                 return cached
         except Exception:
@@ -51,8 +51,8 @@ def load_or_fetch_goals_by_source(
     raw_data = metrika_client.goals_by_source(date1, date2, goal_id, fetch_limit)
     normalized_data = normalize_goals_by_source(raw_data)
 
-    raw_file.write_text(json.dumps(raw_data, ensure_ascii=False, indent=2), encoding="utf-8")
-    norm_file.write_text(json.dumps(normalized_data, ensure_ascii=False, indent=2), encoding="utf-8")
+    write_json(raw_file, raw_data)
+    write_json(norm_file, normalized_data)
     return normalized_data
 
 
@@ -75,7 +75,7 @@ def load_or_fetch_goals_by_page(
 
     if not refresh and norm_file.exists():
         try:
-            cached = json.loads(norm_file.read_text(encoding="utf-8"))
+            cached = read_json(norm_file)
             if isinstance(cached, list) and len(cached) >= max(1, fetch_limit):
                 return cached
         except Exception:
@@ -84,8 +84,8 @@ def load_or_fetch_goals_by_page(
     raw_data = metrika_client.goals_by_page(date1, date2, goal_id, fetch_limit)
     normalized_data = normalize_goals_by_page(raw_data)
 
-    raw_file.write_text(json.dumps(raw_data, ensure_ascii=False, indent=2), encoding="utf-8")
-    norm_file.write_text(json.dumps(normalized_data, ensure_ascii=False, indent=2), encoding="utf-8")
+    write_json(raw_file, raw_data)
+    write_json(norm_file, normalized_data)
     return normalized_data
 
 
@@ -108,7 +108,7 @@ def load_or_fetch_goals_by_source_page(
 
     if not refresh and norm_file.exists():
         try:
-            cached = json.loads(norm_file.read_text(encoding="utf-8"))
+            cached = read_json(norm_file)
             if isinstance(cached, list) and len(cached) >= max(1, min(fetch_limit, 50)):
                 return cached
         except Exception:
@@ -117,8 +117,8 @@ def load_or_fetch_goals_by_source_page(
     raw_data = metrika_client.goals_by_source_page(date1, date2, goal_id, fetch_limit)
     normalized_data = normalize_goals_by_source_page(raw_data)
 
-    raw_file.write_text(json.dumps(raw_data, ensure_ascii=False, indent=2), encoding="utf-8")
-    norm_file.write_text(json.dumps(normalized_data, ensure_ascii=False, indent=2), encoding="utf-8")
+    write_json(raw_file, raw_data)
+    write_json(norm_file, normalized_data)
     return normalized_data
 
 
@@ -182,8 +182,19 @@ def calculate_contributions(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
     return rows
 
 
-def sort_rows(rows: List[Dict[str, Any]], key_field: str) -> List[Dict[str, Any]]:
-    return sorted(rows, key=lambda x: (-abs(x["delta_goal_visits_abs"]), str(x.get(key_field, ""))))
+def sort_rows(rows: List[Dict[str, Any]], key_field: str, demote_noise: bool = False) -> List[Dict[str, Any]]:
+    """
+    Сортировка по abs(delta_goal_visits_abs). С demote_noise строки с volume_is_noise
+    (изменение goal_visits неотличимо от шума) уходят в конец, чтобы top-N не забивался страницами с единичными визитами.
+    """
+    return sorted(
+        rows,
+        key=lambda x: (
+            bool(demote_noise and x.get("volume_is_noise")),
+            -abs(x["delta_goal_visits_abs"]),
+            str(x.get(key_field, "")),
+        ),
+    )
 
 
 def _totals_from_rows(all_rows: List[Dict[str, Any]]) -> Dict[str, Any]:
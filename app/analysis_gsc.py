@@ -1,13 +1,20 @@
 from __future__ import annotations
 
-import json
 from datetime import datetime, timezone
 from pathlib import Path
 from typing import Any, Dict, List, Tuple
 
+from app.cache_io import read_json, write_json
 from app.gsc_client import GSCClient, normalize_gsc_rows
 
 
+def _is_complete(raw_file: Path) -> bool:
+    if not raw_file.exists():
+        return False
+    raw = read_json(raw_file)
+    return isinstance(raw, dict) and raw.get("complete") is True
+
+
 def load_or_fetch_gsc(
     client: str,
     kind: str,  # "queries" | "pages" | "query_page"
@@ -18,7 +25,8 @@ def load_or_fetch_gsc(
     gsc_client: GSCClient,
 ) -> Tuple[List[Dict[str, Any]], List[str]]:
     """
-    Загружает данные GSC из кэша или запрашивает Search Analytics API.
+    Загружает данные GSC из кэша или запрашивает Search Analytics API
+    (постранично; limit <= 0 — все строки).
 
     Returns:
       (normalized_rows, dimensions)
@@ -39,19 +47,21 @@ def load_or_fetch_gsc(
     raw_file = cache_dir / f"gsc_{kind}_raw_{date1}_{date2}.json"
     norm_file = cache_dir / f"gsc_{kind}_norm_{date1}_{date2}.json"
 
+    max_rows = int(limit) if limit and limit > 0 else 0
     if not refresh and norm_file.exists():
         try:
-            cached = json.loads(norm_file.read_text(encoding="utf-8"))
-            if isinstance(cached, list) and len(cached) >= max(1, int(limit) if limit and limit > 0 else 1):
+            cached = read_json(norm_file)
+            # Кэш годится, если строк хватает на limit или прошлая выгрузка забрала всё.
+            if isinstance(cached, list) and ((max_rows and len(cached) >= max_rows) or _is_complete(raw_file)):
                 return cached, dimensions
         except Exception:
             pass
 
-    raw = gsc_client.search_analytics(date1=date1, date2=date2, dimensions=dimensions, row_limit=int(limit))
+    raw = gsc_client.search_analytics_all(date1=date1, date2=date2, dimensions=dimensions, max_rows=max_rows)
     norm = normalize_gsc_rows(raw, dimensions)
 
-    raw_file.write_text(json.dumps(raw, ensure_ascii=False, indent=2), encoding="utf-8")
-    norm_file.write_text(json.dumps(norm, ensure_ascii=False, indent=2), encoding="utf-8")
+    write_json(raw_file, raw)
+    write_json(norm_file, norm)
 
     return norm, dimensions
 
@@ -118,8 +128,19 @@ def calculate_contributions(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
     return rows
 
 
-def sort_rows(rows: List[Dict[str, Any]], key_field: str) -> List[Dict[str, Any]]:
-    return sorted(rows, key=lambda x: (-abs(x["delta_clicks"]), str(x.get(key_field, ""))))
+def sort_rows(rows: List[Dict[str, Any]], key_field: str, demote_noise: bool = False) -> List[Dict[str, Any]]:
+    """
+    Сортировка по abs(delta_clicks). С demote_noise строки с volume_is_noise
+    (изменение clicks неотличимо от шума) уходят в конец.
+    """
+    return sorted(
+        rows,
+        key=lambda x: (
+            bool(demote_noise and x.get("volume_is_noise")),
+            -abs(x["delta_clicks"]),
+            str(x.get(key_field, "")),
+        ),
+    )
 
 
 def _totals_from_rows(all_rows: List[Dict[str, Any]]) -> Dict[str, Any]:
@@ -1,12 +1,12 @@
 from __future__ import annotations
 
-import json
 import re
 from datetime import datetime, timezone
 from pathlib import Path
 from typing import Any, Dict, List
 
-from app.metrika_client import MetrikaClient, normalize_pages
+from app.cache_io import read_json, write_json
+from app.metrika_client import MetrikaClient, is_complete_response, normalize_pages
 
 
 def load_or_fetch_pages(
@@ -30,7 +30,7 @@ def load_or_fetch_pages(
 
     # Проверяем кэш
     if not refresh and norm_file.exists():
-        return json.loads(norm_file.read_text(encoding="utf-8"))
+        return read_json(norm_file)
 
     # Запрашиваем API
     raw_data = metrika_client.landing_pages(date1, date2, limit)
@@ -38,8 +38,8 @@ def load_or_fetch_pages(
 
     # Сохраняем в кэш
     raw_file = cache_dir / f"metrika_pages_raw_{date1}_{date2}.json"
-    raw_file.write_text(json.dumps(raw_data, ensure_ascii=False, indent=2), encoding="utf-8")
-    norm_file.write_text(json.dumps(normalized_data, ensure_ascii=False, indent=2), encoding="utf-8")
+    write_json(raw_file, raw_data)
+    write_json(norm_file, normalized_data)
 
     return normalized_data
 
@@ -76,14 +76,18 @@ def load_or_fetch_pages_by_source(
     raw_file = cache_dir / f"metrika_pages_by_source_raw_{source_slug}_{date1}_{date2}.json"
     norm_file = cache_dir / f"metrika_pages_by_source_norm_{source_slug}_{date1}_{date2}.json"
 
-    # Для анализа вкладов лучше иметь большой срез (но без дополнительных API вызовов).
-    fetch_limit = max(5000, int(limit) if limit and limit > 0 else 0)
+    # Для анализа вкладов лучше иметь большой срез (но без дополнительных API вызовов);
+    # limit <= 0 — все страницы.
+    fetch_limit = max(5000, int(limit)) if limit and limit > 0 else 0
 
-    # Проверяем кэш (если он достаточный по размеру)
+    # Проверяем кэш: строк хватает на fetch_limit или прошлая выгрузка забрала всё
     if not refresh and norm_file.exists():
         try:
-            cached = json.loads(norm_file.read_text(encoding="utf-8"))
-            if isinstance(cached, list) and len(cached) >= max(1, fetch_limit):
+            cached = read_json(norm_file)
+            if isinstance(cached, list) and (
+                (fetch_limit and len(cached) >= fetch_limit)
+                or (raw_file.exists() and is_complete_response(read_json(raw_file)))
+            ):
                 return cached
         except Exception:
             pass
@@ -91,8 +95,8 @@ def load_or_fetch_pages_by_source(
     raw_data = metrika_client.landing_pages_by_source(date1, date2, source, fetch_limit)
     normalized_data = normalize_pages(raw_data)
 
-    raw_file.write_text(json.dumps(raw_data, ensure_ascii=False, indent=2), encoding="utf-8")
-    norm_file.write_text(json.dumps(normalized_data, ensure_ascii=False, indent=2), encoding="utf-8")
+    write_json(raw_file, raw_data)
+    write_json(norm_file, normalized_data)
 
     return normalized_data
 
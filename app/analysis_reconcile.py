@@ -0,0 +1,206 @@
+"""
+Сверка источников по страницам: клики GSC, органика Метрики и индексация Вебмастера.
+
+Одна и та же страница в норме движется в GSC и в Метрике одинаково:
+если клики Google держатся, а визиты из поиска в Метрике пропали, дело
+не в SEO, а в счётчике (снят код, редирект, согласие на cookies).
+Строки обоих сравнений склеиваются по нормализованному URL за один
+проход (словари по колонкам, без вложенных циклов), для каждой страницы
+считается расхождение динамики относительно сайта в целом:
+
+    divergence = ((m2+1)/(m1+1)) / ((g2+1)/(g1+1)) / site_divergence
+
+m — органические визиты Метрики, g — клики GSC. Общий для сайта сдвиг
+(Яндекс рос быстрее Google) сокращается делением на site_divergence —
+медиану того же отношения по страницам, которые есть в обоих источниках:
+сломанные страницы в неё почти не попадают, в отличие от суммы по сайту.
+
+Флаги (только для страниц с кликами GSC не меньше min_clicks):
+- tracking_break — клики GSC есть, визиты Метрики пропали до нуля;
+- not_tracked — клики GSC есть, визитов Метрики нет ни в одном периоде;
+- metrika_down / metrika_up — динамика Метрики расходится с GSC в threshold раз и больше;
+- yandex_excluded — Метрика просела, но Вебмастер исключил URL из поиска:
+  объяснение в индексации Яндекса, а не в счётчике.
+
+Вебмастер не отдаёт клики по страницам, поэтому от него берётся статус
+URL из выгрузок индексации (ym_webmaster_indexing), если они есть в кэше.
+"""
+
+from __future__ import annotations
+
+import math
+import statistics
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import unquote, urlsplit
+
+DEFAULT_MIN_CLICKS = 20.0
+DEFAULT_THRESHOLD = 2.0
+# Статусы Вебмастера, при которых URL в поиске Яндекса есть.
+YMW_SEARCHABLE = {"", "SEARCHABLE", "INDEXED"}
+FLAG_ORDER = ("tracking_break", "not_tracked", "metrika_down", "yandex_excluded", "metrika_up")
+
+
+def normalize_url(url: str) -> str:
+    """
+    Ключ склейки: хост без www и схемы, путь без query/fragment и без
+    завершающего слэша. https://www.Site.ru/a/?utm=1 -> site.ru/a
+    """
+    raw = str(url or "").strip()
+    parts = urlsplit(raw if "//" in raw else f"//{raw}")
+    host = (parts.hostname or "").lower()
+    if host.startswith("www."):
+        host = host[4:]
+    path = unquote(parts.path).rstrip("/") or "/"
+    return f"{host}{path}"
+
+
+def _columns(rows: Iterable[Dict[str, Any]], key_field: str, p1_field: str, p2_field: str) -> Dict[str, Tuple[float, float, str]]:
+    """URL -> (p1, p2, исходный URL); дубли после нормализации суммируются."""
+    out: Dict[str, Tuple[float, float, str]] = {}
+    for row in rows:
+        key = normalize_url(row.get(key_field, ""))
+        v1 = float(row.get(p1_field, 0.0) or 0.0)
+        v2 = float(row.get(p2_field, 0.0) or 0.0)
+        previous = out.get(key)
+        out[key] = (v1, v2, str(row.get(key_field, ""))) if previous is None else (previous[0] + v1, previous[1] + v2, previous[2])
+    return out
+
+
+def _change(v1: float, v2: float) -> float:
+    return (v2 + 1.0) / (v1 + 1.0)
+
+
+def reconcile_pages(
+    gsc_rows: List[Dict[str, Any]],
+    metrika_rows: List[Dict[str, Any]],
+    indexing_rows: Optional[List[Dict[str, Any]]] = None,
+    min_clicks: float = DEFAULT_MIN_CLICKS,
+    threshold: float = DEFAULT_THRESHOLD,
+) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+    """
+    gsc_rows: строки analysis_gsc_pages (page, clicks_p1, clicks_p2);
+    metrika_rows: строки analysis_pages_by_source для органики (landingPage, visits_p1, visits_p2);
+    indexing_rows: выгрузки ym_webmaster_indexing (url, search_url_status).
+
+    Returns: строки по всем страницам (сначала с флагами, по оценке
+    потерянных визитов) и totals.
+    """
+    gsc = _columns(gsc_rows, "page", "clicks_p1", "clicks_p2")
+    metrika = _columns(metrika_rows, "landingPage", "visits_p1", "visits_p2")
+    statuses = {normalize_url(row.get("url", "")): str(row.get("search_url_status", "")) for row in indexing_rows or []}
+
+    keys = list(gsc.keys() | metrika.keys())
+    zero = (0.0, 0.0, "")
+    g1 = [gsc.get(key, zero)[0] for key in keys]
+    g2 = [gsc.get(key, zero)[1] for key in keys]
+    m1 = [metrika.get(key, zero)[0] for key in keys]
+    m2 = [metrika.get(key, zero)[1] for key in keys]
+    matched = [key in gsc and key in metrika for key in keys]
+
+    # Сдвиг сайта в целом — по страницам, которые есть в обоих источниках.
+    ratios = [
+        _change(c, d) / _change(a, b)
+        for a, b, c, d, both in zip(g1, g2, m1, m2, matched)
+        if both and a + b >= min_clicks
+    ]
+    site_divergence = statistics.median(ratios) if ratios else 1.0
+    site_g1 = sum(v for v, both in zip(g1, matched) if both)
+    site_g2 = sum(v for v, both in zip(g2, matched) if both)
+    site_m1 = sum(v for v, both in zip(m1, matched) if both)
+    site_m2 = sum(v for v, both in zip(m2, matched) if both)
+
+    divergence = [_change(a, b) / _change(c, d) / site_divergence for a, b, c, d in zip(m1, m2, g1, g2)]
+    expected_m2 = [a * _change(c, d) * site_divergence for a, c, d in zip(m1, g1, g2)]
+
+    rows: List[Dict[str, Any]] = []
+    flag_counts = {flag: 0 for flag in FLAG_ORDER}
+    for i, key in enumerate(keys):
+        status = statuses.get(key, "")
+        flag = ""
+        if g1[i] + g2[i] >= min_clicks:
+            if m1[i] == 0 and m2[i] == 0:
+                flag = "not_tracked"
+            elif m2[i] == 0 and g2[i] >= min_clicks / 2:
+                flag = "tracking_break"
+            elif divergence[i] <= 1.0 / threshold:
+                flag = "metrika_down"
+            elif divergence[i] >= threshold:
+                flag = "metrika_up"
+            if flag in ("tracking_break", "metrika_down") and status not in YMW_SEARCHABLE:
+                flag = "yandex_excluded"
+        if flag:
+            flag_counts[flag] += 1
+        rows.append(
+            {
+                "url": key,
+                "gsc_page": gsc.get(key, zero)[2],
+                "metrika_page": metrika.get(key, zero)[2],
+                "clicks_p1": g1[i],
+                "clicks_p2": g2[i],
+                "visits_p1": m1[i],
+                "visits_p2": m2[i],
+                "visits_per_click_p1": m1[i] / g1[i] if g1[i] else None,
+                "visits_per_click_p2": m2[i] / g2[i] if g2[i] else None,
+                "divergence": divergence[i],
+                "log2_divergence": math.log2(divergence[i]),
+                "visits_gap": m2[i] - expected_m2[i],
+                "ymw_status": status,
+                "flag": flag,
+            }
+        )
+
+    rank = {flag: position for position, flag in enumerate(FLAG_ORDER)}
+    rows.sort(key=lambda row: (not row["flag"], rank.get(row["flag"], len(rank)), row["visits_gap"], row["url"]))
+    totals = {
+        "pages": len(keys),
+        "pages_gsc": len(gsc),
+        "pages_metrika": len(metrika),
+        "pages_matched": sum(matched),
+        "pages_flagged": sum(flag_counts.values()),
+        "flags": flag_counts,
+        "site_clicks_p1": site_g1,
+        "site_clicks_p2": site_g2,
+        "site_visits_p1": site_m1,
+        "site_visits_p2": site_m2,
+        "site_divergence": site_divergence,
+    }
+    return rows, totals
+
+
+def create_workbook(
+    client: str,
+    p1_start: str,
+    p1_end: str,
+    p2_start: str,
+    p2_end: str,
+    source: str,
+    top: int,
+    refresh_used: bool,
+    rows: List[Dict[str, Any]],
+    totals: Dict[str, Any],
+    min_clicks: float = DEFAULT_MIN_CLICKS,
+    threshold: float = DEFAULT_THRESHOLD,
+) -> Dict[str, Any]:
+    return {
+        "meta": {
+            "client": client,
+            "p1_start": p1_start,
+            "p1_end": p1_end,
+            "p2_start": p2_start,
+            "p2_end": p2_end,
+            "metrika_source": source,
+            "min_clicks": min_clicks,
+            "threshold": threshold,
+            "generated_at": datetime.now(timezone.utc).isoformat().replace("+00:00", "Z"),
+            "top": top,
+            "refresh_used": refresh_used,
+        },
+        "totals": totals,
+        "rows": rows[:top] if top > 0 else rows,
+    }
+
+
+def workbook_filename(p1_start: str, p1_end: str, p2_start: str, p2_end: str) -> str:
+    slug = f"{p1_start}{p1_end}__{p2_start}{p2_end}".replace("-", "")
+    return f"analysis_reconcile_pages_{slug}.json"
@@ -0,0 +1,241 @@
+from __future__ import annotations
+
+import math
+from typing import Any, Dict, List, Sequence, Tuple
+
+# Сила априорного распределения в "псевдо-визитах": чем больше, тем сильнее
+# маленькие строки стягиваются к общему CR/CTR.
+DEFAULT_PRIOR_STRENGTH = 50.0
+DEFAULT_ALPHA = 0.05
+# z-квантиль для 95% интервала
+DEFAULT_Z = 1.959963984540054
+
+_SQRT2 = math.sqrt(2.0)
+
+
+def _column(rows: Sequence[Dict[str, Any]], field: str) -> List[float]:
+    return [float(row.get(field, 0.0) or 0.0) for row in rows]
+
+
+def two_proportion_p_values(
+    successes_p1: Sequence[float],
+    trials_p1: Sequence[float],
+    successes_p2: Sequence[float],
+    trials_p2: Sequence[float],
+) -> List[float]:
+    """
+    Двусторонний z-test для разницы двух долей по целым колонкам.
+
+    Строки без наблюдений в одном из периодов получают p_value = 1.0.
+    """
+    out: List[float] = []
+    for x1, n1, x2, n2 in zip(successes_p1, trials_p1, successes_p2, trials_p2):
+        if n1 <= 0 or n2 <= 0:
+            out.append(1.0)
+            continue
+        pooled = (x1 + x2) / (n1 + n2)
+        variance = pooled * (1.0 - pooled) * (1.0 / n1 + 1.0 / n2)
+        if variance <= 0:
+            out.append(1.0 if x1 / n1 == x2 / n2 else 0.0)
+            continue
+        z = (x2 / n2 - x1 / n1) / math.sqrt(variance)
+        out.append(math.erfc(abs(z) / _SQRT2))
+    return out
+
+
+def poisson_delta_p_values(
+    counts_p1: Sequence[float],
+    counts_p2: Sequence[float],
+    days_p1: float = 1.0,
+    days_p2: float = 1.0,
+) -> List[float]:
+    """
+    Двусторонний тест разницы объёмов (визиты с целью, клики) как пуассоновских счётчиков.
+
+    При H0 (одинаковый дневной темп) x2 | x1 + x2 ~ Binomial(n, r), n = x1 + x2,
+    r = days_p2 / (days_p1 + days_p2); нормальное приближение
+    z = (x2 - n*r) / sqrt(n*r*(1 - r)). Пустые строки — p_value = 1.0.
+    """
+    if days_p1 <= 0 or days_p2 <= 0:
+        raise ValueError("days_p1 and days_p2 must be positive")
+    share = days_p2 / (days_p1 + days_p2)
+    out: List[float] = []
+    for x1, x2 in zip(counts_p1, counts_p2):
+        x1, x2 = max(x1, 0.0), max(x2, 0.0)
+        total = x1 + x2
+        if total <= 0:
+            out.append(1.0)
+            continue
+        z = (x2 - total * share) / math.sqrt(total * share * (1.0 - share))
+        out.append(math.erfc(abs(z) / _SQRT2))
+    return out
+
+
+def beta_binomial_shrinkage(
+    successes: Sequence[float],
+    trials: Sequence[float],
+    prior_mean: float,
+    prior_strength: float = DEFAULT_PRIOR_STRENGTH,
+) -> Tuple[List[float], List[float]]:
+    """
+    Апостериорные среднее и дисперсия доли для Beta(prior) x Binomial.
+
+    Returns:
+        (posterior_means, posterior_variances) — доли в диапазоне 0..1
+    """
+    prior_mean = min(max(prior_mean, 1e-9), 1.0 - 1e-9)
+    a0 = prior_mean * prior_strength
+    b0 = (1.0 - prior_mean) * prior_strength
+
+    means: List[float] = []
+    variances: List[float] = []
+    for x, n in zip(successes, trials):
+        x = min(max(x, 0.0), max(n, 0.0))
+        a = a0 + x
+        b = b0 + max(n, 0.0) - x
+        total = a + b
+        means.append(a / total)
+        variances.append((a * b) / (total * total * (total + 1.0)))
+    return means, variances
+
+
+def annotate_proportion_significance(
+    rows: List[Dict[str, Any]],
+    *,
+    prefix: str,
+    successes_field: str,
+    trials_field: str,
+    alpha: float = DEFAULT_ALPHA,
+    prior_strength: float = DEFAULT_PRIOR_STRENGTH,
+) -> List[Dict[str, Any]]:
+    """
+    Добавляет к строкам сравнения оценку шума для доли (CR/CTR).
+
+    Поля берутся как `<successes_field>_p1/_p2` и `<trials_field>_p1/_p2`.
+    Добавляет:
+      - <prefix>_p_value: z-test разницы долей
+      - <prefix>_p1_shrunk, <prefix>_p2_shrunk: доли после shrinkage к общему уровню (%)
+      - <prefix>_delta_pp_shrunk: разница shrunk-долей (п.п.)
+      - <prefix>_ci_low_pp, <prefix>_ci_high_pp: 95% credible interval разницы (п.п.)
+      - <prefix>_is_noise: изменение неотличимо от шума
+    """
+    if not rows:
+        return rows
+
+    x1 = _column(rows, f"{successes_field}_p1")
+    n1 = _column(rows, f"{trials_field}_p1")
+    x2 = _column(rows, f"{successes_field}_p2")
+    n2 = _column(rows, f"{trials_field}_p2")
+
+    # Empirical Bayes: априорный уровень = общая доля по всем строкам обоих периодов.
+    total_trials = sum(n1) + sum(n2)
+    prior_mean = (sum(x1) + sum(x2)) / total_trials if total_trials > 0 else 0.0
+
+    p_values = two_proportion_p_values(x1, n1, x2, n2)
+    mean1, var1 = beta_binomial_shrinkage(x1, n1, prior_mean, prior_strength)
+    mean2, var2 = beta_binomial_shrinkage(x2, n2, prior_mean, prior_strength)
+
+    z = DEFAULT_Z if alpha == DEFAULT_ALPHA else _z_for_alpha(alpha)
+    for row, p_value, m1, v1, m2, v2 in zip(rows, p_values, mean1, var1, mean2, var2):
+        delta = (m2 - m1) * 100.0
+        half_width = z * math.sqrt(v1 + v2) * 100.0
+        ci_low = delta - half_width
+        ci_high = delta + half_width
+        row[f"{prefix}_p_value"] = p_value
+        row[f"{prefix}_p1_shrunk"] = m1 * 100.0
+        row[f"{prefix}_p2_shrunk"] = m2 * 100.0
+        row[f"{prefix}_delta_pp_shrunk"] = delta
+        row[f"{prefix}_ci_low_pp"] = ci_low
+        row[f"{prefix}_ci_high_pp"] = ci_high
+        row[f"{prefix}_is_noise"] = bool(p_value >= alpha or ci_low <= 0.0 <= ci_high)
+    return rows
+
+
+def _z_for_alpha(alpha: float) -> float:
+    """Квантиль нормального распределения для двустороннего alpha (бисекция по erfc)."""
+    low, high = 0.0, 10.0
+    for _ in range(80):
+        mid = (low + high) / 2.0
+        if math.erfc(mid / _SQRT2) > alpha:
+            low = mid
+        else:
+            high = mid
+    return (low + high) / 2.0
+
+
+def annotate_volume_significance(
+    rows: List[Dict[str, Any]],
+    *,
+    count_field: str,
+    alpha: float = DEFAULT_ALPHA,
+    days_p1: float = 1.0,
+    days_p2: float = 1.0,
+) -> List[Dict[str, Any]]:
+    """
+    Добавляет к строкам оценку шума для изменения объёма `<count_field>_p1 -> _p2`.
+    days_p1/days_p2 — длины периодов в днях (по умолчанию равные).
+
+    Добавляет:
+      - volume_p_value: пуассоновский тест разницы счётчиков
+      - volume_is_noise: изменение объёма неотличимо от шума
+    """
+    p_values = poisson_delta_p_values(
+        _column(rows, f"{count_field}_p1"), _column(rows, f"{count_field}_p2"), days_p1, days_p2
+    )
+    for row, p_value in zip(rows, p_values):
+        row["volume_p_value"] = p_value
+        row["volume_is_noise"] = bool(p_value >= alpha)
+    return rows
+
+
+def annotate_goals_significance(
+    rows: List[Dict[str, Any]],
+    alpha: float = DEFAULT_ALPHA,
+    days_p1: float = 1.0,
+    days_p2: float = 1.0,
+) -> List[Dict[str, Any]]:
+    """Шум для CR (goal_visits / visits) и для объёма goal_visits (строки compare_goals_periods)."""
+    rows = annotate_proportion_significance(
+        rows,
+        prefix="cr",
+        successes_field="goal_visits",
+        trials_field="visits",
+        alpha=alpha,
+    )
+    return annotate_volume_significance(rows, count_field="goal_visits", alpha=alpha, days_p1=days_p1, days_p2=days_p2)
+
+
+def annotate_gsc_significance(
+    rows: List[Dict[str, Any]],
+    alpha: float = DEFAULT_ALPHA,
+    days_p1: float = 1.0,
+    days_p2: float = 1.0,
+) -> List[Dict[str, Any]]:
+    """Шум для CTR (clicks / impressions) и для объёма clicks (строки compare_gsc_periods)."""
+    rows = annotate_proportion_significance(
+        rows,
+        prefix="ctr",
+        successes_field="clicks",
+        trials_field="impressions",
+        alpha=alpha,
+    )
+    return annotate_volume_significance(rows, count_field="clicks", alpha=alpha, days_p1=days_p1, days_p2=days_p2)
+
+
+def is_noise(row: Dict[str, Any]) -> bool:
+    """
+    True, если изменение объёма строки (volume_is_noise) или её вклад (bootstrap) неотличимы от шума.
+
+    Флаги cr_is_noise/ctr_is_noise сюда не входят: они про долю, а строки
+    ранжируются по объёму — доля нужна только для гипотез про CR/CTR.
+    """
+    return bool(row.get("volume_is_noise") or row.get("contribution_is_noise"))
+
+
+def signal_rows(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Строки без флага шума. Если все строки шумовые (или флагов нет),
+    возвращает исходный список, чтобы не терять драйверы целиком.
+    """
+    filtered = [row for row in rows if not is_noise(row)]
+    return filtered or rows
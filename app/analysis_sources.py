@@ -1,11 +1,11 @@
 from __future__ import annotations
 
-import json
 import os
 from datetime import datetime, timezone
 from pathlib import Path
 from typing import Any, Dict, List
 
+from app.cache_io import read_json, write_json
 from app.metrika_client import MetrikaClient, normalize_sources
 
 
@@ -30,7 +30,7 @@ def load_or_fetch_sources(
     
     # Проверяем кэш
     if not refresh and norm_file.exists():
-        return json.loads(norm_file.read_text(encoding="utf-8"))
+        return read_json(norm_file)
     
     # Запрашиваем API
     raw_data = metrika_client.traffic_sources(date1, date2, limit)
@@ -38,8 +38,8 @@ def load_or_fetch_sources(
     
     # Сохраняем в кэш
     raw_file = cache_dir / f"metrika_sources_raw_{date1}_{date2}.json"
-    raw_file.write_text(json.dumps(raw_data, ensure_ascii=False, indent=2), encoding="utf-8")
-    norm_file.write_text(json.dumps(normalized_data, ensure_ascii=False, indent=2), encoding="utf-8")
+    write_json(raw_file, raw_data)
+    write_json(norm_file, normalized_data)
     
     return normalized_data
 
@@ -1,10 +1,10 @@
 from __future__ import annotations
 
-import json
 from datetime import datetime, timezone
 from pathlib import Path
 from typing import Any, Dict, List
 
+from app.cache_io import read_json, write_json
 from app.ym_webmaster_client import YMWebmasterClient, normalize_webmaster_queries
 
 
@@ -24,7 +24,7 @@ def load_or_fetch_queries(
 
     if not refresh and norm_file.exists():
         try:
-            cached = json.loads(norm_file.read_text(encoding="utf-8"))
+            cached = read_json(norm_file)
             if isinstance(cached, list) and len(cached) >= max(1, int(limit) if limit and limit > 0 else 1):
                 return cached
         except Exception:
@@ -33,8 +33,8 @@ def load_or_fetch_queries(
     raw = ym.popular_queries(date_from=date1, date_to=date2, limit=int(limit))
     norm = normalize_webmaster_queries(raw)
 
-    raw_file.write_text(json.dumps(raw, ensure_ascii=False, indent=2), encoding="utf-8")
-    norm_file.write_text(json.dumps(norm, ensure_ascii=False, indent=2), encoding="utf-8")
+    write_json(raw_file, raw)
+    write_json(norm_file, norm)
     return norm
 
 
@@ -0,0 +1,84 @@
+"""
+Контентно-адресуемое хранилище артефактов: sha256 → сжатый blob.
+
+Workbook-и, выгрузки API из data_cache/ и логи шагов, на которые ссылается
+evidence.json, снимаются сюда по хэшу содержимого. --refresh может
+переписать data_cache/, но evidence старого расследования по-прежнему
+указывает на те данные, на которых оно сделано. Одинаковое содержимое
+хранится один раз на все расследования: архив за месяцы стоит столько,
+сколько уникальных данных.
+
+    reports/_store/ab/ab12…ef.gz
+"""
+
+from __future__ import annotations
+
+import gzip
+import hashlib
+import os
+import threading
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+DEFAULT_STORE_DIR = Path("reports") / "_store"
+
+
+class ArtifactStore:
+    def __init__(self, root: Optional[Path] = None) -> None:
+        self.root = Path(root) if root is not None else DEFAULT_STORE_DIR
+        self.stats: Dict[str, int] = {"stored": 0, "deduplicated": 0, "bytes_in": 0, "bytes_stored": 0}
+        # (путь, mtime_ns, size) → sha256: один и тот же файл не хэшируем повторно.
+        self._file_digests: Dict[Tuple[str, int, int], str] = {}
+        self._lock = threading.Lock()
+
+    def path_for(self, digest: str) -> Path:
+        return self.root / digest[:2] / f"{digest}.gz"
+
+    def has(self, digest: str) -> bool:
+        return self.path_for(digest).exists()
+
+    def put_bytes(self, data: bytes) -> str:
+        """Кладёт содержимое (если такого ещё нет). Returns: sha256."""
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.path_for(digest)
+        with self._lock:
+            self.stats["bytes_in"] += len(data)
+        if path.exists():
+            with self._lock:
+                self.stats["deduplicated"] += 1
+            return digest
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Уникальный tmp на поток и процесс; os.replace атомарен, гонка одинаковых blob-ов безопасна.
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        # mtime=0: один и тот же blob даёт побайтно один и тот же файл.
+        with open(tmp_path, "wb") as raw, gzip.GzipFile(fileobj=raw, mode="wb", mtime=0) as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        with self._lock:
+            self.stats["stored"] += 1
+            self.stats["bytes_stored"] += path.stat().st_size
+        return digest
+
+    def put_text(self, text: str) -> str:
+        return self.put_bytes(text.encode("utf-8"))
+
+    def put_file(self, path: Path | str) -> str:
+        stat = os.stat(path)
+        key = (str(path), stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            digest = self._file_digests.get(key)
+        if digest is not None and self.has(digest):
+            return digest
+        digest = self.put_bytes(Path(path).read_bytes())
+        with self._lock:
+            self._file_digests[key] = digest
+        return digest
+
+    def get_bytes(self, digest: str) -> bytes:
+        path = self.path_for(digest)
+        if not path.exists():
+            raise FileNotFoundError(f"Artifact not found in store: {digest}")
+        return gzip.decompress(path.read_bytes())
+
+    def get_text(self, digest: str) -> str:
+        return self.get_bytes(digest).decode("utf-8")
@@ -5,10 +5,12 @@ Audit Layer для проверки данных, выводов и гипоте
 Этот модуль реализует механизм "devil's advocate" - ставит под сомнение каждое утверждение.
 """
 
-from typing import Dict, List, Any, Optional, Tuple
+from typing import Dict, Iterable, List, Any, Optional, Tuple
 from dataclasses import dataclass
 from pathlib import Path
+import csv
 import json
+import os
 from datetime import datetime
 
 
@@ -33,6 +35,78 @@ class DataPoint:
     context: Dict[str, Any]  # Дополнительный контекст
 
 
+class SourceIndex:
+    """
+    Индекс JSON-источника: имя ключа → [(путь, значение)] и путь → значение.
+
+    Документ разбирается один раз, дальше любая метрика ищется за O(1).
+    Пути вида totals.total_visits_p1, rows[3].visits или rows.length
+    (длина списка). Совпадения по имени ключа идут в порядке прежнего
+    поиска: ключи уровня раньше вложенных, вложенные — в порядке документа.
+    """
+
+    def __init__(self, data: Any):
+        self.by_key: Dict[str, List[Tuple[str, Any]]] = {}
+        self.by_path: Dict[str, Any] = {}
+        self._walk(data, "")
+
+    def _walk(self, node: Any, prefix: str) -> None:
+        if isinstance(node, dict):
+            children = []
+            for key, value in node.items():
+                path = f"{prefix}.{key}" if prefix else str(key)
+                self.by_key.setdefault(str(key), []).append((path, value))
+                self.by_path[path] = value
+                if isinstance(value, (dict, list)):
+                    children.append((path, value))
+            for path, value in children:
+                self._walk(value, path)
+        elif isinstance(node, list):
+            # Длина списка тоже цифра отчёта («N URL в выборке»): rows.length
+            self.by_path[f"{prefix}.length" if prefix else "length"] = len(node)
+            for position, item in enumerate(node):
+                if isinstance(item, (dict, list)):
+                    self._walk(item, f"{prefix}[{position}]")
+
+    def lookup(self, metric: str) -> List[Tuple[str, Any]]:
+        """Полный путь — ровно одно совпадение; имя ключа — все его вхождения."""
+        if metric in self.by_path and ("." in metric or "[" in metric):
+            return [(metric, self.by_path[metric])]
+        return self.by_key.get(metric, [])
+
+
+def parse_claim_value(value_str: str) -> Any:
+    """Число, если строка им является, иначе строка как есть."""
+    try:
+        return float(value_str)
+    except ValueError:
+        return value_str
+
+
+def read_claims_csv(path: Path, default_source: str = "", default_period: str = "") -> List[DataPoint]:
+    """
+    Утверждения из CSV с заголовком metric,value,source,period
+    (source и period можно не указывать — берутся значения по умолчанию).
+    """
+    points: List[DataPoint] = []
+    with open(path, newline="", encoding="utf-8") as f:
+        for line_number, row in enumerate(csv.DictReader(f), start=2):
+            metric = (row.get("metric") or "").strip()
+            source = (row.get("source") or "").strip() or default_source
+            if not metric or row.get("value") is None or not source:
+                raise ValueError(f"{path}:{line_number}: нужны metric, value и source")
+            points.append(
+                DataPoint(
+                    metric=metric,
+                    value=parse_claim_value(row["value"].strip()),
+                    source_file=source,
+                    period=(row.get("period") or "").strip() or default_period,
+                    context={"line": line_number},
+                )
+            )
+    return points
+
+
 class AuditEngine:
     """
     Движок аудита данных и выводов.
@@ -50,6 +124,20 @@ class AuditEngine:
         self.reports_dir = reports_dir / client_name
         self.cache_dir = Path("data_cache") / client_name
         self.audit_log: List[AuditResult] = []
+        # Разобранные источники: путь → ((mtime_ns, size), индекс); переписанный файл разбирается заново.
+        self._indexes: Dict[Path, Tuple[Tuple[int, int], SourceIndex]] = {}
+        self._resolved: Dict[str, Optional[Path]] = {}
+
+    def source_index(self, source_path: Path) -> SourceIndex:
+        stat = os.stat(source_path)
+        version = (stat.st_mtime_ns, stat.st_size)
+        cached = self._indexes.get(source_path)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        with open(source_path, "r", encoding="utf-8") as f:
+            index = SourceIndex(json.load(f))
+        self._indexes[source_path] = (version, index)
+        return index
 
     def _resolve_source_path(self, source_file: str) -> Optional[Path]:
         """
@@ -97,7 +185,9 @@ class AuditEngine:
         evidence = []
         
         # 1. Проверка существования файла
-        source_path = self._resolve_source_path(data_point.source_file)
+        if data_point.source_file not in self._resolved:
+            self._resolved[data_point.source_file] = self._resolve_source_path(data_point.source_file)
+        source_path = self._resolved[data_point.source_file]
         if source_path is None:
             issues.append(f"Source file not found: {data_point.source_file}")
             return AuditResult(
@@ -111,28 +201,24 @@ class AuditEngine:
         
         evidence.append(str(source_path))
         
-        # 2. Проверка наличия метрики в файле
+        # 2. Проверка наличия метрики в файле (источник разбирается один раз на движок)
         try:
-            with open(source_path, 'r') as f:
-                source_data = json.load(f)
-            
-            # Ищем метрику в данных
-            metric_found = self._find_metric_in_data(
-                source_data, 
-                data_point.metric, 
-                data_point.period
-            )
-            
-            if not metric_found:
+            matches = [(path, value) for path, value in self.source_index(source_path).lookup(data_point.metric) if value is not None]
+
+            if not matches:
                 issues.append(f"Metric '{data_point.metric}' not found in source")
             else:
-                # 3. Проверка значения
+                # 3. Проверка значения: по первому вхождению, как раньше
+                path, metric_found = matches[0]
+                evidence[-1] = f"{source_path}#{path}"
                 if metric_found != data_point.value:
-                    issues.append(
-                        f"Value mismatch: claimed {data_point.value}, "
-                        f"source has {metric_found}"
-                    )
-        
+                    issue = f"Value mismatch: claimed {data_point.value}, source has {metric_found} at {path}"
+                    elsewhere = [other for other, value in matches[1:] if value == data_point.value]
+                    if elsewhere:
+                        # Ключ встречается несколько раз: подсказываем полный путь вместо ложного PASS.
+                        issue += f"; claimed value is at {', '.join(elsewhere[:3])} — specify the full path"
+                    issues.append(issue)
+
         except Exception as e:
             issues.append(f"Error reading source: {str(e)}")
         
@@ -153,12 +239,20 @@ class AuditEngine:
             confidence=confidence
         )
     
+    def verify_data_sources(self, data_points: Iterable[DataPoint]) -> List[AuditResult]:
+        """
+        Пакетная проверка: каждый источник читается и индексируется один раз,
+        дальше каждое утверждение — поиск в индексе.
+        """
+        return [self.verify_data_source(data_point) for data_point in data_points]
+
     def verify_calculation(
         self, 
         result: float, 
         operands: List[float], 
         operation: str,
-        description: str
+        description: str,
+        tolerance: float = 0.01
     ) -> AuditResult:
         """
         Проверяет правильность математических расчетов.
@@ -168,6 +262,7 @@ class AuditEngine:
             operands: Операнды
             operation: Тип операции (sum, delta, pct_change, avg, etc)
             description: Описание расчета
+            tolerance: Допустимая погрешность (для округлённых цифр отчёта — полразряда)
         """
         issues = []
         expected = None
@@ -188,7 +283,7 @@ class AuditEngine:
         
         if expected is not None:
             # Допускаем погрешность округления
-            if abs(result - expected) > 0.01:
+            if abs(result - expected) > tolerance:
                 issues.append(
                     f"Calculation error: expected {expected:.2f}, got {result:.2f}"
                 )
@@ -316,23 +411,30 @@ class AuditEngine:
             confidence=confidence
         )
     
-    def audit_report(self, report_data: Dict[str, Any]) -> Dict[str, Any]:
+    def audit_report(self, report_data: Dict[str, Any], workers: int = 0) -> Dict[str, Any]:
         """
         Полный аудит отчета перед публикацией.
         
         Проверяет:
         - Все цифры имеют источники
         - Все расчеты верны
-        - Все гипотезы обоснованы
-        - Нет противоречий
-        """
-        self.audit_log = []
+        - Цифры совпадают с источником (с точностью до округления в отчёте)
         
-        # TODO: Реализовать полный аудит структуры отчета
-        # Это будет зависеть от формата отчета
+        Args:
+            report_data: {"markdown": текст report.md, "evidence": evidence.json или None}
+                (см. report_audit.load_report)
+            workers: Процессов для проверки источников (0 = по числу CPU)
+        """
+        from app.report_audit import audit_markdown
+
+        self.audit_log, stats = audit_markdown(
+            self, report_data["markdown"], report_data.get("evidence"), workers=workers
+        )
         
         summary = {
             "total_checks": len(self.audit_log),
+            "cached": stats["cached"],
+            "sources": stats["sources"],
             "passed": len([a for a in self.audit_log if a.status == "passed"]),
             "warnings": len([a for a in self.audit_log if a.status == "warning"]),
             "failed": len([a for a in self.audit_log if a.status == "failed"]),
@@ -350,30 +452,6 @@ class AuditEngine:
         
         return summary
     
-    def _find_metric_in_data(
-        self, 
-        data: Dict[str, Any], 
-        metric: str, 
-        period: str
-    ) -> Optional[Any]:
-        """Ищет метрику в структуре данных"""
-        if metric in data:
-            return data.get(metric)
-
-        for value in data.values():
-            if isinstance(value, dict):
-                nested = self._find_metric_in_data(value, metric, period)
-                if nested is not None:
-                    return nested
-            elif isinstance(value, list):
-                for item in value:
-                    if isinstance(item, dict):
-                        nested = self._find_metric_in_data(item, metric, period)
-                        if nested is not None:
-                            return nested
-
-        return None
-    
     def _generate_alternative_hypotheses(
         self,
         original: str,
@@ -391,11 +469,12 @@ class AuditEngine:
         - Конкуренция
         """
         alternatives = []
+        seasonal = self._seasonal_alternative(context)
         
         # Примеры альтернатив (можно расширить с помощью LLM)
         if "падение" in original.lower() or "снижение" in original.lower():
             alternatives.extend([
-                "Сезонное снижение активности",
+                "Сезонное снижение активности" if seasonal is None else seasonal,
                 "Технические проблемы с tracking",
                 "Изменения в методологии измерения",
                 "Внешние факторы (экономика, конкуренты)"
@@ -403,13 +482,31 @@ class AuditEngine:
         
         if "рост" in original.lower() or "увеличение" in original.lower():
             alternatives.extend([
-                "Сезонный пик активности",
+                "Сезонный пик активности" if seasonal is None else seasonal,
                 "Разовая акция/кампания",
                 "Изменения в учете данных",
                 "Общий рост рынка"
             ])
         
+        # Baseline показала, что сезонность изменение не объясняет
+        alternatives = [alt for alt in alternatives if alt]
         return alternatives[:3]  # Топ-3 альтернативы
+
+    def _seasonal_alternative(self, context: Dict[str, Any]) -> Optional[str]:
+        """
+        Сезонная альтернатива по baseline-модели из context["baseline"]
+        (workbook["baseline"]). Без baseline — общий текст, если сезонность
+        не объясняет факт — пустая строка (альтернатива снимается).
+        """
+        baseline = context.get("baseline") if context else None
+        if not baseline:
+            return None
+        expected = float(baseline.get("expected_total_p2", 0.0) or 0.0)
+        actual = float(baseline.get("actual_total_p2", 0.0) or 0.0)
+        deviation = float(baseline.get("delta_vs_expected_pct", 0.0) or 0.0)
+        if abs(deviation) < 5.0:
+            return f"Сезонность: ожидалось {expected:.0f}, факт {actual:.0f} ({deviation:+.1f}% к baseline)"
+        return ""
     
     def _assess_hypothesis_confidence(
         self,
@@ -0,0 +1,235 @@
+from __future__ import annotations
+
+import json
+import re
+from datetime import date, datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from app.analysis_changepoints import CHANGEPOINT_KINDS, build_series, date_range
+
+# Ключ модели для суммы по всем ключам среза.
+TOTAL_KEY = "__total__"
+DEFAULT_MIN_TOTAL = 50.0
+DEFAULT_MAX_KEYS = 5000
+# Годовую сезонность оцениваем только при истории не короче года,
+# иначе месячные факторы впитают тренд.
+MIN_DAYS_FOR_YEARLY = 365
+# Фактор дня недели / месяца оцениваем, только если этих дней в истории достаточно;
+# иначе фактор 1.0 (нет данных — нет сезонной поправки).
+MIN_DAYS_PER_WEEKDAY = 3
+MIN_DAYS_PER_MONTH = 14
+
+_NORM_PERIOD_RE = re.compile(r"_norm_(\d{4}-\d{2}-\d{2})_(\d{4}-\d{2}-\d{2})\.json$")
+
+
+def baselines_path(client: str, kind: str) -> Path:
+    return Path("data_cache") / client / f"baselines_{kind}.json"
+
+
+def _daily_cache_files(client: str, kind: str) -> List[Path]:
+    source = CHANGEPOINT_KINDS[kind][0]
+    prefix = "metrika" if source == "metrika" else "gsc"
+    return sorted((Path("data_cache") / client).glob(f"{prefix}_daily_{kind}_norm_*.json"))
+
+
+def load_daily_history(client: str, kind: str) -> List[Dict[str, Any]]:
+    """
+    Все закэшированные дневные строки для kind (из detect-changepoints / fit-baselines).
+
+    Пересекающиеся выгрузки схлопываются по (date, key): побеждает более поздний файл.
+    """
+    _, _, key_field, _ = CHANGEPOINT_KINDS[kind]
+    merged: Dict[tuple, Dict[str, Any]] = {}
+    for path in _daily_cache_files(client, kind):
+        try:
+            rows = json.loads(path.read_text(encoding="utf-8"))
+        except Exception:
+            continue
+        for row in rows if isinstance(rows, list) else []:
+            merged[(str(row.get("date", ""))[:10], str(row.get(key_field, "")))] = row
+    return list(merged.values())
+
+
+def observed_dates(client: str, kind: str, history: List[Dict[str, Any]]) -> List[str]:
+    """
+    Дни, за которые история действительно выгружалась: периоды кэш-файлов и даты строк.
+
+    Промежутки между выгрузками сюда не попадают — это отсутствие данных, а не нули.
+    """
+    days = {str(row.get("date", ""))[:10] for row in history if row.get("date")}
+    for path in _daily_cache_files(client, kind):
+        match = _NORM_PERIOD_RE.search(path.name)
+        if match:
+            days.update(date_range(match.group(1), match.group(2)))
+    return sorted(days)
+
+
+def _fit_series(values: List[float], dates: List[date], yearly: bool) -> Dict[str, Any]:
+    level = sum(values) / len(values) if values else 0.0
+    weekday = [1.0] * 7
+    month = [1.0] * 12
+    if level > 0:
+        sums = [0.0] * 7
+        counts = [0] * 7
+        for value, day in zip(values, dates):
+            sums[day.weekday()] += value
+            counts[day.weekday()] += 1
+        weekday = [(sums[i] / counts[i]) / level if counts[i] >= MIN_DAYS_PER_WEEKDAY else 1.0 for i in range(7)]
+        norm = sum(weekday) / 7.0
+        weekday = [w / norm for w in weekday] if norm > 0 else [1.0] * 7
+
+        if yearly:
+            m_sums = [0.0] * 12
+            m_counts = [0] * 12
+            for value, day in zip(values, dates):
+                # Убираем недельный профиль, чтобы состав дней месяца не влиял на фактор.
+                m_sums[day.month - 1] += value / max(weekday[day.weekday()], 1e-9)
+                m_counts[day.month - 1] += 1
+            month = [(m_sums[i] / m_counts[i]) / level if m_counts[i] >= MIN_DAYS_PER_MONTH else 1.0 for i in range(12)]
+    return {
+        "level": level,
+        "weekday": weekday,
+        "month": month,
+        "total": sum(values),
+    }
+
+
+def fit_baselines(
+    client: str,
+    kind: str,
+    min_total: float = DEFAULT_MIN_TOTAL,
+    max_keys: int = DEFAULT_MAX_KEYS,
+) -> Dict[str, Any]:
+    """
+    Строит мультипликативные модели level x weekday x month по кэшу дневных рядов.
+    Учитываются только выгруженные дни (observed_dates), meta.days — их число.
+
+    Returns:
+        {"meta": {...}, "models": {key: {"level", "weekday"[7], "month"[12], "total"}}}
+        Модель TOTAL_KEY описывает сумму по всем ключам.
+    """
+    if kind not in CHANGEPOINT_KINDS:
+        raise ValueError(f"kind must be one of: {', '.join(CHANGEPOINT_KINDS)}")
+    _, _, key_field, value_field = CHANGEPOINT_KINDS[kind]
+
+    history = load_daily_history(client, kind)
+    dates = observed_dates(client, kind, history)
+    if not dates:
+        raise ValueError(f"Нет дневной истории для {kind} в data_cache/{client}/ (запустите fit-baselines с --date1/--date2)")
+
+    parsed = [datetime.strptime(d, "%Y-%m-%d").date() for d in dates]
+    yearly = len(dates) >= MIN_DAYS_FOR_YEARLY
+    series = build_series(history, key_field, value_field, dates)
+
+    total_series = [0.0] * len(dates)
+    for values in series.values():
+        total_series = [a + b for a, b in zip(total_series, values)]
+
+    ranked = sorted(
+        ((key, values) for key, values in series.items() if sum(values) >= min_total),
+        key=lambda item: -sum(item[1]),
+    )[:max_keys]
+    models = {key: _fit_series(values, parsed, yearly) for key, values in ranked}
+    models[TOTAL_KEY] = _fit_series(total_series, parsed, yearly)
+
+    return {
+        "meta": {
+            "client": client,
+            "kind": kind,
+            "key_field": key_field,
+            "value_field": value_field,
+            "history_start": dates[0],
+            "history_end": dates[-1],
+            "days": len(dates),
+            "yearly": yearly,
+            "fitted_at": datetime.now(timezone.utc).isoformat().replace("+00:00", "Z"),
+        },
+        "models": models,
+    }
+
+
+def save_baselines(client: str, kind: str, baselines: Dict[str, Any]) -> Path:
+    path = baselines_path(client, kind)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(baselines, ensure_ascii=False), encoding="utf-8")
+    return path
+
+
+def load_baselines(client: str, kind: str) -> Optional[Dict[str, Any]]:
+    path = baselines_path(client, kind)
+    if not path.exists():
+        return None
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except Exception:
+        return None
+
+
+def seasonal_index(model: Dict[str, Any], date1: str, date2: str) -> float:
+    """Сумма сезонных факторов за дни периода (ожидаемый объём в единицах level)."""
+    weekday = model.get("weekday") or [1.0] * 7
+    month = model.get("month") or [1.0] * 12
+    total = 0.0
+    for day in date_range(date1, date2):
+        d = datetime.strptime(day, "%Y-%m-%d").date()
+        total += weekday[d.weekday()] * month[d.month - 1]
+    return total
+
+
+def expected_value(
+    model: Dict[str, Any],
+    actual_p1: float,
+    p1_start: str,
+    p1_end: str,
+    p2_start: str,
+    p2_end: str,
+) -> float:
+    """Ожидание для P2: факт P1, пересчитанный на сезонный профиль P2."""
+    index_p1 = seasonal_index(model, p1_start, p1_end)
+    if index_p1 <= 0:
+        return actual_p1
+    return actual_p1 * seasonal_index(model, p2_start, p2_end) / index_p1
+
+
+def annotate_expected(
+    rows: List[Dict[str, Any]],
+    baselines: Dict[str, Any],
+    p1_start: str,
+    p1_end: str,
+    p2_start: str,
+    p2_end: str,
+) -> Dict[str, Any]:
+    """
+    Добавляет к строкам сравнения expected_p2 / delta_vs_expected / delta_vs_expected_pct.
+
+    Строки без модели не трогаются. Возвращает сводку для workbook["baseline"].
+    """
+    key_field = baselines["meta"]["key_field"]
+    value_field = baselines["meta"]["value_field"]
+    models = baselines.get("models") or {}
+
+    for row in rows:
+        model = models.get(str(row.get(key_field, "")))
+        if model is None:
+            continue
+        expected = expected_value(model, float(row.get(f"{value_field}_p1", 0.0) or 0.0), p1_start, p1_end, p2_start, p2_end)
+        actual = float(row.get(f"{value_field}_p2", 0.0) or 0.0)
+        row["expected_p2"] = expected
+        row["delta_vs_expected"] = actual - expected
+        row["delta_vs_expected_pct"] = ((actual - expected) / max(expected, 1.0)) * 100.0
+
+    actual_p1 = sum(float(row.get(f"{value_field}_p1", 0.0) or 0.0) for row in rows)
+    actual_p2 = sum(float(row.get(f"{value_field}_p2", 0.0) or 0.0) for row in rows)
+    expected_total = expected_value(models.get(TOTAL_KEY) or {}, actual_p1, p1_start, p1_end, p2_start, p2_end)
+    return {
+        "kind": baselines["meta"]["kind"],
+        "fitted_at": baselines["meta"]["fitted_at"],
+        "history_start": baselines["meta"]["history_start"],
+        "history_end": baselines["meta"]["history_end"],
+        "yearly": baselines["meta"]["yearly"],
+        "expected_total_p2": expected_total,
+        "actual_total_p2": actual_p2,
+        "delta_vs_expected": actual_p2 - expected_total,
+        "delta_vs_expected_pct": ((actual_p2 - expected_total) / max(expected_total, 1.0)) * 100.0,
+    }
@@ -0,0 +1,149 @@
+"""
+Инкрементальный пересчёт по хэшам, как make, но по содержимому файлов.
+
+Производный артефакт пересчитывается, только если изменились его входы
+(sha256 файлов) или версия кода. Узлы графа:
+
+- workbook шага: (kind, params) → data_cache/<client>/analysis_*.json;
+  входы — файлы data_cache/, которые шаг прочитал или выгрузил, плюс
+  config.yaml клиента и baselines_*.json;
+- отчёт investigate: (запрос, период, цель) → reports/<client>/<run_id>/;
+  входы — входы всех успешных шагов.
+
+Манифесты: data_cache/<client>/build_manifest.json (шаги) и
+reports/_build/<client>.json (отчёты). Сверка входов сначала
+по (mtime_ns, size); хэш считается, только если они изменились.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import threading
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+MANIFEST_FILE = "build_manifest.json"
+APP_DIR = Path(__file__).resolve().parent
+
+_LOCK = threading.Lock()
+
+
+@lru_cache(maxsize=None)
+def code_version(scope: str = "steps") -> str:
+    """
+    Хэш исходников, от которых зависит узел.
+
+    steps — модули app/*.py (загрузка, нормализация, сравнения);
+    report — ещё и app/orchestrator/ (анализатор и отрисовка отчёта).
+    """
+    pattern = "*.py" if scope == "steps" else "**/*.py"
+    digest = hashlib.sha256()
+    for path in sorted(APP_DIR.glob(pattern)):
+        if "__pycache__" in path.parts:
+            continue
+        digest.update(path.relative_to(APP_DIR).as_posix().encode("utf-8"))
+        digest.update(path.read_bytes())
+    return digest.hexdigest()
+
+
+def file_record(path: Path | str, previous: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+    """{sha256, mtime_ns, size} файла или None, если его нет. previous избавляет от лишнего хэширования."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    if previous and previous.get("mtime_ns") == stat.st_mtime_ns and previous.get("size") == stat.st_size:
+        return previous
+    digest = hashlib.sha256(Path(path).read_bytes()).hexdigest()
+    return {"sha256": digest, "mtime_ns": stat.st_mtime_ns, "size": stat.st_size}
+
+
+def record_files(paths: Iterable[str]) -> Dict[str, Optional[Dict[str, Any]]]:
+    return {str(path): file_record(path) for path in paths}
+
+
+def files_unchanged(recorded: Dict[str, Optional[Dict[str, Any]]]) -> bool:
+    """Все файлы на месте с тем же содержимым (и отсутствовавшие по-прежнему отсутствуют)."""
+    for path, previous in recorded.items():
+        current = file_record(path, previous)
+        if (current or {}).get("sha256") != (previous or {}).get("sha256"):
+            return False
+    return True
+
+
+def implicit_inputs(client: str) -> List[str]:
+    """Входы, которые шаги читают не через cache_io: конфиг клиента и baselines."""
+    paths = [str(Path("clients") / client / "config.yaml")]
+    paths.extend(str(path) for path in sorted((Path("data_cache") / client).glob("baselines_*.json")))
+    return paths
+
+
+def node_key(*parts: Any) -> str:
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str).encode("utf-8")).hexdigest()
+
+
+class BuildManifest:
+    """JSON-манифест узлов: ключ → запись. Запись идёт через временный файл."""
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+
+    def _read(self) -> Dict[str, Any]:
+        if not self.path.exists():
+            return {}
+        try:
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+        except ValueError:
+            return {}
+        return data if isinstance(data, dict) else {}
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        return self._read().get(key)
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        """Найденные записи по ключам; файл читается один раз."""
+        entries = self._read()
+        return {key: entries[key] for key in keys if key in entries}
+
+    def put(self, key: str, entry: Dict[str, Any]) -> None:
+        self.put_many({key: entry})
+
+    def put_many(self, new_entries: Dict[str, Dict[str, Any]]) -> None:
+        if not new_entries:
+            return
+        with _LOCK:
+            # Перечитываем под замком: параллельные шаги клиента пишут в один манифест.
+            entries = self._read()
+            entries.update(new_entries)
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+            tmp_path.write_text(json.dumps(entries, ensure_ascii=False, indent=1), encoding="utf-8")
+            os.replace(tmp_path, self.path)
+
+
+def step_manifest(client: str) -> BuildManifest:
+    return BuildManifest(Path("data_cache") / client / MANIFEST_FILE)
+
+
+def report_manifest(client: str) -> BuildManifest:
+    # Не в reports/<client>/: там только папки расследований.
+    return BuildManifest(Path("reports") / "_build" / f"{client}.json")
+
+
+def inputs_fingerprint(client: str, steps: Iterable[Dict[str, Any]]) -> str:
+    """
+    Хэш входов набора шагов: kind, params (без refresh) и sha256 входных
+    файлов каждого шага. Workbook — функция этих входов и кода, поэтому его
+    собственный хэш (с generated_at) не нужен; у шагов без входов (выгрузка
+    индексации, где artifact и есть кэш) берутся artifacts.
+    """
+    items = []
+    for step in steps:
+        params = {key: value for key, value in step["params"].items() if key != "refresh"}
+        files = step["inputs"] or step["artifacts"]
+        items.append([step["kind"], params, {path: (file_record(path) or {}).get("sha256") for path in sorted(files)}])
+    implicit = {path: (file_record(path) or {}).get("sha256") for path in implicit_inputs(client)}
+    return node_key(sorted(items, key=lambda item: json.dumps(item, sort_keys=True, default=str)), implicit)
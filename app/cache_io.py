@@ -0,0 +1,44 @@
+"""Чтение и запись JSON-кэша в data_cache/ (с span-ами трассировки)."""
+
+from __future__ import annotations
+
+import contextvars
+import json
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Iterator, List, Optional
+
+from app import tracing
+
+# Файлы кэша, прочитанные или записанные внутри record_touched() (по потоку/контексту).
+_TOUCHED: contextvars.ContextVar[Optional[List[str]]] = contextvars.ContextVar("cache_touched", default=None)
+
+
+def _touch(path: Path | str) -> None:
+    touched = _TOUCHED.get()
+    if touched is not None and str(path) not in touched:
+        touched.append(str(path))
+
+
+@contextmanager
+def record_touched() -> Iterator[List[str]]:
+    """Собирает пути кэша, которые читал или писал код внутри блока (входы шага)."""
+    touched: List[str] = []
+    token = _TOUCHED.set(touched)
+    try:
+        yield touched
+    finally:
+        _TOUCHED.reset(token)
+
+
+def read_json(path: Path | str) -> Any:
+    with tracing.span("cache.read", file=Path(path).name):
+        data = json.loads(Path(path).read_text(encoding="utf-8"))
+    _touch(path)
+    return data
+
+
+def write_json(path: Path, data: Any) -> None:
+    with tracing.span("cache.write", file=Path(path).name):
+        Path(path).write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding="utf-8")
+    _touch(path)
@@ -1,68 +1,20 @@
 from __future__ import annotations
 
+import csv
 import json
 import os
 from pathlib import Path
 from datetime import datetime
+from typing import List, Optional
 
 import typer
 from dotenv import load_dotenv
 from rich import print as rprint
 from rich.table import Table
 
-from app.analysis_gsc import (
-    calculate_contributions as calculate_contributions_gsc,
-    compare_gsc_periods,
-    create_workbook as create_workbook_gsc,
-    load_or_fetch_gsc,
-    sort_rows as sort_gsc_rows,
-    workbook_filename as gsc_workbook_filename,
-)
-from app.analysis_goals import (
-    calculate_contributions as calculate_contributions_goals,
-    compare_goals_periods,
-    create_workbook as create_workbook_goals,
-    load_or_fetch_goals_by_page,
-    load_or_fetch_goals_by_source,
-    load_or_fetch_goals_by_source_page,
-    sort_rows as sort_goals_rows,
-    workbook_filename as goals_workbook_filename,
-)
-from app.en_seo_report import create_en_seo_weekly_report, save_report
-from app.seo_activation_funnel import (
-    create_seo_activation_funnel_report,
-    load_product_activation_by_landing_page,
-    save_report as save_seo_activation_funnel_report,
-)
-from app.analysis_pages import (
-    calculate_contributions as calculate_contributions_pages,
-    compare_pages_periods,
-    create_workbook as create_workbook_pages,
-    load_or_fetch_pages,
-    load_or_fetch_pages_by_source,
-    sort_analysis_rows as sort_analysis_rows_pages,
-)
-from app.analysis_sources import (
-    calculate_contributions,
-    compare_sources_periods,
-    create_workbook,
-    load_or_fetch_sources,
-    sort_analysis_rows,
-)
 from app.config import list_clients, load_client_config
-from app.metrika_client import MetrikaClient, normalize_goals_list, normalize_pages, normalize_sources
-from app.gsc_client import GSCClient
-from app.analysis_ym_webmaster import (
-    calculate_contributions as calculate_contributions_ymw,
-    compare_queries_periods as compare_ymw_queries_periods,
-    create_workbook as create_workbook_ymw,
-    load_or_fetch_queries as load_or_fetch_ymw_queries,
-    sort_rows as sort_ymw_rows,
-    workbook_filename as ymw_workbook_filename,
-)
-from app.ym_webmaster_client import YMWebmasterClient, normalize_webmaster_indexing
-from app.analysis_insights import print_insights
-from app.orchestrator import investigate
+from app.defaults import CHANGEPOINT_KINDS, DEFAULT_PENALTY_FACTOR, DEFAULT_Z_THRESHOLD
+from app.remote import DEFAULT_HOST, DEFAULT_PORT
 
 # Загружаем переменные окружения из .env
 load_dotenv()
@@ -70,6 +22,11 @@ load_dotenv()
 app = typer.Typer(no_args_is_help=True, add_completion=False)
 
 
+def _print_workbook_saved(result) -> None:
+    suffix = " [dim](без пересчёта: входы и код не менялись)[/dim]" if result.reused else ""
+    rprint(f"[green]Workbook сохранён:[/green] {result.path.name}{suffix}")
+
+
 @app.command("clients")
 def clients_cmd():
     """Показать список клиентов (папок в clients/ без _template)."""
@@ -139,6 +96,8 @@ def metrika_sources_cmd(
     limit: int = typer.Option(50, "--limit", help="Лимит источников трафика"),
 ):
     """Получить источники трафика из Яндекс.Метрики и сохранить в data_cache."""
+    from app.metrika_client import MetrikaClient, normalize_sources
+
     cfg, _ = load_client_config(client)
 
     token = os.getenv("YANDEX_METRIKA_TOKEN")
@@ -200,6 +159,8 @@ def metrika_pages_cmd(
     refresh: bool = typer.Option(False, "--refresh", help="Принудительно перезапросить Метрику"),
 ):
     """Получить входные страницы (landing pages) из Яндекс.Метрики и сохранить в data_cache."""
+    from app.metrika_client import MetrikaClient, normalize_pages
+
     cfg, _ = load_client_config(client)
 
     token = os.getenv("YANDEX_METRIKA_TOKEN")
@@ -275,6 +236,9 @@ def metrika_pages_by_source_cmd(
     refresh: bool = typer.Option(False, "--refresh", help="Принудительно перезапросить Метрику"),
 ):
     """Получить landing pages из Метрики в разрезе источника и сохранить в data_cache."""
+    from app.analysis_pages import load_or_fetch_pages_by_source
+    from app.metrika_client import MetrikaClient
+
     cfg, _ = load_client_config(client)
 
     token = os.getenv("YANDEX_METRIKA_TOKEN")
@@ -344,6 +308,9 @@ def metrika_goals_by_source_cmd(
     refresh: bool = typer.Option(False, "--refresh", help="Принудительно перезапросить Метрику"),
 ):
     """Получить конверсии (goal) по источникам и сохранить в data_cache."""
+    from app.analysis_goals import load_or_fetch_goals_by_source
+    from app.metrika_client import MetrikaClient
+
     cfg, _ = load_client_config(client)
 
     token = os.getenv("YANDEX_METRIKA_TOKEN")
@@ -413,6 +380,9 @@ def metrika_goals_by_page_cmd(
     refresh: bool = typer.Option(False, "--refresh", help="Принудительно перезапросить Метрику"),
 ):
     """Получить конверсии (goal) по входным страницам и сохранить в data_cache."""
+    from app.analysis_goals import load_or_fetch_goals_by_page
+    from app.metrika_client import MetrikaClient
+
     cfg, _ = load_client_config(client)
 
     token = os.getenv("YANDEX_METRIKA_TOKEN")
@@ -478,6 +448,8 @@ def metrika_goals_list_cmd(
     refresh: bool = typer.Option(False, "--refresh", help="Принудительно перезапросить Метрику"),
 ):
     """Показать список целей Метрики (Management API) для выбора goal_id."""
+    from app.metrika_client import MetrikaClient, normalize_goals_list
+
     cfg, _ = load_client_config(client)
 
     token = os.getenv("YANDEX_METRIKA_TOKEN")
@@ -541,23 +513,6 @@ def metrika_goals_list_cmd(
     rprint(table)
 
 
-def _get_gsc_client(cfg) -> GSCClient:
-    client_id = os.getenv("GSC_CLIENT_ID", "").strip()
-    client_secret = os.getenv("GSC_CLIENT_SECRET", "").strip()
-    refresh_token = os.getenv("GSC_REFRESH_TOKEN", "").strip()
-    site_url = str(getattr(cfg, "gsc_site_url", "") or "").strip()
-    if not site_url:
-        raise ValueError("gsc.site_url не задан в clients/<client>/config.yaml")
-    if not client_id or not client_secret or not refresh_token:
-        raise ValueError("GSC_CLIENT_ID/GSC_CLIENT_SECRET/GSC_REFRESH_TOKEN не заданы в окружении")
-    return GSCClient(
-        client_id=client_id,
-        client_secret=client_secret,
-        refresh_token=refresh_token,
-        site_url=site_url,
-    )
-
-
 @app.command("gsc-queries")
 def gsc_queries_cmd(
     client: str = typer.Argument(..., help="Имя папки в clients/<client>/"),
@@ -567,6 +522,9 @@ def gsc_queries_cmd(
     refresh: bool = typer.Option(False, "--refresh", help="Принудительно перезапросить GSC"),
 ):
     """Получить данные GSC по запросам (queries) за период и сохранить в data_cache."""
+    from app.analysis_gsc import load_or_fetch_gsc
+    from app.steps import gsc_client_from_config as _get_gsc_client
+
     cfg, _ = load_client_config(client)
     try:
         gsc = _get_gsc_client(cfg)
@@ -613,6 +571,9 @@ def gsc_pages_cmd(
     refresh: bool = typer.Option(False, "--refresh", help="Принудительно перезапросить GSC"),
 ):
     """Получить данные GSC по страницам (pages) за период и сохранить в data_cache."""
+    from app.analysis_gsc import load_or_fetch_gsc
+    from app.steps import gsc_client_from_config as _get_gsc_client
+
     cfg, _ = load_client_config(client)
     try:
         gsc = _get_gsc_client(cfg)
@@ -658,6 +619,9 @@ def gsc_query_page_cmd(
     refresh: bool = typer.Option(False, "--refresh", help="Принудительно перезапросить GSC"),
 ):
     """Получить данные GSC по связке query x page за период и сохранить в data_cache."""
+    from app.analysis_gsc import load_or_fetch_gsc
+    from app.steps import gsc_client_from_config as _get_gsc_client
+
     cfg, _ = load_client_config(client)
     try:
         gsc = _get_gsc_client(cfg)
@@ -712,6 +676,12 @@ def en_seo_weekly_report_cmd(
     refresh: bool = typer.Option(False, "--refresh", help="Принудительно перезапросить GSC и Метрику"),
 ):
     """Еженедельный EN SEO отчёт: GSC + signup_success из Метрики."""
+    from app.analysis_goals import load_or_fetch_goals_by_source, load_or_fetch_goals_by_source_page
+    from app.analysis_gsc import load_or_fetch_gsc
+    from app.en_seo_report import create_en_seo_weekly_report, save_report
+    from app.metrika_client import MetrikaClient
+    from app.steps import gsc_client_from_config as _get_gsc_client
+
     try:
         cfg, _ = load_client_config(client)
     except Exception as e:
@@ -873,9 +843,30 @@ def seo_activation_funnel_cmd(
     limit: int = typer.Option(50, "--limit", help="Лимит landing pages в отчёте"),
     refresh: bool = typer.Option(False, "--refresh", help="Принудительно перезапросить GSC и Метрику"),
     product_db_url_env: str = typer.Option("STAS_DATABASE_URL", "--product-db-url-env", help="Имя env-переменной с URL продуктовой БД"),
+    product_db_timeout_ms: int = typer.Option(60000, "--product-db-timeout-ms", help="statement_timeout запроса к продуктовой БД, мс"),
+    product_db_rollup: bool = typer.Option(
+        True, "--product-db-rollup/--no-product-db-rollup", help="Воронка из инкрементального rollup (иначе полный запрос за окно)"
+    ),
     format: str = typer.Option("table", "--format", help="Формат вывода: table или json"),
 ):
-    """SEO activation funnel: GSC + органическая Метрика + optional product DB по landing page."""
+    """
+    SEO activation funnel: GSC + органическая Метрика + optional product DB по landing page.
+
+    Запрос к продуктовой БД идёт в фоне, пока выгружаются GSC и Метрика.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    from app.analysis_goals import load_or_fetch_goals_by_source_page
+    from app.analysis_gsc import load_or_fetch_gsc
+    from app.analysis_pages import load_or_fetch_pages_by_source
+    from app.metrika_client import MetrikaClient
+    from app.seo_activation_funnel import (
+        create_seo_activation_funnel_report,
+        load_product_activation_by_landing_page,
+        save_report as save_seo_activation_funnel_report,
+    )
+    from app.steps import gsc_client_from_config as _get_gsc_client
+
     if format not in {"table", "json"}:
         rprint("[bold red]Error:[/bold red] --format должен быть table или json")
         raise typer.Exit(code=1)
@@ -908,6 +899,18 @@ def seo_activation_funnel_cmd(
 
     metrika = MetrikaClient(token=token, counter_id=cfg.counter_id)
 
+    # БД не зависит от API: запрос стартует сразу, и время команды — max(БД, API), а не сумма.
+    db_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="product-db")
+    product_db_future = db_pool.submit(
+        load_product_activation_by_landing_page,
+        date1=date1,
+        date2=date2,
+        env_var=product_db_url_env,
+        statement_timeout_ms=product_db_timeout_ms,
+        rollup=product_db_rollup,
+    )
+    db_pool.shutdown(wait=False)
+
     try:
         gsc_pages, _ = load_or_fetch_gsc(
             client=client,
@@ -949,11 +952,7 @@ def seo_activation_funnel_cmd(
         rprint(f"[bold red]Error:[/bold red] Не удалось собрать GSC/Метрику: {e}")
         raise typer.Exit(code=1)
 
-    product_db = load_product_activation_by_landing_page(
-        date1=date1,
-        date2=date2,
-        env_var=product_db_url_env,
-    )
+    product_db = product_db_future.result()
 
     report = create_seo_activation_funnel_report(
         client=client,
@@ -1030,6 +1029,36 @@ def seo_activation_funnel_cmd(
     rprint(table)
 
 
+@app.command("activation-rollup")
+def activation_rollup_cmd(
+    product_db_url_env: str = typer.Option("STAS_DATABASE_URL", "--product-db-url-env", help="Имя env-переменной с URL продуктовой БД"),
+    days_per_batch: int = typer.Option(7, "--days-per-batch", help="Дней user_event в одной транзакции"),
+    batch_size: int = typer.Option(5000, "--batch-size", help="Событий в одной пачке обновления"),
+):
+    """
+    Строит или догоняет rollup активации в продуктовой БД (для seo-activation-funnel).
+
+    Без таймаута отчёта: окна по --days-per-batch дней, коммит и watermark после каждого.
+    """
+    from app.activation_rollup import build_rollup
+    from app.seo_activation_funnel import product_db_connection
+
+    db_url = os.getenv(product_db_url_env)
+    if not db_url:
+        rprint(f"[bold red]Error:[/bold red] {product_db_url_env} не задан в окружении")
+        raise typer.Exit(code=1)
+    try:
+        with product_db_connection(db_url) as conn:
+            stats = build_rollup(conn, days_per_batch=days_per_batch, batch_size=batch_size)
+    except Exception as e:
+        rprint(f"[bold red]Error:[/bold red] {e.__class__.__name__}: {str(e)[:300]}")
+        raise typer.Exit(code=1)
+    rprint(
+        f"[green]Rollup обновлён:[/green] {stats['batches']} окон, {stats['events']} событий, "
+        f"watermark {stats['watermark'] or '-'}"
+    )
+
+
 @app.command("analyze-gsc-queries")
 def analyze_gsc_queries_cmd(
     client: str = typer.Argument(..., help="Имя папки в clients/<client>/"),
@@ -1039,51 +1068,25 @@ def analyze_gsc_queries_cmd(
     p2_end: str = typer.Argument(..., help="Конечная дата периода 2 (YYYY-MM-DD)"),
     limit: int = typer.Option(1000, "--limit", help="Лимит строк (rowLimit)"),
     refresh: bool = typer.Option(False, "--refresh", help="Принудительно перезапросить GSC"),
+    demote_noise: bool = typer.Option(False, "--demote-noise", help="Опускать статистически незначимые изменения кликов в конец top-N"),
+    bootstrap: int = typer.Option(0, "--bootstrap", help="Число bootstrap-реплик для интервалов вклада (0 = выкл.)"),
     format: str = typer.Option("table", "--format", help="Формат вывода: table или insights"),
 ):
     """Сравнение GSC queries между двумя периодами (детерминированно)."""
-    cfg, _ = load_client_config(client)
-    try:
-        gsc = _get_gsc_client(cfg)
-    except Exception as e:
-        rprint(f"[bold red]Error:[/bold red] {e}")
-        raise typer.Exit(code=1)
+    from app.analysis_insights import print_insights
+    from app.steps import StepError, run_analyze_gsc_queries
 
     try:
-        d1, _ = load_or_fetch_gsc(client, "queries", p1_start, p1_end, limit, refresh, gsc)
-        d2, _ = load_or_fetch_gsc(client, "queries", p2_start, p2_end, limit, refresh, gsc)
-    except Exception as e:
-        msg = str(e)
-        for secret in [gsc.client_id, gsc.client_secret, gsc.refresh_token]:
-            if secret and secret in msg:
-                msg = msg.replace(secret, "***")
-        rprint(f"[bold red]Error:[/bold red] GSC error: {msg[:500]}")
+        result = run_analyze_gsc_queries(
+            client, p1_start, p1_end, p2_start, p2_end, limit=limit, refresh=refresh, demote_noise=demote_noise, bootstrap=bootstrap
+        )
+    except StepError as e:
+        rprint(f"[bold red]Error:[/bold red] {e}")
         raise typer.Exit(code=1)
 
-    rows = compare_gsc_periods(d1, d2, key_field="query")
-    rows = calculate_contributions_gsc(rows)
-    all_rows = rows.copy()
-    rows = sort_gsc_rows(rows, key_field="query")
-
-    workbook = create_workbook_gsc(
-        client=client,
-        site_url=cfg.gsc_site_url,
-        kind="queries",
-        p1_start=p1_start,
-        p1_end=p1_end,
-        p2_start=p2_start,
-        p2_end=p2_end,
-        limit=limit,
-        refresh_used=refresh,
-        rows=rows,
-        all_rows=all_rows,
-    )
-
-    cache_dir = Path("data_cache") / client
-    cache_dir.mkdir(parents=True, exist_ok=True)
-    workbook_file = cache_dir / gsc_workbook_filename("queries", p1_start, p1_end, p2_start, p2_end)
-    workbook_file.write_text(json.dumps(workbook, ensure_ascii=False, indent=2), encoding="utf-8")
-    rprint(f"[green]Workbook сохранён:[/green] {workbook_file.name}")
+    rows = result.ranked_rows
+    workbook = result.data
+    _print_workbook_saved(result)
 
     if format == "insights":
         print_insights(
@@ -1127,51 +1130,25 @@ def analyze_gsc_pages_cmd(
     p2_end: str = typer.Argument(..., help="Конечная дата периода 2 (YYYY-MM-DD)"),
     limit: int = typer.Option(1000, "--limit", help="Лимит строк (rowLimit)"),
     refresh: bool = typer.Option(False, "--refresh", help="Принудительно перезапросить GSC"),
+    demote_noise: bool = typer.Option(False, "--demote-noise", help="Опускать статистически незначимые изменения кликов в конец top-N"),
+    bootstrap: int = typer.Option(0, "--bootstrap", help="Число bootstrap-реплик для интервалов вклада (0 = выкл.)"),
     format: str = typer.Option("table", "--format", help="Формат вывода: table или insights"),
 ):
     """Сравнение GSC pages между двумя периодами (детерминированно)."""
-    cfg, _ = load_client_config(client)
-    try:
-        gsc = _get_gsc_client(cfg)
-    except Exception as e:
-        rprint(f"[bold red]Error:[/bold red] {e}")
-        raise typer.Exit(code=1)
+    from app.analysis_insights import print_insights
+    from app.steps import StepError, run_analyze_gsc_pages
 
     try:
-        d1, _ = load_or_fetch_gsc(client, "pages", p1_start, p1_end, limit, refresh, gsc)
-        d2, _ = load_or_fetch_gsc(client, "pages", p2_start, p2_end, limit, refresh, gsc)
-    except Exception as e:
-        msg = str(e)
-        for secret in [gsc.client_id, gsc.client_secret, gsc.refresh_token]:
-            if secret and secret in msg:
-                msg = msg.replace(secret, "***")
-        rprint(f"[bold red]Error:[/bold red] GSC error: {msg[:500]}")
+        result = run_analyze_gsc_pages(
+            client, p1_start, p1_end, p2_start, p2_end, limit=limit, refresh=refresh, demote_noise=demote_noise, bootstrap=bootstrap
+        )
+    except StepError as e:
+        rprint(f"[bold red]Error:[/bold red] {e}")
         raise typer.Exit(code=1)
 
-    rows = compare_gsc_periods(d1, d2, key_field="page")
-    rows = calculate_contributions_gsc(rows)
-    all_rows = rows.copy()
-    rows = sort_gsc_rows(rows, key_field="page")
-
-    workbook = create_workbook_gsc(
-        client=client,
-        site_url=cfg.gsc_site_url,
-        kind="pages",
-        p1_start=p1_start,
-        p1_end=p1_end,
-        p2_start=p2_start,
-        p2_end=p2_end,
-        limit=limit,
-        refresh_used=refresh,
-        rows=rows,
-        all_rows=all_rows,
-    )
-
-    cache_dir = Path("data_cache") / client
-    cache_dir.mkdir(parents=True, exist_ok=True)
-    workbook_file = cache_dir / gsc_workbook_filename("pages", p1_start, p1_end, p2_start, p2_end)
-    workbook_file.write_text(json.dumps(workbook, ensure_ascii=False, indent=2), encoding="utf-8")
-    rprint(f"[green]Workbook сохранён:[/green] {workbook_file.name}")
+    rows = result.ranked_rows
+    workbook = result.data
+    _print_workbook_saved(result)
 
     if format == "insights":
         print_insights(
@@ -1206,30 +1183,14 @@ def analyze_gsc_pages_cmd(
     rprint(table)
 
 
-def _get_ym_webmaster_token() -> str:
-    return os.getenv("YM_WEBMASTER_TOKEN", "").strip() or os.getenv("YANDEX_WEBMASTER_TOKEN", "").strip()
-
-
-def _get_ym_webmaster_client(cfg) -> YMWebmasterClient:
-    token = _get_ym_webmaster_token()
-    if not token:
-        raise ValueError("YM_WEBMASTER_TOKEN (или YANDEX_WEBMASTER_TOKEN) не задан в окружении")
-    user_id = str(getattr(cfg, "ym_webmaster_user_id", "") or "").strip()
-    host_id = str(getattr(cfg, "ym_webmaster_host_id", "") or "").strip()
-    if not user_id or not host_id:
-        raise ValueError(
-            "ym_webmaster.user_id/host_id не заданы в clients/<client>/config.yaml. "
-            "Сначала выполните: python -m app.cli ym-webmaster-hosts <client>"
-        )
-    return YMWebmasterClient(token=token, user_id=user_id, host_id=host_id)
-
-
 @app.command("ym-webmaster-hosts")
 def ym_webmaster_hosts_cmd(
     client: str = typer.Argument(..., help="Имя папки в clients/<client>/"),
     refresh: bool = typer.Option(False, "--refresh", help="Принудительно перезапросить Вебмастер"),
 ):
     """Показать список hosts (сайтов) в Яндекс.Вебмастер и сохранить в data_cache."""
+    from app.steps import ym_webmaster_token as _get_ym_webmaster_token
+
     _cfg, _ = load_client_config(client)
     token = _get_ym_webmaster_token()
     if not token:
@@ -1330,6 +1291,9 @@ def ym_webmaster_queries_cmd(
     refresh: bool = typer.Option(False, "--refresh", help="Принудительно перезапросить Вебмастер"),
 ):
     """Получить популярные запросы из Яндекс.Вебмастера и сохранить в data_cache."""
+    from app.analysis_ym_webmaster import load_or_fetch_queries as load_or_fetch_ymw_queries
+    from app.steps import ym_webmaster_client_from_config as _get_ym_webmaster_client
+
     cfg, _ = load_client_config(client)
     try:
         ym = _get_ym_webmaster_client(cfg)
@@ -1370,49 +1334,24 @@ def analyze_ym_webmaster_queries_cmd(
     p2_end: str = typer.Argument(..., help="Конечная дата периода 2 (YYYY-MM-DD)"),
     limit: int = typer.Option(500, "--limit", help="Лимит строк"),
     refresh: bool = typer.Option(False, "--refresh", help="Принудительно перезапросить Вебмастер"),
+    bootstrap: int = typer.Option(0, "--bootstrap", help="Число bootstrap-реплик для интервалов вклада (0 = выкл.)"),
     format: str = typer.Option("table", "--format", help="Формат вывода: table или insights"),
 ):
     """Сравнение запросов Яндекс.Вебмастера между двумя периодами."""
-    cfg, _ = load_client_config(client)
-    try:
-        ym = _get_ym_webmaster_client(cfg)
-    except Exception as e:
-        rprint(f"[bold red]Error:[/bold red] {e}")
-        raise typer.Exit(code=1)
+    from app.analysis_insights import print_insights
+    from app.steps import StepError, run_analyze_ym_webmaster_queries
 
     try:
-        d1 = load_or_fetch_ymw_queries(client, p1_start, p1_end, limit, refresh, ym)
-        d2 = load_or_fetch_ymw_queries(client, p2_start, p2_end, limit, refresh, ym)
-    except Exception as e:
-        msg = str(e)
-        if ym.token and ym.token in msg:
-            msg = msg.replace(ym.token, "***")
-        rprint(f"[bold red]Error:[/bold red] Вебмастер error: {msg[:500]}")
+        result = run_analyze_ym_webmaster_queries(
+            client, p1_start, p1_end, p2_start, p2_end, limit=limit, refresh=refresh, bootstrap=bootstrap
+        )
+    except StepError as e:
+        rprint(f"[bold red]Error:[/bold red] {e}")
         raise typer.Exit(code=1)
 
-    rows = compare_ymw_queries_periods(d1, d2)
-    rows = calculate_contributions_ymw(rows)
-    all_rows = rows.copy()
-    rows = sort_ymw_rows(rows)
-
-    workbook = create_workbook_ymw(
-        client=client,
-        host_id=cfg.ym_webmaster_host_id,
-        p1_start=p1_start,
-        p1_end=p1_end,
-        p2_start=p2_start,
-        p2_end=p2_end,
-        limit=limit,
-        refresh_used=refresh,
-        rows=rows,
-        all_rows=all_rows,
-    )
-
-    cache_dir = Path("data_cache") / client
-    cache_dir.mkdir(parents=True, exist_ok=True)
-    workbook_file = cache_dir / ymw_workbook_filename(p1_start, p1_end, p2_start, p2_end)
-    workbook_file.write_text(json.dumps(workbook, ensure_ascii=False, indent=2), encoding="utf-8")
-    rprint(f"[green]Workbook сохранён:[/green] {workbook_file.name}")
+    rows = result.ranked_rows
+    workbook = result.data
+    _print_workbook_saved(result)
 
     if format == "insights":
         print_insights(
@@ -1453,42 +1392,19 @@ def ym_webmaster_indexing_cmd(
     refresh: bool = typer.Option(False, "--refresh", help="Принудительно перезапросить Вебмастер"),
 ):
     """Получить список URL по статусу индексации (например EXCLUDED) и сохранить в data_cache."""
-    cfg, _ = load_client_config(client)
+    from app.steps import StepError, run_ym_webmaster_indexing
+
     try:
-        ym = _get_ym_webmaster_client(cfg)
-    except Exception as e:
+        result = run_ym_webmaster_indexing(client, status=status, limit=limit, offset=offset, refresh=refresh)
+    except StepError as e:
         rprint(f"[bold red]Error:[/bold red] {e}")
         raise typer.Exit(code=1)
 
-    cache_dir = Path("data_cache") / client
-    cache_dir.mkdir(parents=True, exist_ok=True)
-    raw_file = cache_dir / f"ym_webmaster_indexing_raw_{status}_{limit}_{offset}.json"
-    norm_file = cache_dir / f"ym_webmaster_indexing_norm_{status}_{limit}_{offset}.json"
-
-    normalized = None
-    if not refresh and norm_file.exists():
-        try:
-            cached = json.loads(norm_file.read_text(encoding="utf-8"))
-            if isinstance(cached, list):
-                normalized = cached
-                rprint(f"[green]Использую кэш:[/green] {norm_file.name}")
-        except Exception:
-            normalized = None
-
-    if normalized is None:
-        try:
-            raw = ym.indexing_samples(search_url_status=status, limit=limit, offset=offset)
-            normalized = normalize_webmaster_indexing(raw)
-        except Exception as e:
-            msg = str(e)
-            if ym.token and ym.token in msg:
-                msg = msg.replace(ym.token, "***")
-            rprint(f"[bold red]Error:[/bold red] Вебмастер error: {msg[:500]}")
-            raise typer.Exit(code=1)
-
-        raw_file.write_text(json.dumps(raw, ensure_ascii=False, indent=2), encoding="utf-8")
-        norm_file.write_text(json.dumps(normalized, ensure_ascii=False, indent=2), encoding="utf-8")
-        rprint(f"[green]Данные сохранены:[/green] {raw_file.name}, {norm_file.name}")
+    normalized = result.rows
+    if result.meta["cache_used"]:
+        rprint(f"[green]Использую кэш:[/green] {result.path.name}")
+    else:
+        rprint(f"[green]Данные сохранены:[/green] {Path(result.meta['raw_file']).name}, {result.path.name}")
 
     table = Table(title=f"YM Webmaster indexing ({client}, status={status}, limit={limit}, offset={offset})")
     table.add_column("url")
@@ -1516,87 +1432,24 @@ def analyze_sources_cmd(
     p2_end: str = typer.Argument(..., help="Конечная дата периода 2 (YYYY-MM-DD)"),
     limit: int = typer.Option(50, "--limit", help="Лимит строк в выводе"),
     refresh: bool = typer.Option(False, "--refresh", help="Принудительно перезапросить Метрику"),
+    bootstrap: int = typer.Option(0, "--bootstrap", help="Число bootstrap-реплик для интервалов вклада (0 = выкл.)"),
     format: str = typer.Option("table", "--format", help="Формат вывода: table или insights"),
 ):
     """Сравнение источников трафика между двумя периодами."""
-    token = os.getenv("YANDEX_METRIKA_TOKEN")
-    if not token:
-        rprint("[bold red]Error:[/bold red] YANDEX_METRIKA_TOKEN не задан в окружении")
-        raise typer.Exit(code=1)
-
-    try:
-        cfg, _ = load_client_config(client)
-    except Exception as e:
-        rprint(f"[bold red]Error:[/bold red] Не удалось загрузить конфиг: {e}")
-        raise typer.Exit(code=1)
-
-    if cfg.counter_id <= 0:
-        rprint("[bold red]Error:[/bold red] metrika.counter_id не задан в конфиге")
-        raise typer.Exit(code=1)
-
-    try:
-        from datetime import datetime
-
-        dt_p1_start = datetime.strptime(p1_start, "%Y-%m-%d")
-        dt_p1_end = datetime.strptime(p1_end, "%Y-%m-%d")
-        dt_p2_start = datetime.strptime(p2_start, "%Y-%m-%d")
-        dt_p2_end = datetime.strptime(p2_end, "%Y-%m-%d")
-
-        if dt_p1_end < dt_p1_start:
-            rprint(f"[bold red]Error:[/bold red] p1_end ({p1_end}) < p1_start ({p1_start})")
-            raise typer.Exit(code=1)
-
-        if dt_p2_end < dt_p2_start:
-            rprint(f"[bold red]Error:[/bold red] p2_end ({p2_end}) < p2_start ({p2_start})")
-            raise typer.Exit(code=1)
-    except ValueError as e:
-        rprint(f"[bold red]Error:[/bold red] Некорректный формат даты: {e}")
-        raise typer.Exit(code=1)
-
-    metrika = MetrikaClient(token=token, counter_id=cfg.counter_id)
+    from app.analysis_insights import print_insights
+    from app.steps import StepError, run_analyze_sources
 
     try:
-        data_p1 = load_or_fetch_sources(client, p1_start, p1_end, limit, refresh, metrika)
-        data_p2 = load_or_fetch_sources(client, p2_start, p2_end, limit, refresh, metrika)
-    except RuntimeError as e:
-        error_msg = str(e)
-        if token in error_msg:
-            error_msg = error_msg.replace(token, "***")
-        if "OAuth" in error_msg:
-            error_msg = error_msg.split("OAuth")[0] + "OAuth ***"
-        rprint(f"[bold red]Error:[/bold red] Ошибка API Метрики: {error_msg[:500]}")
-        raise typer.Exit(code=1)
-    except Exception as e:
-        rprint(f"[bold red]Error:[/bold red] Не удалось загрузить данные: {e}")
+        result = run_analyze_sources(
+            client, p1_start, p1_end, p2_start, p2_end, limit=limit, refresh=refresh, bootstrap=bootstrap
+        )
+    except StepError as e:
+        rprint(f"[bold red]Error:[/bold red] {e}")
         raise typer.Exit(code=1)
 
-    rows = compare_sources_periods(data_p1, data_p2)
-    rows = calculate_contributions(rows)
-    all_rows = rows.copy()
-    rows = sort_analysis_rows(rows)
-
-    workbook = create_workbook(
-        client=client,
-        counter_id=cfg.counter_id,
-        p1_start=p1_start,
-        p1_end=p1_end,
-        p2_start=p2_start,
-        p2_end=p2_end,
-        limit=limit,
-        refresh_used=refresh,
-        rows=rows,
-        all_rows=all_rows,
-    )
-
-    cache_dir = Path("data_cache") / client
-    cache_dir.mkdir(parents=True, exist_ok=True)
-    workbook_file = cache_dir / (
-        f"analysis_sources_{p1_start.replace('-', '')}{p1_end.replace('-', '')}"
-        f"__{p2_start.replace('-', '')}{p2_end.replace('-', '')}.json"
-    )
-    workbook_file.write_text(json.dumps(workbook, ensure_ascii=False, indent=2), encoding="utf-8")
-
-    rprint(f"[green]Workbook сохранён:[/green] {workbook_file.name}")
+    rows = result.ranked_rows
+    workbook = result.data
+    _print_workbook_saved(result)
 
     if format == "insights":
         print_insights(
@@ -1646,85 +1499,24 @@ def analyze_pages_cmd(
     p2_end: str = typer.Argument(..., help="Конечная дата периода 2 (YYYY-MM-DD)"),
     limit: int = typer.Option(50, "--limit", help="Лимит строк в выводе"),
     refresh: bool = typer.Option(False, "--refresh", help="Принудительно перезапросить Метрику"),
+    bootstrap: int = typer.Option(0, "--bootstrap", help="Число bootstrap-реплик для интервалов вклада (0 = выкл.)"),
     format: str = typer.Option("table", "--format", help="Формат вывода: table или insights"),
 ):
     """Сравнение входных страниц (landing pages) между двумя периодами."""
-    token = os.getenv("YANDEX_METRIKA_TOKEN")
-    if not token:
-        rprint("[bold red]Error:[/bold red] YANDEX_METRIKA_TOKEN не задан в окружении")
-        raise typer.Exit(code=1)
-
-    try:
-        cfg, _ = load_client_config(client)
-    except Exception as e:
-        rprint(f"[bold red]Error:[/bold red] Не удалось загрузить конфиг: {e}")
-        raise typer.Exit(code=1)
-
-    if cfg.counter_id <= 0:
-        rprint("[bold red]Error:[/bold red] metrika.counter_id не задан в конфиге")
-        raise typer.Exit(code=1)
-
-    try:
-        dt_p1_start = __import__("datetime").datetime.strptime(p1_start, "%Y-%m-%d")
-        dt_p1_end = __import__("datetime").datetime.strptime(p1_end, "%Y-%m-%d")
-        dt_p2_start = __import__("datetime").datetime.strptime(p2_start, "%Y-%m-%d")
-        dt_p2_end = __import__("datetime").datetime.strptime(p2_end, "%Y-%m-%d")
-
-        if dt_p1_end < dt_p1_start:
-            rprint(f"[bold red]Error:[/bold red] p1_end ({p1_end}) < p1_start ({p1_start})")
-            raise typer.Exit(code=1)
-
-        if dt_p2_end < dt_p2_start:
-            rprint(f"[bold red]Error:[/bold red] p2_end ({p2_end}) < p2_start ({p2_start})")
-            raise typer.Exit(code=1)
-    except ValueError as e:
-        rprint(f"[bold red]Error:[/bold red] Некорректный формат даты: {e}")
-        raise typer.Exit(code=1)
-
-    metrika = MetrikaClient(token=token, counter_id=cfg.counter_id)
+    from app.analysis_insights import print_insights
+    from app.steps import StepError, run_analyze_pages
 
     try:
-        data_p1 = load_or_fetch_pages(client, p1_start, p1_end, limit, refresh, metrika)
-        data_p2 = load_or_fetch_pages(client, p2_start, p2_end, limit, refresh, metrika)
-    except RuntimeError as e:
-        error_msg = str(e)
-        if token in error_msg:
-            error_msg = error_msg.replace(token, "***")
-        if "OAuth" in error_msg:
-            error_msg = error_msg.split("OAuth")[0] + "OAuth ***"
-        rprint(f"[bold red]Error:[/bold red] Ошибка API Метрики: {error_msg[:500]}")
-        raise typer.Exit(code=1)
-    except Exception as e:
-        rprint(f"[bold red]Error:[/bold red] Не удалось загрузить данные: {e}")
+        result = run_analyze_pages(
+            client, p1_start, p1_end, p2_start, p2_end, limit=limit, refresh=refresh, bootstrap=bootstrap
+        )
+    except StepError as e:
+        rprint(f"[bold red]Error:[/bold red] {e}")
         raise typer.Exit(code=1)
 
-    rows = compare_pages_periods(data_p1, data_p2)
-    rows = calculate_contributions_pages(rows)
-    all_rows = rows.copy()
-    rows = sort_analysis_rows_pages(rows)
-
-    workbook = create_workbook_pages(
-        client=client,
-        counter_id=cfg.counter_id,
-        p1_start=p1_start,
-        p1_end=p1_end,
-        p2_start=p2_start,
-        p2_end=p2_end,
-        limit=limit,
-        refresh_used=refresh,
-        rows=rows,
-        all_rows=all_rows,
-    )
-
-    cache_dir = Path("data_cache") / client
-    cache_dir.mkdir(parents=True, exist_ok=True)
-    workbook_file = cache_dir / (
-        f"analysis_pages_{p1_start.replace('-', '')}{p1_end.replace('-', '')}"
-        f"__{p2_start.replace('-', '')}{p2_end.replace('-', '')}.json"
-    )
-    workbook_file.write_text(json.dumps(workbook, ensure_ascii=False, indent=2), encoding="utf-8")
-
-    rprint(f"[green]Workbook сохранён:[/green] {workbook_file.name}")
+    rows = result.ranked_rows
+    workbook = result.data
+    _print_workbook_saved(result)
 
     if format == "insights":
         print_insights(
@@ -1777,92 +1569,24 @@ def analyze_pages_by_source_cmd(
     ),
     limit: int = typer.Option(50, "--limit", help="Лимит строк в выводе"),
     refresh: bool = typer.Option(False, "--refresh", help="Принудительно перезапросить Метрику"),
+    bootstrap: int = typer.Option(0, "--bootstrap", help="Число bootstrap-реплик для интервалов вклада (0 = выкл.)"),
     format: str = typer.Option("table", "--format", help="Формат вывода: table или insights"),
 ):
     """Сравнение landing pages между двумя периодами внутри выбранного источника трафика."""
-    token = os.getenv("YANDEX_METRIKA_TOKEN")
-    if not token:
-        rprint("[bold red]Error:[/bold red] YANDEX_METRIKA_TOKEN не задан в окружении")
-        raise typer.Exit(code=1)
+    from app.analysis_insights import print_insights
+    from app.steps import StepError, run_analyze_pages_by_source
 
     try:
-        cfg, _ = load_client_config(client)
-    except Exception as e:
-        rprint(f"[bold red]Error:[/bold red] Не удалось загрузить конфиг: {e}")
-        raise typer.Exit(code=1)
-
-    if cfg.counter_id <= 0:
-        rprint("[bold red]Error:[/bold red] metrika.counter_id не задан в конфиге")
+        result = run_analyze_pages_by_source(
+            client, p1_start, p1_end, p2_start, p2_end, source=source, limit=limit, refresh=refresh, bootstrap=bootstrap
+        )
+    except StepError as e:
+        rprint(f"[bold red]Error:[/bold red] {e}")
         raise typer.Exit(code=1)
 
-    try:
-        dt_p1_start = __import__("datetime").datetime.strptime(p1_start, "%Y-%m-%d")
-        dt_p1_end = __import__("datetime").datetime.strptime(p1_end, "%Y-%m-%d")
-        dt_p2_start = __import__("datetime").datetime.strptime(p2_start, "%Y-%m-%d")
-        dt_p2_end = __import__("datetime").datetime.strptime(p2_end, "%Y-%m-%d")
-
-        if dt_p1_end < dt_p1_start:
-            rprint(f"[bold red]Error:[/bold red] p1_end ({p1_end}) < p1_start ({p1_start})")
-            raise typer.Exit(code=1)
-
-        if dt_p2_end < dt_p2_start:
-            rprint(f"[bold red]Error:[/bold red] p2_end ({p2_end}) < p2_start ({p2_start})")
-            raise typer.Exit(code=1)
-    except ValueError as e:
-        rprint(f"[bold red]Error:[/bold red] Некорректный формат даты: {e}")
-        raise typer.Exit(code=1)
-
-    metrika = MetrikaClient(token=token, counter_id=cfg.counter_id)
-
-    try:
-        data_p1 = load_or_fetch_pages_by_source(client, p1_start, p1_end, source, limit, refresh, metrika)
-        data_p2 = load_or_fetch_pages_by_source(client, p2_start, p2_end, source, limit, refresh, metrika)
-    except RuntimeError as e:
-        error_msg = str(e)
-        if token in error_msg:
-            error_msg = error_msg.replace(token, "***")
-        if "OAuth" in error_msg:
-            error_msg = error_msg.split("OAuth")[0] + "OAuth ***"
-        rprint(f"[bold red]Error:[/bold red] Ошибка API Метрики: {error_msg[:500]}")
-        raise typer.Exit(code=1)
-    except Exception as e:
-        rprint(f"[bold red]Error:[/bold red] Не удалось загрузить данные: {e}")
-        raise typer.Exit(code=1)
-
-    rows = compare_pages_periods(data_p1, data_p2)
-    rows = calculate_contributions_pages(rows)
-    all_rows = rows.copy()
-    rows = sort_analysis_rows_pages(rows)
-
-    workbook = create_workbook_pages(
-        client=client,
-        counter_id=cfg.counter_id,
-        p1_start=p1_start,
-        p1_end=p1_end,
-        p2_start=p2_start,
-        p2_end=p2_end,
-        limit=limit,
-        refresh_used=refresh,
-        rows=rows,
-        all_rows=all_rows,
-    )
-    workbook["meta"]["source"] = source
-
-    cache_dir = Path("data_cache") / client
-    cache_dir.mkdir(parents=True, exist_ok=True)
-    # Безопасное имя файла (ascii slug)
-    import re as _re
-
-    source_slug = _re.sub(r"[^a-z0-9]+", "_", source.strip().lower())
-    source_slug = _re.sub(r"_+", "_", source_slug).strip("_") or "unknown"
-    workbook_file = cache_dir / (
-        f"analysis_pages_by_source_{source_slug}_"
-        f"{p1_start.replace('-', '')}{p1_end.replace('-', '')}"
-        f"__{p2_start.replace('-', '')}{p2_end.replace('-', '')}.json"
-    )
-    workbook_file.write_text(json.dumps(workbook, ensure_ascii=False, indent=2), encoding="utf-8")
-
-    rprint(f"[green]Workbook сохранён:[/green] {workbook_file.name}")
+    rows = result.ranked_rows
+    workbook = result.data
+    _print_workbook_saved(result)
 
     if format == "insights":
         print_insights(
@@ -1913,96 +1637,26 @@ def analyze_goals_by_source_cmd(
     goal_id: int = typer.Option(0, "--goal-id", help="ID цели в Метрике (0 = взять из config)"),
     limit: int = typer.Option(50, "--limit", help="Лимит строк в выводе"),
     refresh: bool = typer.Option(False, "--refresh", help="Принудительно перезапросить Метрику"),
+    demote_noise: bool = typer.Option(False, "--demote-noise", help="Опускать статистически незначимые изменения конверсий в конец top-N"),
+    bootstrap: int = typer.Option(0, "--bootstrap", help="Число bootstrap-реплик для интервалов вклада (0 = выкл.)"),
     format: str = typer.Option("table", "--format", help="Формат вывода: table или insights"),
 ):
     """Сравнение goals (конверсий) по источникам между двумя периодами."""
-    token = os.getenv("YANDEX_METRIKA_TOKEN")
-    if not token:
-        rprint("[bold red]Error:[/bold red] YANDEX_METRIKA_TOKEN не задан в окружении")
-        raise typer.Exit(code=1)
+    from app.analysis_insights import print_insights
+    from app.steps import StepError, run_analyze_goals_by_source
 
     try:
-        cfg, _ = load_client_config(client)
-    except Exception as e:
-        rprint(f"[bold red]Error:[/bold red] Не удалось загрузить конфиг: {e}")
-        raise typer.Exit(code=1)
-
-    if cfg.counter_id <= 0:
-        rprint("[bold red]Error:[/bold red] metrika.counter_id не задан в конфиге")
-        raise typer.Exit(code=1)
-
-    resolved_goal_id = int(goal_id or 0) or int(cfg.goal_id or 0)
-    if resolved_goal_id <= 0:
-        rprint(
-            "[bold red]Error:[/bold red] goal_id не задан. Укажите --goal-id или заполните metrika.goal_id в config.yaml"
-        )
-        raise typer.Exit(code=1)
-
-    try:
-        dt_p1_start = __import__("datetime").datetime.strptime(p1_start, "%Y-%m-%d")
-        dt_p1_end = __import__("datetime").datetime.strptime(p1_end, "%Y-%m-%d")
-        dt_p2_start = __import__("datetime").datetime.strptime(p2_start, "%Y-%m-%d")
-        dt_p2_end = __import__("datetime").datetime.strptime(p2_end, "%Y-%m-%d")
-
-        if dt_p1_end < dt_p1_start:
-            rprint(f"[bold red]Error:[/bold red] p1_end ({p1_end}) < p1_start ({p1_start})")
-            raise typer.Exit(code=1)
-
-        if dt_p2_end < dt_p2_start:
-            rprint(f"[bold red]Error:[/bold red] p2_end ({p2_end}) < p2_start ({p2_start})")
-            raise typer.Exit(code=1)
-    except ValueError as e:
-        rprint(f"[bold red]Error:[/bold red] Некорректный формат даты: {e}")
-        raise typer.Exit(code=1)
-
-    metrika = MetrikaClient(token=token, counter_id=cfg.counter_id)
-
-    try:
-        data_p1 = load_or_fetch_goals_by_source(
-            client, p1_start, p1_end, resolved_goal_id, limit, refresh, metrika
+        result = run_analyze_goals_by_source(
+            client, p1_start, p1_end, p2_start, p2_end, goal_id=goal_id, limit=limit, refresh=refresh, demote_noise=demote_noise, bootstrap=bootstrap
         )
-        data_p2 = load_or_fetch_goals_by_source(
-            client, p2_start, p2_end, resolved_goal_id, limit, refresh, metrika
-        )
-    except RuntimeError as e:
-        error_msg = str(e)
-        if token in error_msg:
-            error_msg = error_msg.replace(token, "***")
-        if "OAuth" in error_msg:
-            error_msg = error_msg.split("OAuth")[0] + "OAuth ***"
-        rprint(f"[bold red]Error:[/bold red] Ошибка API Метрики: {error_msg[:500]}")
-        raise typer.Exit(code=1)
-    except Exception as e:
-        rprint(f"[bold red]Error:[/bold red] Не удалось загрузить данные: {e}")
+    except StepError as e:
+        rprint(f"[bold red]Error:[/bold red] {e}")
         raise typer.Exit(code=1)
 
-    rows = compare_goals_periods(data_p1, data_p2, key_field="source")
-    rows = calculate_contributions_goals(rows)
-    all_rows = rows.copy()
-    rows = sort_goals_rows(rows, key_field="source")
-
-    workbook = create_workbook_goals(
-        client=client,
-        counter_id=cfg.counter_id,
-        goal_id=resolved_goal_id,
-        dimension="source",
-        p1_start=p1_start,
-        p1_end=p1_end,
-        p2_start=p2_start,
-        p2_end=p2_end,
-        limit=limit,
-        refresh_used=refresh,
-        rows=rows,
-        all_rows=all_rows,
-    )
-
-    cache_dir = Path("data_cache") / client
-    cache_dir.mkdir(parents=True, exist_ok=True)
-    workbook_file = cache_dir / goals_workbook_filename(
-        "goals_by_source", resolved_goal_id, p1_start, p1_end, p2_start, p2_end
-    )
-    workbook_file.write_text(json.dumps(workbook, ensure_ascii=False, indent=2), encoding="utf-8")
-    rprint(f"[green]Workbook сохранён:[/green] {workbook_file.name}")
+    rows = result.ranked_rows
+    workbook = result.data
+    resolved_goal_id = int(result.meta["goal_id"])
+    _print_workbook_saved(result)
 
     if format == "insights":
         print_insights(
@@ -2059,92 +1713,26 @@ def analyze_goals_by_page_cmd(
     goal_id: int = typer.Option(0, "--goal-id", help="ID цели в Метрике (0 = взять из config)"),
     limit: int = typer.Option(50, "--limit", help="Лимит строк в выводе"),
     refresh: bool = typer.Option(False, "--refresh", help="Принудительно перезапросить Метрику"),
+    demote_noise: bool = typer.Option(False, "--demote-noise", help="Опускать статистически незначимые изменения конверсий в конец top-N"),
+    bootstrap: int = typer.Option(0, "--bootstrap", help="Число bootstrap-реплик для интервалов вклада (0 = выкл.)"),
     format: str = typer.Option("table", "--format", help="Формат вывода: table или insights"),
 ):
     """Сравнение goals (конверсий) по входным страницам между двумя периодами."""
-    token = os.getenv("YANDEX_METRIKA_TOKEN")
-    if not token:
-        rprint("[bold red]Error:[/bold red] YANDEX_METRIKA_TOKEN не задан в окружении")
-        raise typer.Exit(code=1)
+    from app.analysis_insights import print_insights
+    from app.steps import StepError, run_analyze_goals_by_page
 
     try:
-        cfg, _ = load_client_config(client)
-    except Exception as e:
-        rprint(f"[bold red]Error:[/bold red] Не удалось загрузить конфиг: {e}")
-        raise typer.Exit(code=1)
-
-    if cfg.counter_id <= 0:
-        rprint("[bold red]Error:[/bold red] metrika.counter_id не задан в конфиге")
-        raise typer.Exit(code=1)
-
-    resolved_goal_id = int(goal_id or 0) or int(cfg.goal_id or 0)
-    if resolved_goal_id <= 0:
-        rprint(
-            "[bold red]Error:[/bold red] goal_id не задан. Укажите --goal-id или заполните metrika.goal_id в config.yaml"
+        result = run_analyze_goals_by_page(
+            client, p1_start, p1_end, p2_start, p2_end, goal_id=goal_id, limit=limit, refresh=refresh, demote_noise=demote_noise, bootstrap=bootstrap
         )
+    except StepError as e:
+        rprint(f"[bold red]Error:[/bold red] {e}")
         raise typer.Exit(code=1)
 
-    try:
-        dt_p1_start = __import__("datetime").datetime.strptime(p1_start, "%Y-%m-%d")
-        dt_p1_end = __import__("datetime").datetime.strptime(p1_end, "%Y-%m-%d")
-        dt_p2_start = __import__("datetime").datetime.strptime(p2_start, "%Y-%m-%d")
-        dt_p2_end = __import__("datetime").datetime.strptime(p2_end, "%Y-%m-%d")
-
-        if dt_p1_end < dt_p1_start:
-            rprint(f"[bold red]Error:[/bold red] p1_end ({p1_end}) < p1_start ({p1_start})")
-            raise typer.Exit(code=1)
-
-        if dt_p2_end < dt_p2_start:
-            rprint(f"[bold red]Error:[/bold red] p2_end ({p2_end}) < p2_start ({p2_start})")
-            raise typer.Exit(code=1)
-    except ValueError as e:
-        rprint(f"[bold red]Error:[/bold red] Некорректный формат даты: {e}")
-        raise typer.Exit(code=1)
-
-    metrika = MetrikaClient(token=token, counter_id=cfg.counter_id)
-
-    try:
-        data_p1 = load_or_fetch_goals_by_page(client, p1_start, p1_end, resolved_goal_id, limit, refresh, metrika)
-        data_p2 = load_or_fetch_goals_by_page(client, p2_start, p2_end, resolved_goal_id, limit, refresh, metrika)
-    except RuntimeError as e:
-        error_msg = str(e)
-        if token in error_msg:
-            error_msg = error_msg.replace(token, "***")
-        if "OAuth" in error_msg:
-            error_msg = error_msg.split("OAuth")[0] + "OAuth ***"
-        rprint(f"[bold red]Error:[/bold red] Ошибка API Метрики: {error_msg[:500]}")
-        raise typer.Exit(code=1)
-    except Exception as e:
-        rprint(f"[bold red]Error:[/bold red] Не удалось загрузить данные: {e}")
-        raise typer.Exit(code=1)
-
-    rows = compare_goals_periods(data_p1, data_p2, key_field="landingPage")
-    rows = calculate_contributions_goals(rows)
-    all_rows = rows.copy()
-    rows = sort_goals_rows(rows, key_field="landingPage")
-
-    workbook = create_workbook_goals(
-        client=client,
-        counter_id=cfg.counter_id,
-        goal_id=resolved_goal_id,
-        dimension="landingPage",
-        p1_start=p1_start,
-        p1_end=p1_end,
-        p2_start=p2_start,
-        p2_end=p2_end,
-        limit=limit,
-        refresh_used=refresh,
-        rows=rows,
-        all_rows=all_rows,
-    )
-
-    cache_dir = Path("data_cache") / client
-    cache_dir.mkdir(parents=True, exist_ok=True)
-    workbook_file = cache_dir / goals_workbook_filename(
-        "goals_by_page", resolved_goal_id, p1_start, p1_end, p2_start, p2_end
-    )
-    workbook_file.write_text(json.dumps(workbook, ensure_ascii=False, indent=2), encoding="utf-8")
-    rprint(f"[green]Workbook сохранён:[/green] {workbook_file.name}")
+    rows = result.ranked_rows
+    workbook = result.data
+    resolved_goal_id = int(result.meta["goal_id"])
+    _print_workbook_saved(result)
 
     if format == "insights":
         print_insights(
@@ -2191,30 +1779,373 @@ def analyze_goals_by_page_cmd(
     rprint(f"  Δ CR (pp): {totals['total_delta_cr_pp']:.2f}")
 
 
+@app.command("reconcile-pages")
+def reconcile_pages_cmd(
+    client: str = typer.Argument(..., help="Имя папки в clients/<client>/"),
+    p1_start: str = typer.Argument(..., help="Начальная дата периода 1 (YYYY-MM-DD)"),
+    p1_end: str = typer.Argument(..., help="Конечная дата периода 1 (YYYY-MM-DD)"),
+    p2_start: str = typer.Argument(..., help="Начальная дата периода 2 (YYYY-MM-DD)"),
+    p2_end: str = typer.Argument(..., help="Конечная дата периода 2 (YYYY-MM-DD)"),
+    source: str = typer.Option("Search engine traffic", "--source", help="Источник Метрики с органикой"),
+    limit: int = typer.Option(0, "--limit", help="Лимит страниц из GSC и Метрики (0 — все страницы)"),
+    top: int = typer.Option(200, "--top", help="Сколько строк сохранить в workbook (флаги идут первыми)"),
+    min_clicks: float = typer.Option(20.0, "--min-clicks", help="Минимум кликов GSC за оба периода для флага"),
+    threshold: float = typer.Option(2.0, "--threshold", help="Во сколько раз динамика Метрики должна разойтись с GSC"),
+    refresh: bool = typer.Option(False, "--refresh", help="Принудительно перезапросить API"),
+):
+    """Сверка GSC, органики Метрики и Вебмастера по страницам: где сломан трекинг."""
+    from app.steps import StepError, run_reconcile_pages
+
+    try:
+        result = run_reconcile_pages(
+            client, p1_start, p1_end, p2_start, p2_end,
+            source=source, limit=limit, top=top, min_clicks=min_clicks, threshold=threshold, refresh=refresh,
+        )
+    except StepError as e:
+        rprint(f"[bold red]Error:[/bold red] {e}")
+        raise typer.Exit(code=1)
+
+    totals = result.data["totals"]
+    _print_workbook_saved(result)
+
+    table = Table(title=f"Сверка страниц ({client}, {p1_start}-{p1_end} vs {p2_start}-{p2_end})")
+    table.add_column("url")
+    table.add_column("flag")
+    table.add_column("clicks_p1", justify="right")
+    table.add_column("clicks_p2", justify="right")
+    table.add_column("visits_p1", justify="right")
+    table.add_column("visits_p2", justify="right")
+    table.add_column("divergence", justify="right")
+    table.add_column("visits_gap", justify="right")
+    table.add_column("ymw")
+    for r in result.ranked_rows[:50]:
+        table.add_row(
+            r["url"],
+            r["flag"],
+            str(int(r["clicks_p1"])),
+            str(int(r["clicks_p2"])),
+            str(int(r["visits_p1"])),
+            str(int(r["visits_p2"])),
+            f"{r['divergence']:.2f}",
+            f"{r['visits_gap']:.0f}",
+            r["ymw_status"],
+        )
+    rprint(table)
+    flags = ", ".join(f"{name}: {count}" for name, count in totals["flags"].items() if count) or "нет"
+    rprint(
+        f"\n[bold]Страниц:[/bold] {totals['pages']} (GSC: {totals['pages_gsc']}, Метрика: {totals['pages_metrika']}, "
+        f"в обоих: {totals['pages_matched']})"
+    )
+    rprint(f"[bold]Флаги:[/bold] {flags}")
+    rprint(f"[bold]Сдвиг Метрики к GSC по сайту:[/bold] x{totals['site_divergence']:.2f}")
+
+
+@app.command("detect-changepoints")
+def detect_changepoints_cmd(
+    client: str = typer.Argument(..., help="Имя папки в clients/<client>/"),
+    date1: str = typer.Argument(..., help="Начальная дата (YYYY-MM-DD)"),
+    date2: str = typer.Argument(..., help="Конечная дата (YYYY-MM-DD)"),
+    kind: str = typer.Option("pages", "--kind", help="Ряды: pages, sources, gsc_queries или gsc_pages"),
+    limit: int = typer.Option(100000, "--limit", help="Размер страницы API (день x ключ); ряд выгружается целиком"),
+    top: int = typer.Option(50, "--top", help="Сколько ключей с наибольшим сдвигом сохранить и показать"),
+    penalty: float = typer.Option(DEFAULT_PENALTY_FACTOR, "--penalty", help="Штраф за точку смены (в единицах sigma^2 * log n)"),
+    refresh: bool = typer.Option(False, "--refresh", help="Принудительно перезапросить API"),
+):
+    """Точки смены уровня по дневным рядам для всех страниц / источников / GSC-ключей."""
+    from app.steps import StepError, run_detect_changepoints
+
+    try:
+        result = run_detect_changepoints(
+            client, date1, date2, kind=kind, limit=limit, top=top, penalty=penalty, refresh=refresh
+        )
+    except StepError as e:
+        rprint(f"[bold red]Error:[/bold red] {e}")
+        raise typer.Exit(code=1)
+
+    _, _, key_field, value_field = CHANGEPOINT_KINDS[kind]
+    workbook = result.data
+    _print_workbook_saved(result)
+
+    table = Table(title=f"Точки смены ({client}, {kind}, {date1}..{date2})")
+    table.add_column(key_field)
+    table.add_column("change_date")
+    table.add_column(f"{value_field}/day before", justify="right")
+    table.add_column(f"{value_field}/day after", justify="right")
+    table.add_column("delta_%", justify="right")
+    table.add_column("impact", justify="right")
+    for r in workbook["rows"]:
+        main = next(cp for cp in r["changepoints"] if cp["date"] == r["change_date"])
+        table.add_row(
+            str(r.get(key_field, "")),
+            r["change_date"],
+            f"{main['mean_before']:.1f}",
+            f"{main['mean_after']:.1f}",
+            f"{r['change_delta_pct']:.1f}",
+            str(int(r["change_impact"])),
+        )
+    rprint(table)
+    totals = workbook["totals"]
+    rprint(f"\n[bold]Рядов:[/bold] {totals['series']}, со сдвигом: {totals['series_with_changes']}, дней: {totals['days']}")
+
+
+@app.command("fit-baselines")
+def fit_baselines_cmd(
+    client: str = typer.Argument(..., help="Имя папки в clients/<client>/"),
+    kind: str = typer.Option("all", "--kind", help="pages, sources, gsc_queries, gsc_pages или all"),
+    date1: str = typer.Option("", "--date1", help="Догрузить дневную историю с этой даты (YYYY-MM-DD)"),
+    date2: str = typer.Option("", "--date2", help="Догрузить дневную историю по эту дату (YYYY-MM-DD)"),
+    limit: int = typer.Option(100000, "--limit", help="Размер страницы API при догрузке (ряд догружается целиком)"),
+):
+    """Сезонные baseline-модели (день недели x месяц) по кэшу дневных рядов."""
+    from app.analysis_changepoints import load_or_fetch_daily
+    from app.baselines import fit_baselines, save_baselines
+    from app.metrika_client import MetrikaClient
+    from app.steps import gsc_client_from_config as _get_gsc_client
+
+    kinds = list(CHANGEPOINT_KINDS) if kind == "all" else [kind]
+    if any(k not in CHANGEPOINT_KINDS for k in kinds):
+        rprint(f"[bold red]Error:[/bold red] --kind должен быть одним из: {', '.join(CHANGEPOINT_KINDS)}, all")
+        raise typer.Exit(code=1)
+    if bool(date1) != bool(date2):
+        rprint("[bold red]Error:[/bold red] --date1 и --date2 задаются вместе")
+        raise typer.Exit(code=1)
+
+    cfg, _ = load_client_config(client)
+    fitted = 0
+    for current in kinds:
+        if date1:
+            source = CHANGEPOINT_KINDS[current][0]
+            try:
+                if source == "metrika":
+                    token = os.getenv("YANDEX_METRIKA_TOKEN")
+                    if not token or cfg.counter_id <= 0:
+                        rprint(f"[yellow]Skip {current}:[/yellow] Метрика не настроена")
+                        continue
+                    load_or_fetch_daily(client, current, date1, date2, limit, False, metrika_client=MetrikaClient(token=token, counter_id=cfg.counter_id))
+                else:
+                    load_or_fetch_daily(client, current, date1, date2, min(limit, 25000), False, gsc_client=_get_gsc_client(cfg))
+            except Exception as e:
+                rprint(f"[yellow]Skip {current}:[/yellow] {str(e)[:300]}")
+                continue
+        try:
+            baselines = fit_baselines(client, current)
+        except ValueError as e:
+            rprint(f"[yellow]Skip {current}:[/yellow] {e}")
+            continue
+        path = save_baselines(client, current, baselines)
+        meta = baselines["meta"]
+        rprint(
+            f"[green]{current}:[/green] {len(baselines['models']) - 1} ключей, "
+            f"история {meta['history_start']}..{meta['history_end']} ({meta['days']} дн., yearly={meta['yearly']}) -> {path.name}"
+        )
+        fitted += 1
+
+    if fitted == 0:
+        rprint("[bold red]Error:[/bold red] Ни одна baseline-модель не построена")
+        raise typer.Exit(code=1)
+
+
+@app.command("watch")
+def watch_cmd(
+    client: str = typer.Option("", "--client", help="Только этот клиент (по умолчанию все из clients/)"),
+    day: str = typer.Option("", "--date", help="День для загрузки (YYYY-MM-DD, по умолчанию вчера)"),
+    once: bool = typer.Option(False, "--once", help="Один проход без ожидания"),
+    interval_hours: float = typer.Option(24.0, "--interval-hours", help="Пауза между проходами"),
+    z_threshold: float = typer.Option(DEFAULT_Z_THRESHOLD, "--z", help="Порог |z| для алерта"),
+    investigate_on: str = typer.Option("drop", "--investigate-on", help="drop, spike, both или none"),
+):
+    """
+    Мониторинг аномалий: ежедневная догрузка вчерашнего дня по всем клиентам
+    (GSC — final-данные с задержкой в 3 дня), инкрементальные EWMA-статистики
+    и автоматический investigate при срабатывании.
+    """
+    from app.metrika_client import MetrikaClient
+    from app.monitoring import (
+        investigation_periods,
+        investigation_query,
+        stream_day,
+        watch_client,
+        yesterday as monitoring_yesterday,
+    )
+    from app.orchestrator import investigate
+    from app.steps import gsc_client_from_config as _get_gsc_client
+
+    import time
+
+    if investigate_on not in {"drop", "spike", "both", "none"}:
+        rprint("[bold red]Error:[/bold red] --investigate-on должен быть drop, spike, both или none")
+        raise typer.Exit(code=1)
+
+    clients = [client] if client else list_clients()
+    if not clients:
+        rprint("[bold red]Error:[/bold red] Нет клиентов в clients/")
+        raise typer.Exit(code=1)
+
+    while True:
+        target_day = day or monitoring_yesterday()
+        for name in clients:
+            try:
+                cfg, _ = load_client_config(name)
+            except Exception as e:
+                rprint(f"[yellow]{name}:[/yellow] не удалось загрузить конфиг: {e}")
+                continue
+            token = os.getenv("YANDEX_METRIKA_TOKEN")
+            metrika = MetrikaClient(token=token, counter_id=cfg.counter_id) if token and cfg.counter_id > 0 else None
+            try:
+                gsc = _get_gsc_client(cfg)
+            except ValueError:
+                gsc = None
+            if metrika is None and gsc is None:
+                rprint(f"[yellow]{name}:[/yellow] нет доступных источников")
+                continue
+
+            try:
+                alerts = watch_client(name, target_day, metrika=metrika, gsc=gsc, goal_id=cfg.goal_id, z_threshold=z_threshold)
+            except Exception as e:
+                msg = str(e)
+                if token and token in msg:
+                    msg = msg.replace(token, "***")
+                rprint(f"[bold red]{name}:[/bold red] ошибка загрузки: {msg[:500]}")
+                continue
+
+            if not alerts:
+                rprint(f"[green]{name}:[/green] {target_day} без аномалий")
+                continue
+
+            table = Table(title=f"Аномалии ({name}, {target_day})")
+            table.add_column("stream")
+            table.add_column("key")
+            table.add_column("day")
+            table.add_column("value", justify="right")
+            table.add_column("expected", justify="right")
+            table.add_column("z", justify="right")
+            for alert in alerts[:20]:
+                table.add_row(alert.stream, alert.key, alert.day, f"{alert.value:.0f}", f"{alert.expected:.1f}", f"{alert.z:.1f}")
+            rprint(table)
+
+            triggering = [
+                alert
+                for alert in alerts
+                if alert.day == stream_day(alert.stream, target_day) and investigate_on in {"both", alert.direction}
+            ]
+            if not triggering:
+                continue
+            p1_start, p1_end, p2_start, p2_end = investigation_periods(max(alert.day for alert in triggering))
+            try:
+                report, analysis, _ = investigate(
+                    client=name,
+                    query=investigation_query(triggering),
+                    p1_start=p1_start,
+                    p1_end=p1_end,
+                    p2_start=p2_start,
+                    p2_end=p2_end,
+                )
+            except Exception as e:
+                rprint(f"[bold red]{name}:[/bold red] investigate не выполнен: {e}")
+                continue
+            rprint(f"[bold]{name}:[/bold] {analysis['summary']}")
+            rprint(f"- Markdown: {report.markdown_path}")
+
+        if once:
+            return
+        time.sleep(max(interval_hours, 0.01) * 3600)
+
+
+def _print_explain(explained: dict) -> None:
+    rprint(f"[bold]Период:[/bold] {explained['period']['description']}")
+    for title, items in [("План раунда 1", explained["plan"]), ("Вероятные следующие шаги", explained["likely_followups"])]:
+        table = Table(title=title)
+        table.add_column("step")
+        table.add_column("source")
+        table.add_column("API calls", justify="right")
+        table.add_column("cache", justify="right")
+        table.add_column("rows", justify="right")
+        table.add_column("~sec", justify="right")
+        table.add_column("p90 sec", justify="right")
+        table.add_column("value", justify="right")
+        table.add_column("info/sec", justify="right")
+        for item in items:
+            table.add_row(
+                item["kind"],
+                item["source"],
+                str(item["api_calls"]),
+                f"{item['cache_hit_prob'] * 100:.0f}%",
+                str(item["expected_rows"]),
+                f"{item['expected_seconds']:.1f}",
+                f"{item['p90_seconds']:.1f}",
+                f"{item['value']:.1f}",
+                f"{item['score']:.2f}",
+            )
+        rprint(table)
+    cost = explained["cost"]
+    budgets = ", ".join(f"{source}: {cost['spent'].get(source, 0)}/{limit}" for source, limit in cost["budgets"].items())
+    rprint(f"[bold]Бюджет вызовов API (раунд 1):[/bold] {budgets}")
+    for item in cost["rejected"]:
+        rprint(f"[yellow]Отброшен:[/yellow] {item['kind']} — {item['reason']}")
+
+
 @app.command("investigate")
 def investigate_cmd(
     client: str = typer.Argument(..., help="Имя клиента"),
-    query: str = typer.Option(..., "--query", help="Запрос обычным языком"),
+    query: str = typer.Option("", "--query", help="Запрос обычным языком (при --resume берётся из checkpoint)"),
     refresh: bool = typer.Option(False, "--refresh", help="Обновить данные у доступных источников"),
     p1_start: str = typer.Option("", "--p1-start", help="Период 1: начало (опционально)"),
     p1_end: str = typer.Option("", "--p1-end", help="Период 1: конец (опционально)"),
     p2_start: str = typer.Option("", "--p2-start", help="Период 2: начало (опционально)"),
     p2_end: str = typer.Option("", "--p2-end", help="Период 2: конец (опционально)"),
+    prefetch: bool = typer.Option(True, "--prefetch/--no-prefetch", help="Заранее загружать вероятные шаги следующих раундов"),
+    explain: bool = typer.Option(False, "--explain", help="Показать план с оценкой стоимости, ничего не выполняя"),
+    resume: str = typer.Option("", "--resume", help="run_id прерванного расследования: продолжить с последнего завершённого шага"),
+    replay: str = typer.Option("", "--replay", help="run_id: пересобрать анализ и отчёт из сохранённых данных, без API"),
+    analyzer: str = typer.Option("", "--analyzer", help="Analyzer для --replay в виде module:function"),
 ):
     """
     Полное расследование по клиенту из обычного запроса:
     система сама выбирает источники, запускает анализы и сохраняет отчёт.
     """
+    from app.orchestrator import explain_investigation, investigate
+
+    if not query and not resume and not replay:
+        rprint("[bold red]Error:[/bold red] Нужен --query (или --resume / --replay <run_id>)")
+        raise typer.Exit(code=1)
+    if analyzer and not replay:
+        rprint("[bold red]Error:[/bold red] --analyzer работает только с --replay")
+        raise typer.Exit(code=1)
+
+    if explain:
+        try:
+            explained = explain_investigation(
+                client=client,
+                query=query,
+                refresh=refresh,
+                p1_start=p1_start or None,
+                p1_end=p1_end or None,
+                p2_start=p2_start or None,
+                p2_end=p2_end or None,
+            )
+        except Exception as e:
+            rprint(f"[bold red]Error:[/bold red] {e}")
+            raise typer.Exit(code=1)
+        _print_explain(explained)
+        return
+
     try:
-        report, analysis, executed_steps = investigate(
-            client=client,
-            query=query,
-            refresh=refresh,
-            p1_start=p1_start or None,
-            p1_end=p1_end or None,
-            p2_start=p2_start or None,
-            p2_end=p2_end or None,
-        )
+        if replay:
+            from app.orchestrator.replay import load_analyzer, replay_investigation
+
+            report, analysis, executed_steps = replay_investigation(client, replay, load_analyzer(analyzer))
+        else:
+            report, analysis, executed_steps = investigate(
+                client=client,
+                query=query,
+                refresh=refresh,
+                p1_start=p1_start or None,
+                p1_end=p1_end or None,
+                p2_start=p2_start or None,
+                p2_end=p2_end or None,
+                prefetch=prefetch,
+                resume=resume or None,
+            )
     except Exception as e:
         rprint(f"[bold red]Error:[/bold red] {e}")
         raise typer.Exit(code=1)
@@ -2251,16 +2182,154 @@ def investigate_cmd(
             rprint(f"- Остановка: {loop_info['stop_reason']}")
 
     rprint("\n[bold]Отчёт:[/bold]")
+    rprint(f"- run_id: {report.run_id}")
+    if report.reused:
+        rprint("- Входы и код не изменились с этого расследования: отчёт не перерисовывался")
+    if replay:
+        rprint(f"- Повтор расследования {replay} по сохранённым данным")
     rprint(f"- Markdown: {report.markdown_path}")
     rprint(f"- HTML: {report.html_path}")
     rprint(f"- Evidence JSON: {report.evidence_json_path}")
     rprint(f"- Evidence TXT: {report.evidence_txt_path}")
+    if report.trace_path:
+        rprint(f"- Trace: {report.trace_path}")
 
     failed = [step for step in executed_steps if not step.success]
     if failed and len(failed) == len(executed_steps):
         raise typer.Exit(code=1)
 
 
+@app.command("investigate-batch")
+def investigate_batch_cmd(
+    spec_path: Path = typer.Argument(..., help="YAML со списком клиентов, запросов и периодов"),
+    workers: int = typer.Option(0, "--workers", help="Процессов (0 = из спецификации или по числу CPU)"),
+):
+    """
+    Пакет расследований: клиенты × запросы × периоды.
+
+    Задания одного клиента идут в одном процессе и делят кэш, вызовы API
+    всех процессов проходят через общий лимит на источник.
+    """
+    from app.orchestrator.batch import load_spec, run_batch
+
+    try:
+        spec = load_spec(spec_path)
+    except Exception as e:
+        rprint(f"[bold red]Error:[/bold red] {e}")
+        raise typer.Exit(code=1)
+
+    rprint(f"[bold]Заданий:[/bold] {len(spec.jobs)}")
+    summary = run_batch(spec, workers=workers or None)
+
+    table = Table(title=f"Пакет {summary['batch_id']}")
+    table.add_column("client")
+    table.add_column("query")
+    table.add_column("status")
+    table.add_column("report")
+    for entry in summary["results"]:
+        job = entry["job"]
+        status = entry.get("root_cause_status") or "" if entry["success"] else "[red]ошибка[/red]"
+        table.add_row(job["client"], job["query"], status, entry.get("report_dir") or entry.get("error", ""))
+    rprint(table)
+    rprint(f"[bold]Успешно:[/bold] {summary['succeeded']}, [bold]с ошибкой:[/bold] {summary['failed']}")
+    rprint(f"[bold]Сводка:[/bold] {summary['summary_dir']}")
+
+    if summary["failed"] and not summary["succeeded"]:
+        raise typer.Exit(code=1)
+
+
+@app.command("investigate-backtest")
+def investigate_backtest_cmd(
+    clients: Optional[List[str]] = typer.Argument(None, help="Клиенты (по умолчанию все из reports/)"),
+    analyzer: str = typer.Option("", "--analyzer", help="Analyzer в виде module:function (по умолчанию штатный)"),
+    workers: int = typer.Option(0, "--workers", help="Процессов (0 = по числу CPU)"),
+):
+    """
+    Прогнать analyzer по всем сохранённым расследованиям, без API.
+
+    Показывает, где выводы разошлись с исходными: статус причины, гипотезы,
+    рекомендации. Сводка — reports/_backtest/<id>/summary.{json,md}.
+    """
+    from app.orchestrator.replay import run_backtest
+
+    try:
+        summary = run_backtest(clients or None, analyzer_spec=analyzer, workers=workers)
+    except Exception as e:
+        rprint(f"[bold red]Error:[/bold red] {e}")
+        raise typer.Exit(code=1)
+
+    table = Table(title=f"Backtest {summary['backtest_id']}")
+    table.add_column("client")
+    table.add_column("run_id")
+    table.add_column("status")
+    table.add_column("гипотезы")
+    for entry in summary["results"]:
+        if not entry["success"]:
+            table.add_row(entry["client"], entry["run_id"], "[red]ошибка[/red]", entry["error"])
+        elif entry["changed"]:
+            before, after = entry["root_cause_status"]
+            hypotheses = [f"+ {title}" for title in entry["hypotheses_added"]]
+            hypotheses += [f"− {title}" for title in entry["hypotheses_removed"]]
+            status = before if before == after else f"{before} → {after}"
+            table.add_row(entry["client"], entry["run_id"], status, "\n".join(hypotheses))
+    rprint(table)
+    rprint(
+        f"[bold]Расследований:[/bold] {summary['runs']}, [bold]изменилось:[/bold] {summary['changed']}, "
+        f"[bold]с ошибкой:[/bold] {summary['failed']}"
+    )
+    rprint(f"[bold]Сводка:[/bold] {summary['summary_dir']}")
+
+
+@app.command("serve")
+def serve_cmd(
+    host: str = typer.Option(DEFAULT_HOST, "--host", help="Адрес для TCP"),
+    port: int = typer.Option(DEFAULT_PORT, "--port", help="Порт для TCP"),
+    socket_path: str = typer.Option("", "--socket", help="Слушать Unix-сокет вместо TCP"),
+):
+    """
+    Долгоживущий локальный сервер: investigate, шаги и кэш по HTTP.
+
+    Конфиги, API-клиенты и готовые шаги остаются в памяти между запросами;
+    одинаковые одновременные запросы выполняются один раз.
+    Клиент: python -m app.remote health | investigate | step | cache | clear
+    """
+    from app.server import ServerApp, create_server
+
+    server_app = ServerApp()
+    server = create_server(server_app, host=host, port=port, socket_path=socket_path or None)
+    address = socket_path or f"http://{host}:{server.server_address[1]}"
+    rprint(f"[bold]Сервер слушает:[/bold] {address} (Ctrl+C — остановить)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        server_app.close()
+        if socket_path and Path(socket_path).exists():
+            Path(socket_path).unlink()
+
+
+@app.command("artifact-cat")
+def artifact_cat_cmd(
+    digest: str = typer.Argument(..., help="sha256 из evidence.json (snapshots / logs)"),
+    out: str = typer.Option("", "--out", help="Записать в файл вместо вывода в консоль"),
+):
+    """Достать артефакт из хранилища reports/_store/ по sha256."""
+    from app.artifact_store import ArtifactStore
+
+    try:
+        data = ArtifactStore().get_bytes(digest)
+    except FileNotFoundError as e:
+        rprint(f"[bold red]Error:[/bold red] {e}")
+        raise typer.Exit(code=1)
+    if out:
+        Path(out).write_bytes(data)
+        rprint(f"[bold]Сохранено:[/bold] {out} ({len(data)} байт)")
+    else:
+        typer.echo(data.decode("utf-8", errors="replace"), nl=False)
+
+
 @app.command()
 def audit_data(
     client: str = typer.Argument(..., help="Имя клиента"),
@@ -2334,12 +2403,70 @@ def audit_data(
         rprint("[green]✅ Audit PASSED: All data files present and up-to-date[/green]")
 
 
+@app.command()
+def audit_all(
+    clients: Optional[List[str]] = typer.Argument(None, help="Клиенты (по умолчанию все из data_cache/)"),
+    max_age_days: int = typer.Option(7, "--max-age-days", help="Workbook старше — предупреждение"),
+    workers: int = typer.Option(0, "--workers", help="Процессов для проверки файлов (0 = по числу CPU)"),
+    strict: bool = typer.Option(False, "--strict", help="Строгий режим (провал при warnings)"),
+    out: str = typer.Option("", "--out", help="JSON с результатом по каждому файлу"),
+):
+    """
+    ⚡ AUDIT: Проверка всех артефактов data_cache/ по всем клиентам.
+
+    Схема, число строк, totals против суммы rows, обрезка по лимитам и
+    свежесть. Неизменённые с прошлого прохода файлы берутся из
+    reports/_audit/data.json и не перечитываются.
+
+    Пример:
+    python -m app.cli audit-all --workers 8
+    """
+    from app.data_audit import sweep
+
+    rprint(f"[bold yellow]⚡ AUDIT: Data Sweep[/bold yellow]")
+    summary = sweep(clients or None, max_age_days=max_age_days, workers=workers)
+
+    problems = [entry for entry in summary["files"] if entry["issues"] or (strict and entry["warnings"])]
+    if problems:
+        table = Table(title="Файлы с замечаниями")
+        table.add_column("client")
+        table.add_column("file")
+        table.add_column("issues")
+        for entry in problems[:100]:
+            notes = [f"[red]{issue}[/red]" for issue in entry["issues"]] + entry["warnings"]
+            table.add_row(entry["client"], Path(entry["path"]).name, "\n".join(notes))
+        rprint(table)
+        if len(problems) > 100:
+            rprint(f"... и ещё {len(problems) - 100}")
+
+    table = Table(title="По клиентам")
+    table.add_column("client")
+    table.add_column("files", justify="right")
+    table.add_column("rows", justify="right")
+    table.add_column("issues", justify="right")
+    table.add_column("warnings", justify="right")
+    for client, counts in summary["clients"].items():
+        table.add_row(client, str(counts["files"]), str(counts["rows"]), str(counts["issues"]), str(counts["warnings"]))
+    rprint(table)
+    rprint(
+        f"Files: {len(summary['files'])} (checked: {summary['checked']}, from cache: {summary['cached']}), "
+        f"[red]issues: {summary['issues']}[/red], warnings: {summary['warnings']}"
+    )
+    if out:
+        Path(out).write_text(json.dumps(summary, ensure_ascii=False, indent=2), encoding="utf-8")
+        rprint(f"Results: {out}")
+    if summary["issues"] or (strict and summary["warnings"]):
+        raise typer.Exit(1)
+
+
 @app.command()
 def audit_metric(
-    claim: str = typer.Argument(..., help="Утверждение вида 'metric=value'"),
-    source: str = typer.Option(..., "--source", help="Файл-источник данных"),
+    claim: str = typer.Argument("", help="Утверждение вида 'metric=value' (metric — ключ или путь totals.visits)"),
+    source: str = typer.Option("", "--source", help="Файл-источник данных (в --batch — для строк без source)"),
     client: str = typer.Option(..., "--client", help="Имя клиента"),
     period: str = typer.Option("", "--period", help="Период (опционально)"),
+    batch: str = typer.Option("", "--batch", help="CSV с колонками metric,value,source,period: проверить все строки"),
+    out: str = typer.Option("", "--out", help="CSV с результатом каждой проверки (для --batch)"),
 ):
     """
     ⚡ AUDIT: Проверка конкретной цифры.
@@ -2349,28 +2476,62 @@ def audit_metric(
         --source "analysis_sources_*.json" \\
         --client trisystems \\
         --period "Q4 2025"
+
+    Тысячи цифр отчёта за один проход (каждый источник читается один раз):
+    python -m app.cli audit-metric --batch claims.csv --client trisystems
     """
-    from app.audit import AuditEngine, DataPoint
-    
+    from app.audit import AuditEngine, DataPoint, parse_claim_value, read_claims_csv
+
+    engine = AuditEngine(client)
+
+    if batch:
+        try:
+            data_points = read_claims_csv(Path(batch), default_source=source, default_period=period)
+        except (OSError, ValueError) as e:
+            rprint(f"[red]Error: {e}[/red]")
+            raise typer.Exit(1)
+        results = engine.verify_data_sources(data_points)
+        failed = [(point, result) for point, result in zip(data_points, results) if result.status != "passed"]
+
+        rprint(f"[bold yellow]⚡ AUDIT: Batch Metric Verification[/bold yellow]")
+        rprint(f"Claims: {len(results)}, Client: {client}\n")
+        if failed:
+            table = Table(title="Failed claims")
+            table.add_column("line")
+            table.add_column("claim")
+            table.add_column("issues")
+            for point, result in failed[:50]:
+                table.add_row(str(point.context.get("line", "")), result.claim, "; ".join(result.issues))
+            rprint(table)
+            if len(failed) > 50:
+                rprint(f"... и ещё {len(failed) - 50}")
+        if out:
+            with open(out, "w", newline="", encoding="utf-8") as f:
+                writer = csv.writer(f)
+                writer.writerow(["line", "claim", "status", "evidence", "issues"])
+                for point, result in zip(data_points, results):
+                    writer.writerow(
+                        [point.context.get("line", ""), result.claim, result.status, " ".join(result.evidence), "; ".join(result.issues)]
+                    )
+            rprint(f"Results: {out}")
+        rprint(f"[green]✅ PASSED[/green]: {len(results) - len(failed)}, [red]❌ FAILED[/red]: {len(failed)}")
+        if failed:
+            raise typer.Exit(1)
+        return
+
     # Парсим claim
-    if "=" not in claim:
-        rprint("[red]Error: claim должен быть вида 'metric=value'[/red]")
+    if "=" not in claim or not source:
+        rprint("[red]Error: claim должен быть вида 'metric=value' и нужен --source (или --batch claims.csv)[/red]")
         raise typer.Exit(1)
     
     metric, value_str = claim.split("=", 1)
-    
-    try:
-        value = float(value_str)
-    except ValueError:
-        value = value_str
+    value = parse_claim_value(value_str)
     
     rprint(f"[bold yellow]⚡ AUDIT: Metric Verification[/bold yellow]")
     rprint(f"Claim: {metric} = {value}")
     rprint(f"Source: {source}")
     rprint(f"Client: {client}\n")
     
-    engine = AuditEngine(client)
-    
     result = engine.verify_data_source(DataPoint(
         metric=metric,
         value=value,
@@ -2392,8 +2553,9 @@ def audit_metric(
 
 @app.command()
 def audit_report(
-    report_path: str = typer.Argument(..., help="Путь к отчету"),
+    report_path: str = typer.Argument(..., help="Путь к отчету (report.md, evidence.json или папка расследования)"),
     strict: bool = typer.Option(False, "--strict", help="Строгий режим (провал при warnings)"),
+    workers: int = typer.Option(0, "--workers", help="Процессов для проверки источников (0 = по числу CPU)"),
 ):
     """
     ⚡ AUDIT: Полная проверка отчета перед публикацией.
@@ -2401,12 +2563,13 @@ def audit_report(
     Проверяет:
     - Все цифры имеют источники
     - Все расчеты верны
-    - Все гипотезы обоснованы
+    - Цифры совпадают с источником (снимок из evidence.json или файл)
     
     Пример:
-    python -m app.cli audit-report reports/trisystems/REPORT.md --strict
+    python -m app.cli audit-report reports/trisystems/<run_id>/report.md --strict
     """
     from app.audit import AuditEngine
+    from app.report_audit import load_report
     
     report_file = Path(report_path)
     if not report_file.exists():
@@ -2415,20 +2578,30 @@ def audit_report(
     
     rprint(f"[bold yellow]⚡ AUDIT: Report Verification[/bold yellow]")
     rprint(f"Report: {report_path}\n")
-    
-    # TODO: Реализовать парсинг отчета и проверку всех утверждений
-    # Пока что базовая проверка
-    
-    rprint("[yellow]⚠️ Full report audit not yet implemented[/yellow]")
-    rprint("Manual checks required:")
-    rprint("  1. Все цифры имеют источники (file + line)?")
-    rprint("  2. Все гипотезы имеют альтернативы?")
-    rprint("  3. Указан confidence для ключевых выводов?")
-    rprint("  4. Нет противоречий в данных?")
-    rprint("  5. Рекомендации реалистичны (не 'с потолка')?")
-    
-    # Placeholder для будущей реализации
-    rprint("\n[blue]ℹ️ See docs/AUDIT_RULES.md for full checklist[/blue]")
+
+    try:
+        report_data = load_report(report_file)
+    except (OSError, ValueError) as e:
+        rprint(f"[red]Error: {e}[/red]")
+        raise typer.Exit(1)
+    summary = AuditEngine(report_data["client"]).audit_report(report_data, workers=workers)
+
+    if not summary["total_checks"]:
+        rprint("[yellow]⚠️ В отчёте нет цифр со ссылкой на источник (Evidence)[/yellow]")
+        rprint("\n[blue]ℹ️ See docs/AUDIT_RULES.md for full checklist[/blue]")
+        raise typer.Exit(1 if strict else 0)
+
+    for detail in summary["details"]:
+        marker = "[red]❌ FAILED[/red]" if detail["status"] == "failed" else "[yellow]⚠️ WARNING[/yellow]"
+        rprint(f"{marker}: {detail['claim']}")
+        for issue in detail["issues"]:
+            rprint(f"  - {issue}")
+    rprint(
+        f"\nClaims: {summary['total_checks']} (from cache: {summary['cached']}), "
+        f"[green]passed: {summary['passed']}[/green], warnings: {summary['warnings']}, [red]failed: {summary['failed']}[/red]"
+    )
+    if summary["failed"] or (strict and summary["warnings"]):
+        raise typer.Exit(1)
 
 
 if __name__ == "__main__":
@@ -8,6 +8,9 @@ import yaml
 
 CLIENTS_DIR = Path("clients")
 
+# Разобранные конфиги: (абсолютный путь) -> ((mtime_ns, size), результат). Живёт весь процесс (serve).
+_CONFIG_CACHE: Dict[Path, Tuple[Tuple[int, int], Tuple["ClientConfig", Path]]] = {}
+
 
 @dataclass(frozen=True)
 class ClientConfig:
@@ -35,6 +38,14 @@ def _read_yaml(path: Path) -> Dict[str, Any]:
 
 def load_client_config(client_name: str) -> Tuple[ClientConfig, Path]:
     cfg_path = CLIENTS_DIR / client_name / "config.yaml"
+    try:
+        stat = cfg_path.stat()
+    except OSError:
+        stat = None
+    if stat is not None:
+        cached = _CONFIG_CACHE.get(cfg_path.resolve())
+        if cached is not None and cached[0] == (stat.st_mtime_ns, stat.st_size):
+            return cached[1]
     raw = _read_yaml(cfg_path)
 
     site = raw.get("site") or {}
@@ -70,9 +81,15 @@ def load_client_config(client_name: str) -> Tuple[ClientConfig, Path]:
         ym_webmaster_user_id=ym_webmaster_user_id,
         ym_webmaster_host_id=ym_webmaster_host_id,
     )
+    if stat is not None:
+        _CONFIG_CACHE[cfg_path.resolve()] = ((stat.st_mtime_ns, stat.st_size), (cfg, cfg_path))
     return cfg, cfg_path
 
 
+def clear_config_cache() -> None:
+    _CONFIG_CACHE.clear()
+
+
 def list_clients() -> list[str]:
     if not CLIENTS_DIR.exists():
         return []
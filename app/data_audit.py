@@ -0,0 +1,272 @@
+"""
+Проверка всего data_cache/ разом: каждый артефакт каждого клиента.
+
+Что проверяется у файла:
+- схема — workbook (meta, totals, rows), нормализованные выгрузки (*_norm_*:
+  список строк с одинаковыми полями), сырые ответы API (*_raw_*);
+- число строк (пустой workbook или выгрузка — предупреждение);
+- согласованность totals: total_<col> равен сумме rows[col] для аддитивных
+  колонок; если rows обрезаны по limit/top, сумма не может превышать total;
+- обрезка: rows упёрлись в limit/top, в ответе Метрики total_rows больше
+  полученных строк, в GSC строк ровно rowLimit;
+- свежесть — файл записан до конца своего периода (данные неполные) или
+  workbook старше max_age_days.
+
+Содержимое проверяется в пуле процессов, результат кэшируется в
+reports/_audit/data.json по (путь, mtime_ns, size, версия кода): при
+повторном проходе неизменённые файлы не читаются. Свежесть зависит от
+текущей даты и считается заново каждый раз, по stat.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from app import build_graph
+
+MANIFEST_PATH = Path("reports") / "_audit" / "data.json"
+DEFAULT_MAX_AGE_DAYS = 7
+# rowLimit, которые ставят команды и мониторинг: ровно столько строк — ответ, скорее всего, обрезан.
+GSC_ROW_LIMITS = {1000, 5000, 10000, 25000}
+# Колонки, которые нельзя складывать по строкам (доли, проценты, позиции).
+NON_ADDITIVE = ("ctr", "cr_", "pct", "pp", "position", "share")
+SKIP_FILES = {build_graph.MANIFEST_FILE}
+
+_DATE_RE = re.compile(r"\d{4}-\d{2}-\d{2}")
+
+
+def artifact_kind(name: str) -> str:
+    if name.startswith("analysis_"):
+        return "workbook"
+    if "_norm_" in name:
+        return "norm"
+    if "_raw_" in name:
+        return "raw"
+    return "other"
+
+
+def _is_number(value: Any) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _check_rows(rows: Any, label: str, issues: List[str]) -> int:
+    """Список словарей с одинаковыми полями; числовые поля первой строки числовые везде."""
+    if not isinstance(rows, list):
+        issues.append(f"{label}: ожидался список строк, получено {type(rows).__name__}")
+        return 0
+    if not rows:
+        return 0
+    if not all(isinstance(row, dict) for row in rows):
+        issues.append(f"{label}: строки должны быть объектами")
+        return len(rows)
+    columns = set(rows[0])
+    numeric = [key for key, value in rows[0].items() if _is_number(value)]
+    for position, row in enumerate(rows):
+        if set(row) != columns:
+            issues.append(f"{label}[{position}]: поля {sorted(set(row) ^ columns)} не совпадают с первой строкой")
+            break
+        bad = [key for key in numeric if not _is_number(row[key])]
+        if bad:
+            issues.append(f"{label}[{position}].{bad[0]}: ожидалось число, получено {row[bad[0]]!r}")
+            break
+    return len(rows)
+
+
+def _check_totals(data: Dict[str, Any], truncated: bool, issues: List[str]) -> None:
+    rows = data.get("rows") or []
+    totals = data.get("totals") or {}
+    if not rows or not isinstance(totals, dict):
+        return
+    for key, total in totals.items():
+        column = key[len("total_"):]
+        if not key.startswith("total_") or not _is_number(total) or any(marker in column for marker in NON_ADDITIVE):
+            continue
+        values = [row.get(column) for row in rows]
+        if not all(_is_number(value) for value in values):
+            continue
+        rows_sum = sum(values)
+        tolerance = 0.5 + 1e-6 * abs(total)
+        if not truncated and abs(rows_sum - total) > tolerance:
+            issues.append(f"totals.{key} = {total:g}, а сумма rows.{column} = {rows_sum:g}")
+        elif truncated and min(values) >= 0 and rows_sum > total + tolerance:
+            issues.append(f"totals.{key} = {total:g} меньше суммы первых {len(rows)} строк ({rows_sum:g})")
+
+
+def _check_workbook(data: Any, issues: List[str], warnings: List[str]) -> Tuple[int, str]:
+    if not isinstance(data, dict) or not isinstance(data.get("meta"), dict) or "rows" not in data:
+        issues.append("workbook: нужны объект meta и rows")
+        return 0, ""
+    meta = data["meta"]
+    if "totals" in data and not isinstance(data["totals"], dict):
+        issues.append("workbook: totals должен быть объектом")
+    count = _check_rows(data["rows"], "rows", issues)
+    limit = meta.get("limit") or meta.get("top") or 0
+    truncated = _is_number(limit) and limit > 0 and count >= limit
+    if truncated:
+        warnings.append(f"rows обрезаны до {count} (limit/top)")
+    if count == 0:
+        warnings.append("workbook без строк")
+    _check_totals(data, truncated, issues)
+    return count, str(meta.get("p2_end") or meta.get("date2") or "")
+
+
+def _check_raw(name: str, data: Any, warnings: List[str]) -> int:
+    if not isinstance(data, dict):
+        return len(data) if isinstance(data, list) else 0
+    if name.startswith("metrika_"):
+        count = len(data.get("data") or [])
+        total_rows = data.get("total_rows")
+        if _is_number(total_rows) and total_rows > count:
+            warnings.append(f"ответ Метрики обрезан: {count} строк из {total_rows:g}")
+        return count
+    if name.startswith("gsc_"):
+        count = len(data.get("rows") or [])
+        if count in GSC_ROW_LIMITS:
+            warnings.append(f"строк ровно {count}: ответ GSC, вероятно, упёрся в rowLimit")
+        return count
+    return 0
+
+
+def check_artifact(path: str) -> Dict[str, Any]:
+    """
+    Выполняется в процессе пула: проверки содержимого одного файла.
+
+    Returns: {kind, rows, period_end, issues, warnings}; свежести здесь нет.
+    """
+    name = Path(path).name
+    kind = artifact_kind(name)
+    issues: List[str] = []
+    warnings: List[str] = []
+    dates = _DATE_RE.findall(name)
+    period_end = dates[-1] if dates else ""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError) as e:
+        return {"kind": kind, "rows": 0, "period_end": period_end, "issues": [f"не читается как JSON: {e}"], "warnings": []}
+
+    rows = 0
+    if kind == "workbook":
+        rows, meta_end = _check_workbook(data, issues, warnings)
+        period_end = meta_end or period_end
+    elif kind == "norm":
+        rows = _check_rows(data, "rows", issues)
+        if rows == 0 and not issues:
+            warnings.append("пустая выгрузка")
+    elif kind == "raw":
+        rows = _check_raw(name, data, warnings)
+    return {"kind": kind, "rows": rows, "period_end": period_end, "issues": issues, "warnings": warnings}
+
+
+def _freshness(kind: str, mtime: float, period_end: str, max_age_days: int, today: date) -> Tuple[List[str], List[str]]:
+    written = datetime.fromtimestamp(mtime).date()
+    issues: List[str] = []
+    warnings: List[str] = []
+    try:
+        end = date.fromisoformat(period_end) if period_end else None
+    except ValueError:
+        end = None
+    if end is not None and written <= end:
+        issues.append(f"записан {written.isoformat()}, до конца периода {end.isoformat()}: данные неполные")
+    age_days = (today - written).days
+    if kind == "workbook" and age_days > max_age_days:
+        warnings.append(f"workbook старше {max_age_days} дней ({age_days})")
+    return issues, warnings
+
+
+def list_artifacts(clients: Optional[List[str]] = None) -> List[Tuple[str, Path]]:
+    """(client, путь) всех JSON в data_cache/<client>/, кроме служебных."""
+    root = Path("data_cache")
+    if not clients:
+        clients = sorted(path.name for path in root.glob("*") if path.is_dir())
+    return [
+        (client, path)
+        for client in clients
+        for path in sorted((root / client).glob("*.json"))
+        if path.name not in SKIP_FILES
+    ]
+
+
+def sweep(
+    clients: Optional[List[str]] = None,
+    max_age_days: int = DEFAULT_MAX_AGE_DAYS,
+    workers: int = 0,
+) -> Dict[str, Any]:
+    """
+    Returns: {"files": [...], "clients": {client: счётчики}, "checked", "cached",
+    "issues", "warnings"}; у файла — client, path, kind, rows, issues, warnings.
+    """
+    artifacts = list_artifacts(clients)
+    code = build_graph.code_version("steps")
+    manifest = build_graph.BuildManifest(MANIFEST_PATH)
+    previous = manifest.get_many(str(path) for _, path in artifacts)
+
+    stats: Dict[str, os.stat_result] = {}
+    results: Dict[str, Dict[str, Any]] = {}
+    todo: List[str] = []
+    for _, path in artifacts:
+        key = str(path)
+        stats[key] = path.stat()
+        entry = previous.get(key)
+        if (
+            entry
+            and entry.get("code") == code
+            and entry.get("mtime_ns") == stats[key].st_mtime_ns
+            and entry.get("size") == stats[key].st_size
+        ):
+            results[key] = entry["result"]
+        else:
+            todo.append(key)
+    cached = len(results)
+
+    max_workers = max(1, min(workers or os.cpu_count() or 1, len(todo) or 1))
+    if max_workers == 1:
+        checked = [check_artifact(path) for path in todo]
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            checked = list(pool.map(check_artifact, todo, chunksize=max(1, len(todo) // (max_workers * 4))))
+    fresh: Dict[str, Dict[str, Any]] = {}
+    for path, result in zip(todo, checked):
+        results[path] = result
+        fresh[path] = {"mtime_ns": stats[path].st_mtime_ns, "size": stats[path].st_size, "code": code, "result": result}
+    manifest.put_many(fresh)
+
+    today = date.today()
+    files: List[Dict[str, Any]] = []
+    by_client: Dict[str, Dict[str, int]] = {}
+    for client, path in artifacts:
+        key = str(path)
+        result = results[key]
+        stale_issues, stale_warnings = _freshness(
+            result["kind"], stats[key].st_mtime, result["period_end"], max_age_days, today
+        )
+        entry = {
+            "client": client,
+            "path": key,
+            "kind": result["kind"],
+            "rows": result["rows"],
+            "issues": result["issues"] + stale_issues,
+            "warnings": result["warnings"] + stale_warnings,
+        }
+        files.append(entry)
+        counts = by_client.setdefault(client, {"files": 0, "rows": 0, "issues": 0, "warnings": 0})
+        counts["files"] += 1
+        counts["rows"] += entry["rows"]
+        counts["issues"] += len(entry["issues"])
+        counts["warnings"] += len(entry["warnings"])
+
+    return {
+        "files": files,
+        "clients": by_client,
+        "checked": len(todo),
+        "cached": cached,
+        "workers": max_workers,
+        "issues": sum(len(entry["issues"]) for entry in files),
+        "warnings": sum(len(entry["warnings"]) for entry in files),
+    }
@@ -0,0 +1,21 @@
+"""
+Константы, которые нужны CLI уже при разборе опций (--help).
+
+Модуль без зависимостей: app.cli импортирует его на старте, а
+analysis_changepoints и monitoring (с API-клиентами) — только команды.
+"""
+
+from __future__ import annotations
+
+from typing import Dict, Tuple
+
+# kind -> (источник, измерение API, ключ строки, метрика)
+CHANGEPOINT_KINDS: Dict[str, Tuple[str, str, str, str]] = {
+    "pages": ("metrika", "ym:s:startURL", "landingPage", "visits"),
+    "sources": ("metrika", "ym:s:lastTrafficSource", "source", "visits"),
+    "gsc_queries": ("gsc", "query", "query", "clicks"),
+    "gsc_pages": ("gsc", "page", "page", "clicks"),
+}
+
+DEFAULT_PENALTY_FACTOR = 3.0
+DEFAULT_Z_THRESHOLD = 3.0
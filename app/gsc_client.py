@@ -1,12 +1,17 @@
 from __future__ import annotations
 
 import json
+import time
 from dataclasses import dataclass, field
 from typing import Any, Dict, List, Optional
+from urllib.parse import quote
 
-import requests
-
+from app import tracing
 from app.http_client import get_default_session
+from app.rate_limit import acquire as acquire_rate_limit
+
+# Больше строк за один запрос Search Analytics не отдаёт.
+GSC_MAX_ROW_LIMIT = 25000
 
 
 @dataclass(frozen=True)
@@ -16,11 +21,15 @@ class GSCClient:
     refresh_token: str
     site_url: str
     _session: Any = field(default_factory=get_default_session, init=False, repr=False)
+    # access_token и момент, до которого он годен: не меняем refresh_token на каждый запрос.
+    _access: Dict[str, Any] = field(default_factory=dict, init=False, repr=False, compare=False)
 
     def _token(self) -> str:
         """
-        Exchange refresh_token -> access_token.
+        Exchange refresh_token -> access_token (кэшируется до истечения expires_in).
         """
+        if self._access.get("token") and time.time() < self._access.get("expires_at", 0.0):
+            return str(self._access["token"])
         url = "https://oauth2.googleapis.com/token"
         data = {
             "client_id": self.client_id,
@@ -35,15 +44,20 @@ class GSCClient:
         token = js.get("access_token")
         if not token:
             raise RuntimeError("GSC token error: access_token missing in response")
+        # Запас в минуту, чтобы токен не истёк посреди запроса.
+        self._access.update(token=str(token), expires_at=time.time() + float(js.get("expires_in", 0) or 0) - 60)
         return str(token)
 
     def _post(self, url: str, payload: Dict[str, Any]) -> Dict[str, Any]:
-        token = self._token()
-        headers = {
-            "Authorization": f"Bearer {token}",
-            "Content-Type": "application/json",
-        }
-        r = self._session.post(url, headers=headers, data=json.dumps(payload))
+        with tracing.span("api.gsc", url=url) as span:
+            span.set("rate_limit_wait_s", acquire_rate_limit("gsc"))
+            token = self._token()
+            headers = {
+                "Authorization": f"Bearer {token}",
+                "Content-Type": "application/json",
+            }
+            r = self._session.post(url, headers=headers, data=json.dumps(payload))
+            span.set("status_code", r.status_code)
         if r.status_code >= 400:
             raise RuntimeError(f"GSC API error {r.status_code}: {r.text[:500]} | url={url}")
         return r.json()
@@ -62,7 +76,7 @@ class GSCClient:
         Search Analytics query.
         Docs: sites/{siteUrl}/searchAnalytics/query
         """
-        site = requests.utils.quote(self.site_url, safe="")
+        site = quote(self.site_url, safe="")
         url = f"https://www.googleapis.com/webmasters/v3/sites/{site}/searchAnalytics/query"
         payload: Dict[str, Any] = {
             "startDate": date1,
@@ -76,6 +90,39 @@ class GSCClient:
             payload["dimensionFilterGroups"] = dimension_filter_groups
         return self._post(url, payload)
 
+    def search_analytics_all(
+        self,
+        date1: str,
+        date2: str,
+        dimensions: List[str],
+        page_size: int = GSC_MAX_ROW_LIMIT,
+        max_rows: int = 0,
+        dimension_filter_groups: Optional[List[Dict[str, Any]]] = None,
+        data_state: str = "final",
+    ) -> Dict[str, Any]:
+        """
+        Search Analytics целиком: страницы по startRow, пока ответ не короче страницы
+        (или не набрано max_rows > 0 строк). complete=True — выгружено всё, что есть.
+        """
+        page_size = max(1, min(int(page_size), GSC_MAX_ROW_LIMIT))
+        if max_rows > 0:
+            page_size = min(page_size, int(max_rows))
+        resp = self.search_analytics(
+            date1, date2, dimensions, row_limit=page_size,
+            dimension_filter_groups=dimension_filter_groups, data_state=data_state,
+        )
+        rows = list(resp.get("rows") or [])
+        page = rows
+        while len(page) == page_size and not (max_rows > 0 and len(rows) >= max_rows):
+            page = self.search_analytics(
+                date1, date2, dimensions, row_limit=page_size, start_row=len(rows),
+                dimension_filter_groups=dimension_filter_groups, data_state=data_state,
+            ).get("rows") or []
+            rows.extend(page)
+        resp["rows"] = rows[:max_rows] if max_rows > 0 else rows
+        resp["complete"] = len(page) < page_size
+        return resp
+
 
 def normalize_gsc_rows(resp: Dict[str, Any], dimensions: List[str]) -> List[Dict[str, Any]]:
     """
@@ -9,10 +9,11 @@ from __future__ import annotations
 
 import os
 from dataclasses import dataclass
-from typing import Iterable, Mapping, MutableMapping, Optional, Sequence
+from typing import TYPE_CHECKING, Iterable, Mapping, MutableMapping, Optional, Sequence
 from urllib.parse import urlparse
 
-import requests
+if TYPE_CHECKING:
+    import requests
 
 
 DEFAULT_TIMEOUT = 30
@@ -69,6 +70,9 @@ def get_default_session(config: HttpConfig | None = None) -> requests.Session:
 
     This is useful when proxy blocks these domains (e.g., 403 CONNECT).
     """
+    # requests импортируется при первой сессии, а не при импорте модуля: CLI стартует быстрее.
+    import requests
+
     cfg = config or HttpConfig()
     session = requests.Session()
     # Доверяем окружению: прокси, CA, etc.
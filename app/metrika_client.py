@@ -6,7 +6,12 @@ from datetime import date
 from typing import Any, Dict, List, Optional
 from urllib.parse import urlencode
 
+from app import tracing
 from app.http_client import get_default_session
+from app.rate_limit import acquire as acquire_rate_limit
+
+# Больше строк за один запрос Stats API не отдаёт.
+METRIKA_MAX_LIMIT = 100000
 
 
 TRAFFIC_SOURCE_NAME_TO_ID: Dict[str, str] = {
@@ -33,15 +38,39 @@ class MetrikaClient:
         return {"Authorization": f"OAuth {self.token}"}
 
     def _get(self, url: str, params: Dict[str, Any]) -> Dict[str, Any]:
-        r = self._session.get(url, headers=self._headers(), params=params)
+        with tracing.span("api.metrika", url=url) as span:
+            span.set("rate_limit_wait_s", acquire_rate_limit("metrika"))
+            r = self._session.get(url, headers=self._headers(), params=params)
+            span.set("status_code", r.status_code)
         if r.status_code >= 400:
             raise RuntimeError(
                 f"Metrika API error {r.status_code}: {r.text[:500]} | url={url}?{urlencode(params)}"
             )
         return r.json()
 
+    def _get_all(self, url: str, params: Dict[str, Any], max_rows: int = 0) -> Dict[str, Any]:
+        """
+        Все строки отчёта: страницы по offset (размер — params["limit"]), пока не
+        собраны total_rows (или max_rows > 0) строк. Ответ — первый с объединёнными data.
+        """
+        resp = self._get(url, dict(params, offset="1"))
+        data = list(resp.get("data") or [])
+        wanted = int(resp.get("total_rows") or 0)
+        if max_rows > 0:
+            wanted = min(wanted, max_rows)
+        while len(data) < wanted:
+            page = self._get(url, dict(params, offset=str(len(data) + 1))).get("data") or []
+            if not page:
+                break
+            data.extend(page)
+        resp["data"] = data[:max_rows] if max_rows > 0 else data
+        return resp
+
     def _get_no_params(self, url: str) -> Dict[str, Any]:
-        r = self._session.get(url, headers=self._headers())
+        with tracing.span("api.metrika", url=url) as span:
+            span.set("rate_limit_wait_s", acquire_rate_limit("metrika"))
+            r = self._session.get(url, headers=self._headers())
+            span.set("status_code", r.status_code)
         if r.status_code >= 400:
             raise RuntimeError(f"Metrika API error {r.status_code}: {r.text[:500]} | url={url}")
         return r.json()
@@ -101,6 +130,7 @@ class MetrikaClient:
         """
         Входные страницы (landing pages) по измерению ym:s:startURL
         с фильтром по источнику трафика ym:s:lastTrafficSource.
+        Больше METRIKA_MAX_LIMIT строк — постранично; limit <= 0 — все страницы.
 
         Документация: Stats API /stat/v1/data
         """
@@ -121,9 +151,9 @@ class MetrikaClient:
             "date2": date2,
             "accuracy": "full",
             "sort": "-ym:s:visits",
-            "limit": str(limit),
+            "limit": str(min(limit, METRIKA_MAX_LIMIT) if limit > 0 else METRIKA_MAX_LIMIT),
         }
-        return self._get(url, params)
+        return self._get_all(url, params, max_rows=limit)
 
     def goals_by_source(
         self,
@@ -230,6 +260,58 @@ class MetrikaClient:
         }
         return self._get(url, params)
 
+    def daily_visits(
+        self,
+        date1: str,
+        date2: str,
+        dimension: str,
+        limit: int = 100000,
+    ) -> Dict[str, Any]:
+        """
+        Визиты по дням в разрезе измерения (ym:s:startURL, ym:s:lastTrafficSource, ...).
+        Dimensions: ym:s:date + dimension. Документация: Stats API /stat/v1/data
+
+        limit — размер страницы: страницы догружаются по offset, пока не собраны
+        все total_rows строк. Ответ — первый ответ API с объединёнными data.
+        """
+        url = "https://api-metrika.yandex.net/stat/v1/data"
+        params = {
+            "ids": str(self.counter_id),
+            "metrics": "ym:s:visits",
+            "dimensions": f"ym:s:date,{dimension}",
+            "date1": date1,
+            "date2": date2,
+            "accuracy": "full",
+            "sort": "ym:s:date",
+            "limit": str(limit),
+        }
+        return self._get_all(url, params)
+
+    def daily_snapshot(
+        self,
+        day: str,
+        goal_id: int = 0,
+        limit: int = 100000,
+    ) -> Dict[str, Any]:
+        """
+        Срез одного дня источник x входная страница (для мониторинга).
+        Metrics: ym:s:visits (+ ym:s:goal<goal_id>visits, если goal_id > 0).
+        """
+        metrics = "ym:s:visits"
+        if goal_id > 0:
+            metrics += f",ym:s:goal{goal_id}visits"
+        url = "https://api-metrika.yandex.net/stat/v1/data"
+        params = {
+            "ids": str(self.counter_id),
+            "metrics": metrics,
+            "dimensions": "ym:s:lastTrafficSource,ym:s:startURL",
+            "date1": day,
+            "date2": day,
+            "accuracy": "full",
+            "limit": str(limit),
+        }
+        return self._get(url, params)
+
     def list_goals(self) -> Dict[str, Any]:
         """
         Список целей счётчика (Management API).
@@ -297,6 +379,48 @@ def normalize_pages(resp: Dict[str, Any]) -> List[Dict[str, Any]]:
     return out
 
 
+def normalize_daily_visits(resp: Dict[str, Any], key_field: str) -> List[Dict[str, Any]]:
+    """Строки daily_visits: {date, <key_field>, visits}."""
+    out: List[Dict[str, Any]] = []
+    data = resp.get("data") or []
+    for row in data:
+        dims = row.get("dimensions") or []
+        day = ""
+        key = ""
+        if len(dims) > 0 and isinstance(dims[0], dict):
+            day = str(dims[0].get("name", "")).strip()
+        if len(dims) > 1 and isinstance(dims[1], dict):
+            key = str(dims[1].get("name", "")).strip()
+        metrics = row.get("metrics") or []
+        visits = float(metrics[0]) if len(metrics) > 0 else 0.0
+        out.append({"date": day, key_field: key or "(unknown)", "visits": visits})
+    return out
+
+
+def normalize_daily_snapshot(resp: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Строки daily_snapshot: {source, landingPage, visits, goal_visits}."""
+    out: List[Dict[str, Any]] = []
+    data = resp.get("data") or []
+    for row in data:
+        dims = row.get("dimensions") or []
+        source = ""
+        url = ""
+        if len(dims) > 0 and isinstance(dims[0], dict):
+            source = str(dims[0].get("name", "")).strip()
+        if len(dims) > 1 and isinstance(dims[1], dict):
+            url = str(dims[1].get("name", "")).strip()
+        metrics = row.get("metrics") or []
+        out.append(
+            {
+                "source": source or "(unknown)",
+                "landingPage": url or "(unknown)",
+                "visits": float(metrics[0]) if len(metrics) > 0 else 0.0,
+                "goal_visits": float(metrics[1]) if len(metrics) > 1 else 0.0,
+            }
+        )
+    return out
+
+
 def normalize_goals_by_source(resp: Dict[str, Any]) -> List[Dict[str, Any]]:
     """
     Нормализация ответа goals_by_source():
@@ -417,3 +541,11 @@ def normalize_goals_list(resp: Dict[str, Any]) -> List[Dict[str, Any]]:
         )
     # Стабильная сортировка по id
     return sorted(out, key=lambda x: x["id"])
+
+
+def is_complete_response(resp: Any) -> bool:
+    """Ответ Stats API содержит все total_rows строк."""
+    if not isinstance(resp, dict):
+        return False
+    total_rows = resp.get("total_rows")
+    return isinstance(total_rows, (int, float)) and len(resp.get("data") or []) >= total_rows
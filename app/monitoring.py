@@ -0,0 +1,236 @@
+from __future__ import annotations
+
+import json
+import math
+from dataclasses import asdict, dataclass
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.defaults import DEFAULT_Z_THRESHOLD
+from app.gsc_client import GSCClient, normalize_gsc_rows
+from app.metrika_client import MetrikaClient, normalize_daily_snapshot
+
+# Вес нового дня в EWMA (~ окно в 20 дней).
+DEFAULT_ALPHA = 0.1
+# Сколько дней накопить по ключу, прежде чем по нему можно алертить.
+DEFAULT_MIN_HISTORY = 7
+# Минимальное абсолютное отклонение: не алертим на 2 -> 0 визитов.
+DEFAULT_MIN_ABS = 20.0
+# Ограничение размера state по длинным хвостам (страницы, GSC-страницы).
+DEFAULT_MAX_KEYS = 500
+MAX_CATCHUP_DAYS = 7
+# GSC отдаёт final-данные с задержкой ~3 дня от сегодня (2 дня от вчерашнего target_day):
+# свежие data_state="all" занижены, а догруженный день не перечитывается.
+GSC_LAG_DAYS = 2
+GSC_STREAMS = {"gsc_clicks"}
+MAX_ALERTS_IN_STATE = 200
+
+TOTAL_KEY = "__total__"
+
+
+@dataclass(frozen=True)
+class Alert:
+    client: str
+    stream: str
+    key: str
+    day: str
+    value: float
+    expected: float
+    z: float
+    direction: str  # drop | spike
+
+
+def state_path(client: str) -> Path:
+    return Path("data_cache") / client / "monitor_state.json"
+
+
+def load_state(client: str) -> Dict[str, Any]:
+    path = state_path(client)
+    if path.exists():
+        try:
+            return json.loads(path.read_text(encoding="utf-8"))
+        except Exception:
+            pass
+    return {"last_ingested": "", "last_ingested_gsc": "", "stats": {}, "alerts": []}
+
+
+def save_state(client: str, state: Dict[str, Any]) -> None:
+    path = state_path(client)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(state, ensure_ascii=False), encoding="utf-8")
+
+
+def _add(bucket: Dict[str, float], key: str, value: float) -> None:
+    bucket[key] = bucket.get(key, 0.0) + value
+
+
+def aggregate_metrika_snapshot(rows: List[Dict[str, Any]], with_goals: bool) -> Dict[str, Dict[str, float]]:
+    """Один срез источник x страница -> потоки sources / pages / goals (+ итог в каждом)."""
+    streams: Dict[str, Dict[str, float]] = {"sources": {}, "pages": {}}
+    if with_goals:
+        streams["goals"] = {}
+    for row in rows:
+        visits = float(row.get("visits", 0.0) or 0.0)
+        _add(streams["sources"], str(row.get("source", "")), visits)
+        _add(streams["sources"], TOTAL_KEY, visits)
+        _add(streams["pages"], str(row.get("landingPage", "")), visits)
+        if with_goals:
+            goal_visits = float(row.get("goal_visits", 0.0) or 0.0)
+            _add(streams["goals"], str(row.get("source", "")), goal_visits)
+            _add(streams["goals"], TOTAL_KEY, goal_visits)
+    return streams
+
+
+def aggregate_gsc_snapshot(rows: List[Dict[str, Any]]) -> Dict[str, Dict[str, float]]:
+    clicks: Dict[str, float] = {}
+    for row in rows:
+        value = float(row.get("clicks", 0.0) or 0.0)
+        _add(clicks, str(row.get("page", "")), value)
+        _add(clicks, TOTAL_KEY, value)
+    return {"gsc_clicks": clicks}
+
+
+def update_stream(
+    stats: Dict[str, Dict[str, float]],
+    values: Dict[str, float],
+    *,
+    alpha: float = DEFAULT_ALPHA,
+    z_threshold: float = DEFAULT_Z_THRESHOLD,
+    min_history: int = DEFAULT_MIN_HISTORY,
+    min_abs: float = DEFAULT_MIN_ABS,
+    max_keys: int = DEFAULT_MAX_KEYS,
+) -> List[Tuple[str, float, float, float]]:
+    """
+    Инкрементально обновляет EWMA mean/variance по ключам одним днём данных.
+
+    Ключи из state, которых нет в values, получают 0 (пропавшая страница — тоже сигнал).
+    Returns:
+        [(key, value, expected, z)] для ключей, где |z| >= z_threshold (до обновления).
+    """
+    anomalies: List[Tuple[str, float, float, float]] = []
+    for key in set(stats) | set(values):
+        x = float(values.get(key, 0.0))
+        current = stats.get(key)
+        if current is None:
+            stats[key] = {"mean": x, "var": 0.0, "n": 1}
+            continue
+        mean = float(current["mean"])
+        var = float(current["var"])
+        n = int(current["n"])
+        # Пол дисперсии — пуассоновский шум уровня, иначе ровные ряды алертят на любое движение.
+        sd = math.sqrt(max(var, mean, 1.0))
+        z = (x - mean) / sd
+        if n >= min_history and abs(z) >= z_threshold and abs(x - mean) >= min_abs:
+            anomalies.append((key, x, mean, z))
+        diff = x - mean
+        increment = alpha * diff
+        current["mean"] = mean + increment
+        current["var"] = (1.0 - alpha) * (var + diff * increment)
+        current["n"] = n + 1
+
+    if len(stats) > max_keys:
+        keep = sorted(stats, key=lambda k: (k != TOTAL_KEY, -float(stats[k]["mean"])))[:max_keys]
+        for key in set(stats) - set(keep):
+            del stats[key]
+    return anomalies
+
+
+def days_to_ingest(last_ingested: str, target_day: str) -> List[str]:
+    """Дни после last_ingested до target_day включительно (не больше MAX_CATCHUP_DAYS)."""
+    target = datetime.strptime(target_day, "%Y-%m-%d").date()
+    if last_ingested:
+        start = datetime.strptime(last_ingested, "%Y-%m-%d").date() + timedelta(days=1)
+    else:
+        start = target
+    start = max(start, target - timedelta(days=MAX_CATCHUP_DAYS - 1))
+    return [(start + timedelta(days=i)).isoformat() for i in range((target - start).days + 1)]
+
+
+def gsc_day(day: str) -> str:
+    """Последний день, за который GSC уже отдаёт final-данные, при target_day = day."""
+    return (datetime.strptime(day, "%Y-%m-%d").date() - timedelta(days=GSC_LAG_DAYS)).isoformat()
+
+
+def stream_day(stream: str, day: str) -> str:
+    """День, до которого догружается поток при target_day = day (у GSC — с задержкой)."""
+    return gsc_day(day) if stream in GSC_STREAMS else day
+
+
+def watch_client(
+    client: str,
+    day: str,
+    *,
+    metrika: Optional[MetrikaClient] = None,
+    gsc: Optional[GSCClient] = None,
+    goal_id: int = 0,
+    z_threshold: float = DEFAULT_Z_THRESHOLD,
+) -> List[Alert]:
+    """
+    Догружает недостающие дни (по одному срезу каждого источника на день),
+    обновляет статистики и возвращает алерты. Историю не пересчитывает.
+
+    Watermark у источников свой: Метрика — до day (last_ingested), GSC —
+    final-данные до gsc_day(day) (last_ingested_gsc).
+    """
+    state = load_state(client)
+    stats: Dict[str, Dict[str, Dict[str, float]]] = state.setdefault("stats", {})
+    alerts: List[Alert] = []
+
+    by_day: Dict[str, Dict[str, Dict[str, float]]] = {}
+    if metrika is not None:
+        for current_day in days_to_ingest(state.get("last_ingested", ""), day):
+            rows = normalize_daily_snapshot(metrika.daily_snapshot(current_day, goal_id=goal_id))
+            by_day.setdefault(current_day, {}).update(aggregate_metrika_snapshot(rows, with_goals=goal_id > 0))
+            state["last_ingested"] = current_day
+    if gsc is not None:
+        for current_day in days_to_ingest(state.get("last_ingested_gsc", ""), gsc_day(day)):
+            raw = gsc.search_analytics_all(date1=current_day, date2=current_day, dimensions=["page"])
+            by_day.setdefault(current_day, {}).update(aggregate_gsc_snapshot(normalize_gsc_rows(raw, ["page"])))
+            state["last_ingested_gsc"] = current_day
+
+    for current_day, streams in sorted(by_day.items()):
+        for stream, values in streams.items():
+            for key, value, expected, z in update_stream(stats.setdefault(stream, {}), values, z_threshold=z_threshold):
+                alerts.append(
+                    Alert(
+                        client=client,
+                        stream=stream,
+                        key=key,
+                        day=current_day,
+                        value=value,
+                        expected=expected,
+                        z=z,
+                        direction="drop" if z < 0 else "spike",
+                    )
+                )
+
+    state["alerts"] = (state.get("alerts") or []) + [asdict(alert) for alert in alerts]
+    state["alerts"] = state["alerts"][-MAX_ALERTS_IN_STATE:]
+    state["updated_at"] = datetime.now(timezone.utc).isoformat().replace("+00:00", "Z")
+    save_state(client, state)
+    return sorted(alerts, key=lambda a: -abs(a.z))
+
+
+def investigation_query(alerts: List[Alert]) -> str:
+    """Текстовый запрос для investigate по сработавшим алертам."""
+    streams = {alert.stream for alert in alerts}
+    down = any(alert.direction == "drop" for alert in alerts)
+    if "goals" in streams:
+        subject = "упали заявки" if down else "выросли заявки"
+    elif "gsc_clicks" in streams:
+        subject = "упала органика" if down else "выросла органика"
+    else:
+        subject = "упал трафик" if down else "вырос трафик"
+    return f"Мониторинг: разберись, почему {subject}"
+
+
+def investigation_periods(day: str) -> Tuple[str, str, str, str]:
+    """P2 = день аномалии, P1 = тот же день недели неделей раньше."""
+    d = datetime.strptime(day, "%Y-%m-%d").date()
+    p1 = (d - timedelta(days=7)).isoformat()
+    return p1, p1, d.isoformat(), d.isoformat()
+
+
+def yesterday(today: Optional[date] = None) -> str:
+    return ((today or date.today()) - timedelta(days=1)).isoformat()
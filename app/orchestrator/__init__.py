@@ -1,3 +1,3 @@
-from app.orchestrator.agent_loop import investigate
+from app.orchestrator.agent_loop import explain_investigation, investigate
 
-__all__ = ["investigate"]
+__all__ = ["explain_investigation", "investigate"]
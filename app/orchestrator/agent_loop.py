@@ -1,42 +1,73 @@
 from __future__ import annotations
 
-from dataclasses import asdict
-from typing import Any, Dict, Optional
+import os
+import shutil
+from dataclasses import asdict, replace
+from pathlib import Path
+from typing import Any, Dict, List, Optional
 
+from app import build_graph, tracing
+from app.artifact_store import ArtifactStore
 from app.config import load_client_config
-from app.orchestrator.analyzer import analyze_results
+from app.orchestrator.analyzer import AnalysisCache, analyze_results
+from app.orchestrator.checkpoint import (
+    InvestigationInterrupted,
+    checkpoint_path,
+    context_from_dict,
+    context_to_dict,
+    executed_from_dicts,
+    executed_to_dict,
+    load_checkpoint,
+    planned_from_dicts,
+    save_checkpoint,
+)
 from app.orchestrator.availability import inspect_availability
+from app.orchestrator.cost_model import CostModel, estimate_to_dict
 from app.orchestrator.date_resolution import resolve_periods
 from app.orchestrator.executor import execute_plan
 from app.orchestrator.goal_resolver import resolve_primary_goal
 from app.orchestrator.intake import parse_intent
-from app.orchestrator.models import GoalSelection, InvestigationReport
+from app.orchestrator.models import (
+    ExecutedStep,
+    GoalSelection,
+    InvestigationAvailability,
+    InvestigationIntent,
+    InvestigationPeriod,
+    InvestigationReport,
+    PlannedStep,
+)
 from app.orchestrator.planner import build_followup_plan, build_initial_plan
-from app.orchestrator.report_generator import write_report_files
+from app.orchestrator.prefetch import Prefetcher, predict_followup_steps
+from app.orchestrator.report_generator import _allocate_report_dir, write_report_files
+from app.orchestrator.snapshots import execution_records
 
 
-def investigate(
-    *,
+def _prepare(
     client: str,
     query: str,
-    refresh: bool = False,
-    p1_start: Optional[str] = None,
-    p1_end: Optional[str] = None,
-    p2_start: Optional[str] = None,
-    p2_end: Optional[str] = None,
-) -> tuple[InvestigationReport, Dict[str, Any], list[Any]]:
-    cfg, _ = load_client_config(client)
-    intent = parse_intent(query)
-    period = resolve_periods(
-        query=query,
-        p1_start=p1_start,
-        p1_end=p1_end,
-        p2_start=p2_start,
-        p2_end=p2_end,
-    )
-    availability = inspect_availability(cfg)
+    refresh: bool,
+    p1_start: Optional[str],
+    p1_end: Optional[str],
+    p2_start: Optional[str],
+    p2_end: Optional[str],
+) -> tuple[InvestigationIntent, InvestigationPeriod, InvestigationAvailability, GoalSelection]:
+    with tracing.span("config.load"):
+        cfg, _ = load_client_config(client)
+    with tracing.span("intake.parse_intent"):
+        intent = parse_intent(query)
+    with tracing.span("date_resolution"):
+        period = resolve_periods(
+            query=query,
+            p1_start=p1_start,
+            p1_end=p1_end,
+            p2_start=p2_start,
+            p2_end=p2_end,
+        )
+    with tracing.span("availability"):
+        availability = inspect_availability(cfg)
     if intent.wants_conversions:
-        goal_selection = resolve_primary_goal(client=client, cfg=cfg, query=query, refresh=refresh)
+        with tracing.span("goal_resolver"):
+            goal_selection = resolve_primary_goal(client=client, cfg=cfg, query=query, refresh=refresh)
     else:
         goal_selection = GoalSelection(
             goal_id=None,
@@ -45,84 +76,290 @@ def investigate(
             reason="Запрос не про конверсии, подбор goal_id пропущен.",
             candidates=[],
         )
-    initial_plan = build_initial_plan(
+    return intent, period, availability, goal_selection
+
+
+def explain_investigation(
+    *,
+    client: str,
+    query: str,
+    refresh: bool = False,
+    p1_start: Optional[str] = None,
+    p1_end: Optional[str] = None,
+    p2_start: Optional[str] = None,
+    p2_end: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    План первого раунда и вероятные следующие шаги с оценками стоимости.
+
+    Шаги не выполняются; к API может обратиться только подбор goal_id, если список целей не в кэше.
+    """
+    intent, period, availability, goal_selection = _prepare(client, query, refresh, p1_start, p1_end, p2_start, p2_end)
+    cost_model = CostModel(client, refresh=refresh)
+    plan = build_initial_plan(
         client=client,
         intent=intent,
         period=period,
         availability=availability,
         goal_selection=goal_selection,
         refresh=refresh,
+        cost_model=cost_model,
     )
-    all_plans = []
-    all_planned_steps = []
-    executed_steps = []
-    analysis: Dict[str, Any] | None = None
-    loop_rounds = []
-    stop_reason = ""
-    next_plan = initial_plan
-    max_rounds = 4
+    followups = predict_followup_steps(
+        client=client,
+        intent=intent,
+        period=period,
+        availability=availability,
+        goal_selection=goal_selection,
+        refresh=refresh,
+        planned_kinds={step.kind for step in plan},
+    )
+    return {
+        "client": client,
+        "query": query,
+        "period": asdict(period),
+        "intent": asdict(intent),
+        "availability": asdict(availability),
+        "goal_selection": asdict(goal_selection),
+        "plan": [
+            {**estimate_to_dict(cost_model.estimate_of(step.id)), "title": step.title, "depends_on": step.depends_on}
+            for step in plan
+        ],
+        "likely_followups": [{**estimate_to_dict(cost_model.estimate(step)), "title": step.title} for step in followups],
+        "cost": cost_model.summary(),
+    }
 
-    for round_number in range(1, max_rounds + 1):
-        if not next_plan:
-            stop_reason = "Новых полезных шагов больше нет."
-            break
 
-        all_plans.append({"round": round_number, "steps": [asdict(step) for step in next_plan]})
-        all_planned_steps.extend(next_plan)
-        round_executions = execute_plan(next_plan)
-        executed_steps.extend(round_executions)
+def investigate(
+    *,
+    client: str,
+    query: str,
+    refresh: bool = False,
+    p1_start: Optional[str] = None,
+    p1_end: Optional[str] = None,
+    p2_start: Optional[str] = None,
+    p2_end: Optional[str] = None,
+    prefetch: bool = True,
+    resume: Optional[str] = None,
+) -> tuple[InvestigationReport, Dict[str, Any], list[Any]]:
+    """
+    Итеративное расследование с checkpoint в reports/<client>/<run_id>/checkpoint.json.
 
-        successful_steps = [step for step in executed_steps if step.success and step.artifacts]
-        if not successful_steps:
-            stop_reason = "Не удалось получить usable artifacts."
-            break
+    resume: run_id прерванного расследования. Запрос, период, цель, планы и
+    успешные шаги берутся из checkpoint; выполняются только шаги, которые
+    не успели завершиться или упали, затем цикл идёт дальше как обычно.
 
-        analysis = analyze_results(
+    Весь прогон трассируется: span-ы попадают в evidence.json (trace) и в
+    trace.json формата Chrome trace-event рядом с отчётом; если задан
+    OTEL_EXPORTER_OTLP_ENDPOINT, trace отправляется и в OTLP-коллектор.
+    """
+    with tracing.start_trace("investigate", client=client, resume=resume or "") as tracer:
+        report, analysis, executed_steps = _investigate(
             client=client,
             query=query,
-            period=period,
-            intent=intent,
-            availability=availability,
-            goal_selection=goal_selection,
-            executed_steps=executed_steps,
+            refresh=refresh,
+            p1_start=p1_start,
+            p1_end=p1_end,
+            p2_start=p2_start,
+            p2_end=p2_end,
+            prefetch=prefetch,
+            resume=resume,
         )
-        loop_rounds.append(
+    if report.reused:
+        # Папка прошлого расследования: его trace не переписываем.
+        return report, analysis, executed_steps
+    trace_path = tracing.write_chrome_trace(tracer, Path(report.report_dir) / "trace.json")
+    otlp_endpoint = os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT", "").strip()
+    if otlp_endpoint:
+        error = tracing.export_otlp(tracer, otlp_endpoint)
+        if error:
+            analysis.setdefault("availability_notes", []).append(error)
+    return replace(report, trace_path=str(trace_path)), analysis, executed_steps
+
+
+def _investigate(
+    *,
+    client: str,
+    query: str,
+    refresh: bool = False,
+    p1_start: Optional[str] = None,
+    p1_end: Optional[str] = None,
+    p2_start: Optional[str] = None,
+    p2_end: Optional[str] = None,
+    prefetch: bool = True,
+    resume: Optional[str] = None,
+) -> tuple[InvestigationReport, Dict[str, Any], list[Any]]:
+    if resume:
+        state = load_checkpoint(client, resume)
+        run_id = resume
+        query = state["query"]
+        refresh = state["refresh"]
+        intent, period, availability, goal_selection = context_from_dict(state)
+        cost_model = CostModel(client, refresh=refresh)
+        cost_model.restore(state["cost"])
+        all_plans = state["plans_by_round"]
+        all_planned_steps = planned_from_dicts(state["planned_steps"])
+        executed_steps = executed_from_dicts(state["executed_steps"])
+        loop_rounds = state["loop_rounds"]
+        start_round = state["round"]
+        next_plan = planned_from_dicts(state["current_plan"])
+        resumed_executions = {step.id: step for step in executed_from_dicts(state["round_executions"]) if step.success}
+    else:
+        intent, period, availability, goal_selection = _prepare(client, query, refresh, p1_start, p1_end, p2_start, p2_end)
+        cost_model = CostModel(client, refresh=refresh)
+        with tracing.span("planner.initial"):
+            next_plan = build_initial_plan(
+                client=client,
+                intent=intent,
+                period=period,
+                availability=availability,
+                goal_selection=goal_selection,
+                refresh=refresh,
+                cost_model=cost_model,
+            )
+        run_id, _ = _allocate_report_dir(client)
+        all_plans = []
+        all_planned_steps = []
+        executed_steps = []
+        loop_rounds = []
+        start_round = 1
+        resumed_executions = {}
+    analysis: Dict[str, Any] | None = None
+    # Разобранные workbook-и и выводы правил переживают раунды: каждый раунд досчитывает только новое.
+    analysis_cache = AnalysisCache()
+    stop_reason = ""
+    max_rounds = 4
+
+    def checkpoint(status: str, round_number: int, plan: List[PlannedStep], round_executions: List[ExecutedStep]) -> None:
+        # Раунд plan ещё не зафиксирован: его шаги хранятся отдельно и при resume выполняются заново (кроме успешных).
+        current_ids = {step.id for step in plan}
+        save_checkpoint(
+            client,
+            run_id,
             {
+                "status": status,
+                "run_id": run_id,
+                "client": client,
+                "query": query,
+                "refresh": refresh,
+                **context_to_dict(intent, period, availability, goal_selection),
                 "round": round_number,
-                "planned_steps": [asdict(step) for step in next_plan],
-                "executed_steps": [
-                    {
-                        "id": step.id,
-                        "kind": step.kind,
-                        "success": step.success,
-                        "artifacts": step.artifacts,
-                    }
-                    for step in round_executions
-                ],
-                "summary": analysis["summary"],
-                "root_cause_status": analysis.get("root_cause_status"),
-                "recommended_next_steps": analysis.get("recommended_next_steps", []),
-            }
+                "current_plan": [asdict(step) for step in plan],
+                "round_executions": [executed_to_dict(step) for step in round_executions],
+                "plans_by_round": [item for item in all_plans if item["round"] != round_number],
+                "planned_steps": [asdict(step) for step in all_planned_steps if step.id not in current_ids],
+                "executed_steps": [executed_to_dict(step) for step in executed_steps if step.id not in current_ids],
+                "loop_rounds": [item for item in loop_rounds if item["round"] != round_number],
+                "cost": cost_model.summary(),
+            },
         )
 
-        next_plan = build_followup_plan(
+    # Пока идёт раунд 1, в фоне греем шаги, которые почти наверняка понадобятся дальше.
+    prefetcher = Prefetcher() if prefetch else None
+    if prefetcher is not None:
+        predicted = predict_followup_steps(
             client=client,
+            intent=intent,
             period=period,
             availability=availability,
             goal_selection=goal_selection,
             refresh=refresh,
-            analysis=analysis,
-            executed_steps=executed_steps,
-            round_number=round_number + 1,
+            planned_kinds={step.kind for step in all_planned_steps + next_plan},
         )
-        if analysis.get("root_cause_status") == "identified" and not next_plan:
-            stop_reason = "Найдена достаточно уверенная причина, дополнительных шагов не требуется."
-            break
-        if not next_plan:
-            stop_reason = "После очередной проверки новые полезные шаги не появились."
-            break
-    else:
-        stop_reason = f"Достигнут лимит в {max_rounds} раунда расследования."
+        # Спекулятивные шаги тоже тратят квоты: греем только то, что влезает в бюджет.
+        prefetcher.submit([step for step in predicted if cost_model.affordable(step)])
+    prefetch_stats: Dict[str, int] = {}
+    last_round: tuple[int, List[PlannedStep], List[ExecutedStep]] | None = None
+
+    try:
+        for round_number in range(start_round, max_rounds + 1):
+            if not next_plan:
+                stop_reason = "Новых полезных шагов больше нет."
+                break
+
+            finished: Dict[str, ExecutedStep] = dict(resumed_executions) if round_number == start_round else {}
+            checkpoint("running", round_number, next_plan, list(finished.values()))
+
+            def record(step: ExecutedStep) -> None:
+                finished[step.id] = step
+                checkpoint("running", round_number, next_plan, list(finished.values()))
+
+            remaining = [step for step in next_plan if step.id not in finished]
+            cost_model.observe(execute_plan(remaining, prefetcher=prefetcher, on_step=record))
+            round_executions = [finished[step.id] for step in next_plan]
+
+            all_plans.append({"round": round_number, "steps": [asdict(step) for step in next_plan]})
+            all_planned_steps.extend(next_plan)
+            executed_steps.extend(round_executions)
+            last_round = (round_number, next_plan, round_executions)
+
+            successful_steps = [step for step in executed_steps if step.success and step.artifacts]
+            if not successful_steps:
+                stop_reason = "Не удалось получить usable artifacts."
+                break
+
+            with tracing.span("analyzer", round=round_number, steps=len(executed_steps)) as span:
+                analysis = analyze_results(
+                    client=client,
+                    query=query,
+                    period=period,
+                    intent=intent,
+                    availability=availability,
+                    goal_selection=goal_selection,
+                    executed_steps=executed_steps,
+                    cache=analysis_cache,
+                )
+                span.set("rules_evaluated", analysis_cache.stats["rules_evaluated"])
+            loop_rounds.append(
+                {
+                    "round": round_number,
+                    "planned_steps": [asdict(step) for step in next_plan],
+                    "executed_steps": [
+                        {
+                            "id": step.id,
+                            "kind": step.kind,
+                            "success": step.success,
+                            "artifacts": step.artifacts,
+                        }
+                        for step in round_executions
+                    ],
+                    "estimates": [
+                        estimate_to_dict(estimate)
+                        for estimate in (cost_model.estimate_of(step.id) for step in next_plan)
+                        if estimate is not None
+                    ],
+                    "summary": analysis["summary"],
+                    "root_cause_status": analysis.get("root_cause_status"),
+                    "recommended_next_steps": analysis.get("recommended_next_steps", []),
+                }
+            )
+
+            with tracing.span("planner.followup", round=round_number + 1):
+                next_plan = build_followup_plan(
+                    client=client,
+                    period=period,
+                    availability=availability,
+                    goal_selection=goal_selection,
+                    refresh=refresh,
+                    analysis=analysis,
+                    executed_steps=executed_steps,
+                    round_number=round_number + 1,
+                    cost_model=cost_model,
+                )
+            if analysis.get("root_cause_status") == "identified" and not next_plan:
+                stop_reason = "Найдена достаточно уверенная причина, дополнительных шагов не требуется."
+                break
+            if not next_plan:
+                stop_reason = "После очередной проверки новые полезные шаги не появились."
+                break
+        else:
+            stop_reason = f"Достигнут лимит в {max_rounds} раунда расследования."
+    except Exception as exc:
+        raise InvestigationInterrupted(f"{exc} (продолжить: --resume {run_id})", run_id) from exc
+    finally:
+        if prefetcher is not None:
+            prefetch_stats = prefetcher.close()
+        cost_model.save()
 
     successful_steps = [step for step in executed_steps if step.success and step.artifacts]
     if not successful_steps:
@@ -159,8 +396,6 @@ def investigate(
                     "exit_code": step.exit_code,
                     "artifacts": step.artifacts,
                     "source": step.source,
-                    "stdout": step.stdout,
-                    "stderr": step.stderr,
                 }
                 for step in executed_steps
             ],
@@ -172,8 +407,30 @@ def investigate(
             "rounds": loop_rounds,
             "stop_reason": stop_reason or "Расследование завершено.",
             "max_rounds": max_rounds,
+            "resumed_from_round": start_round if resume else None,
+            "prefetch": prefetch_stats,
+            "cost": cost_model.summary(),
+            "analyzer_cache": dict(analysis_cache.stats),
         }
 
+    # Узел отчёта в build_graph: те же входы шагов и тот же код — прошлый отчёт остаётся в силе.
+    complete = last_round is None or all(step.success for step in last_round[2])
+    report_key = build_graph.node_key(query, asdict(period), asdict(goal_selection))
+    fingerprint = build_graph.inputs_fingerprint(
+        client,
+        (
+            {"kind": step.kind, "params": step.params, "inputs": step.inputs, "artifacts": step.artifacts}
+            for step in executed_steps
+            if step.success
+        ),
+    )
+    if complete and successful_steps:
+        previous = _reusable_report(client, report_key, fingerprint)
+        if previous is not None:
+            shutil.rmtree(checkpoint_path(client, run_id).parent, ignore_errors=True)
+            return previous, analysis, executed_steps
+
+    artifact_store = ArtifactStore()
     evidence = {
         "client": client,
         "query": query,
@@ -184,15 +441,40 @@ def investigate(
         "goal_selection": asdict(goal_selection),
         "plan": [asdict(step) for step in all_planned_steps],
         "plans_by_round": all_plans,
-        "executions": [
-            {
-                **asdict(step),
-                "stdout": step.stdout,
-                "stderr": step.stderr,
-            }
-            for step in executed_steps
-        ],
+        # Вывод шагов, workbook-и и их входы из data_cache/ — ссылками (sha256) в хранилище.
+        "artifact_store": str(artifact_store.root),
+        "executions": execution_records(executed_steps, artifact_store),
         "analysis": analysis,
     }
-    report = write_report_files(client=client, analysis=analysis, evidence=evidence)
+    tracer = tracing.current_tracer()
+    if tracer is not None:
+        # Отрисовка отчёта ещё не закончилась: полный trace — в trace.json.
+        evidence["trace"] = tracer.export()
+    with tracing.span("report.write"):
+        report = write_report_files(client=client, analysis=analysis, evidence=evidence, run_id=run_id)
+
+    # Упавшие шаги последнего раунда оставляем в checkpoint открытыми: --resume повторит только их.
+    if not complete:
+        checkpoint("incomplete", *last_round)
+    else:
+        checkpoint("completed", len(all_plans), [], [])
+        if successful_steps:
+            build_graph.report_manifest(client).put(
+                report_key,
+                {
+                    "fingerprint": fingerprint,
+                    "code": build_graph.code_version("report"),
+                    "report": asdict(replace(report, trace_path=str(Path(report.report_dir) / "trace.json"))),
+                },
+            )
     return report, analysis, executed_steps
+
+
+def _reusable_report(client: str, report_key: str, fingerprint: str) -> Optional[InvestigationReport]:
+    entry = build_graph.report_manifest(client).get(report_key)
+    if entry is None or entry.get("fingerprint") != fingerprint or entry.get("code") != build_graph.code_version("report"):
+        return None
+    report = InvestigationReport(**entry["report"])
+    if not Path(report.markdown_path).exists() or not Path(report.evidence_json_path).exists():
+        return None
+    return replace(report, reused=True)
@@ -1,14 +1,19 @@
 from __future__ import annotations
 
-import json
-from pathlib import Path
-from typing import Any, Dict, List
+import os
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
+from app.analysis_significance import signal_rows
+from app.cache_io import read_json
 from app.orchestrator.models import ExecutedStep, GoalSelection, InvestigationAvailability, InvestigationIntent, InvestigationPeriod
 
+# Отклонение от сезонной baseline (в %), в пределах которого изменение считаем сезонным.
+SEASONAL_TOLERANCE_PCT = 5.0
+
 
 def _load_json(path: str) -> Any:
-    return json.loads(Path(path).read_text(encoding="utf-8"))
+    return read_json(path)
 
 
 def _fmt_number(value: float) -> str:
@@ -25,15 +30,6 @@ def _direction_class(value: float) -> str:
     return "neutral"
 
 
-def _artifact_map(executed_steps: List[ExecutedStep]) -> Dict[str, Any]:
-    artifacts: Dict[str, Any] = {}
-    for step in executed_steps:
-        for artifact in step.artifacts:
-            if artifact.endswith(".json"):
-                artifacts[artifact] = _load_json(artifact)
-    return artifacts
-
-
 def _first_artifact(executed_steps: List[ExecutedStep], kind: str) -> str | None:
     for step in executed_steps:
         if step.kind == kind and step.artifacts:
@@ -41,246 +37,409 @@ def _first_artifact(executed_steps: List[ExecutedStep], kind: str) -> str | None
     return None
 
 
-def _recommend(kind: str, reason: str, priority: str = "medium") -> Dict[str, str]:
-    return {"kind": kind, "reason": reason, "priority": priority}
-
-
-def analyze_results(
-    *,
-    client: str,
-    query: str,
-    period: InvestigationPeriod,
-    intent: InvestigationIntent,
-    availability: InvestigationAvailability,
-    goal_selection: GoalSelection,
-    executed_steps: List[ExecutedStep],
-) -> Dict[str, Any]:
-    artifact_payloads = _artifact_map(executed_steps)
-    facts: List[Dict[str, Any]] = []
-    drivers: List[Dict[str, Any]] = []
-    hypotheses: List[Dict[str, Any]] = []
-    recommended_next_steps: List[Dict[str, str]] = []
-    availability_notes = list(availability.notes)
-    executed_kinds = {step.kind for step in executed_steps if step.success}
-
-    sources_artifact = _first_artifact(executed_steps, "analyze_sources")
-    pages_artifact = _first_artifact(executed_steps, "analyze_pages")
-    search_pages_artifact = _first_artifact(executed_steps, "analyze_pages_by_source")
-    goals_source_artifact = _first_artifact(executed_steps, "analyze_goals_by_source")
-    goals_page_artifact = _first_artifact(executed_steps, "analyze_goals_by_page")
-    gsc_queries_artifact = _first_artifact(executed_steps, "analyze_gsc_queries")
-    gsc_pages_artifact = _first_artifact(executed_steps, "analyze_gsc_pages")
-    ymw_queries_artifact = _first_artifact(executed_steps, "analyze_ym_webmaster_queries")
-    ymw_indexing_artifact = None
+def _indexing_artifact(executed_steps: List[ExecutedStep]) -> str | None:
+    found = None
     for step in executed_steps:
         if step.kind == "ym_webmaster_indexing":
             for artifact in step.artifacts:
                 if artifact.endswith("_norm_EXCLUDED_100_0.json"):
-                    ymw_indexing_artifact = artifact
+                    found = artifact
                     break
+    return found
+
+
+def _mtime(path: str) -> Optional[int]:
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+def _recommend(kind: str, reason: str, priority: str = "medium") -> Dict[str, str]:
+    return {"kind": kind, "reason": reason, "priority": priority}
+
 
-    traffic_delta = None
-    search_source_row = None
-    search_source_down = False
-    goal_drop = False
-    goal_cr_drop = False
-    if sources_artifact:
-        workbook = artifact_payloads[sources_artifact]
-        totals = workbook["totals"]
-        traffic_delta = float(totals["total_delta_abs"])
-        facts.append(
+@dataclass
+class RuleOutput:
+    """Вклад одного правила: факты, драйверы, гипотезы и сигналы для общих выводов."""
+
+    facts: List[Dict[str, Any]] = field(default_factory=list)
+    drivers: List[Dict[str, Any]] = field(default_factory=list)
+    hypotheses: List[Dict[str, Any]] = field(default_factory=list)
+    signals: Dict[str, Any] = field(default_factory=dict)
+
+
+def _rule_sources(path: str, workbook: Any) -> RuleOutput:
+    out = RuleOutput()
+    totals = workbook["totals"]
+    traffic_delta = float(totals["total_delta_abs"])
+    out.signals["traffic_delta"] = traffic_delta
+    out.facts.append(
+        {
+            "title": "Общий трафик",
+            "value": f"{_fmt_number(float(totals['total_visits_p1']))} -> {_fmt_number(float(totals['total_visits_p2']))} ({_fmt_number(float(totals['total_delta_pct']))}%)",
+            "evidence": path,
+        }
+    )
+    baseline = workbook.get("baseline")
+    if baseline:
+        out.facts.append(
             {
-                "title": "Общий трафик",
-                "value": f"{_fmt_number(float(totals['total_visits_p1']))} -> {_fmt_number(float(totals['total_visits_p2']))} ({_fmt_number(float(totals['total_delta_pct']))}%)",
-                "evidence": sources_artifact,
+                "title": "Ожидание с учётом сезонности",
+                "value": (
+                    f"ожидалось {_fmt_number(float(baseline['expected_total_p2']))}, "
+                    f"факт {_fmt_number(float(baseline['actual_total_p2']))} "
+                    f"({_fmt_number(float(baseline['delta_vs_expected_pct']))}% к ожиданию)"
+                ),
+                "evidence": path,
             }
         )
-        rows = workbook.get("rows") or []
-        if rows:
-            top_growth = max(rows, key=lambda row: float(row.get("delta_abs", 0.0)))
-            top_decline = min(rows, key=lambda row: float(row.get("delta_abs", 0.0)))
-            drivers.extend(
-                [
-                    {
-                        "title": "Главный рост по источникам",
-                        "value": f"{top_growth.get('source', '(unknown)')}: {_fmt_number(float(top_growth.get('delta_abs', 0.0)))}",
-                        "evidence": sources_artifact,
-                    },
-                    {
-                        "title": "Главное падение по источникам",
-                        "value": f"{top_decline.get('source', '(unknown)')}: {_fmt_number(float(top_decline.get('delta_abs', 0.0)))}",
-                        "evidence": sources_artifact,
-                    },
-                ]
-            )
-        for row in rows:
-            if str(row.get("source", "")) == "Search engine traffic":
-                search_source_row = row
-                search_source_down = float(row.get("delta_abs", 0.0)) < 0
-                break
-
-    if pages_artifact:
-        workbook = artifact_payloads[pages_artifact]
-        rows = workbook.get("rows") or []
-        if rows:
-            worst_page = min(rows, key=lambda row: float(row.get("delta_abs", 0.0)))
-            facts.append(
+        if traffic_delta != 0 and abs(float(baseline["delta_vs_expected_pct"])) < SEASONAL_TOLERANCE_PCT:
+            out.hypotheses.append(
                 {
-                    "title": "Наиболее просевшая страница",
-                    "value": f"{worst_page.get('landingPage', '(unknown)')}: {_fmt_number(float(worst_page.get('delta_abs', 0.0)))}",
-                    "evidence": pages_artifact,
+                    "title": "Изменение трафика объясняется сезонностью",
+                    "status": "подтверждается",
+                    "confidence": "medium",
+                    "because": "Фактический трафик P2 в пределах сезонной baseline-модели.",
+                    "next_check": "Сравнить с тем же периодом прошлого года и проверить отдельные страницы вне baseline.",
+                    "evidence": [path],
                 }
             )
-
-    if search_pages_artifact:
-        workbook = artifact_payloads[search_pages_artifact]
-        rows = workbook.get("rows") or []
-        if rows:
-            worst_search_page = min(rows, key=lambda row: float(row.get("delta_abs", 0.0)))
-            facts.append(
+    rows = workbook.get("rows") or []
+    if rows:
+        top_growth = max(rows, key=lambda row: float(row.get("delta_abs", 0.0)))
+        top_decline = min(rows, key=lambda row: float(row.get("delta_abs", 0.0)))
+        out.drivers.extend(
+            [
                 {
-                    "title": "Просевшая SEO-страница",
-                    "value": f"{worst_search_page.get('landingPage', '(unknown)')}: {_fmt_number(float(worst_search_page.get('delta_abs', 0.0)))}",
-                    "evidence": search_pages_artifact,
-                }
-            )
-            if float(worst_search_page.get("delta_abs", 0.0)) < 0:
-                hypotheses.append(
-                    {
-                        "title": "Потеря поискового трафика на важных страницах",
-                        "status": "подтверждается",
-                        "confidence": "high",
-                        "because": f"Сильнейшее падение у SEO-страницы {worst_search_page.get('landingPage', '(unknown)')}.",
-                        "next_check": "Проверить редиректы, индексацию и изменение контента этой страницы.",
-                        "evidence": [search_pages_artifact],
-                    }
-                )
-
-    if gsc_queries_artifact:
-        workbook = artifact_payloads[gsc_queries_artifact]
-        totals = workbook["totals"]
-        facts.append(
+                    "title": "Главный рост по источникам",
+                    "value": f"{top_growth.get('source', '(unknown)')}: {_fmt_number(float(top_growth.get('delta_abs', 0.0)))}",
+                    "evidence": path,
+                },
+                {
+                    "title": "Главное падение по источникам",
+                    "value": f"{top_decline.get('source', '(unknown)')}: {_fmt_number(float(top_decline.get('delta_abs', 0.0)))}",
+                    "evidence": path,
+                },
+            ]
+        )
+    for row in rows:
+        if str(row.get("source", "")) == "Search engine traffic":
+            out.signals["search_source_row"] = row
+            break
+    return out
+
+
+def _rule_pages(path: str, workbook: Any) -> RuleOutput:
+    out = RuleOutput()
+    rows = workbook.get("rows") or []
+    if rows:
+        worst_page = min(rows, key=lambda row: float(row.get("delta_abs", 0.0)))
+        out.facts.append(
             {
-                "title": "GSC clicks по запросам",
-                "value": f"{_fmt_number(float(totals['total_clicks_p1']))} -> {_fmt_number(float(totals['total_clicks_p2']))} ({_fmt_number(float(totals['total_delta_pct']))}%)",
-                "evidence": gsc_queries_artifact,
+                "title": "Наиболее просевшая страница",
+                "value": f"{worst_page.get('landingPage', '(unknown)')}: {_fmt_number(float(worst_page.get('delta_abs', 0.0)))}",
+                "evidence": path,
             }
         )
-        rows = workbook.get("rows") or []
-        if rows:
-            worst_query = min(rows, key=lambda row: float(row.get("delta_clicks", 0.0)))
-            drivers.append(
-                {
-                    "title": "Главный просевший запрос (GSC)",
-                    "value": f"{worst_query.get('query', '(unknown)')}: {_fmt_number(float(worst_query.get('delta_clicks', 0.0)))}",
-                    "evidence": gsc_queries_artifact,
-                }
-            )
-            if float(worst_query.get("delta_position", 0.0)) > 0 or float(worst_query.get("delta_ctr_pp", 0.0)) < 0:
-                hypotheses.append(
-                    {
-                        "title": "Просадка органики из-за ухудшения запросов",
-                        "status": "подтверждается",
-                        "confidence": "high",
-                        "because": "По GSC просели клики, а позиции или CTR ухудшились.",
-                        "next_check": "Проверить title/snippet и конкурентную выдачу по ключевым запросам.",
-                        "evidence": [gsc_queries_artifact],
-                    }
-                )
-
-    if gsc_pages_artifact:
-        workbook = artifact_payloads[gsc_pages_artifact]
-        rows = workbook.get("rows") or []
-        if rows:
-            worst_page = min(rows, key=lambda row: float(row.get("delta_clicks", 0.0)))
-            drivers.append(
-                {
-                    "title": "Главная просевшая страница в GSC",
-                    "value": f"{worst_page.get('page', '(unknown)')}: {_fmt_number(float(worst_page.get('delta_clicks', 0.0)))}",
-                    "evidence": gsc_pages_artifact,
-                }
-            )
+    return out
+
 
-    if ymw_queries_artifact:
-        workbook = artifact_payloads[ymw_queries_artifact]
-        totals = workbook["totals"]
-        facts.append(
+def _rule_changepoints(path: str, workbook: Any) -> RuleOutput:
+    out = RuleOutput()
+    key_field = workbook["meta"].get("key_field", "landingPage")
+    rows = workbook.get("rows") or []
+    if rows:
+        top_shift = rows[0]
+        out.facts.append(
             {
-                "title": "Яндекс.Вебмастер clicks по запросам",
-                "value": f"{_fmt_number(float(totals['total_clicks_p1']))} -> {_fmt_number(float(totals['total_clicks_p2']))} ({_fmt_number(float(totals['total_delta_pct']))}%)",
-                "evidence": ymw_queries_artifact,
+                "title": "Самый весомый сдвиг по дням",
+                "value": (
+                    f"{top_shift.get(key_field, '(unknown)')}: с {top_shift['change_date']} "
+                    f"{_fmt_number(float(top_shift['change_delta_pct']))}% в день "
+                    f"({_fmt_number(float(top_shift['change_impact']))} за период)"
+                ),
+                "evidence": path,
             }
         )
+        dates = sorted({str(row["change_date"]) for row in rows[:10]})
+        out.facts.append(
+            {
+                "title": "Даты сдвигов у топ-10 ключей",
+                "value": ", ".join(dates),
+                "evidence": path,
+            }
+        )
+    return out
 
-    if ymw_indexing_artifact:
-        rows = artifact_payloads[ymw_indexing_artifact]
-        excluded_count = len(rows) if isinstance(rows, list) else 0
-        facts.append(
+
+def _rule_search_pages(path: str, workbook: Any) -> RuleOutput:
+    out = RuleOutput()
+    rows = workbook.get("rows") or []
+    if rows:
+        worst_search_page = min(rows, key=lambda row: float(row.get("delta_abs", 0.0)))
+        out.facts.append(
             {
-                "title": "Снимок исключённых URL",
-                "value": f"{excluded_count} URL в выборке EXCLUDED",
-                "evidence": ymw_indexing_artifact,
+                "title": "Просевшая SEO-страница",
+                "value": f"{worst_search_page.get('landingPage', '(unknown)')}: {_fmt_number(float(worst_search_page.get('delta_abs', 0.0)))}",
+                "evidence": path,
             }
         )
-        if excluded_count > 0:
-            hypotheses.append(
+        if float(worst_search_page.get("delta_abs", 0.0)) < 0:
+            out.hypotheses.append(
                 {
-                    "title": "Есть риски по индексации",
-                    "status": "частично подтверждается",
-                    "confidence": "medium",
-                    "because": f"В Яндекс.Вебмастере найдено {excluded_count} исключённых URL в выборке.",
-                    "next_check": "Разобрать причины исключения: 404, duplicate, noindex, robots.",
-                    "evidence": [ymw_indexing_artifact],
+                    "title": "Потеря поискового трафика на важных страницах",
+                    "status": "подтверждается",
+                    "confidence": "high",
+                    "because": f"Сильнейшее падение у SEO-страницы {worst_search_page.get('landingPage', '(unknown)')}.",
+                    "next_check": "Проверить редиректы, индексацию и изменение контента этой страницы.",
+                    "evidence": [path],
                 }
             )
-
-    if goals_source_artifact:
-        workbook = artifact_payloads[goals_source_artifact]
-        totals = workbook["totals"]
-        goal_drop = float(totals["total_delta_goal_visits_abs"]) < 0
-        goal_cr_drop = float(totals["total_delta_cr_pp"]) < 0
-        facts.append(
+    return out
+
+
+def _rule_gsc_queries(path: str, workbook: Any) -> RuleOutput:
+    out = RuleOutput()
+    totals = workbook["totals"]
+    out.facts.append(
+        {
+            "title": "GSC clicks по запросам",
+            "value": f"{_fmt_number(float(totals['total_clicks_p1']))} -> {_fmt_number(float(totals['total_clicks_p2']))} ({_fmt_number(float(totals['total_delta_pct']))}%)",
+            "evidence": path,
+        }
+    )
+    rows = workbook.get("rows") or []
+    if rows:
+        worst_query = min(signal_rows(rows), key=lambda row: float(row.get("delta_clicks", 0.0)))
+        out.drivers.append(
             {
-                "title": "Конверсионные визиты по источникам",
-                "value": f"{_fmt_number(float(totals['total_goal_visits_p1']))} -> {_fmt_number(float(totals['total_goal_visits_p2']))} ({_fmt_number(float(totals['total_delta_goal_visits_pct']))}%)",
-                "evidence": goals_source_artifact,
+                "title": "Главный просевший запрос (GSC)",
+                "value": f"{worst_query.get('query', '(unknown)')}: {_fmt_number(float(worst_query.get('delta_clicks', 0.0)))}",
+                "evidence": path,
             }
         )
-        if goal_drop and goal_cr_drop:
-            hypotheses.append(
+        ctr_dropped = float(worst_query.get("delta_ctr_pp", 0.0)) < 0 and not worst_query.get("ctr_is_noise", False)
+        if float(worst_query.get("delta_position", 0.0)) > 0 or ctr_dropped:
+            out.hypotheses.append(
                 {
-                    "title": "Падение заявок из-за ухудшения качества трафика",
+                    "title": "Просадка органики из-за ухудшения запросов",
                     "status": "подтверждается",
                     "confidence": "high",
-                    "because": "Конверсионные визиты и общий CR по источникам снизились.",
-                    "next_check": "Проверить источники с самым сильным падением CR и лендинги для них.",
-                    "evidence": [goals_source_artifact],
+                    "because": "По GSC просели клики, а позиции или CTR ухудшились.",
+                    "next_check": "Проверить title/snippet и конкурентную выдачу по ключевым запросам.",
+                    "evidence": [path],
                 }
             )
+    return out
+
+
+def _rule_gsc_pages(path: str, workbook: Any) -> RuleOutput:
+    out = RuleOutput()
+    rows = workbook.get("rows") or []
+    if rows:
+        worst_page = min(signal_rows(rows), key=lambda row: float(row.get("delta_clicks", 0.0)))
+        out.drivers.append(
+            {
+                "title": "Главная просевшая страница в GSC",
+                "value": f"{worst_page.get('page', '(unknown)')}: {_fmt_number(float(worst_page.get('delta_clicks', 0.0)))}",
+                "evidence": path,
+            }
+        )
+    return out
+
+
+def _rule_ymw_queries(path: str, workbook: Any) -> RuleOutput:
+    out = RuleOutput()
+    totals = workbook["totals"]
+    out.facts.append(
+        {
+            "title": "Яндекс.Вебмастер clicks по запросам",
+            "value": f"{_fmt_number(float(totals['total_clicks_p1']))} -> {_fmt_number(float(totals['total_clicks_p2']))} ({_fmt_number(float(totals['total_delta_pct']))}%)",
+            "evidence": path,
+        }
+    )
+    return out
+
+
+def _rule_ymw_indexing(path: str, workbook: Any) -> RuleOutput:
+    out = RuleOutput()
+    rows = workbook
+    excluded_count = len(rows) if isinstance(rows, list) else 0
+    out.facts.append(
+        {
+            "title": "Снимок исключённых URL",
+            "value": f"{excluded_count} URL в выборке EXCLUDED",
+            "evidence": path,
+        }
+    )
+    if excluded_count > 0:
+        out.hypotheses.append(
+            {
+                "title": "Есть риски по индексации",
+                "status": "частично подтверждается",
+                "confidence": "medium",
+                "because": f"В Яндекс.Вебмастере найдено {excluded_count} исключённых URL в выборке.",
+                "next_check": "Разобрать причины исключения: 404, duplicate, noindex, robots.",
+                "evidence": [path],
+            }
+        )
+    return out
+
+
+def _rule_goals_source(path: str, workbook: Any) -> RuleOutput:
+    out = RuleOutput()
+    totals = workbook["totals"]
+    goal_drop = float(totals["total_delta_goal_visits_abs"]) < 0
+    goal_cr_drop = float(totals["total_delta_cr_pp"]) < 0
+    out.signals.update(goal_drop=goal_drop, goal_cr_drop=goal_cr_drop)
+    out.facts.append(
+        {
+            "title": "Конверсионные визиты по источникам",
+            "value": f"{_fmt_number(float(totals['total_goal_visits_p1']))} -> {_fmt_number(float(totals['total_goal_visits_p2']))} ({_fmt_number(float(totals['total_delta_goal_visits_pct']))}%)",
+            "evidence": path,
+        }
+    )
+    if goal_drop and goal_cr_drop:
+        out.hypotheses.append(
+            {
+                "title": "Падение заявок из-за ухудшения качества трафика",
+                "status": "подтверждается",
+                "confidence": "high",
+                "because": "Конверсионные визиты и общий CR по источникам снизились.",
+                "next_check": "Проверить источники с самым сильным падением CR и лендинги для них.",
+                "evidence": [path],
+            }
+        )
+    return out
+
 
-    if goals_page_artifact:
-        workbook = artifact_payloads[goals_page_artifact]
-        rows = workbook.get("rows") or []
-        if rows:
-            worst_goal_page = min(rows, key=lambda row: float(row.get("delta_goal_visits_abs", 0.0)))
-            drivers.append(
+def _rule_goals_page(path: str, workbook: Any) -> RuleOutput:
+    out = RuleOutput()
+    rows = workbook.get("rows") or []
+    if rows:
+        worst_goal_page = min(signal_rows(rows), key=lambda row: float(row.get("delta_goal_visits_abs", 0.0)))
+        out.drivers.append(
+            {
+                "title": "Главная просевшая страница по конверсиям",
+                "value": f"{worst_goal_page.get('landingPage', '(unknown)')}: {_fmt_number(float(worst_goal_page.get('delta_goal_visits_abs', 0.0)))}",
+                "evidence": path,
+            }
+        )
+        if (
+            float(worst_goal_page.get("visits_p2", 0.0)) > 0
+            and float(worst_goal_page.get("goal_visits_p2", 0.0)) == 0
+            and not worst_goal_page.get("cr_is_noise", False)
+        ):
+            out.hypotheses.append(
                 {
-                    "title": "Главная просевшая страница по конверсиям",
-                    "value": f"{worst_goal_page.get('landingPage', '(unknown)')}: {_fmt_number(float(worst_goal_page.get('delta_goal_visits_abs', 0.0)))}",
-                    "evidence": goals_page_artifact,
+                    "title": "Проблема трекинга или формы на части страниц",
+                    "status": "частично подтверждается",
+                    "confidence": "medium",
+                    "because": "Есть страницы с трафиком, но без конверсий в текущем периоде.",
+                    "next_check": "Проверить форму, события и отправку цели на просевших страницах.",
+                    "evidence": [path],
                 }
             )
-            if float(worst_goal_page.get("visits_p2", 0.0)) > 0 and float(worst_goal_page.get("goal_visits_p2", 0.0)) == 0:
-                hypotheses.append(
-                    {
-                        "title": "Проблема трекинга или формы на части страниц",
-                        "status": "частично подтверждается",
-                        "confidence": "medium",
-                        "because": "Есть страницы с трафиком, но без конверсий в текущем периоде.",
-                        "next_check": "Проверить форму, события и отправку цели на просевших страницах.",
-                        "evidence": [goals_page_artifact],
-                    }
-                )
+    return out
+
+
+# Правило на artifact шага; порядок задаёт порядок фактов, драйверов и гипотез в отчёте.
+RULES: List[Tuple[str, Callable[[str, Any], RuleOutput]]] = [
+    ("analyze_sources", _rule_sources),
+    ("analyze_pages", _rule_pages),
+    ("detect_changepoints", _rule_changepoints),
+    ("analyze_pages_by_source", _rule_search_pages),
+    ("analyze_gsc_queries", _rule_gsc_queries),
+    ("analyze_gsc_pages", _rule_gsc_pages),
+    ("analyze_ym_webmaster_queries", _rule_ymw_queries),
+    ("ym_webmaster_indexing", _rule_ymw_indexing),
+    ("analyze_goals_by_source", _rule_goals_source),
+    ("analyze_goals_by_page", _rule_goals_page),
+]
+
+
+class AnalysisCache:
+    """
+    Память analyzer-а между раундами одного расследования.
+
+    Разобранные workbook-и хранятся по пути и mtime: следующий раунд не
+    перечитывает JSON прошлых раундов. Правило пересчитывается, только если
+    его входной artifact сменился (другой путь или файл переписан), так что
+    раунд стоит O(новых artifacts). Artifact без файла на диске
+    пересчитывается каждый раз.
+    """
+
+    def __init__(self) -> None:
+        self._workbooks: Dict[str, Tuple[Optional[int], Any]] = {}
+        self._outputs: Dict[str, Tuple[Tuple[str, Optional[int]], RuleOutput]] = {}
+        self.stats: Dict[str, int] = {"workbooks_loaded": 0, "rules_evaluated": 0, "rules_reused": 0}
+
+    def _workbook(self, path: str, mtime: Optional[int], payloads: Dict[str, Any]) -> Any:
+        cached = self._workbooks.get(path)
+        if cached is not None and mtime is not None and cached[0] == mtime:
+            return cached[1]
+        data = payloads[path] if path in payloads else _load_json(path)
+        self.stats["workbooks_loaded"] += 1
+        self._workbooks[path] = (mtime, data)
+        return data
+
+    def evaluate(self, kind: str, rule: Callable[[str, Any], RuleOutput], path: str, payloads: Dict[str, Any]) -> RuleOutput:
+        mtime = _mtime(path)
+        cached = self._outputs.get(kind)
+        if cached is not None and mtime is not None and cached[0] == (path, mtime):
+            self.stats["rules_reused"] += 1
+            return cached[1]
+        output = rule(path, self._workbook(path, mtime, payloads))
+        self.stats["rules_evaluated"] += 1
+        self._outputs[kind] = ((path, mtime), output)
+        return output
+
+
+def analyze_results(
+    *,
+    client: str,
+    query: str,
+    period: InvestigationPeriod,
+    intent: InvestigationIntent,
+    availability: InvestigationAvailability,
+    goal_selection: GoalSelection,
+    executed_steps: List[ExecutedStep],
+    cache: Optional[AnalysisCache] = None,
+) -> Dict[str, Any]:
+    """
+    cache: AnalysisCache, общий для раундов расследования; без него всё считается заново.
+    """
+    cache = cache if cache is not None else AnalysisCache()
+    payloads = {path: document for step in executed_steps for path, document in step.payloads.items()}
+    facts: List[Dict[str, Any]] = []
+    drivers: List[Dict[str, Any]] = []
+    hypotheses: List[Dict[str, Any]] = []
+    recommended_next_steps: List[Dict[str, str]] = []
+    availability_notes = list(availability.notes)
+    executed_kinds = {step.kind for step in executed_steps if step.success}
+
+    artifacts: Dict[str, str] = {}
+    signals: Dict[str, Any] = {}
+    for kind, rule in RULES:
+        path = _indexing_artifact(executed_steps) if kind == "ym_webmaster_indexing" else _first_artifact(executed_steps, kind)
+        if not path:
+            continue
+        artifacts[kind] = path
+        output = cache.evaluate(kind, rule, path, payloads)
+        facts.extend(output.facts)
+        drivers.extend(output.drivers)
+        hypotheses.extend(output.hypotheses)
+        signals.update(output.signals)
+
+    sources_artifact = artifacts.get("analyze_sources")
+    search_pages_artifact = artifacts.get("analyze_pages_by_source")
+    goals_source_artifact = artifacts.get("analyze_goals_by_source")
+    traffic_delta = signals.get("traffic_delta")
+    search_source_row = signals.get("search_source_row")
+    search_source_down = search_source_row is not None and float(search_source_row.get("delta_abs", 0.0)) < 0
+    goal_drop = bool(signals.get("goal_drop", False))
+    goal_cr_drop = bool(signals.get("goal_cr_drop", False))
 
     if not hypotheses and search_source_row is not None and float(search_source_row.get("delta_abs", 0.0)) < 0:
         hypotheses.append(
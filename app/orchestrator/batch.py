@@ -0,0 +1,220 @@
+from __future__ import annotations
+
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import yaml
+
+from app import rate_limit
+from app.config import list_clients
+from app.orchestrator.report_generator import _allocate_report_dir
+
+# Вызовов API в секунду на токен; общий лимит для всех процессов пачки.
+DEFAULT_RATE_LIMITS: Dict[str, float] = {
+    "metrika": 3.0,
+    "gsc": 2.0,
+    "ym_webmaster": 1.0,
+}
+PERIOD_FIELDS = ("p1_start", "p1_end", "p2_start", "p2_end")
+# Флаги намерения, добавляющие в план свои выгрузки (цели, GSC, индексация, дневные ряды).
+FETCH_INTENT_FLAGS = ("wants_conversions", "wants_seo", "wants_indexing", "wants_timing")
+
+
+@dataclass(frozen=True)
+class BatchJob:
+    client: str
+    query: str
+    period: Dict[str, str] = field(default_factory=dict)
+
+
+@dataclass(frozen=True)
+class BatchSpec:
+    jobs: List[BatchJob]
+    refresh: bool = False
+    workers: int = 0
+    rate_limits: Dict[str, float] = field(default_factory=lambda: dict(DEFAULT_RATE_LIMITS))
+
+
+def load_spec(path: Path) -> BatchSpec:
+    """
+    Спецификация пачки (YAML):
+
+        clients: all            # или список папок clients/
+        queries: ["Почему упал трафик"]
+        periods:                # опционально; без них период берётся из текста запроса
+          - {p1_start: 2024-01-01, p1_end: 2024-01-31, p2_start: 2025-01-01, p2_end: 2025-01-31}
+        refresh: false
+        workers: 4
+        rate_limits: {metrika: 3, gsc: 2, ym_webmaster: 1}
+    """
+    raw = yaml.safe_load(path.read_text(encoding="utf-8")) or {}
+    clients = raw.get("clients", "all")
+    if clients == "all" or clients == ["all"]:
+        clients = list_clients()
+    queries = [str(q) for q in (raw.get("queries") or []) if str(q).strip()]
+    if not clients:
+        raise ValueError("В спецификации нет клиентов (и папка clients/ пуста)")
+    if not queries:
+        raise ValueError("В спецификации нет запросов (queries)")
+
+    periods: List[Dict[str, str]] = []
+    for item in raw.get("periods") or []:
+        missing = [name for name in PERIOD_FIELDS if not item.get(name)]
+        if missing:
+            raise ValueError(f"В периоде не хватает полей: {', '.join(missing)}")
+        periods.append({name: str(item[name]) for name in PERIOD_FIELDS})
+
+    jobs: List[BatchJob] = []
+    seen = set()
+    for client in clients:
+        for query in queries:
+            for period in periods or [{}]:
+                key = (str(client), query, tuple(sorted(period.items())))
+                if key in seen:
+                    continue
+                seen.add(key)
+                jobs.append(BatchJob(client=str(client), query=query, period=period))
+
+    rates = dict(DEFAULT_RATE_LIMITS)
+    rates.update({str(k): float(v) for k, v in (raw.get("rate_limits") or {}).items()})
+    return BatchSpec(jobs=jobs, refresh=bool(raw.get("refresh", False)), workers=int(raw.get("workers", 0) or 0), rate_limits=rates)
+
+
+def group_by_client(jobs: List[BatchJob]) -> Dict[str, List[BatchJob]]:
+    groups: Dict[str, List[BatchJob]] = {}
+    for job in jobs:
+        groups.setdefault(job.client, []).append(job)
+    return groups
+
+
+def _init_worker(shared_limits: Dict[str, Any]) -> None:
+    rate_limit.install(shared_limits)
+
+
+def fetch_keys(job: BatchJob) -> Set[Tuple[Tuple[str, ...], str]]:
+    """
+    Какие выгрузки задание тянет из API: (период P1/P2, группа срезов).
+
+    Период — как его разрешит investigate (явный или из текста запроса),
+    группы — базовые срезы и те, что добавляют флаги намерения.
+    """
+    from app.orchestrator.date_resolution import resolve_periods
+    from app.orchestrator.intake import parse_intent
+
+    try:
+        period = resolve_periods(job.query, **{name: job.period.get(name) or None for name in PERIOD_FIELDS})
+    except ValueError:
+        span: Tuple[str, ...] = ("query", job.query)
+    else:
+        span = (period.p1_start, period.p1_end, period.p2_start, period.p2_end)
+    intent = parse_intent(job.query)
+    return {(span, "base")} | {(span, flag) for flag in FETCH_INTENT_FLAGS if getattr(intent, flag)}
+
+
+def run_client_jobs(client: str, jobs: List[BatchJob], refresh: bool) -> List[Dict[str, Any]]:
+    """
+    Все задания одного клиента в одном процессе, последовательно.
+
+    Задания клиента делят data_cache/<client>/: одинаковые выгрузки (те же
+    срезы и периоды) идут в API один раз. С --refresh задание обновляет кэш,
+    если тянет хотя бы одну ещё не обновлённую выгрузку (fetch_keys);
+    задания с уже обновлёнными периодами и срезами берут свежий кэш.
+    """
+    from app.orchestrator.agent_loop import investigate
+
+    results: List[Dict[str, Any]] = []
+    refreshed: Set[Tuple[Tuple[str, ...], str]] = set()
+    for job in jobs:
+        entry: Dict[str, Any] = {"job": asdict(job)}
+        job_refresh = False
+        if refresh:
+            keys = fetch_keys(job)
+            job_refresh = not keys <= refreshed
+            refreshed |= keys
+        try:
+            report, analysis, executed_steps = investigate(
+                client=job.client,
+                query=job.query,
+                refresh=job_refresh,
+                prefetch=False,
+                **{name: job.period.get(name) or None for name in PERIOD_FIELDS},
+            )
+            entry.update(
+                {
+                    "success": True,
+                    "run_id": report.run_id,
+                    "report_dir": report.report_dir,
+                    "markdown_path": report.markdown_path,
+                    "summary": report.summary,
+                    "reused": report.reused,
+                    "root_cause_status": analysis.get("root_cause_status"),
+                    "steps": len(executed_steps),
+                }
+            )
+        except Exception as e:
+            entry.update({"success": False, "error": str(e)[:500]})
+        results.append(entry)
+    return results
+
+
+def _render_summary(results: List[Dict[str, Any]]) -> str:
+    lines = ["# Пакетное расследование", ""]
+    lines.append("| client | query | статус | итог | отчёт |")
+    lines.append("|---|---|---|---|---|")
+    for entry in results:
+        job = entry["job"]
+        status = entry.get("root_cause_status") or "" if entry["success"] else "ошибка"
+        summary = (entry.get("summary") or entry.get("error") or "").replace("|", "/").replace("\n", " ")
+        lines.append(f"| {job['client']} | {job['query']} | {status} | {summary} | {entry.get('markdown_path', '')} |")
+    return "\n".join(lines) + "\n"
+
+
+def run_batch(spec: BatchSpec, workers: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Выполняет пачку: клиенты — в пуле процессов, вызовы API — через общий
+    лимитер на токен. Пишет сводку reports/_batch/<batch_id>/summary.{json,md}.
+    """
+    groups = group_by_client(spec.jobs)
+    max_workers = max(1, min(workers or spec.workers or os.cpu_count() or 1, len(groups) or 1))
+    shared_limits = rate_limit.create_shared_limits(spec.rate_limits)
+
+    results: List[Dict[str, Any]] = []
+    if max_workers == 1:
+        rate_limit.install(shared_limits)
+        try:
+            for client, jobs in groups.items():
+                results.extend(run_client_jobs(client, jobs, spec.refresh))
+        finally:
+            rate_limit.uninstall()
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker, initargs=(shared_limits,)) as pool:
+            futures = {pool.submit(run_client_jobs, client, jobs, spec.refresh): client for client, jobs in groups.items()}
+            for future in as_completed(futures):
+                try:
+                    results.extend(future.result())
+                except Exception as e:
+                    for job in groups[futures[future]]:
+                        results.append({"job": asdict(job), "success": False, "error": str(e)[:500]})
+
+    order = {(job.client, job.query, tuple(sorted(job.period.items()))): i for i, job in enumerate(spec.jobs)}
+    results.sort(key=lambda entry: order.get((entry["job"]["client"], entry["job"]["query"], tuple(sorted(entry["job"]["period"].items()))), 0))
+
+    batch_id, batch_dir = _allocate_report_dir("_batch")
+    summary = {
+        "batch_id": batch_id,
+        "jobs": len(spec.jobs),
+        "clients": len(groups),
+        "workers": max_workers,
+        "rate_limits": spec.rate_limits,
+        "succeeded": sum(1 for entry in results if entry["success"]),
+        "failed": sum(1 for entry in results if not entry["success"]),
+        "results": results,
+    }
+    (batch_dir / "summary.json").write_text(json.dumps(summary, ensure_ascii=False, indent=2), encoding="utf-8")
+    (batch_dir / "summary.md").write_text(_render_summary(results), encoding="utf-8")
+    summary["summary_dir"] = str(batch_dir)
+    return summary
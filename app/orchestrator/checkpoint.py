@@ -0,0 +1,99 @@
+from __future__ import annotations
+
+import json
+import os
+from dataclasses import asdict, fields
+from pathlib import Path
+from typing import Any, Dict, List
+
+from app import tracing
+from app.orchestrator.models import (
+    ExecutedStep,
+    GoalSelection,
+    InvestigationAvailability,
+    InvestigationIntent,
+    InvestigationPeriod,
+    PlannedStep,
+)
+
+CHECKPOINT_FILE = "checkpoint.json"
+CHECKPOINT_VERSION = 1
+
+
+class InvestigationInterrupted(RuntimeError):
+    """Расследование прервано; состояние сохранено и его можно продолжить по run_id."""
+
+    def __init__(self, message: str, run_id: str) -> None:
+        super().__init__(message)
+        self.run_id = run_id
+
+
+def checkpoint_path(client: str, run_id: str) -> Path:
+    return Path("reports") / client / run_id / CHECKPOINT_FILE
+
+
+def executed_to_dict(step: ExecutedStep) -> Dict[str, Any]:
+    # payloads не сохраняем: artifacts лежат на диске, analyzer перечитает их сам.
+    return {f.name: getattr(step, f.name) for f in fields(step) if f.name != "payloads"}
+
+
+def context_to_dict(
+    intent: InvestigationIntent,
+    period: InvestigationPeriod,
+    availability: InvestigationAvailability,
+    goal_selection: GoalSelection,
+) -> Dict[str, Any]:
+    return {
+        "intent": asdict(intent),
+        "period": asdict(period),
+        "availability": asdict(availability),
+        "goal_selection": asdict(goal_selection),
+    }
+
+
+def context_from_dict(
+    state: Dict[str, Any],
+) -> tuple[InvestigationIntent, InvestigationPeriod, InvestigationAvailability, GoalSelection]:
+    return (
+        InvestigationIntent(**state["intent"]),
+        InvestigationPeriod(**state["period"]),
+        InvestigationAvailability(**state["availability"]),
+        GoalSelection(**state["goal_selection"]),
+    )
+
+
+def save_checkpoint(client: str, run_id: str, state: Dict[str, Any]) -> Path:
+    """
+    Пишет состояние атомарно (через временный файл): обрыв посреди записи
+    не должен портить последний целый checkpoint.
+    """
+    path = checkpoint_path(client, run_id)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(".json.tmp")
+    with tracing.span("checkpoint.save", status=state.get("status", ""), round=state.get("round", 0)):
+        tmp_path.write_text(
+            json.dumps({"version": CHECKPOINT_VERSION, **state}, ensure_ascii=False, indent=2, default=str),
+            encoding="utf-8",
+        )
+        os.replace(tmp_path, path)
+    return path
+
+
+def load_checkpoint(client: str, run_id: str) -> Dict[str, Any]:
+    path = checkpoint_path(client, run_id)
+    if not path.exists():
+        raise FileNotFoundError(f"Checkpoint not found: {path}")
+    state = json.loads(path.read_text(encoding="utf-8"))
+    if state.get("version") != CHECKPOINT_VERSION:
+        raise ValueError(f"Неподдерживаемая версия checkpoint: {state.get('version')} ({path})")
+    if state.get("status") == "completed":
+        raise ValueError(f"Расследование {run_id} уже завершено, продолжать нечего")
+    return state
+
+
+def executed_from_dicts(items: List[Dict[str, Any]]) -> List[ExecutedStep]:
+    return [ExecutedStep(**item) for item in items]
+
+
+def planned_from_dicts(items: List[Dict[str, Any]]) -> List[PlannedStep]:
+    return [PlannedStep(**item) for item in items]
@@ -0,0 +1,31 @@
+"""
+Лимиты одновременных вызовов одного API на процесс.
+
+Общие для executor-а и prefetch-а: фоновые выборки занимают те же слоты,
+что и шаги текущего раунда, и вместе не превышают квоту источника.
+"""
+
+from __future__ import annotations
+
+import threading
+from typing import Dict
+
+# Одновременные шаги на один API: квоты Метрики мягче, чем у GSC и Вебмастера.
+SOURCE_CONCURRENCY: Dict[str, int] = {
+    "metrika": 3,
+    "gsc": 2,
+    "ym_webmaster": 1,
+}
+
+_SEMAPHORES: Dict[str, threading.Semaphore] = {}
+_LOCK = threading.Lock()
+
+
+def source_semaphore(source: str) -> threading.Semaphore:
+    """Семафор источника; неизвестным источникам — самый строгий лимит."""
+    with _LOCK:
+        semaphore = _SEMAPHORES.get(source)
+        if semaphore is None:
+            limit = SOURCE_CONCURRENCY.get(source, min(SOURCE_CONCURRENCY.values()))
+            semaphore = _SEMAPHORES[source] = threading.Semaphore(limit)
+        return semaphore
@@ -0,0 +1,254 @@
+from __future__ import annotations
+
+import json
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.analysis_pages import _slugify_for_filename
+from app.orchestrator.models import ExecutedStep, PlannedStep
+
+# Верхние границы корзин гистограммы латентности шага, секунды (+ переполнение).
+LATENCY_BUCKETS: List[float] = [0.1, 0.5, 1.0, 2.0, 5.0, 10.0, 30.0, 60.0]
+# Оценка на один вызов API, пока по kind нет наблюдений.
+DEFAULT_API_SECONDS: Dict[str, float] = {
+    "metrika": 2.0,
+    "gsc": 3.0,
+    "ym_webmaster": 2.0,
+}
+CACHED_SECONDS = 0.05
+# Бюджет вызовов API на одно расследование (кэш не тратит бюджет).
+DEFAULT_QUOTA_BUDGETS: Dict[str, int] = {
+    "metrika": 40,
+    "gsc": 20,
+    "ym_webmaster": 10,
+}
+# Ценность шагов первого раунда; для следующих раундов — по priority рекомендации.
+INITIAL_STEP_VALUES: Dict[str, float] = {
+    "analyze_sources": 3.0,
+    "analyze_pages": 2.0,
+    "analyze_goals_by_source": 3.0,
+    "detect_changepoints": 2.0,
+}
+PRIORITY_VALUES: Dict[str, float] = {"high": 3.0, "medium": 2.0, "low": 1.0}
+DEFAULT_STEP_VALUE = 1.0
+
+
+@dataclass(frozen=True)
+class StepEstimate:
+    step_id: str
+    kind: str
+    source: str
+    api_calls: int
+    cache_hit_prob: float
+    expected_rows: int
+    expected_seconds: float
+    p90_seconds: float
+    value: float
+
+    @property
+    def score(self) -> float:
+        """Ожидаемая информация в секунду."""
+        return self.value / max(self.expected_seconds, CACHED_SECONDS)
+
+
+def latency_path(client: str) -> Path:
+    return Path("data_cache") / client / "step_latency.json"
+
+
+def _empty_histogram() -> Dict[str, Any]:
+    return {"buckets": [0] * (len(LATENCY_BUCKETS) + 1), "count": 0, "total_s": 0.0, "rows_total": 0}
+
+
+def _observe(histogram: Dict[str, Any], seconds: float, rows: int) -> None:
+    index = next((i for i, bound in enumerate(LATENCY_BUCKETS) if seconds <= bound), len(LATENCY_BUCKETS))
+    histogram["buckets"][index] += 1
+    histogram["count"] += 1
+    histogram["total_s"] += seconds
+    histogram["rows_total"] += rows
+
+
+def _quantile(histogram: Dict[str, Any], q: float) -> float:
+    """Верхняя граница корзины, в которую попадает квантиль q."""
+    target = q * histogram["count"]
+    cumulative = 0
+    for i, count in enumerate(histogram["buckets"]):
+        cumulative += count
+        if cumulative >= target:
+            return LATENCY_BUCKETS[i] if i < len(LATENCY_BUCKETS) else LATENCY_BUCKETS[-1] * 2
+    return LATENCY_BUCKETS[-1] * 2
+
+
+def cache_files(step: PlannedStep) -> List[Path]:
+    """norm-файлы кэша, из которых шаг возьмёт данные без обращения к API."""
+    params = step.params
+    cache_dir = Path("data_cache") / str(params.get("client", ""))
+    periods = [
+        (params.get("p1_start", ""), params.get("p1_end", "")),
+        (params.get("p2_start", ""), params.get("p2_end", "")),
+    ]
+    kind = step.kind
+    if kind == "analyze_sources":
+        return [cache_dir / f"metrika_sources_norm_{d1}_{d2}.json" for d1, d2 in periods]
+    if kind == "analyze_pages":
+        return [cache_dir / f"metrika_pages_norm_{d1}_{d2}.json" for d1, d2 in periods]
+    if kind == "analyze_pages_by_source":
+        slug = _slugify_for_filename(str(params.get("source", "")))
+        return [cache_dir / f"metrika_pages_by_source_norm_{slug}_{d1}_{d2}.json" for d1, d2 in periods]
+    if kind in ("analyze_goals_by_source", "analyze_goals_by_page"):
+        dimension = "source" if kind == "analyze_goals_by_source" else "page"
+        goal_id = params.get("goal_id", 0)
+        return [cache_dir / f"metrika_goals_by_{dimension}_norm_{goal_id}_{d1}_{d2}.json" for d1, d2 in periods]
+    if kind in ("analyze_gsc_queries", "analyze_gsc_pages"):
+        gsc_kind = kind.replace("analyze_gsc_", "")
+        return [cache_dir / f"gsc_{gsc_kind}_norm_{d1}_{d2}.json" for d1, d2 in periods]
+    if kind == "analyze_ym_webmaster_queries":
+        return [cache_dir / f"ym_webmaster_queries_norm_{d1}_{d2}.json" for d1, d2 in periods]
+    if kind == "detect_changepoints":
+        prefix = "gsc" if str(params.get("kind", "")).startswith("gsc") else "metrika"
+        return [cache_dir / f"{prefix}_daily_{params.get('kind')}_norm_{params.get('date1')}_{params.get('date2')}.json"]
+    if kind == "ym_webmaster_indexing":
+        return [
+            cache_dir / f"ym_webmaster_indexing_norm_{params.get('status')}_{params.get('limit')}_{params.get('offset')}.json"
+        ]
+    return []
+
+
+class CostModel:
+    """
+    Оценка стоимости шагов: вызовы API, строки, вероятность кэша, латентность.
+
+    Латентность копится по клиенту в data_cache/<client>/step_latency.json
+    (отдельно для шагов из кэша и с обращением к API). select() тратит бюджет
+    вызовов на источник и отбрасывает шаги, которые в него не влезают.
+    """
+
+    def __init__(self, client: str, refresh: bool = False, budgets: Optional[Dict[str, int]] = None) -> None:
+        self.client = client
+        self.refresh = refresh
+        self.budgets: Dict[str, int] = dict(budgets or DEFAULT_QUOTA_BUDGETS)
+        self.spent: Dict[str, int] = {source: 0 for source in self.budgets}
+        self.rejected: List[Dict[str, Any]] = []
+        self._estimates: Dict[str, StepEstimate] = {}
+        self.history: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        path = latency_path(client)
+        if path.exists():
+            try:
+                self.history = json.loads(path.read_text(encoding="utf-8"))
+            except Exception:
+                self.history = {}
+
+    def estimate(self, step: PlannedStep, value: float = DEFAULT_STEP_VALUE) -> StepEstimate:
+        files = cache_files(step)
+        calls = max(len(files), 1)
+        cached = 0 if self.refresh else sum(1 for path in files if path.exists())
+        api_calls = calls - cached
+        hit_prob = cached / calls
+
+        mode = "cached" if api_calls == 0 else "api"
+        observed = (self.history.get(step.kind) or {}).get(mode)
+        if observed and observed["count"] > 0:
+            expected_seconds = observed["total_s"] / observed["count"]
+            p90_seconds = _quantile(observed, 0.9)
+        else:
+            per_call = DEFAULT_API_SECONDS.get(step.source, max(DEFAULT_API_SECONDS.values()))
+            expected_seconds = CACHED_SECONDS + api_calls * per_call
+            p90_seconds = expected_seconds * 2
+
+        any_observed = next((h for h in (self.history.get(step.kind) or {}).values() if h["count"] > 0), None)
+        if any_observed:
+            expected_rows = int(any_observed["rows_total"] / any_observed["count"])
+        else:
+            expected_rows = int(step.params.get("top") or step.params.get("limit") or 0)
+
+        estimate = StepEstimate(
+            step_id=step.id,
+            kind=step.kind,
+            source=step.source,
+            api_calls=api_calls,
+            cache_hit_prob=hit_prob,
+            expected_rows=expected_rows,
+            expected_seconds=expected_seconds,
+            p90_seconds=p90_seconds,
+            value=value,
+        )
+        self._estimates[step.id] = estimate
+        return estimate
+
+    def estimate_of(self, step_id: str) -> Optional[StepEstimate]:
+        return self._estimates.get(step_id)
+
+    def affordable(self, step: PlannedStep) -> bool:
+        """Влезает ли шаг в остаток бюджета (без списания)."""
+        left = self.remaining(step.source)
+        return left is None or self.estimate(step).api_calls <= left
+
+    def remaining(self, source: str) -> Optional[int]:
+        if source not in self.budgets:
+            return None
+        return self.budgets[source] - self.spent.get(source, 0)
+
+    def select(self, steps: List[PlannedStep], values: Dict[str, float]) -> Tuple[List[PlannedStep], List[StepEstimate]]:
+        """
+        Сортирует шаги по информации в секунду и оставляет те, что влезают в бюджет.
+
+        values: ценность по step.kind. Returns: (выбранные шаги, их оценки) в новом порядке.
+        """
+        estimates = [self.estimate(step, values.get(step.kind, DEFAULT_STEP_VALUE)) for step in steps]
+        ranked = sorted(zip(steps, estimates), key=lambda item: -item[1].score)
+        selected: List[PlannedStep] = []
+        selected_estimates: List[StepEstimate] = []
+        for step, estimate in ranked:
+            left = self.remaining(step.source)
+            if left is not None and estimate.api_calls > left:
+                self.rejected.append(
+                    {
+                        "step_id": step.id,
+                        "kind": step.kind,
+                        "reason": f"бюджет {step.source}: нужно {estimate.api_calls} вызовов, осталось {left}",
+                    }
+                )
+                continue
+            if left is not None:
+                self.spent[step.source] = self.spent.get(step.source, 0) + estimate.api_calls
+            selected.append(step)
+            selected_estimates.append(estimate)
+        return selected, selected_estimates
+
+    def observe(self, executed_steps: List[ExecutedStep]) -> None:
+        for step in executed_steps:
+            estimate = self._estimates.get(step.id)
+            if not step.success or estimate is None or step.prefetched:
+                continue
+            mode = "cached" if estimate.api_calls == 0 else "api"
+            rows = sum(len(doc.get("rows") or []) if isinstance(doc, dict) else len(doc) for doc in step.payloads.values())
+            by_mode = self.history.setdefault(step.kind, {})
+            _observe(by_mode.setdefault(mode, _empty_histogram()), step.duration_s, rows)
+
+    def save(self) -> None:
+        path = latency_path(self.client)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(self.history, ensure_ascii=False), encoding="utf-8")
+
+    def restore(self, summary: Dict[str, Any]) -> None:
+        """Потраченный бюджет из checkpoint прерванного расследования."""
+        self.spent.update(summary.get("spent") or {})
+        self.rejected = list(summary.get("rejected") or [])
+
+    def summary(self) -> Dict[str, Any]:
+        return {"budgets": dict(self.budgets), "spent": dict(self.spent), "rejected": list(self.rejected)}
+
+
+def estimate_to_dict(estimate: StepEstimate) -> Dict[str, Any]:
+    return {
+        "step_id": estimate.step_id,
+        "kind": estimate.kind,
+        "source": estimate.source,
+        "api_calls": estimate.api_calls,
+        "cache_hit_prob": round(estimate.cache_hit_prob, 2),
+        "expected_rows": estimate.expected_rows,
+        "expected_seconds": round(estimate.expected_seconds, 2),
+        "p90_seconds": round(estimate.p90_seconds, 2),
+        "value": estimate.value,
+        "score": round(estimate.score, 3),
+    }
@@ -1,69 +1,191 @@
 from __future__ import annotations
 
-import io
-from contextlib import redirect_stderr, redirect_stdout
+import os
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from contextlib import contextmanager, nullcontext
 from pathlib import Path
-from typing import List
-
-import click
+from typing import Any, Callable, Dict, Iterator, List, Optional, TextIO, Tuple
 
+from app import tracing
+from app.orchestrator.concurrency import SOURCE_CONCURRENCY, source_semaphore  # noqa: F401
 from app.orchestrator.models import ExecutedStep, PlannedStep
+from app.orchestrator.prefetch import Prefetcher
+from app.steps import StepError, Workbook, run_step
 
+DEFAULT_MAX_WORKERS = 4
+# Сколько последних символов stdout/stderr шага держать в памяти (0 — без ограничения).
+# Переопределяется ANALYZER_CAPTURE_LIMIT или capture_limit в execute_plan.
+DEFAULT_CAPTURE_LIMIT = 64 * 1024
 
-def _invoke_direct(step: PlannedStep) -> ExecutedStep:
-    stdout_buffer = io.StringIO()
-    stderr_buffer = io.StringIO()
-    exit_code = 0
 
+class BoundedCapture:
+    """
+    Кольцевой буфер вывода шага: хранит только последние limit символов.
+
+    Шумный шаг не раздувает память, checkpoint и evidence; сколько отброшено,
+    видно по первой строке getvalue().
+    """
+
+    def __init__(self, limit: int = DEFAULT_CAPTURE_LIMIT) -> None:
+        self.limit = limit
+        self.dropped = 0
+        self._chunks: deque[str] = deque()
+        self._size = 0
+
+    def write(self, text: str) -> int:
+        if not text:
+            return 0
+        self._chunks.append(text)
+        self._size += len(text)
+        while self.limit > 0 and self._size > self.limit:
+            excess = self._size - self.limit
+            head = self._chunks[0]
+            if len(head) <= excess:
+                self._chunks.popleft()
+                cut = len(head)
+            else:
+                self._chunks[0] = head[excess:]
+                cut = excess
+            self._size -= cut
+            self.dropped += cut
+        return len(text)
+
+    def flush(self) -> None:
+        pass
+
+    def getvalue(self) -> str:
+        text = "".join(self._chunks)
+        if self.dropped:
+            return f"[... отброшено символов: {self.dropped} ...]\n{text}"
+        return text
+
+
+def capture_limit_from_env() -> int:
+    value = os.getenv("ANALYZER_CAPTURE_LIMIT", "").strip()
+    return int(value) if value else DEFAULT_CAPTURE_LIMIT
+
+
+class _ThreadLocalStream:
+    """
+    Подмена sys.stdout/sys.stderr: каждый поток пишет в свой буфер.
+
+    redirect_stdout меняет глобальный sys.stdout и при параллельных шагах
+    перемешивает вывод; здесь глобальная подмена делается один раз на план,
+    а буфер выбирается по текущему потоку.
+    """
+
+    def __init__(self, fallback: TextIO) -> None:
+        self._fallback = fallback
+        self._local = threading.local()
+
+    def _target(self) -> TextIO:
+        return getattr(self._local, "buffer", None) or self._fallback
+
+    @contextmanager
+    def capture(self, buffer: BoundedCapture) -> Iterator[None]:
+        previous = getattr(self._local, "buffer", None)
+        self._local.buffer = buffer
+        try:
+            yield
+        finally:
+            self._local.buffer = previous
+
+    def write(self, text: str) -> int:
+        return self._target().write(text)
+
+    def flush(self) -> None:
+        self._target().flush()
+
+    def isatty(self) -> bool:
+        return False
+
+    @property
+    def encoding(self) -> str:
+        return getattr(self._fallback, "encoding", None) or "utf-8"
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._target(), name)
+
+
+@contextmanager
+def _thread_local_std_streams() -> Iterator[Tuple[_ThreadLocalStream, _ThreadLocalStream]]:
+    if isinstance(sys.stdout, _ThreadLocalStream) and isinstance(sys.stderr, _ThreadLocalStream):
+        # Вложенный execute_plan: переиспользуем уже установленную подмену.
+        yield sys.stdout, sys.stderr
+        return
+    original_stdout, original_stderr = sys.stdout, sys.stderr
+    stdout, stderr = _ThreadLocalStream(original_stdout), _ThreadLocalStream(original_stderr)
+    sys.stdout, sys.stderr = stdout, stderr  # type: ignore[assignment]
     try:
-        with redirect_stdout(stdout_buffer), redirect_stderr(stderr_buffer):
-            if step.kind == "analyze_sources":
-                from app.cli import analyze_sources_cmd
+        yield stdout, stderr
+    finally:
+        sys.stdout, sys.stderr = original_stdout, original_stderr
 
-                analyze_sources_cmd(**step.params)
-            elif step.kind == "analyze_pages":
-                from app.cli import analyze_pages_cmd
 
-                analyze_pages_cmd(**step.params)
-            elif step.kind == "analyze_pages_by_source":
-                from app.cli import analyze_pages_by_source_cmd
+def install_std_streams() -> None:
+    """
+    Подмена sys.stdout/sys.stderr на всё время жизни процесса (serve).
 
-                analyze_pages_by_source_cmd(**step.params)
-            elif step.kind == "analyze_goals_by_source":
-                from app.cli import analyze_goals_by_source_cmd
+    Подмену на время одного плана снимает тот план, что завершился первым,
+    и вывод параллельного плана уходит в настоящий stdout; установленную
+    заранее execute_plan переиспользует и не снимает.
+    """
+    if not isinstance(sys.stdout, _ThreadLocalStream):
+        sys.stdout = _ThreadLocalStream(sys.stdout)  # type: ignore[assignment]
+    if not isinstance(sys.stderr, _ThreadLocalStream):
+        sys.stderr = _ThreadLocalStream(sys.stderr)  # type: ignore[assignment]
 
-                analyze_goals_by_source_cmd(**step.params)
-            elif step.kind == "analyze_goals_by_page":
-                from app.cli import analyze_goals_by_page_cmd
 
-                analyze_goals_by_page_cmd(**step.params)
-            elif step.kind == "analyze_gsc_queries":
-                from app.cli import analyze_gsc_queries_cmd
+def uninstall_std_streams() -> None:
+    if isinstance(sys.stdout, _ThreadLocalStream):
+        sys.stdout = sys.stdout._fallback
+    if isinstance(sys.stderr, _ThreadLocalStream):
+        sys.stderr = sys.stderr._fallback
 
-                analyze_gsc_queries_cmd(**step.params)
-            elif step.kind == "analyze_gsc_pages":
-                from app.cli import analyze_gsc_pages_cmd
 
-                analyze_gsc_pages_cmd(**step.params)
-            elif step.kind == "analyze_ym_webmaster_queries":
-                from app.cli import analyze_ym_webmaster_queries_cmd
+def _summary(workbook: Workbook, prefetched: bool) -> str:
+    suffix = (", из prefetch" if prefetched else "") + (", без пересчёта" if workbook.reused else "")
+    return f"Workbook: {workbook.path.name} (строк: {len(workbook.rows)}{suffix})\n"
 
-                analyze_ym_webmaster_queries_cmd(**step.params)
-            elif step.kind == "ym_webmaster_indexing":
-                from app.cli import ym_webmaster_indexing_cmd
 
-                ym_webmaster_indexing_cmd(**step.params)
-            else:
-                raise RuntimeError(f"Unsupported planned step kind: {step.kind}")
-    except click.exceptions.Exit as exc:
-        exit_code = int(exc.exit_code or 0)
-    except SystemExit as exc:
-        exit_code = int(exc.code or 0)
+def _invoke_direct(
+    step: PlannedStep,
+    stdout: _ThreadLocalStream,
+    stderr: _ThreadLocalStream,
+    prefetched: Optional[Future] = None,
+    capture_limit: int = DEFAULT_CAPTURE_LIMIT,
+) -> ExecutedStep:
+    """
+    Выполняет шаг через app.steps: workbook остаётся в памяти (payloads),
+    анализатору не нужно перечитывать JSON с диска. prefetched — уже
+    запущенная prefetcher-ом выборка того же шага.
+    """
+    stdout_buffer = BoundedCapture(capture_limit)
+    stderr_buffer = BoundedCapture(capture_limit)
+    exit_code = 0
+    payloads: Dict[str, Any] = {}
+    inputs: List[str] = []
+
+    started = time.perf_counter()
+    try:
+        with stdout.capture(stdout_buffer), stderr.capture(stderr_buffer):
+            workbook = prefetched.result() if prefetched is not None else run_step(step.kind, step.params)
+        payloads[str(workbook.path)] = workbook.document()
+        inputs = list(workbook.inputs)
+        stdout_buffer.write(_summary(workbook, prefetched is not None))
+    except StepError as exc:
+        exit_code = 1
+        stderr_buffer.write(str(exc))
     except Exception as exc:  # pragma: no cover - defensive path
         exit_code = 1
         stderr_buffer.write(str(exc))
 
-    artifacts = [artifact for artifact in step.expected_artifacts if Path(artifact).exists()]
+    artifacts = [artifact for artifact in step.expected_artifacts if artifact in payloads or Path(artifact).exists()]
+    artifacts.extend(path for path in payloads if path not in artifacts)
     return ExecutedStep(
         id=step.id,
         title=step.title,
@@ -75,8 +197,90 @@ def _invoke_direct(step: PlannedStep) -> ExecutedStep:
         artifacts=artifacts,
         source=step.source,
         params=step.params,
+        duration_s=time.perf_counter() - started,
+        prefetched=prefetched is not None,
+        inputs=inputs,
+        payloads=payloads,
+    )
+
+
+def _skipped(step: PlannedStep, reason: str) -> ExecutedStep:
+    return ExecutedStep(
+        id=step.id,
+        title=step.title,
+        kind=step.kind,
+        success=False,
+        exit_code=1,
+        stdout="",
+        stderr=reason,
+        artifacts=[],
+        source=step.source,
+        params=step.params,
     )
 
 
-def execute_plan(plan: List[PlannedStep]) -> List[ExecutedStep]:
-    return [_invoke_direct(step) for step in plan]
+def execute_plan(
+    plan: List[PlannedStep],
+    max_workers: Optional[int] = None,
+    prefetcher: Optional[Prefetcher] = None,
+    on_step: Optional[Callable[[ExecutedStep], None]] = None,
+    capture_limit: Optional[int] = None,
+) -> List[ExecutedStep]:
+    """
+    Выполняет шаги плана с учётом depends_on; независимые шаги идут параллельно.
+
+    Зависимости на шаги вне плана (прошлые раунды) считаются выполненными.
+    Шаг с упавшей зависимостью не запускается. Одновременных шагов на один
+    источник не больше SOURCE_CONCURRENCY (вместе с prefetch). Результаты — в порядке плана.
+    Если шаг уже запрошен prefetcher-ом, берётся его результат.
+    on_step вызывается в вызывающем потоке по мере завершения шагов (checkpoint).
+    capture_limit: сколько последних символов вывода шага хранить
+    (по умолчанию ANALYZER_CAPTURE_LIMIT или DEFAULT_CAPTURE_LIMIT).
+    """
+    if not plan:
+        return []
+    limit = capture_limit if capture_limit is not None else capture_limit_from_env()
+    workers = max(1, max_workers or DEFAULT_MAX_WORKERS)
+    plan_ids = {step.id for step in plan}
+
+    def run(step: PlannedStep, stdout: _ThreadLocalStream, stderr: _ThreadLocalStream) -> ExecutedStep:
+        prefetched = prefetcher.take(step) if prefetcher is not None else None
+        # Слот источника держит поток prefetch-а; ожидание его результата со своим слотом
+        # могло бы занять все слоты и не дать выборке стартовать.
+        slot = nullcontext() if prefetched is not None else source_semaphore(step.source)
+        with slot, tracing.span("executor.step", id=step.id, kind=step.kind, source=step.source) as span:
+            executed = _invoke_direct(step, stdout, stderr, prefetched, limit)
+            span.set("success", executed.success)
+            span.set("prefetched", executed.prefetched)
+            return executed
+
+    results: Dict[str, ExecutedStep] = {}
+    pending = list(plan)
+    running: Dict[Future, PlannedStep] = {}
+    with (
+        tracing.span("executor.plan", steps=len(plan)),
+        _thread_local_std_streams() as (stdout, stderr),
+        ThreadPoolExecutor(max_workers=workers) as pool,
+    ):
+        while pending or running:
+            for step in list(pending):
+                deps = [dep for dep in step.depends_on if dep in plan_ids]
+                if any(dep in results and not results[dep].success for dep in deps):
+                    results[step.id] = _skipped(step, f"Пропущен: не выполнена зависимость ({', '.join(deps)})")
+                    pending.remove(step)
+                    if on_step is not None:
+                        on_step(results[step.id])
+                elif all(dep in results for dep in deps):
+                    running[pool.submit(tracing.in_context(run), step, stdout, stderr)] = step
+                    pending.remove(step)
+            if not running:
+                if pending:
+                    raise RuntimeError("Циклические зависимости в плане: " + ", ".join(step.id for step in pending))
+                break
+            done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+            for future in done:
+                step = running.pop(future)
+                results[step.id] = future.result()
+                if on_step is not None:
+                    on_step(results[step.id])
+    return [results[step.id] for step in plan]
@@ -1,10 +1,10 @@
 from __future__ import annotations
 
-import json
 import os
 from pathlib import Path
 from typing import Any, Dict, List
 
+from app.cache_io import read_json, write_json
 from app.config import ClientConfig
 from app.metrika_client import MetrikaClient, normalize_goals_list
 from app.orchestrator.models import GoalSelection
@@ -63,7 +63,7 @@ def _load_cached_goals(client: str) -> List[Dict[str, Any]] | None:
     if not path.exists():
         return None
     try:
-        data = json.loads(path.read_text(encoding="utf-8"))
+        data = read_json(path)
     except Exception:
         return None
     return data if isinstance(data, list) else None
@@ -80,14 +80,8 @@ def _fetch_goals(client: str, cfg: ClientConfig) -> List[Dict[str, Any]] | None:
 
     cache_dir = Path("data_cache") / client
     cache_dir.mkdir(parents=True, exist_ok=True)
-    (cache_dir / "metrika_goals_list_raw.json").write_text(
-        json.dumps(raw, ensure_ascii=False, indent=2),
-        encoding="utf-8",
-    )
-    (cache_dir / "metrika_goals_list_norm.json").write_text(
-        json.dumps(normalized, ensure_ascii=False, indent=2),
-        encoding="utf-8",
-    )
+    write_json(cache_dir / "metrika_goals_list_raw.json", raw)
+    write_json(cache_dir / "metrika_goals_list_norm.json", normalized)
     return normalized
 
 
@@ -34,12 +34,14 @@ def parse_intent(query: str) -> InvestigationIntent:
     page_markers = ["страниц", "page", "landing", "лендинг", "входн"]
     traffic_markers = ["трафик", "посещ", "источник", "канал", "traffic"]
     indexing_markers = ["индексац", "excluded", "robots", "404", "noindex"]
+    timing_markers = ["когда", "с какого", "какого числа", "в какой день", "дата", "when"]
 
     wants_seo = any(marker in lowered for marker in seo_markers)
     wants_conversions = any(marker in lowered for marker in conversion_markers)
     wants_pages = wants_seo or any(marker in lowered for marker in page_markers)
     wants_traffic = True if not lowered.strip() else wants_seo or any(marker in lowered for marker in traffic_markers) or wants_conversions
     wants_indexing = wants_seo or any(marker in lowered for marker in indexing_markers)
+    wants_timing = any(marker in lowered for marker in timing_markers)
 
     direction = "unknown"
     if any(token in lowered for token in ["упал", "упали", "падени", "сниз", "просел", "потер"]):
@@ -67,4 +69,5 @@ def parse_intent(query: str) -> InvestigationIntent:
         direction=direction,
         primary_focus=primary_focus,
         period_note="auto-resolved",
+        wants_timing=wants_timing,
     )
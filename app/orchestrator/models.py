@@ -17,6 +17,7 @@ class InvestigationIntent:
     direction: str
     primary_focus: str
     period_note: str
+    wants_timing: bool = False
 
 
 @dataclass(frozen=True)
@@ -54,6 +55,7 @@ class PlannedStep:
     params: Dict[str, Any]
     source: str
     expected_artifacts: List[str]
+    depends_on: List[str] = field(default_factory=list)
 
 
 @dataclass(frozen=True)
@@ -68,6 +70,12 @@ class ExecutedStep:
     artifacts: List[str]
     source: str
     params: Dict[str, Any]
+    duration_s: float = 0.0
+    prefetched: bool = False
+    # Файлы data_cache/, из которых посчитаны artifacts (снимаются в хранилище вместе с ними).
+    inputs: List[str] = field(default_factory=list)
+    # Содержимое JSON-артефактов по пути; в evidence не сериализуется.
+    payloads: Dict[str, Any] = field(default_factory=dict, compare=False, repr=False)
 
 
 @dataclass(frozen=True)
@@ -79,3 +87,6 @@ class InvestigationReport:
     evidence_json_path: str
     evidence_txt_path: str
     summary: str
+    trace_path: str = ""
+    # Отчёт прошлого расследования с теми же входами (build_graph), новый не создавался.
+    reused: bool = False
@@ -2,12 +2,14 @@ from __future__ import annotations
 
 import re
 from pathlib import Path
-from typing import Any, Dict, List, Set
+from typing import Any, Dict, List, Optional, Set
 
+from app.analysis_changepoints import workbook_filename as changepoints_workbook_filename
 from app.analysis_goals import workbook_filename as goals_workbook_filename
 from app.analysis_gsc import workbook_filename as gsc_workbook_filename
 from app.analysis_pages import _slugify_for_filename
 from app.analysis_ym_webmaster import workbook_filename as ymw_workbook_filename
+from app.orchestrator.cost_model import INITIAL_STEP_VALUES, PRIORITY_VALUES, CostModel
 from app.orchestrator.models import (
     ExecutedStep,
     GoalSelection,
@@ -137,6 +139,7 @@ def _build_step(
                 "goal_id": goal_id,
                 "limit": limit,
                 "refresh": refresh,
+                "demote_noise": True,
                 "format": "insights",
             },
             expected_artifacts=[
@@ -161,6 +164,7 @@ def _build_step(
                 "goal_id": goal_id,
                 "limit": limit,
                 "refresh": refresh,
+                "demote_noise": True,
                 "format": "insights",
             },
             expected_artifacts=[
@@ -181,6 +185,7 @@ def _build_step(
                 "p2_end": period.p2_end,
                 "limit": 1000,
                 "refresh": refresh,
+                "demote_noise": True,
                 "format": "insights",
             },
             expected_artifacts=[str(Path("data_cache") / client / gsc_workbook_filename("queries", period.p1_start, period.p1_end, period.p2_start, period.p2_end))],
@@ -199,6 +204,7 @@ def _build_step(
                 "p2_end": period.p2_end,
                 "limit": 1000,
                 "refresh": refresh,
+                "demote_noise": True,
                 "format": "insights",
             },
             expected_artifacts=[str(Path("data_cache") / client / gsc_workbook_filename("pages", period.p1_start, period.p1_end, period.p2_start, period.p2_end))],
@@ -221,6 +227,25 @@ def _build_step(
             },
             expected_artifacts=[str(Path("data_cache") / client / ymw_workbook_filename(period.p1_start, period.p1_end, period.p2_start, period.p2_end))],
         )
+    if kind == "detect_changepoints":
+        # Ряды покрывают оба периода, чтобы найти дату, с которой начался сдвиг.
+        date1 = min(period.p1_start, period.p2_start)
+        date2 = max(period.p1_end, period.p2_end)
+        return PlannedStep(
+            id=f"round-{round_number}-changepoints-pages",
+            title="Поиск даты сдвига по страницам",
+            kind=kind,
+            source="metrika",
+            params={
+                "client": client,
+                "date1": date1,
+                "date2": date2,
+                "kind": "pages",
+                "top": limit,
+                "refresh": refresh,
+            },
+            expected_artifacts=[str(Path("data_cache") / client / changepoints_workbook_filename("pages", date1, date2))],
+        )
     if kind == "ym_webmaster_indexing":
         return PlannedStep(
             id=f"round-{round_number}-ym-indexing",
@@ -250,6 +275,7 @@ def build_initial_plan(
     goal_selection: GoalSelection,
     refresh: bool,
     limit: int = 50,
+    cost_model: Optional[CostModel] = None,
 ) -> List[PlannedStep]:
     plan: List[PlannedStep] = []
     if availability.metrika:
@@ -267,6 +293,10 @@ def build_initial_plan(
                     round_number=1,
                 )
             )
+        if intent.wants_timing:
+            plan.append(_build_step(kind="detect_changepoints", client=client, period=period, goal_selection=goal_selection, refresh=refresh, limit=limit, round_number=1))
+    if cost_model is not None:
+        plan, _ = cost_model.select(plan, INITIAL_STEP_VALUES)
     return plan
 
 
@@ -281,9 +311,11 @@ def build_followup_plan(
     executed_steps: List[ExecutedStep],
     round_number: int,
     limit: int = 50,
+    cost_model: Optional[CostModel] = None,
 ) -> List[PlannedStep]:
     executed_kinds: Set[str] = {step.kind for step in executed_steps}
     plan: List[PlannedStep] = []
+    values: Dict[str, float] = {}
     for recommendation in analysis.get("recommended_next_steps", []):
         kind = str(recommendation.get("kind", "")).strip()
         if not kind or kind in executed_kinds:
@@ -296,6 +328,7 @@ def build_followup_plan(
             continue
         if kind.startswith("analyze_goal") and goal_selection.goal_id is None:
             continue
+        values[kind] = PRIORITY_VALUES.get(str(recommendation.get("priority", "")), 1.0)
         plan.append(
             _build_step(
                 kind=kind,
@@ -307,6 +340,8 @@ def build_followup_plan(
                 round_number=round_number,
             )
         )
+    if cost_model is not None:
+        plan, _ = cost_model.select(plan, values)
     return plan
 
 
@@ -0,0 +1,138 @@
+from __future__ import annotations
+
+import json
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List, Optional, Set
+
+from app import tracing
+from app.orchestrator.concurrency import source_semaphore
+from app.orchestrator.models import (
+    GoalSelection,
+    InvestigationAvailability,
+    InvestigationIntent,
+    InvestigationPeriod,
+    PlannedStep,
+)
+from app.orchestrator.planner import _build_step
+from app.steps import Workbook, run_step
+
+# Фоновые выборки не должны отъедать квоты у шагов текущего раунда.
+PREFETCH_MAX_WORKERS = 2
+
+
+def predict_followup_kinds(
+    intent: InvestigationIntent,
+    availability: InvestigationAvailability,
+    goal_selection: GoalSelection,
+) -> List[str]:
+    """
+    Шаги, которые analyzer почти наверняка порекомендует в следующих раундах.
+
+    Повторяет условия recommended_next_steps, но по намерению, а не по данным.
+    SEO-шаги греем только для явных SEO-запросов: по одному падению трафика
+    угадывать поисковую причину слишком дорого по квотам GSC и Вебмастера.
+    """
+    kinds: List[str] = []
+    has_goal = intent.wants_conversions and goal_selection.goal_id is not None
+    if has_goal and availability.metrika:
+        kinds.append("analyze_goals_by_source")
+        if intent.direction != "up":
+            kinds.append("analyze_goals_by_page")
+
+    seo_likely = intent.wants_seo
+    if seo_likely and availability.metrika:
+        kinds.append("analyze_pages_by_source")
+    if seo_likely and availability.gsc:
+        kinds.extend(["analyze_gsc_queries", "analyze_gsc_pages"])
+    if seo_likely and availability.ym_webmaster:
+        kinds.append("analyze_ym_webmaster_queries")
+    if (seo_likely or intent.wants_indexing) and availability.ym_webmaster:
+        kinds.append("ym_webmaster_indexing")
+    return kinds
+
+
+def predict_followup_steps(
+    *,
+    client: str,
+    intent: InvestigationIntent,
+    period: InvestigationPeriod,
+    availability: InvestigationAvailability,
+    goal_selection: GoalSelection,
+    refresh: bool,
+    planned_kinds: Set[str],
+    limit: int = 50,
+) -> List[PlannedStep]:
+    return [
+        _build_step(
+            kind=kind,
+            client=client,
+            period=period,
+            goal_selection=goal_selection,
+            refresh=refresh,
+            limit=limit,
+            round_number=0,
+        )
+        for kind in predict_followup_kinds(intent, availability, goal_selection)
+        if kind not in planned_kinds
+    ]
+
+
+def _run_limited(step: PlannedStep) -> Workbook:
+    """Фоновая выборка занимает слот источника, как шаг executor-а."""
+    with source_semaphore(step.source):
+        return run_step(step.kind, step.params)
+
+
+def step_key(step: PlannedStep) -> str:
+    """Ключ шага без id/раунда: одинаковые kind + params дают одинаковые данные."""
+    return step.kind + ":" + json.dumps(step.params, sort_keys=True, ensure_ascii=False, default=str)
+
+
+class Prefetcher:
+    """
+    Спекулятивно выполняет вероятные шаги следующих раундов в фоне.
+
+    executor забирает готовый (или ещё идущий) результат через take(); всё,
+    что не пригодилось, отменяется в close(). Ошибка prefetch-шага отдаётся
+    как ошибка самого шага — повторный запрос с теми же параметрами дал бы её же.
+    """
+
+    def __init__(self, max_workers: int = PREFETCH_MAX_WORKERS) -> None:
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="prefetch")
+        self._futures: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self._closed = False
+        self.stats: Dict[str, int] = {"submitted": 0, "hits": 0, "cancelled": 0, "unused": 0}
+
+    def submit(self, steps: List[PlannedStep]) -> None:
+        with self._lock:
+            if self._closed:
+                return
+            for step in steps:
+                key = step_key(step)
+                if key in self._futures:
+                    continue
+                self._futures[key] = self._pool.submit(tracing.in_context(_run_limited), step)
+                self.stats["submitted"] += 1
+
+    def take(self, step: PlannedStep) -> Optional[Future]:
+        with self._lock:
+            future = self._futures.pop(step_key(step), None)
+        if future is None or future.cancelled():
+            return None
+        self.stats["hits"] += 1
+        return future
+
+    def close(self) -> Dict[str, int]:
+        with self._lock:
+            self._closed = True
+            for future in self._futures.values():
+                if future.cancel():
+                    self.stats["cancelled"] += 1
+                else:
+                    self.stats["unused"] += 1
+            self._futures.clear()
+        # Запущенные выборки (не больше max_workers) дожидаемся: они пишут кэш в data_cache/<client>/.
+        self._pool.shutdown(wait=True, cancel_futures=True)
+        return dict(self.stats)
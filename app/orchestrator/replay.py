@@ -0,0 +1,272 @@
+"""
+Офлайн-повтор расследования по evidence.json и хранилищу артефактов.
+
+Шаги восстанавливаются из evidence["executions"]: вывод — из logs,
+workbook-и — из snapshots (sha256 в reports/_store/), поэтому ни API,
+ни data_cache/ не нужны. Заново считаются только analyzer и отчёт, и
+analyzer можно подменить: так новые правила прогоняются на истории
+(backtest) до того, как попадут в боевой код.
+
+    investigate demo --replay 20250101-120000 --analyzer my_rules:analyze
+    investigate-backtest --analyzer my_rules:analyze
+"""
+
+from __future__ import annotations
+
+import importlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, fields
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from app.artifact_store import ArtifactStore
+from app.orchestrator.analyzer import analyze_results
+from app.orchestrator.checkpoint import context_from_dict
+from app.orchestrator.models import (
+    ExecutedStep,
+    GoalSelection,
+    InvestigationAvailability,
+    InvestigationIntent,
+    InvestigationPeriod,
+    InvestigationReport,
+)
+from app.orchestrator.report_generator import _allocate_report_dir, write_report_files
+from app.orchestrator.snapshots import LOG_STREAMS, execution_records, read_step_log
+
+EVIDENCE_FILE = "evidence.json"
+
+Analyzer = Callable[..., Dict[str, Any]]
+
+
+@dataclass(frozen=True)
+class ReplayBundle:
+    client: str
+    run_id: str
+    query: str
+    intent: InvestigationIntent
+    period: InvestigationPeriod
+    availability: InvestigationAvailability
+    goal_selection: GoalSelection
+    executed_steps: List[ExecutedStep]
+    analysis: Dict[str, Any]
+    evidence: Dict[str, Any]
+
+
+def load_analyzer(spec: str = "") -> Analyzer:
+    """
+    spec: "module:function" с той же сигнатурой, что у analyze_results;
+    пустая строка — штатный analyzer.
+    """
+    if not spec:
+        return analyze_results
+    module_name, _, attr = spec.partition(":")
+    if not module_name or not attr:
+        raise ValueError(f"Analyzer задаётся как module:function, получено: {spec}")
+    analyzer = getattr(importlib.import_module(module_name), attr, None)
+    if not callable(analyzer):
+        raise ValueError(f"В модуле {module_name} нет функции {attr}")
+    return analyzer
+
+
+def evidence_path(client: str, run_id: str) -> Path:
+    return Path("reports") / client / run_id / EVIDENCE_FILE
+
+
+def _restore_step(record: Dict[str, Any], store: ArtifactStore) -> ExecutedStep:
+    names = {f.name for f in fields(ExecutedStep)}
+    values = {key: value for key, value in record.items() if key in names}
+    logs = record.get("logs") or {}
+    for stream in LOG_STREAMS:
+        if stream not in values:
+            values[stream] = read_step_log(store, logs[stream]) if stream in logs else ""
+    snapshots = record.get("snapshots") or {}
+    payloads: Dict[str, Any] = {}
+    for path in values.get("artifacts") or []:
+        digest = snapshots.get(path)
+        if digest is None:
+            # evidence до хранилища артефактов: analyzer прочитает файл с диска, если он ещё есть.
+            continue
+        try:
+            payloads[path] = json.loads(store.get_text(digest))
+        except ValueError:
+            continue
+    return ExecutedStep(**{**values, "payloads": payloads})
+
+
+def load_bundle(client: str, run_id: str) -> ReplayBundle:
+    path = evidence_path(client, run_id)
+    if not path.exists():
+        raise FileNotFoundError(f"Evidence not found: {path}")
+    evidence = json.loads(path.read_text(encoding="utf-8"))
+    store = ArtifactStore(Path(evidence["artifact_store"])) if evidence.get("artifact_store") else ArtifactStore()
+    intent, period, availability, goal_selection = context_from_dict(evidence)
+    return ReplayBundle(
+        client=client,
+        run_id=run_id,
+        query=evidence["query"],
+        intent=intent,
+        period=period,
+        availability=availability,
+        goal_selection=goal_selection,
+        executed_steps=[_restore_step(record, store) for record in evidence.get("executions") or []],
+        analysis=evidence.get("analysis") or {},
+        evidence=evidence,
+    )
+
+
+def replay_analysis(bundle: ReplayBundle, analyzer: Optional[Analyzer] = None) -> Dict[str, Any]:
+    """
+    Один проход analyzer-а по всем шагам расследования: это и был последний
+    раунд оригинала. Цикл (раунды, причина остановки) берётся из evidence.
+    """
+    if not any(step.success and step.artifacts for step in bundle.executed_steps):
+        raise ValueError(f"В расследовании {bundle.run_id} нет usable artifacts, повторять нечего")
+    analysis = (analyzer or analyze_results)(
+        client=bundle.client,
+        query=bundle.query,
+        period=bundle.period,
+        intent=bundle.intent,
+        availability=bundle.availability,
+        goal_selection=bundle.goal_selection,
+        executed_steps=bundle.executed_steps,
+    )
+    analysis["loop"] = {**(bundle.analysis.get("loop") or {}), "replay_of": bundle.run_id}
+    return analysis
+
+
+def replay_investigation(
+    client: str,
+    run_id: str,
+    analyzer: Optional[Analyzer] = None,
+) -> tuple[InvestigationReport, Dict[str, Any], List[ExecutedStep]]:
+    """Новый отчёт reports/<client>/<new run_id>/ по данным расследования run_id, без сети."""
+    bundle = load_bundle(client, run_id)
+    analysis = replay_analysis(bundle, analyzer)
+    store = ArtifactStore()
+    evidence = {
+        # Первым ключом: list_runs отличает повторы по началу файла.
+        "replay_of": run_id,
+        **{key: value for key, value in bundle.evidence.items() if key not in ("replay_of", "trace", "executions", "analysis")},
+        "artifact_store": str(store.root),
+        "executions": execution_records(bundle.executed_steps, store),
+        "analysis": analysis,
+    }
+    new_run_id, _ = _allocate_report_dir(client)
+    report = write_report_files(client=client, analysis=analysis, evidence=evidence, run_id=new_run_id)
+    return report, analysis, bundle.executed_steps
+
+
+def list_runs(clients: Optional[List[str]] = None) -> List[Tuple[str, str]]:
+    """(client, run_id) всех сохранённых расследований; повторы (replay_of) не входят."""
+    root = Path("reports")
+    if not clients:
+        clients = sorted(path.name for path in root.glob("*") if path.is_dir() and not path.name.startswith("_"))
+    runs: List[Tuple[str, str]] = []
+    for client in clients:
+        for path in sorted((root / client).glob(f"*/{EVIDENCE_FILE}")):
+            # replay_of — первый ключ evidence повтора: весь файл ради него не разбираем.
+            with open(path, encoding="utf-8") as f:
+                head = f.read(64)
+            if '"replay_of"' not in head:
+                runs.append((client, path.parent.name))
+    return runs
+
+
+def _titles(items: List[Dict[str, Any]]) -> List[str]:
+    return [str(item.get("title", "")) for item in items or []]
+
+
+def compare_analyses(before: Dict[str, Any], after: Dict[str, Any]) -> Dict[str, Any]:
+    """Что поменялось в выводах: статус причины, итог, гипотезы и рекомендации."""
+    before_hypotheses, after_hypotheses = _titles(before.get("hypotheses")), _titles(after.get("hypotheses"))
+    before_next = [item.get("kind") for item in before.get("recommended_next_steps") or []]
+    after_next = [item.get("kind") for item in after.get("recommended_next_steps") or []]
+    diff = {
+        "root_cause_status": [before.get("root_cause_status"), after.get("root_cause_status")],
+        "summary_changed": before.get("summary") != after.get("summary"),
+        "hypotheses_added": [title for title in after_hypotheses if title not in before_hypotheses],
+        "hypotheses_removed": [title for title in before_hypotheses if title not in after_hypotheses],
+        "next_steps_added": [kind for kind in after_next if kind not in before_next],
+        "next_steps_removed": [kind for kind in before_next if kind not in after_next],
+    }
+    diff["changed"] = bool(
+        diff["root_cause_status"][0] != diff["root_cause_status"][1]
+        or diff["summary_changed"]
+        or diff["hypotheses_added"]
+        or diff["hypotheses_removed"]
+        or diff["next_steps_added"]
+        or diff["next_steps_removed"]
+    )
+    return diff
+
+
+def backtest_run(client: str, run_id: str, analyzer_spec: str = "") -> Dict[str, Any]:
+    entry: Dict[str, Any] = {"client": client, "run_id": run_id}
+    try:
+        bundle = load_bundle(client, run_id)
+        analysis = replay_analysis(bundle, load_analyzer(analyzer_spec))
+    except Exception as e:
+        entry.update({"success": False, "error": str(e)[:500]})
+        return entry
+    entry.update({"success": True, "query": bundle.query, **compare_analyses(bundle.analysis, analysis)})
+    return entry
+
+
+def _render_backtest(summary: Dict[str, Any]) -> str:
+    lines = ["# Backtest analyzer-а", "", f"Analyzer: `{summary['analyzer']}`", ""]
+    lines.append(f"Расследований: {summary['runs']}, изменилось: {summary['changed']}, ошибок: {summary['failed']}")
+    lines.append("")
+    lines.append("| client | run_id | статус | + гипотезы | − гипотезы |")
+    lines.append("|---|---|---|---|---|")
+    for entry in summary["results"]:
+        if not entry["success"]:
+            lines.append(f"| {entry['client']} | {entry['run_id']} | ошибка: {entry['error']} | | |")
+        elif entry["changed"]:
+            before, after = entry["root_cause_status"]
+            status = before if before == after else f"{before} → {after}"
+            added = "; ".join(entry["hypotheses_added"]).replace("|", "/")
+            removed = "; ".join(entry["hypotheses_removed"]).replace("|", "/")
+            lines.append(f"| {entry['client']} | {entry['run_id']} | {status} | {added} | {removed} |")
+    return "\n".join(lines) + "\n"
+
+
+def run_backtest(clients: Optional[List[str]] = None, analyzer_spec: str = "", workers: int = 0) -> Dict[str, Any]:
+    """
+    Повторяет все сохранённые расследования с analyzer_spec и сравнивает выводы
+    с исходными. Расследования делятся между процессами (analyzer задаётся
+    строкой, чтобы его можно было импортировать в каждом). Пишет сводку
+    reports/_backtest/<backtest_id>/summary.{json,md}.
+    """
+    load_analyzer(analyzer_spec)  # ошибка в spec — сразу, а не в каждом процессе
+    runs = list_runs(clients)
+    max_workers = max(1, min(workers or os.cpu_count() or 1, len(runs) or 1))
+    if max_workers == 1:
+        results = [backtest_run(client, run_id, analyzer_spec) for client, run_id in runs]
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            results = list(
+                pool.map(
+                    backtest_run,
+                    [client for client, _ in runs],
+                    [run_id for _, run_id in runs],
+                    [analyzer_spec] * len(runs),
+                    chunksize=max(1, len(runs) // (max_workers * 4)),
+                )
+            )
+
+    backtest_id, backtest_dir = _allocate_report_dir("_backtest")
+    summary = {
+        "backtest_id": backtest_id,
+        "analyzer": analyzer_spec or "app.orchestrator.analyzer:analyze_results",
+        "runs": len(runs),
+        "workers": max_workers,
+        "changed": sum(1 for entry in results if entry.get("changed")),
+        "failed": sum(1 for entry in results if not entry["success"]),
+        "results": results,
+    }
+    (backtest_dir / "summary.json").write_text(json.dumps(summary, ensure_ascii=False, indent=2), encoding="utf-8")
+    (backtest_dir / "summary.md").write_text(_render_backtest(summary), encoding="utf-8")
+    summary["summary_dir"] = str(backtest_dir)
+    return summary
@@ -4,7 +4,7 @@ import html
 import json
 from datetime import datetime, timezone
 from pathlib import Path
-from typing import Any, Dict, List
+from typing import Any, Dict, Iterable, List, Optional, TextIO
 
 from app.orchestrator.models import InvestigationReport
 
@@ -13,6 +13,26 @@ def _run_id() -> str:
     return datetime.now(timezone.utc).strftime("%Y%m%d-%H%M%S")
 
 
+def _allocate_report_dir(client: str) -> tuple[str, Path]:
+    """
+    Новая папка reports/<client>/<run_id>/.
+
+    Несколько расследований в одну секунду (batch) получают суффиксы -2, -3, ...;
+    mkdir без exist_ok делает выбор атомарным и между процессами.
+    """
+    base = _run_id()
+    parent = Path("reports") / client
+    parent.mkdir(parents=True, exist_ok=True)
+    attempt = 1
+    while True:
+        run_id = base if attempt == 1 else f"{base}-{attempt}"
+        try:
+            (parent / run_id).mkdir()
+            return run_id, parent / run_id
+        except FileExistsError:
+            attempt += 1
+
+
 def _render_markdown(analysis: Dict[str, Any]) -> str:
     lines: List[str] = []
     lines.append(f"# Расследование: {analysis['client']}")
@@ -192,10 +212,45 @@ def _render_html(analysis: Dict[str, Any]) -> str:
 """
 
 
-def write_report_files(client: str, analysis: Dict[str, Any], evidence: Dict[str, Any]) -> InvestigationReport:
-    run_id = _run_id()
-    report_dir = Path("reports") / client / run_id
-    report_dir.mkdir(parents=True, exist_ok=True)
+def _write_evidence(f: TextIO, evidence: Dict[str, Any]) -> None:
+    """
+    Пишет evidence.json потоково, не собирая весь документ в одну строку.
+
+    Списки и генераторы верхнего уровня (executions, plan, ...) пишутся по
+    элементу на строку: generator-у не нужно держать все записи в памяти.
+    """
+    encoder = json.JSONEncoder(ensure_ascii=False, default=str)
+    f.write("{")
+    for index, (key, value) in enumerate(evidence.items()):
+        f.write(",\n" if index else "\n")
+        f.write(f"  {json.dumps(key, ensure_ascii=False)}: ")
+        if isinstance(value, (str, bytes, dict)) or not isinstance(value, Iterable):
+            for chunk in encoder.iterencode(value):
+                f.write(chunk)
+            continue
+        f.write("[")
+        empty = True
+        for item in value:
+            f.write("\n    " if empty else ",\n    ")
+            for chunk in encoder.iterencode(item):
+                f.write(chunk)
+            empty = False
+        f.write("]" if empty else "\n  ]")
+    f.write("\n}\n")
+
+
+def write_report_files(
+    client: str,
+    analysis: Dict[str, Any],
+    evidence: Dict[str, Any],
+    run_id: Optional[str] = None,
+) -> InvestigationReport:
+    """run_id: папка, уже выделенная под расследование (там лежит checkpoint)."""
+    if run_id is None:
+        run_id, report_dir = _allocate_report_dir(client)
+    else:
+        report_dir = Path("reports") / client / run_id
+        report_dir.mkdir(parents=True, exist_ok=True)
 
     markdown_path = report_dir / "report.md"
     html_path = report_dir / "report.html"
@@ -204,7 +259,8 @@ def write_report_files(client: str, analysis: Dict[str, Any], evidence: Dict[str
 
     markdown_path.write_text(_render_markdown(analysis), encoding="utf-8")
     html_path.write_text(_render_html(analysis), encoding="utf-8")
-    evidence_json_path.write_text(json.dumps(evidence, ensure_ascii=False, indent=2), encoding="utf-8")
+    with evidence_json_path.open("w", encoding="utf-8") as f:
+        _write_evidence(f, evidence)
 
     evidence_lines = [f"query={analysis['query']}", f"period={analysis['period']['description']}"]
     for step in analysis["executed_steps"]:
@@ -0,0 +1,61 @@
+"""
+Записи evidence["executions"] со ссылками в хранилище артефактов.
+
+Вместо текста stdout/stderr и путей data_cache/, которые может переписать
+следующий --refresh, evidence хранит sha256 содержимого в ArtifactStore.
+"""
+
+from __future__ import annotations
+
+import json
+from dataclasses import fields
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator
+
+from app.artifact_store import ArtifactStore
+from app.orchestrator.models import ExecutedStep
+
+LOG_STREAMS = ("stdout", "stderr")
+
+
+def write_step_log(store: ArtifactStore, text: str) -> Dict[str, Any]:
+    """Returns: ссылка для evidence.json; одинаковый вывод хранится один раз."""
+    return {"sha256": store.put_text(text), "chars": len(text)}
+
+
+def read_step_log(store: ArtifactStore, ref: Dict[str, Any]) -> str:
+    return store.get_text(ref["sha256"])
+
+
+def snapshot_step(store: ArtifactStore, step: ExecutedStep) -> Dict[str, str]:
+    """
+    Снимки artifacts и inputs шага: путь → sha256.
+
+    Workbook, который не сохранялся на диск (persist=False), снимается из payloads.
+    Файлы, которых уже нет (удалён кэш), пропускаются.
+    """
+    snapshots: Dict[str, str] = {}
+    for path in [*step.artifacts, *step.inputs]:
+        if path in snapshots:
+            continue
+        if Path(path).is_file():
+            snapshots[path] = store.put_file(path)
+        elif path in step.payloads:
+            snapshots[path] = store.put_text(json.dumps(step.payloads[path], ensure_ascii=False, indent=2))
+    return snapshots
+
+
+def execution_records(executed_steps: Iterable[ExecutedStep], store: ArtifactStore) -> Iterator[Dict[str, Any]]:
+    """
+    Поля шага без payloads и без текста stdout/stderr, плюс logs и snapshots
+    (sha256 в хранилище). Генератор: снимки пишутся по мере сериализации
+    evidence.json.
+    """
+    skipped = {"payloads", *LOG_STREAMS}
+    for step in executed_steps:
+        record = {f.name: getattr(step, f.name) for f in fields(step) if f.name not in skipped}
+        record["logs"] = {
+            stream: write_step_log(store, getattr(step, stream)) for stream in LOG_STREAMS if getattr(step, stream)
+        }
+        record["snapshots"] = snapshot_step(store, step)
+        yield record
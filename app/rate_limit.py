@@ -0,0 +1,50 @@
+from __future__ import annotations
+
+import multiprocessing
+import time
+from typing import Any, Dict, Optional, Tuple
+
+# source -> (lock, время следующего свободного слота, интервал между вызовами)
+_LIMITERS: Dict[str, Tuple[Any, Any, float]] = {}
+
+
+def create_shared_limits(rates: Dict[str, float]) -> Dict[str, Tuple[Any, Any, float]]:
+    """
+    Общие для процессов слоты: передаются воркерам через initializer пула.
+
+    rates: вызовов в секунду на источник (один токен на источник в окружении).
+    """
+    shared: Dict[str, Tuple[Any, Any, float]] = {}
+    for source, rate in rates.items():
+        if rate and rate > 0:
+            shared[source] = (multiprocessing.Lock(), multiprocessing.Value("d", 0.0, lock=False), 1.0 / float(rate))
+    return shared
+
+
+def install(shared: Dict[str, Tuple[Any, Any, float]]) -> None:
+    _LIMITERS.clear()
+    _LIMITERS.update(shared)
+
+
+def uninstall() -> None:
+    _LIMITERS.clear()
+
+
+def acquire(source: str) -> float:
+    """
+    Ждёт свой слот для вызова API источника. Без install() ничего не делает.
+
+    Returns: сколько секунд пришлось ждать.
+    """
+    limiter: Optional[Tuple[Any, Any, float]] = _LIMITERS.get(source)
+    if limiter is None:
+        return 0.0
+    lock, next_slot, interval = limiter
+    with lock:
+        now = time.time()
+        slot = max(now, next_slot.value)
+        next_slot.value = slot + interval
+    wait = slot - now
+    if wait > 0:
+        time.sleep(wait)
+    return wait
@@ -0,0 +1,126 @@
+"""Тонкий клиент к `serve`: только stdlib, стартует за миллисекунды.
+
+    python -m app.remote health
+    python -m app.remote investigate demo "Почему упал трафик в январе"
+    python -m app.remote step analyze_sources '{"client": "demo", "p1_start": "2024-01-01", ...}'
+    python -m app.remote cache demo
+    python -m app.remote clear [demo]
+
+Адрес: --url (по умолчанию http://127.0.0.1:8765) или --socket PATH.
+"""
+
+from __future__ import annotations
+
+import argparse
+import http.client
+import json
+import socket
+import sys
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import quote, urlparse
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+DEFAULT_URL = f"http://{DEFAULT_HOST}:{DEFAULT_PORT}"
+TIMEOUT = 3600
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, socket_path: str, timeout: float = TIMEOUT) -> None:
+        super().__init__("localhost", timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self) -> None:
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.socket_path)
+
+
+def request(
+    method: str,
+    path: str,
+    body: Optional[Dict[str, Any]] = None,
+    url: str = DEFAULT_URL,
+    socket_path: str = "",
+) -> Tuple[int, Dict[str, Any]]:
+    if socket_path:
+        conn: http.client.HTTPConnection = UnixHTTPConnection(socket_path)
+    else:
+        parsed = urlparse(url)
+        conn = http.client.HTTPConnection(parsed.hostname or "127.0.0.1", parsed.port or 80, timeout=TIMEOUT)
+    data = json.dumps(body, ensure_ascii=False).encode("utf-8") if body is not None else None
+    headers = {"Content-Type": "application/json"} if data is not None else {}
+    try:
+        conn.request(method, path, body=data, headers=headers)
+        response = conn.getresponse()
+        return response.status, json.loads(response.read().decode("utf-8") or "{}")
+    finally:
+        conn.close()
+
+
+def _parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="python -m app.remote", description="Клиент локального сервера (serve)")
+    parser.add_argument("--url", default=DEFAULT_URL)
+    parser.add_argument("--socket", default="", help="Unix-сокет сервера (serve --socket)")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    sub.add_parser("health", help="Состояние сервера")
+
+    inv = sub.add_parser("investigate", help="Расследование")
+    inv.add_argument("client")
+    inv.add_argument("query", nargs="?", default="")
+    inv.add_argument("--refresh", action="store_true")
+    inv.add_argument("--no-prefetch", action="store_true")
+    inv.add_argument("--resume", default="")
+    for name in ("p1_start", "p1_end", "p2_start", "p2_end"):
+        inv.add_argument(f"--{name.replace('_', '-')}", dest=name, default="")
+
+    step = sub.add_parser("step", help="Один шаг анализа (kind как в плане: analyze_sources, ...)")
+    step.add_argument("kind")
+    step.add_argument("params", help="JSON с параметрами шага, client обязателен")
+
+    cache = sub.add_parser("cache", help="Файлы кэша клиента и статистика памяти")
+    cache.add_argument("client")
+
+    clear = sub.add_parser("clear", help="Сбросить память сервера (файлы кэша не трогаются)")
+    clear.add_argument("client", nargs="?", default="")
+    return parser
+
+
+def main(argv: Optional[list] = None) -> int:
+    args = _parser().parse_args(argv)
+    if args.command == "health":
+        method, path, body = "GET", "/health", None
+    elif args.command == "investigate":
+        body = {
+            "client": args.client,
+            "query": args.query,
+            "refresh": args.refresh,
+            "prefetch": not args.no_prefetch,
+            "resume": args.resume,
+        }
+        body.update({name: getattr(args, name) for name in ("p1_start", "p1_end", "p2_start", "p2_end") if getattr(args, name)})
+        method, path = "POST", "/investigate"
+    elif args.command == "step":
+        try:
+            params = json.loads(args.params)
+        except ValueError as e:
+            print(f"Error: params должен быть JSON: {e}", file=sys.stderr)
+            return 2
+        method, path, body = "POST", "/step", {"kind": args.kind, "params": params}
+    elif args.command == "cache":
+        method, path, body = "GET", f"/cache?client={quote(args.client)}", None
+    else:
+        method, path, body = "POST", "/cache/clear", {"client": args.client} if args.client else {}
+
+    try:
+        status, payload = request(method, path, body, url=args.url, socket_path=args.socket)
+    except OSError as e:
+        print(f"Error: сервер недоступен ({e}). Запустите: python -m app.cli serve", file=sys.stderr)
+        return 1
+    print(json.dumps(payload, ensure_ascii=False, indent=2))
+    return 0 if status == 200 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,382 @@
+"""
+Аудит готового отчёта расследования: каждая цифра — к своему источнику.
+
+Из report.md берутся утверждения с источником: факты и драйверы
+(«- **Заголовок**: значение» + строка «Evidence: `путь`») и строки
+«Почему:» гипотез. У утверждений анализатора (CLAIM_FIELDS) каждая цифра
+сверяется со своим полем: «Общий трафик: A -> B» — A с totals.total_visits_p1,
+B с totals.total_visits_p2; у драйвера «метка: число» — поле строки rows с
+этой меткой. Так перепутанные местами или с другим знаком цифры не проходят.
+Прочие цифры ищутся среди всех чисел источника с точностью до показанного
+округления. Производные («A -> B (P%)», «ожидалось A, факт B (P%)»)
+пересчитываются через AuditEngine.verify_calculation из точных значений.
+
+Источник — снимок из evidence.json (snapshots в reports/_store/), то есть
+ровно те данные, на которых построен отчёт; без снимка — файл на диске.
+Источники проверяются в пуле процессов, каждый разбирается один раз.
+Результат кэшируется по (утверждение, sha256 источника, версия кода) в
+reports/_audit/claims.json: повторный аудит неизменного отчёта не читает
+источники вовсе.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import re
+from bisect import bisect_left
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
+
+from app import build_graph
+from app.artifact_store import ArtifactStore
+from app.audit import AuditResult, SourceIndex
+
+if TYPE_CHECKING:
+    from app.audit import AuditEngine
+
+CLAIM_CACHE_PATH = Path("reports") / "_audit" / "claims.json"
+
+# «1 234», «-12.5», «950.0»; не часть даты, URL или слова.
+_NUMBER = r"-?\d{1,3}(?: \d{3})+(?:\.\d+)?|-?\d+(?:\.\d+)?"
+_NUMBER_RE = re.compile(rf"(?<![\w./-])(?:{_NUMBER})(?![\w/-]|\.\d)")
+_BULLET_RE = re.compile(r"^- \*\*(?P<title>.+?)\*\*: (?P<value>.*?)\s*$")
+_EVIDENCE_RE = re.compile(r"^\s*-? ?Evidence: `(?P<path>[^`]+)`")
+_HEADING_RE = re.compile(r"^#{2,3} (?P<title>.+?)\s*$")
+_BECAUSE_PREFIX = "- Почему: "
+# Производные цифры: P — процент изменения от A к B (verify_calculation, pct_change).
+_DERIVED = [
+    re.compile(rf"(?P<a>{_NUMBER}) -> (?P<b>{_NUMBER}) \((?P<result>{_NUMBER})%\)"),
+    re.compile(rf"ожидалось (?P<a>{_NUMBER}), факт (?P<b>{_NUMBER}) \((?P<result>{_NUMBER})%"),
+]
+
+# Поле источника для каждой цифры утверждения (по порядку в тексте).
+# ("totals.total_visits_p1", None) — путь в документе; ("delta_abs", LABEL) — поле
+# строки rows, у которой одно из строковых полей равно метке утверждения;
+# None — производный процент: сверяется пересчётом из полей A и B.
+LABEL = "label"
+FieldSpec = Optional[Tuple[str, Optional[str]]]
+_PCT: FieldSpec = None
+CLAIM_FIELDS: Dict[str, List[FieldSpec]] = {
+    "Общий трафик": [("totals.total_visits_p1", None), ("totals.total_visits_p2", None), _PCT],
+    "Ожидание с учётом сезонности": [("baseline.expected_total_p2", None), ("baseline.actual_total_p2", None), _PCT],
+    "GSC clicks по запросам": [("totals.total_clicks_p1", None), ("totals.total_clicks_p2", None), _PCT],
+    "Яндекс.Вебмастер clicks по запросам": [("totals.total_clicks_p1", None), ("totals.total_clicks_p2", None), _PCT],
+    "Конверсионные визиты по источникам": [
+        ("totals.total_goal_visits_p1", None),
+        ("totals.total_goal_visits_p2", None),
+        _PCT,
+    ],
+    "Главный рост по источникам": [("delta_abs", LABEL)],
+    "Главное падение по источникам": [("delta_abs", LABEL)],
+    "Наиболее просевшая страница": [("delta_abs", LABEL)],
+    "Просевшая SEO-страница": [("delta_abs", LABEL)],
+    "Самый весомый сдвиг по дням": [("change_delta_pct", LABEL), ("change_impact", LABEL)],
+    "Главный просевший запрос (GSC)": [("delta_clicks", LABEL)],
+    "Главная просевшая страница в GSC": [("delta_clicks", LABEL)],
+    "Главная просевшая страница по конверсиям": [("delta_goal_visits_abs", LABEL)],
+    "Снимок исключённых URL": [("length", None)],
+}
+
+
+@dataclass(frozen=True)
+class ReportClaim:
+    line: int
+    title: str
+    text: str
+    evidence: str
+    # Метка «Ключ: значение» (страница, источник, запрос); пусто, если её нет.
+    label: str = ""
+
+
+def _parse_number(token: str) -> Tuple[float, int]:
+    """Число и знаков после точки (по ним — допуск округления)."""
+    plain = token.replace(" ", "")
+    decimals = len(plain.split(".", 1)[1]) if "." in plain else 0
+    return float(plain), decimals
+
+
+def _tolerance(decimals: int) -> float:
+    return 0.5 * 10 ** (-decimals) + 1e-9
+
+
+def claim_numbers(text: str) -> List[Tuple[float, int]]:
+    return [_parse_number(match.group(0)) for match in _NUMBER_RE.finditer(text)]
+
+
+def extract_claims(markdown: str) -> List[ReportClaim]:
+    """
+    Утверждения с цифрами и источником. У «Ключ: значение» метка до
+    последнего «: » (страница, запрос) цифрой не считается.
+    """
+    lines = markdown.splitlines()
+    claims: List[ReportClaim] = []
+    pending: List[Tuple[int, str, str]] = []
+    heading = ""
+    for number, line in enumerate(lines, start=1):
+        heading_match = _HEADING_RE.match(line)
+        if heading_match:
+            heading = heading_match.group("title")
+            pending = []
+            continue
+        bullet = _BULLET_RE.match(line)
+        if bullet:
+            label, _, value = bullet.group("value").rpartition(": ")
+            pending = [(number, bullet.group("title"), value, label)] if claim_numbers(value) else []
+            continue
+        if line.startswith(_BECAUSE_PREFIX):
+            text = line[len(_BECAUSE_PREFIX):].strip()
+            if claim_numbers(text):
+                pending.append((number, heading, text, ""))
+            continue
+        evidence = _EVIDENCE_RE.match(line)
+        if evidence:
+            claims.extend(
+                ReportClaim(line=n, title=title, text=text, evidence=evidence.group("path"), label=label)
+                for n, title, text, label in pending
+            )
+            pending = []
+    return claims
+
+
+def _snapshots(evidence: Optional[Dict[str, Any]]) -> Dict[str, str]:
+    snapshots: Dict[str, str] = {}
+    for record in (evidence or {}).get("executions") or []:
+        snapshots.update(record.get("snapshots") or {})
+    return snapshots
+
+
+def _load_source(location: Tuple[str, ...]) -> Any:
+    if location[0] == "store":
+        return json.loads(ArtifactStore(Path(location[1])).get_text(location[2]))
+    with open(location[1], "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _numeric_leaves(index: SourceIndex) -> List[Tuple[float, int, str]]:
+    """(значение, порядок в документе, путь), отсортировано по значению."""
+    leaves = [
+        (float(value), order, path)
+        for order, (path, value) in enumerate(index.by_path.items())
+        if isinstance(value, (int, float)) and not isinstance(value, bool)
+    ]
+    leaves.sort()
+    return leaves
+
+
+def claim_fields(claim: ReportClaim) -> Optional[List[FieldSpec]]:
+    """Поля источника для цифр утверждения (метка подставлена) или None, если утверждение не из CLAIM_FIELDS."""
+    specs = CLAIM_FIELDS.get(claim.title)
+    if specs is None:
+        return None
+    return [None if spec is None else (spec[0], claim.label if spec[1] == LABEL else None) for spec in specs]
+
+
+def _resolve_field(data: Any, index: SourceIndex, field: str, label: Optional[str]) -> Optional[List[Any]]:
+    """[путь, значение] поля; с меткой — поле первой строки rows, где есть строковое поле, равное метке."""
+    if label is None:
+        return [field, index.by_path[field]] if field in index.by_path else None
+    rows, prefix = (data.get("rows"), "rows") if isinstance(data, dict) else (data, "")
+    for position, row in enumerate(rows if isinstance(rows, list) else []):
+        if isinstance(row, dict) and field in row and label in {value for value in row.values() if isinstance(value, str)}:
+            return [f"{prefix}[{position}].{field}", row[field]]
+    return None
+
+
+def _number_fields(claim: ReportClaim, count: int) -> List[FieldSpec]:
+    """Поле на каждую цифру; при несовпадении числа цифр — поиск по всему файлу (_claim_result отметит ошибку)."""
+    fields = claim_fields(claim)
+    return fields if fields is not None and len(fields) == count else [None] * count
+
+
+def check_source(
+    location: Tuple[str, ...],
+    wanted: List[Tuple[float, int]],
+    fields: Optional[List[FieldSpec]] = None,
+) -> Dict[str, Any]:
+    """
+    Выполняется в процессе пула: разбирает источник один раз. Для цифры с
+    полем (fields[i] = (поле, метка)) берёт значение этого поля, для
+    остальных — первое (по документу) число с тем же округлением.
+
+    Returns: {"matches": [[путь, значение] | None, ...]} или {"error": ...}.
+    """
+    try:
+        data = _load_source(location)
+        index = SourceIndex(data)
+    except Exception as e:
+        return {"error": f"Error reading source: {e}"}
+    leaves = _numeric_leaves(index)
+    values = [leaf[0] for leaf in leaves]
+    matches: List[Optional[List[Any]]] = []
+    for (number, decimals), spec in zip(wanted, fields or [None] * len(wanted)):
+        if spec is not None:
+            matches.append(_resolve_field(data, index, spec[0], spec[1]))
+            continue
+        tolerance = _tolerance(decimals)
+        best: Optional[Tuple[float, int, str]] = None
+        position = bisect_left(values, number - tolerance)
+        while position < len(leaves) and leaves[position][0] <= number + tolerance:
+            if best is None or leaves[position][1] < best[1]:
+                best = leaves[position]
+            position += 1
+        matches.append([best[2], best[0]] if best is not None else None)
+    return {"matches": matches}
+
+
+def _claim_result(
+    engine: "AuditEngine",
+    claim: ReportClaim,
+    source_label: str,
+    numbers: List[Tuple[float, int]],
+    checked: Dict[str, Any],
+) -> AuditResult:
+    description = f"{claim.title}: {claim.text}"
+    if "error" in checked:
+        return AuditResult(description, "failed", [source_label], [checked["error"]], [], 0.0)
+    fields = claim_fields(claim)
+    if fields is not None and len(fields) != len(numbers):
+        issue = f"expected {len(fields)} numbers for '{claim.title}', got {len(numbers)}"
+        return AuditResult(description, "failed", [source_label], [issue], [], 0.0)
+    issues: List[str] = []
+    evidence: List[str] = []
+    exact: Dict[float, float] = {}
+    # Цифры, привязанные к полю: значение поля по позиции цифры в тексте.
+    bound: Dict[int, float] = {}
+    for position, ((number, decimals), match) in enumerate(zip(numbers, checked["matches"])):
+        spec = fields[position] if fields is not None else None
+        if spec is not None and match is None:
+            where = f" for '{spec[1]}'" if spec[1] is not None else ""
+            issues.append(f"{spec[0]}{where} not found in source {source_label}")
+            continue
+        if match is None:
+            continue
+        evidence.append(f"{source_label}#{match[0]}")
+        exact[number] = float(match[1])
+        if spec is not None:
+            bound[position] = float(match[1])
+            if abs(number - float(match[1])) > _tolerance(decimals):
+                issues.append(f"{number:g} not found in source {source_label}: {match[0]} = {float(match[1]):g}")
+    # Производная цифра сверяется пересчётом: в источнике её может и не быть.
+    recomputed = set()
+    for pattern in _DERIVED:
+        derived = pattern.search(claim.text)
+        if derived is None:
+            continue
+        a, b = _parse_number(derived.group("a"))[0], _parse_number(derived.group("b"))[0]
+        result, decimals = _parse_number(derived.group("result"))
+        # У привязанного утверждения A и B — первые два поля, а не любые совпавшие числа.
+        operands = [bound.get(0), bound.get(1)] if fields is not None else [exact.get(a), exact.get(b)]
+        if None in operands:
+            continue
+        calculation = engine.verify_calculation(
+            result, operands, "pct_change", claim.title, tolerance=_tolerance(decimals)
+        )
+        recomputed.add(result)
+        issues.extend(calculation.issues)
+        evidence.extend(calculation.evidence)
+    for position, (number, _) in enumerate(numbers):
+        if fields is not None and fields[position] is not None:
+            continue
+        if number not in exact and number not in recomputed:
+            issues.append(f"{number:g} not found in source {source_label}")
+    status = "passed" if not issues else "failed"
+    return AuditResult(description, status, evidence, issues, [], 1.0 if status == "passed" else 0.0)
+
+
+def audit_markdown(
+    engine: "AuditEngine",
+    markdown: str,
+    evidence: Optional[Dict[str, Any]] = None,
+    workers: int = 0,
+) -> Tuple[List[AuditResult], Dict[str, int]]:
+    """
+    Returns: результат на каждое утверждение (в порядке отчёта) и
+    счётчики claims / cached / sources.
+    """
+    claims = extract_claims(markdown)
+    snapshots = _snapshots(evidence)
+    store_root = str((evidence or {}).get("artifact_store") or ArtifactStore().root)
+    code = build_graph.code_version("steps")
+
+    # Источник утверждения: (sha256, где лежит, как показать в отчёте аудита).
+    sources: Dict[str, Optional[Tuple[str, Tuple[str, ...], str]]] = {}
+    for claim in claims:
+        if claim.evidence in sources:
+            continue
+        digest = snapshots.get(claim.evidence)
+        if digest is not None and ArtifactStore(Path(store_root)).has(digest):
+            sources[claim.evidence] = (digest, ("store", store_root, digest), claim.evidence)
+            continue
+        path = engine._resolve_source_path(claim.evidence)
+        record = build_graph.file_record(path) if path is not None else None
+        sources[claim.evidence] = (record["sha256"], ("file", str(path)), str(path)) if record else None
+
+    cache = build_graph.BuildManifest(CLAIM_CACHE_PATH)
+    keys = [
+        build_graph.node_key(claim.title, claim.label, claim.text, claim.evidence, (sources[claim.evidence] or ("",))[0], code)
+        for claim in claims
+    ]
+    cached = cache.get_many(key for key, claim in zip(keys, claims) if sources[claim.evidence] is not None)
+
+    # Непроверенные цифры — группами по источнику: процесс пула разбирает источник один раз.
+    groups: Dict[Tuple[str, ...], List[int]] = {}
+    for position, (key, claim) in enumerate(zip(keys, claims)):
+        if key not in cached and sources[claim.evidence] is not None:
+            groups.setdefault(sources[claim.evidence][1], []).append(position)
+    numbers = [claim_numbers(claim.text) for claim in claims]
+    specs = [_number_fields(claim, count) for claim, count in zip(claims, map(len, numbers))]
+    wanted = {location: [number for position in positions for number in numbers[position]] for location, positions in groups.items()}
+    fields = {location: [spec for position in positions for spec in specs[position]] for location, positions in groups.items()}
+    max_workers = max(1, min(workers or os.cpu_count() or 1, len(groups) or 1))
+    if max_workers == 1:
+        checked_by_source = {location: check_source(location, items, fields[location]) for location, items in wanted.items()}
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            locations = list(wanted)
+            checked_by_source = dict(zip(locations, pool.map(check_source, locations, [wanted[location] for location in locations], [fields[location] for location in locations])))
+
+    results: List[AuditResult] = []
+    fresh: Dict[str, Dict[str, Any]] = {}
+    offsets = {location: 0 for location in groups}
+    for position, (key, claim) in enumerate(zip(keys, claims)):
+        source = sources[claim.evidence]
+        if source is None:
+            results.append(
+                AuditResult(f"{claim.title}: {claim.text}", "failed", [], [f"Source file not found: {claim.evidence}"], [], 0.0)
+            )
+            continue
+        if key in cached:
+            results.append(AuditResult(**cached[key]))
+            continue
+        location = source[1]
+        checked = checked_by_source[location]
+        if "matches" in checked:
+            start = offsets[location]
+            offsets[location] += len(numbers[position])
+            checked = {"matches": checked["matches"][start : start + len(numbers[position])]}
+        result = _claim_result(engine, claim, source[2], numbers[position], checked)
+        results.append(result)
+        fresh[key] = asdict(result)
+    cache.put_many(fresh)
+    return results, {"claims": len(claims), "cached": len(cached), "sources": len(groups)}
+
+
+def load_report(report_path: Path) -> Dict[str, Any]:
+    """
+    report.md и evidence.json рядом с ним. Можно передать папку
+    расследования или сам evidence.json.
+    """
+    report_dir = report_path if report_path.is_dir() else report_path.parent
+    markdown_path = report_path if report_path.suffix == ".md" else report_dir / "report.md"
+    if not markdown_path.exists():
+        raise FileNotFoundError(f"Report not found: {markdown_path}")
+    evidence_path = report_dir / "evidence.json"
+    evidence = json.loads(evidence_path.read_text(encoding="utf-8")) if evidence_path.exists() else None
+    return {
+        "markdown": markdown_path.read_text(encoding="utf-8"),
+        "evidence": evidence,
+        "client": (evidence or {}).get("client") or report_dir.parent.name,
+    }
@@ -1,10 +1,13 @@
 from __future__ import annotations
 
+import atexit
 import json
 import os
+import threading
+from contextlib import contextmanager
 from datetime import datetime, timezone
 from pathlib import Path
-from typing import Any, Dict, Iterable, List, Optional
+from typing import Any, Dict, Iterable, Iterator, List, Optional
 from urllib.parse import urlparse
 
 
@@ -15,6 +18,15 @@ ORGANIC_SOURCE_NAMES = {
     "search",
 }
 
+DEFAULT_STATEMENT_TIMEOUT_MS = 60_000
+# Строк за один FETCH серверного курсора.
+CURSOR_ITERSIZE = 2_000
+POOL_MAX_SIZE = 4
+
+# Пулы соединений по URL БД: живут весь процесс (serve, watch, batch).
+_POOLS: Dict[str, Any] = {}
+_POOLS_LOCK = threading.Lock()
+
 PRODUCT_EVENT_FIELDS = [
     "signups",
     "oauth_start",
@@ -152,19 +164,86 @@ def empty_product_db_status(
     }
 
 
+def _close_pools() -> None:
+    with _POOLS_LOCK:
+        pools = list(_POOLS.values())
+        _POOLS.clear()
+    for pool in pools:
+        pool.close()
+
+
+atexit.register(_close_pools)
+
+
+@contextmanager
+def product_db_connection(db_url: str) -> Iterator[Any]:
+    """
+    Соединение с продуктовой БД (row_factory=dict_row).
+
+    С psycopg_pool соединение берётся из пула процесса и возвращается в
+    него; без него — обычный psycopg.connect на время блока.
+    """
+    import psycopg  # type: ignore
+    from psycopg.rows import dict_row  # type: ignore
+
+    try:
+        from psycopg_pool import ConnectionPool  # type: ignore
+    except Exception:
+        ConnectionPool = None
+
+    if ConnectionPool is None:
+        with psycopg.connect(db_url, row_factory=dict_row) as conn:
+            yield conn
+        return
+
+    with _POOLS_LOCK:
+        pool = _POOLS.get(db_url)
+        if pool is None:
+            pool = ConnectionPool(
+                db_url, min_size=1, max_size=POOL_MAX_SIZE, kwargs={"row_factory": dict_row}, open=True
+            )
+            _POOLS[db_url] = pool
+    with pool.connection() as conn:
+        yield conn
+
+
+def _add_activation_row(grouped: Dict[str, Dict[str, Any]], row: Dict[str, Any]) -> None:
+    """Строки, совпавшие после normalize_landing_page (/a и /a/), суммируются."""
+    landing_page = normalize_landing_page(str(row.get("landing_page", "")))
+    item = grouped.get(landing_page)
+    if item is None:
+        grouped[landing_page] = {"landingPage": landing_page, **{field: int(row.get(field) or 0) for field in PRODUCT_EVENT_FIELDS}}
+        return
+    for field in PRODUCT_EVENT_FIELDS:
+        item[field] += int(row.get(field) or 0)
+
+
 def load_product_activation_by_landing_page(
     *,
     date1: str,
     date2: str,
     env_var: str = "STAS_DATABASE_URL",
+    statement_timeout_ms: int = DEFAULT_STATEMENT_TIMEOUT_MS,
+    rollup: bool = True,
 ) -> Dict[str, Any]:
+    """
+    Продуктовая активация органических регистраций по landing page.
+
+    rollup=True — из инкрементального rollup (app.activation_rollup): он
+    дочитывает только новые события и отдаёт воронку за любое окно. Пока
+    rollup не построен (нет watermark; строится командой activation-rollup),
+    используется полный запрос — первичный скан под таймаутом отчёта не пройдёт.
+    rollup=False — полный запрос по user_event за окно через серверный
+    курсор (строки читаются порциями по CURSOR_ITERSIZE, а не fetchall).
+    В обоих случаях statement_timeout на транзакцию; превышение —
+    reason="query_failed:QueryCanceled", без исключения.
+    """
     db_url = os.getenv(env_var)
     if not db_url:
         return empty_product_db_status(env_var=env_var, reason="env_missing")
 
     try:
-        import psycopg  # type: ignore
-        from psycopg.rows import dict_row  # type: ignore
+        import psycopg  # type: ignore  # noqa: F401
     except Exception:
         return empty_product_db_status(env_var=env_var, reason="psycopg_missing")
 
@@ -198,6 +277,10 @@ def load_product_activation_by_landing_page(
             FROM organic_signups s
             LEFT JOIN user_event e
               ON e.athlete_id = s.athlete_id
+             AND e.event_type IN (
+                 'oauth_start', 'intervals_connected', 'gpt_connected', 'claude_connected',
+                 'gpt_data_requested', 'claude_data_requested', 'training_processed'
+             )
              AND e.created_at >= s.signup_at
              AND e.created_at < (%(date2)s::date + INTERVAL '1 day')
             GROUP BY s.landing_page, s.athlete_id
@@ -216,16 +299,29 @@ def load_product_activation_by_landing_page(
         ORDER BY signups DESC, landing_page ASC
     """
 
+    grouped: Dict[str, Dict[str, Any]] = {}
     try:
-        with psycopg.connect(db_url, row_factory=dict_row) as conn:
-            with conn.cursor() as cur:
-                cur.execute(query, {"date1": date1, "date2": date2})
-                rows = [dict(row) for row in cur.fetchall()]
+        with product_db_connection(db_url) as conn:
+            with conn.transaction():
+                # set_config(..., true) — как SET LOCAL, но с параметром: таймаут только на эту транзакцию.
+                conn.execute("SELECT set_config('statement_timeout', %s, true)", [str(int(statement_timeout_ms))])
+                if rollup:
+                    from app.activation_rollup import ensure_schema, query_rollup, read_watermark, update_rollup
+
+                    ensure_schema(conn)
+                    if read_watermark(conn) is not None:
+                        update_rollup(conn)
+                        rows = query_rollup(conn, date1, date2)
+                        return empty_product_db_status(env_var=env_var, available=True, reason="ok", rows=rows)
+                with conn.cursor(name="product_activation_by_landing_page") as cur:
+                    cur.itersize = CURSOR_ITERSIZE
+                    cur.execute(query, {"date1": date1, "date2": date2})
+                    for row in cur:
+                        _add_activation_row(grouped, row)
     except Exception as exc:
         return empty_product_db_status(env_var=env_var, reason=f"query_failed:{exc.__class__.__name__}")
 
-    for row in rows:
-        row["landingPage"] = normalize_landing_page(str(row.pop("landing_page", "")))
+    rows = sorted(grouped.values(), key=lambda row: (-row["signups"], row["landingPage"]))
     return empty_product_db_status(env_var=env_var, available=True, reason="ok", rows=rows)
 
 
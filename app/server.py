@@ -0,0 +1,264 @@
+"""Локальный сервер: investigate, шаги analyze-* и операции с кэшем по HTTP.
+
+Процесс живёт долго, поэтому импорты, .env, разобранные конфиги, HTTP-сессии
+API-клиентов, access_token GSC и готовые workbook-и (StepMemo) остаются
+тёплыми между запросами. Одинаковые запросы, пришедшие одновременно,
+выполняются один раз (Coalescer). Слушает TCP (по умолчанию 127.0.0.1) или
+Unix-сокет; тонкий клиент — app/remote.py.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import socketserver
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import asdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+from app.config import clear_config_cache
+from app.orchestrator import investigate
+from app.orchestrator.executor import install_std_streams, uninstall_std_streams
+from app.remote import DEFAULT_HOST, DEFAULT_PORT
+from app.steps import STEP_RUNNERS, StepError, StepMemo, clear_shared_clients, run_step, set_step_memo
+
+INVESTIGATE_FIELDS = ("p1_start", "p1_end", "p2_start", "p2_end")
+
+
+class RequestError(Exception):
+    def __init__(self, status: int, message: str) -> None:
+        super().__init__(message)
+        self.status = status
+
+
+class Coalescer:
+    """Одинаковые запросы в полёте делят один результат (и одну ошибку)."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._inflight: Dict[str, Future] = {}
+
+    def run(self, key: str, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """Returns: (результат, True если запрос присоединился к уже идущему)."""
+        with self._lock:
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = self._inflight[key] = Future()
+        if not leader:
+            return future.result(), True
+        try:
+            result = fn()
+        except BaseException as exc:
+            future.set_exception(exc)
+            raise
+        else:
+            future.set_result(result)
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+        return result, False
+
+
+class ServerApp:
+    """Маршрутизация запросов без привязки к транспорту (удобно тестировать)."""
+
+    def __init__(self, memo: Optional[StepMemo] = None) -> None:
+        self.started_at = time.time()
+        self.memo = memo if memo is not None else StepMemo()
+        self.coalescer = Coalescer()
+        self.stats: Dict[str, int] = {"requests": 0, "coalesced": 0, "errors": 0}
+        self._stats_lock = threading.Lock()
+        self._client_locks: Dict[str, threading.Lock] = {}
+        self._locks_guard = threading.Lock()
+        set_step_memo(self.memo)
+        # Один раз на сервер: параллельные расследования делят одну подмену stdout/stderr.
+        install_std_streams()
+
+    def close(self) -> None:
+        set_step_memo(None)
+        uninstall_std_streams()
+
+    def _count(self, name: str) -> None:
+        with self._stats_lock:
+            self.stats[name] += 1
+
+    def _client_lock(self, client: str) -> threading.Lock:
+        with self._locks_guard:
+            return self._client_locks.setdefault(client, threading.Lock())
+
+    def handle(self, method: str, path: str, body: Optional[Dict[str, Any]] = None) -> Tuple[int, Dict[str, Any]]:
+        self._count("requests")
+        url = urlparse(path)
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        routes: Dict[Tuple[str, str], Callable[[Dict[str, Any]], Dict[str, Any]]] = {
+            ("GET", "/health"): self._health,
+            ("POST", "/investigate"): self._investigate,
+            ("POST", "/step"): self._step,
+            ("GET", "/cache"): self._cache,
+            ("POST", "/cache/clear"): self._cache_clear,
+        }
+        handler = routes.get((method, url.path))
+        if handler is None:
+            return 404, {"error": f"Unknown endpoint: {method} {url.path}"}
+        payload = {**query, **(body or {})}
+        key = json.dumps([method, url.path, payload], sort_keys=True, ensure_ascii=False, default=str)
+        try:
+            if method == "GET":
+                return 200, handler(payload)
+            result, coalesced = self.coalescer.run(key, lambda: handler(payload))
+        except RequestError as e:
+            self._count("errors")
+            return e.status, {"error": str(e)}
+        except (StepError, FileNotFoundError, ValueError) as e:
+            self._count("errors")
+            return 400, {"error": str(e)}
+        except Exception as e:
+            self._count("errors")
+            return 500, {"error": str(e)[:500]}
+        if coalesced:
+            self._count("coalesced")
+        return 200, {**result, "coalesced": coalesced}
+
+    def _stats_snapshot(self) -> Dict[str, int]:
+        with self._stats_lock:
+            return dict(self.stats)
+
+    def _health(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "ok": True,
+            "pid": os.getpid(),
+            "uptime_s": round(time.time() - self.started_at, 1),
+            "stats": self._stats_snapshot(),
+            "memo": {"entries": len(self.memo), **self.memo.stats},
+        }
+
+    def _investigate(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        client = str(payload.get("client") or "")
+        if not client or not (payload.get("query") or payload.get("resume")):
+            raise RequestError(400, "Нужны client и query (или resume)")
+        started = time.perf_counter()
+        # Расследования одного клиента по очереди: они пишут в один data_cache/<client>/.
+        with self._client_lock(client):
+            report, analysis, executed_steps = investigate(
+                client=client,
+                query=str(payload.get("query") or ""),
+                refresh=bool(payload.get("refresh", False)),
+                prefetch=bool(payload.get("prefetch", True)),
+                resume=payload.get("resume") or None,
+                **{name: payload.get(name) or None for name in INVESTIGATE_FIELDS},
+            )
+        return {
+            "report": asdict(report),
+            "summary": analysis.get("summary"),
+            "root_cause_status": analysis.get("root_cause_status"),
+            "hypotheses": analysis.get("hypotheses", []),
+            "steps": [{"id": step.id, "kind": step.kind, "success": step.success} for step in executed_steps],
+            "duration_s": round(time.perf_counter() - started, 3),
+        }
+
+    def _step(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        kind = str(payload.get("kind") or "")
+        if kind not in STEP_RUNNERS:
+            raise RequestError(400, f"Unsupported step kind: {kind or '(empty)'}")
+        params = payload.get("params") or {}
+        if not isinstance(params, dict) or not params.get("client"):
+            raise RequestError(400, "params.client обязателен")
+        started = time.perf_counter()
+        hits_before = self.memo.stats["hits"]
+        workbook = run_step(kind, params)
+        return {
+            "kind": kind,
+            "path": str(workbook.path),
+            "workbook": workbook.document(),
+            "from_memo": self.memo.stats["hits"] > hits_before,
+            "duration_s": round(time.perf_counter() - started, 3),
+        }
+
+    def _cache(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        client = str(payload.get("client") or "")
+        if not client:
+            raise RequestError(400, "Нужен client")
+        cache_dir = Path("data_cache") / client
+        files = []
+        if cache_dir.is_dir():
+            for path in sorted(cache_dir.iterdir()):
+                if path.is_file():
+                    stat = path.stat()
+                    files.append({"name": path.name, "size": stat.st_size, "mtime": stat.st_mtime})
+        return {"client": client, "files": files, "memo": {"entries": len(self.memo), **self.memo.stats}}
+
+    def _cache_clear(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """Сбрасывает только память процесса; файлы data_cache/ не трогаются."""
+        client = payload.get("client") or None
+        removed = self.memo.clear(client)
+        if client is None:
+            clear_config_cache()
+            clear_shared_clients()
+        return {"cleared_memo_entries": removed, "client": client}
+
+
+def _handler_class(server_app: ServerApp) -> type:
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def _send(self, status: int, payload: Dict[str, Any]) -> None:
+            data = json.dumps(payload, ensure_ascii=False, default=str).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _dispatch(self, method: str) -> None:
+            body: Dict[str, Any] = {}
+            length = int(self.headers.get("Content-Length") or 0)
+            if length:
+                try:
+                    body = json.loads(self.rfile.read(length).decode("utf-8"))
+                except ValueError:
+                    self._send(400, {"error": "Тело запроса должно быть JSON"})
+                    return
+            status, payload = server_app.handle(method, self.path, body)
+            self._send(status, payload)
+
+        def do_GET(self) -> None:  # noqa: N802 - имя задаёт BaseHTTPRequestHandler
+            self._dispatch("GET")
+
+        def do_POST(self) -> None:  # noqa: N802
+            self._dispatch("POST")
+
+        def address_string(self) -> str:
+            # У Unix-сокета client_address — пустая строка.
+            return str(self.client_address[0]) if isinstance(self.client_address, tuple) else "unix"
+
+        def log_message(self, format: str, *args: Any) -> None:
+            pass
+
+    return Handler
+
+
+class ThreadingUnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def create_server(
+    server_app: ServerApp,
+    host: str = DEFAULT_HOST,
+    port: int = DEFAULT_PORT,
+    socket_path: Optional[str] = None,
+) -> socketserver.BaseServer:
+    handler = _handler_class(server_app)
+    if socket_path:
+        path = Path(socket_path)
+        if path.exists():
+            path.unlink()
+        return ThreadingUnixHTTPServer(str(path), handler)
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
@@ -0,0 +1,1036 @@
+from __future__ import annotations
+
+import inspect
+import json
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field, replace
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from app.analysis_bootstrap import bootstrap_contributions
+from app.analysis_changepoints import (
+    CHANGEPOINT_KINDS,
+    DEFAULT_PENALTY_FACTOR,
+    build_series,
+    create_workbook as create_workbook_changepoints,
+    date_range as changepoint_date_range,
+    detect_changepoints,
+    load_or_fetch_daily,
+    workbook_filename as changepoints_workbook_filename,
+)
+from app.analysis_goals import (
+    calculate_contributions as calculate_contributions_goals,
+    compare_goals_periods,
+    create_workbook as create_workbook_goals,
+    load_or_fetch_goals_by_page,
+    load_or_fetch_goals_by_source,
+    sort_rows as sort_goals_rows,
+    workbook_filename as goals_workbook_filename,
+)
+from app.analysis_gsc import (
+    calculate_contributions as calculate_contributions_gsc,
+    compare_gsc_periods,
+    create_workbook as create_workbook_gsc,
+    load_or_fetch_gsc,
+    sort_rows as sort_gsc_rows,
+    workbook_filename as gsc_workbook_filename,
+)
+from app.analysis_pages import (
+    _slugify_for_filename,
+    calculate_contributions as calculate_contributions_pages,
+    compare_pages_periods,
+    create_workbook as create_workbook_pages,
+    load_or_fetch_pages,
+    load_or_fetch_pages_by_source,
+    sort_analysis_rows as sort_analysis_rows_pages,
+)
+from app.analysis_reconcile import (
+    DEFAULT_MIN_CLICKS as RECONCILE_MIN_CLICKS,
+    DEFAULT_THRESHOLD as RECONCILE_THRESHOLD,
+    create_workbook as create_workbook_reconcile,
+    reconcile_pages,
+    workbook_filename as reconcile_workbook_filename,
+)
+from app.analysis_significance import annotate_goals_significance, annotate_gsc_significance
+from app.analysis_sources import (
+    calculate_contributions,
+    compare_sources_periods,
+    create_workbook,
+    load_or_fetch_sources,
+    sort_analysis_rows,
+)
+from app.analysis_ym_webmaster import (
+    calculate_contributions as calculate_contributions_ymw,
+    compare_queries_periods as compare_ymw_queries_periods,
+    create_workbook as create_workbook_ymw,
+    load_or_fetch_queries as load_or_fetch_ymw_queries,
+    sort_rows as sort_ymw_rows,
+    workbook_filename as ymw_workbook_filename,
+)
+from app import build_graph, tracing
+from app.artifact_store import ArtifactStore
+from app.baselines import annotate_expected, load_baselines
+from app.cache_io import read_json, record_touched, write_json
+from app.config import load_client_config
+from app.gsc_client import GSCClient
+from app.metrika_client import MetrikaClient
+from app.ym_webmaster_client import YMWebmasterClient, normalize_webmaster_indexing
+
+# Шаги-выгрузки: на диске лежит только список строк, без meta/totals.
+LISTING_KINDS = {"ym_webmaster_indexing"}
+
+
+class StepError(RuntimeError):
+    """Шаг не выполнен; сообщение уже без секретов и готово к показу пользователю."""
+
+
+@dataclass(frozen=True)
+class Workbook:
+    """
+    Результат шага анализа в памяти.
+
+    data — то же, что пишется в JSON (meta / totals / rows [/ baseline / bootstrap]).
+    ranked_rows — все строки после сортировки (data["rows"] обрезан по limit).
+    path — куда workbook сохранён (или был бы сохранён при persist=False).
+    inputs — файлы data_cache/, из которых он посчитан (прочитанные или выгруженные).
+    reused — входы и код не менялись, workbook взят с диска без пересчёта (build_graph).
+    """
+
+    kind: str
+    data: Dict[str, Any]
+    path: Path
+    ranked_rows: List[Dict[str, Any]] = field(default_factory=list, repr=False)
+    persisted: bool = True
+    inputs: List[str] = field(default_factory=list)
+    reused: bool = False
+
+    @property
+    def meta(self) -> Dict[str, Any]:
+        return self.data.get("meta") or {}
+
+    @property
+    def totals(self) -> Dict[str, Any]:
+        return self.data.get("totals") or {}
+
+    @property
+    def rows(self) -> List[Dict[str, Any]]:
+        return self.data.get("rows") or []
+
+    def to_dict(self) -> Dict[str, Any]:
+        return self.data
+
+    def document(self) -> Any:
+        """Содержимое файла path в том виде, в каком его читает анализатор."""
+        return self.rows if self.kind in LISTING_KINDS else self.data
+
+
+# API-клиенты по учётным данным: в долгоживущем процессе (serve) переиспользуются
+# их HTTP-сессии (keep-alive) и access_token GSC.
+_CLIENTS: Dict[Tuple[Any, ...], Any] = {}
+_CLIENTS_LOCK = threading.Lock()
+
+
+def _shared_client(key: Tuple[Any, ...], factory: Callable[[], Any]) -> Any:
+    with _CLIENTS_LOCK:
+        client = _CLIENTS.get(key)
+        if client is None:
+            client = _CLIENTS[key] = factory()
+        return client
+
+
+def clear_shared_clients() -> None:
+    with _CLIENTS_LOCK:
+        _CLIENTS.clear()
+
+
+def _mask(message: str, secrets: List[str]) -> str:
+    for secret in secrets:
+        if secret and secret in message:
+            message = message.replace(secret, "***")
+    return message
+
+
+def _period_slug(p1_start: str, p1_end: str, p2_start: str, p2_end: str) -> str:
+    return f"{p1_start.replace('-', '')}{p1_end.replace('-', '')}__{p2_start.replace('-', '')}{p2_end.replace('-', '')}"
+
+
+def _workbook_path(client: str, filename: str) -> Path:
+    return Path("data_cache") / client / filename
+
+
+def _finish(kind: str, data: Dict[str, Any], path: Path, ranked_rows: List[Dict[str, Any]], persist: bool) -> Workbook:
+    if persist:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        write_json(path, data)
+    return Workbook(kind=kind, data=data, path=path, ranked_rows=ranked_rows, persisted=persist)
+
+
+def _validate_periods(p1_start: str, p1_end: str, p2_start: str, p2_end: str) -> None:
+    try:
+        dt_p1_start = datetime.strptime(p1_start, "%Y-%m-%d")
+        dt_p1_end = datetime.strptime(p1_end, "%Y-%m-%d")
+        dt_p2_start = datetime.strptime(p2_start, "%Y-%m-%d")
+        dt_p2_end = datetime.strptime(p2_end, "%Y-%m-%d")
+    except ValueError as e:
+        raise StepError(f"Некорректный формат даты: {e}") from e
+    if dt_p1_end < dt_p1_start:
+        raise StepError(f"p1_end ({p1_end}) < p1_start ({p1_start})")
+    if dt_p2_end < dt_p2_start:
+        raise StepError(f"p2_end ({p2_end}) < p2_start ({p2_start})")
+
+
+def _period_days(start: str, end: str) -> int:
+    """Длина периода в днях (включительно)."""
+    return (datetime.strptime(end, "%Y-%m-%d") - datetime.strptime(start, "%Y-%m-%d")).days + 1
+
+
+def _load_config(client: str):
+    try:
+        cfg, _ = load_client_config(client)
+    except Exception as e:
+        raise StepError(f"Не удалось загрузить конфиг: {e}") from e
+    return cfg
+
+
+def _metrika(client: str):
+    token = os.getenv("YANDEX_METRIKA_TOKEN")
+    if not token:
+        raise StepError("YANDEX_METRIKA_TOKEN не задан в окружении")
+    cfg = _load_config(client)
+    if cfg.counter_id <= 0:
+        raise StepError("metrika.counter_id не задан в конфиге")
+    metrika = _shared_client(
+        ("metrika", token, cfg.counter_id),
+        lambda: MetrikaClient(token=token, counter_id=cfg.counter_id),
+    )
+    return cfg, metrika, token
+
+
+def _metrika_error(e: Exception, token: str) -> StepError:
+    if not isinstance(e, RuntimeError):
+        return StepError(f"Не удалось загрузить данные: {e}")
+    error_msg = _mask(str(e), [token])
+    if "OAuth" in error_msg:
+        error_msg = error_msg.split("OAuth")[0] + "OAuth ***"
+    return StepError(f"Ошибка API Метрики: {error_msg[:500]}")
+
+
+def _resolve_goal_id(cfg, goal_id: int) -> int:
+    resolved = int(goal_id or 0) or int(cfg.goal_id or 0)
+    if resolved <= 0:
+        raise StepError("goal_id не задан. Укажите --goal-id или заполните metrika.goal_id в config.yaml")
+    return resolved
+
+
+def gsc_client_from_config(cfg) -> GSCClient:
+    client_id = os.getenv("GSC_CLIENT_ID", "").strip()
+    client_secret = os.getenv("GSC_CLIENT_SECRET", "").strip()
+    refresh_token = os.getenv("GSC_REFRESH_TOKEN", "").strip()
+    site_url = str(getattr(cfg, "gsc_site_url", "") or "").strip()
+    if not site_url:
+        raise ValueError("gsc.site_url не задан в clients/<client>/config.yaml")
+    if not client_id or not client_secret or not refresh_token:
+        raise ValueError("GSC_CLIENT_ID/GSC_CLIENT_SECRET/GSC_REFRESH_TOKEN не заданы в окружении")
+    return _shared_client(
+        ("gsc", client_id, client_secret, refresh_token, site_url),
+        lambda: GSCClient(
+            client_id=client_id,
+            client_secret=client_secret,
+            refresh_token=refresh_token,
+            site_url=site_url,
+        ),
+    )
+
+
+def ym_webmaster_token() -> str:
+    return os.getenv("YM_WEBMASTER_TOKEN", "").strip() or os.getenv("YANDEX_WEBMASTER_TOKEN", "").strip()
+
+
+def ym_webmaster_client_from_config(cfg) -> YMWebmasterClient:
+    token = ym_webmaster_token()
+    if not token:
+        raise ValueError("YM_WEBMASTER_TOKEN (или YANDEX_WEBMASTER_TOKEN) не задан в окружении")
+    user_id = str(getattr(cfg, "ym_webmaster_user_id", "") or "").strip()
+    host_id = str(getattr(cfg, "ym_webmaster_host_id", "") or "").strip()
+    if not user_id or not host_id:
+        raise ValueError(
+            "ym_webmaster.user_id/host_id не заданы в clients/<client>/config.yaml. "
+            "Сначала выполните: python -m app.cli ym-webmaster-hosts <client>"
+        )
+    return _shared_client(
+        ("ym_webmaster", token, user_id, host_id),
+        lambda: YMWebmasterClient(token=token, user_id=user_id, host_id=host_id),
+    )
+
+
+def _gsc(client: str):
+    cfg = _load_config(client)
+    try:
+        return cfg, gsc_client_from_config(cfg)
+    except Exception as e:
+        raise StepError(str(e)) from e
+
+
+def _ym_webmaster(client: str):
+    cfg = _load_config(client)
+    try:
+        return cfg, ym_webmaster_client_from_config(cfg)
+    except Exception as e:
+        raise StepError(str(e)) from e
+
+
+def _attach_extras(
+    workbook: Dict[str, Any],
+    all_rows: List[Dict[str, Any]],
+    *,
+    client: str,
+    baseline_kind: Optional[str],
+    value_field: str,
+    bootstrap: int,
+    p1_start: str,
+    p1_end: str,
+    p2_start: str,
+    p2_end: str,
+) -> None:
+    if baseline_kind:
+        baselines = load_baselines(client, baseline_kind)
+        if baselines:
+            workbook["baseline"] = annotate_expected(all_rows, baselines, p1_start, p1_end, p2_start, p2_end)
+    if bootstrap > 0:
+        workbook["bootstrap"] = bootstrap_contributions(all_rows, value_field=value_field, replicates=bootstrap)
+
+
+def run_analyze_sources(
+    client: str,
+    p1_start: str,
+    p1_end: str,
+    p2_start: str,
+    p2_end: str,
+    limit: int = 50,
+    refresh: bool = False,
+    bootstrap: int = 0,
+    persist: bool = True,
+) -> Workbook:
+    """Сравнение источников трафика между двумя периодами."""
+    cfg, metrika, token = _metrika(client)
+    _validate_periods(p1_start, p1_end, p2_start, p2_end)
+    try:
+        data_p1 = load_or_fetch_sources(client, p1_start, p1_end, limit, refresh, metrika)
+        data_p2 = load_or_fetch_sources(client, p2_start, p2_end, limit, refresh, metrika)
+    except Exception as e:
+        raise _metrika_error(e, token) from e
+
+    rows = compare_sources_periods(data_p1, data_p2)
+    rows = calculate_contributions(rows)
+    all_rows = rows.copy()
+    rows = sort_analysis_rows(rows)
+
+    workbook = create_workbook(
+        client=client,
+        counter_id=cfg.counter_id,
+        p1_start=p1_start,
+        p1_end=p1_end,
+        p2_start=p2_start,
+        p2_end=p2_end,
+        limit=limit,
+        refresh_used=refresh,
+        rows=rows,
+        all_rows=all_rows,
+    )
+    _attach_extras(
+        workbook, all_rows, client=client, baseline_kind="sources", value_field="visits", bootstrap=bootstrap,
+        p1_start=p1_start, p1_end=p1_end, p2_start=p2_start, p2_end=p2_end,
+    )
+    path = _workbook_path(client, f"analysis_sources_{_period_slug(p1_start, p1_end, p2_start, p2_end)}.json")
+    return _finish("analyze_sources", workbook, path, rows, persist)
+
+
+def run_analyze_pages(
+    client: str,
+    p1_start: str,
+    p1_end: str,
+    p2_start: str,
+    p2_end: str,
+    limit: int = 50,
+    refresh: bool = False,
+    bootstrap: int = 0,
+    persist: bool = True,
+) -> Workbook:
+    """Сравнение landing pages между двумя периодами."""
+    cfg, metrika, token = _metrika(client)
+    _validate_periods(p1_start, p1_end, p2_start, p2_end)
+    try:
+        data_p1 = load_or_fetch_pages(client, p1_start, p1_end, limit, refresh, metrika)
+        data_p2 = load_or_fetch_pages(client, p2_start, p2_end, limit, refresh, metrika)
+    except Exception as e:
+        raise _metrika_error(e, token) from e
+
+    rows = compare_pages_periods(data_p1, data_p2)
+    rows = calculate_contributions_pages(rows)
+    all_rows = rows.copy()
+    rows = sort_analysis_rows_pages(rows)
+
+    workbook = create_workbook_pages(
+        client=client,
+        counter_id=cfg.counter_id,
+        p1_start=p1_start,
+        p1_end=p1_end,
+        p2_start=p2_start,
+        p2_end=p2_end,
+        limit=limit,
+        refresh_used=refresh,
+        rows=rows,
+        all_rows=all_rows,
+    )
+    _attach_extras(
+        workbook, all_rows, client=client, baseline_kind="pages", value_field="visits", bootstrap=bootstrap,
+        p1_start=p1_start, p1_end=p1_end, p2_start=p2_start, p2_end=p2_end,
+    )
+    path = _workbook_path(client, f"analysis_pages_{_period_slug(p1_start, p1_end, p2_start, p2_end)}.json")
+    return _finish("analyze_pages", workbook, path, rows, persist)
+
+
+def run_analyze_pages_by_source(
+    client: str,
+    p1_start: str,
+    p1_end: str,
+    p2_start: str,
+    p2_end: str,
+    source: str = "Search engine traffic",
+    limit: int = 50,
+    refresh: bool = False,
+    bootstrap: int = 0,
+    persist: bool = True,
+) -> Workbook:
+    """Сравнение landing pages внутри одного источника трафика."""
+    cfg, metrika, token = _metrika(client)
+    _validate_periods(p1_start, p1_end, p2_start, p2_end)
+    try:
+        data_p1 = load_or_fetch_pages_by_source(client, p1_start, p1_end, source, limit, refresh, metrika)
+        data_p2 = load_or_fetch_pages_by_source(client, p2_start, p2_end, source, limit, refresh, metrika)
+    except Exception as e:
+        raise _metrika_error(e, token) from e
+
+    rows = compare_pages_periods(data_p1, data_p2)
+    rows = calculate_contributions_pages(rows)
+    all_rows = rows.copy()
+    rows = sort_analysis_rows_pages(rows)
+
+    workbook = create_workbook_pages(
+        client=client,
+        counter_id=cfg.counter_id,
+        p1_start=p1_start,
+        p1_end=p1_end,
+        p2_start=p2_start,
+        p2_end=p2_end,
+        limit=limit,
+        refresh_used=refresh,
+        rows=rows,
+        all_rows=all_rows,
+    )
+    workbook["meta"]["source"] = source
+    _attach_extras(
+        workbook, all_rows, client=client, baseline_kind=None, value_field="visits", bootstrap=bootstrap,
+        p1_start=p1_start, p1_end=p1_end, p2_start=p2_start, p2_end=p2_end,
+    )
+    path = _workbook_path(
+        client,
+        f"analysis_pages_by_source_{_slugify_for_filename(source)}_{_period_slug(p1_start, p1_end, p2_start, p2_end)}.json",
+    )
+    return _finish("analyze_pages_by_source", workbook, path, rows, persist)
+
+
+def _run_goals(
+    kind: str,
+    dimension: str,
+    client: str,
+    p1_start: str,
+    p1_end: str,
+    p2_start: str,
+    p2_end: str,
+    goal_id: int,
+    limit: int,
+    refresh: bool,
+    demote_noise: bool,
+    bootstrap: int,
+    persist: bool,
+) -> Workbook:
+    cfg, metrika, token = _metrika(client)
+    resolved_goal_id = _resolve_goal_id(cfg, goal_id)
+    _validate_periods(p1_start, p1_end, p2_start, p2_end)
+    loader = load_or_fetch_goals_by_source if dimension == "source" else load_or_fetch_goals_by_page
+    try:
+        data_p1 = loader(client, p1_start, p1_end, resolved_goal_id, limit, refresh, metrika)
+        data_p2 = loader(client, p2_start, p2_end, resolved_goal_id, limit, refresh, metrika)
+    except Exception as e:
+        raise _metrika_error(e, token) from e
+
+    rows = compare_goals_periods(data_p1, data_p2, key_field=dimension)
+    rows = calculate_contributions_goals(rows)
+    rows = annotate_goals_significance(
+        rows, days_p1=_period_days(p1_start, p1_end), days_p2=_period_days(p2_start, p2_end)
+    )
+    all_rows = rows.copy()
+    rows = sort_goals_rows(rows, key_field=dimension, demote_noise=demote_noise)
+
+    workbook = create_workbook_goals(
+        client=client,
+        counter_id=cfg.counter_id,
+        goal_id=resolved_goal_id,
+        dimension=dimension,
+        p1_start=p1_start,
+        p1_end=p1_end,
+        p2_start=p2_start,
+        p2_end=p2_end,
+        limit=limit,
+        refresh_used=refresh,
+        rows=rows,
+        all_rows=all_rows,
+    )
+    _attach_extras(
+        workbook, all_rows, client=client, baseline_kind=None, value_field="goal_visits", bootstrap=bootstrap,
+        p1_start=p1_start, p1_end=p1_end, p2_start=p2_start, p2_end=p2_end,
+    )
+    filename_kind = "goals_by_source" if dimension == "source" else "goals_by_page"
+    path = _workbook_path(
+        client, goals_workbook_filename(filename_kind, resolved_goal_id, p1_start, p1_end, p2_start, p2_end)
+    )
+    return _finish(kind, workbook, path, rows, persist)
+
+
+def run_analyze_goals_by_source(
+    client: str,
+    p1_start: str,
+    p1_end: str,
+    p2_start: str,
+    p2_end: str,
+    goal_id: int = 0,
+    limit: int = 50,
+    refresh: bool = False,
+    demote_noise: bool = False,
+    bootstrap: int = 0,
+    persist: bool = True,
+) -> Workbook:
+    """Сравнение конверсий по источникам; goal_id=0 — цель из config."""
+    return _run_goals(
+        "analyze_goals_by_source", "source", client, p1_start, p1_end, p2_start, p2_end,
+        goal_id, limit, refresh, demote_noise, bootstrap, persist,
+    )
+
+
+def run_analyze_goals_by_page(
+    client: str,
+    p1_start: str,
+    p1_end: str,
+    p2_start: str,
+    p2_end: str,
+    goal_id: int = 0,
+    limit: int = 50,
+    refresh: bool = False,
+    demote_noise: bool = False,
+    bootstrap: int = 0,
+    persist: bool = True,
+) -> Workbook:
+    """Сравнение конверсий по входным страницам; goal_id=0 — цель из config."""
+    return _run_goals(
+        "analyze_goals_by_page", "landingPage", client, p1_start, p1_end, p2_start, p2_end,
+        goal_id, limit, refresh, demote_noise, bootstrap, persist,
+    )
+
+
+def _run_gsc(
+    gsc_kind: str,
+    key_field: str,
+    client: str,
+    p1_start: str,
+    p1_end: str,
+    p2_start: str,
+    p2_end: str,
+    limit: int,
+    refresh: bool,
+    demote_noise: bool,
+    bootstrap: int,
+    persist: bool,
+) -> Workbook:
+    cfg, gsc = _gsc(client)
+    _validate_periods(p1_start, p1_end, p2_start, p2_end)
+    try:
+        d1, _ = load_or_fetch_gsc(client, gsc_kind, p1_start, p1_end, limit, refresh, gsc)
+        d2, _ = load_or_fetch_gsc(client, gsc_kind, p2_start, p2_end, limit, refresh, gsc)
+    except Exception as e:
+        msg = _mask(str(e), [gsc.client_id, gsc.client_secret, gsc.refresh_token])
+        raise StepError(f"GSC error: {msg[:500]}") from e
+
+    rows = compare_gsc_periods(d1, d2, key_field=key_field)
+    rows = calculate_contributions_gsc(rows)
+    rows = annotate_gsc_significance(
+        rows, days_p1=_period_days(p1_start, p1_end), days_p2=_period_days(p2_start, p2_end)
+    )
+    all_rows = rows.copy()
+    rows = sort_gsc_rows(rows, key_field=key_field, demote_noise=demote_noise)
+
+    workbook = create_workbook_gsc(
+        client=client,
+        site_url=cfg.gsc_site_url,
+        kind=gsc_kind,
+        p1_start=p1_start,
+        p1_end=p1_end,
+        p2_start=p2_start,
+        p2_end=p2_end,
+        limit=limit,
+        refresh_used=refresh,
+        rows=rows,
+        all_rows=all_rows,
+    )
+    _attach_extras(
+        workbook, all_rows, client=client, baseline_kind=f"gsc_{gsc_kind}", value_field="clicks", bootstrap=bootstrap,
+        p1_start=p1_start, p1_end=p1_end, p2_start=p2_start, p2_end=p2_end,
+    )
+    path = _workbook_path(client, gsc_workbook_filename(gsc_kind, p1_start, p1_end, p2_start, p2_end))
+    return _finish(f"analyze_gsc_{gsc_kind}", workbook, path, rows, persist)
+
+
+def run_analyze_gsc_queries(
+    client: str,
+    p1_start: str,
+    p1_end: str,
+    p2_start: str,
+    p2_end: str,
+    limit: int = 1000,
+    refresh: bool = False,
+    demote_noise: bool = False,
+    bootstrap: int = 0,
+    persist: bool = True,
+) -> Workbook:
+    """Сравнение запросов GSC между двумя периодами."""
+    return _run_gsc(
+        "queries", "query", client, p1_start, p1_end, p2_start, p2_end, limit, refresh, demote_noise, bootstrap, persist
+    )
+
+
+def run_analyze_gsc_pages(
+    client: str,
+    p1_start: str,
+    p1_end: str,
+    p2_start: str,
+    p2_end: str,
+    limit: int = 1000,
+    refresh: bool = False,
+    demote_noise: bool = False,
+    bootstrap: int = 0,
+    persist: bool = True,
+) -> Workbook:
+    """Сравнение страниц GSC между двумя периодами."""
+    return _run_gsc(
+        "pages", "page", client, p1_start, p1_end, p2_start, p2_end, limit, refresh, demote_noise, bootstrap, persist
+    )
+
+
+def run_analyze_ym_webmaster_queries(
+    client: str,
+    p1_start: str,
+    p1_end: str,
+    p2_start: str,
+    p2_end: str,
+    limit: int = 500,
+    refresh: bool = False,
+    bootstrap: int = 0,
+    persist: bool = True,
+) -> Workbook:
+    """Сравнение запросов Яндекс.Вебмастера между двумя периодами."""
+    cfg, ym = _ym_webmaster(client)
+    try:
+        d1 = load_or_fetch_ymw_queries(client, p1_start, p1_end, limit, refresh, ym)
+        d2 = load_or_fetch_ymw_queries(client, p2_start, p2_end, limit, refresh, ym)
+    except Exception as e:
+        raise StepError(f"Вебмастер error: {_mask(str(e), [ym.token])[:500]}") from e
+
+    rows = compare_ymw_queries_periods(d1, d2)
+    rows = calculate_contributions_ymw(rows)
+    all_rows = rows.copy()
+    rows = sort_ymw_rows(rows)
+
+    workbook = create_workbook_ymw(
+        client=client,
+        host_id=cfg.ym_webmaster_host_id,
+        p1_start=p1_start,
+        p1_end=p1_end,
+        p2_start=p2_start,
+        p2_end=p2_end,
+        limit=limit,
+        refresh_used=refresh,
+        rows=rows,
+        all_rows=all_rows,
+    )
+    _attach_extras(
+        workbook, all_rows, client=client, baseline_kind=None, value_field="clicks", bootstrap=bootstrap,
+        p1_start=p1_start, p1_end=p1_end, p2_start=p2_start, p2_end=p2_end,
+    )
+    path = _workbook_path(client, ymw_workbook_filename(p1_start, p1_end, p2_start, p2_end))
+    return _finish("analyze_ym_webmaster_queries", workbook, path, rows, persist)
+
+
+def run_ym_webmaster_indexing(
+    client: str,
+    status: str = "EXCLUDED",
+    limit: int = 100,
+    offset: int = 0,
+    refresh: bool = False,
+    persist: bool = True,
+) -> Workbook:
+    """
+    Выгрузка URL по статусу индексации.
+
+    В отличие от сравнений, path указывает на norm-файл со списком строк;
+    meta["cache_used"] показывает, пришли ли данные из кэша.
+    """
+    _, ym = _ym_webmaster(client)
+    cache_dir = Path("data_cache") / client
+    raw_file = cache_dir / f"ym_webmaster_indexing_raw_{status}_{limit}_{offset}.json"
+    norm_file = cache_dir / f"ym_webmaster_indexing_norm_{status}_{limit}_{offset}.json"
+
+    normalized = None
+    if not refresh and norm_file.exists():
+        try:
+            cached = read_json(norm_file)
+            if isinstance(cached, list):
+                normalized = cached
+        except Exception:
+            normalized = None
+    cache_used = normalized is not None
+
+    if normalized is None:
+        try:
+            raw = ym.indexing_samples(search_url_status=status, limit=limit, offset=offset)
+            normalized = normalize_webmaster_indexing(raw)
+        except Exception as e:
+            raise StepError(f"Вебмастер error: {_mask(str(e), [ym.token])[:500]}") from e
+        if persist:
+            cache_dir.mkdir(parents=True, exist_ok=True)
+            write_json(raw_file, raw)
+            write_json(norm_file, normalized)
+
+    data = {
+        "meta": {
+            "client": client,
+            "status": status,
+            "limit": limit,
+            "offset": offset,
+            "cache_used": cache_used,
+            "raw_file": str(raw_file),
+        },
+        "totals": {"urls": len(normalized)},
+        "rows": normalized,
+    }
+    return Workbook(
+        kind="ym_webmaster_indexing",
+        data=data,
+        path=norm_file,
+        ranked_rows=normalized,
+        persisted=persist or cache_used,
+    )
+
+
+def run_detect_changepoints(
+    client: str,
+    date1: str,
+    date2: str,
+    kind: str = "pages",
+    limit: int = 100000,
+    top: int = 50,
+    penalty: float = DEFAULT_PENALTY_FACTOR,
+    refresh: bool = False,
+    persist: bool = True,
+) -> Workbook:
+    """Точки смены уровня по дневным рядам выбранного среза."""
+    if kind not in CHANGEPOINT_KINDS:
+        raise StepError(f"--kind должен быть одним из: {', '.join(CHANGEPOINT_KINDS)}")
+    try:
+        dates = changepoint_date_range(date1, date2)
+    except ValueError as e:
+        raise StepError(f"Некорректный формат даты: {e}") from e
+    if not dates:
+        raise StepError(f"date2 ({date2}) < date1 ({date1})")
+
+    source, _, key_field, value_field = CHANGEPOINT_KINDS[kind]
+    metrika = None
+    gsc = None
+    if source == "metrika":
+        _, metrika, token = _metrika(client)
+        secrets = [token]
+    else:
+        _, gsc = _gsc(client)
+        secrets = [gsc.client_id, gsc.client_secret, gsc.refresh_token]
+
+    try:
+        daily = load_or_fetch_daily(client, kind, date1, date2, limit, refresh, metrika_client=metrika, gsc_client=gsc)
+    except Exception as e:
+        raise StepError(f"Не удалось загрузить дневные ряды: {_mask(str(e), secrets)[:500]}") from e
+
+    series = build_series(daily, key_field, value_field, dates)
+    rows = detect_changepoints(series, dates, key_field, penalty_factor=penalty)
+    workbook = create_workbook_changepoints(
+        client=client,
+        kind=kind,
+        date1=date1,
+        date2=date2,
+        top=top,
+        refresh_used=refresh,
+        series_count=len(series),
+        days=len(dates),
+        rows=rows,
+        penalty_factor=penalty,
+    )
+    path = _workbook_path(client, changepoints_workbook_filename(kind, date1, date2))
+    return _finish("detect_changepoints", workbook, path, rows, persist)
+
+
+def run_reconcile_pages(
+    client: str,
+    p1_start: str,
+    p1_end: str,
+    p2_start: str,
+    p2_end: str,
+    source: str = "Search engine traffic",
+    limit: int = 0,
+    top: int = 200,
+    min_clicks: float = RECONCILE_MIN_CLICKS,
+    threshold: float = RECONCILE_THRESHOLD,
+    refresh: bool = False,
+    persist: bool = True,
+) -> Workbook:
+    """
+    Сверка по страницам: клики GSC, органика Метрики и статус URL в Вебмастере.
+
+    limit идёт в оба сравнения целиком (не top-N), чтобы склеить все страницы;
+    0 — выгрузить все страницы постранично (полная выгрузка переиспользуется из кэша);
+    статусы Вебмастера берутся из выгрузок индексации, уже лежащих в кэше.
+    """
+    gsc_pages = run_analyze_gsc_pages(client, p1_start, p1_end, p2_start, p2_end, limit=limit, refresh=refresh, persist=False)
+    organic = run_analyze_pages_by_source(
+        client, p1_start, p1_end, p2_start, p2_end, source=source, limit=limit, refresh=refresh, persist=False
+    )
+    indexing_rows: List[Dict[str, Any]] = []
+    for norm_file in sorted((Path("data_cache") / client).glob("ym_webmaster_indexing_norm_*.json")):
+        cached = read_json(norm_file)
+        if isinstance(cached, list):
+            indexing_rows.extend(cached)
+
+    rows, totals = reconcile_pages(
+        gsc_pages.data["rows"], organic.data["rows"], indexing_rows, min_clicks=min_clicks, threshold=threshold
+    )
+    workbook = create_workbook_reconcile(
+        client=client,
+        p1_start=p1_start,
+        p1_end=p1_end,
+        p2_start=p2_start,
+        p2_end=p2_end,
+        source=source,
+        top=top,
+        refresh_used=refresh,
+        rows=rows,
+        totals=totals,
+        min_clicks=min_clicks,
+        threshold=threshold,
+    )
+    path = _workbook_path(client, reconcile_workbook_filename(p1_start, p1_end, p2_start, p2_end))
+    return _finish("reconcile_pages", workbook, path, [row for row in rows if row["flag"]], persist)
+
+
+STEP_RUNNERS: Dict[str, Callable[..., Workbook]] = {
+    "analyze_sources": run_analyze_sources,
+    "analyze_pages": run_analyze_pages,
+    "analyze_pages_by_source": run_analyze_pages_by_source,
+    "analyze_goals_by_source": run_analyze_goals_by_source,
+    "analyze_goals_by_page": run_analyze_goals_by_page,
+    "analyze_gsc_queries": run_analyze_gsc_queries,
+    "analyze_gsc_pages": run_analyze_gsc_pages,
+    "analyze_ym_webmaster_queries": run_analyze_ym_webmaster_queries,
+    "ym_webmaster_indexing": run_ym_webmaster_indexing,
+    "detect_changepoints": run_detect_changepoints,
+    "reconcile_pages": run_reconcile_pages,
+}
+
+
+_OUTPUT_FILES = {"step_latency.json", build_graph.MANIFEST_FILE}
+
+
+def _reuse_workbook(step_kind: str, params: Dict[str, Any]) -> Optional[Workbook]:
+    """Workbook с диска, если с прошлого расчёта не изменились входы, конфиг, baselines и код."""
+    client = str(params.get("client", ""))
+    entry = build_graph.step_manifest(client).get(build_graph.node_key(step_kind, params))
+    if entry is None or entry.get("code") != build_graph.code_version("steps"):
+        return None
+    if set(entry["implicit"]) != set(build_graph.implicit_inputs(client)):
+        return None
+    if not build_graph.files_unchanged({**entry["inputs"], **entry["implicit"], entry["path"]: entry["output"]}):
+        return None
+    try:
+        ranked_rows = json.loads(ArtifactStore().get_text(entry["ranked_rows"]))
+        data = read_json(entry["path"])
+    except (FileNotFoundError, ValueError):
+        return None
+    return Workbook(
+        kind=step_kind,
+        data=data,
+        path=Path(entry["path"]),
+        ranked_rows=ranked_rows,
+        inputs=list(entry["inputs"]),
+        reused=True,
+    )
+
+
+def _record_workbook(step_kind: str, params: Dict[str, Any], workbook: Workbook) -> None:
+    client = str(params.get("client", ""))
+    build_graph.step_manifest(client).put(
+        build_graph.node_key(step_kind, params),
+        {
+            "kind": step_kind,
+            "code": build_graph.code_version("steps"),
+            "path": str(workbook.path),
+            "output": build_graph.file_record(workbook.path),
+            "inputs": build_graph.record_files(workbook.inputs),
+            "implicit": build_graph.record_files(build_graph.implicit_inputs(client)),
+            "ranked_rows": ArtifactStore().put_text(json.dumps(workbook.ranked_rows, ensure_ascii=False, default=str)),
+        },
+    )
+
+
+def _cache_fingerprint(client: str) -> Tuple[int, int]:
+    """
+    (число файлов, максимальный mtime_ns) входного кэша клиента.
+
+    Workbook-и (analysis_*) и статистика латентности — выходы шагов, их
+    запись не должна сбрасывать память готовых результатов.
+    """
+    count, latest = 0, 0
+    cache_dir = Path("data_cache") / client
+    if not cache_dir.is_dir():
+        return count, latest
+    with os.scandir(cache_dir) as entries:
+        for entry in entries:
+            if entry.name.startswith("analysis_") or entry.name in _OUTPUT_FILES or not entry.is_file():
+                continue
+            count += 1
+            latest = max(latest, entry.stat().st_mtime_ns)
+    return count, latest
+
+
+class StepMemo:
+    """
+    Готовые workbook-и по (kind, params) для долгоживущего процесса (serve).
+
+    Запись годна, пока не изменился входной кэш клиента в data_cache/<client>/
+    (добавился или переписан файл) и его config.yaml. Шаги с refresh и без
+    persist мимо памяти не проходят: их результат всегда считается заново.
+    """
+
+    def __init__(self, max_entries: int = 256) -> None:
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[Tuple[Any, ...], Workbook]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats: Dict[str, int] = {"hits": 0, "misses": 0}
+
+    @staticmethod
+    def _key(step_kind: str, params: Dict[str, Any]) -> str:
+        return step_kind + ":" + json.dumps(params, sort_keys=True, ensure_ascii=False, default=str)
+
+    @staticmethod
+    def _version(params: Dict[str, Any]) -> Tuple[Any, ...]:
+        client = str(params.get("client", ""))
+        config_path = Path("clients") / client / "config.yaml"
+        config_mtime = config_path.stat().st_mtime_ns if config_path.exists() else 0
+        return (str(Path.cwd()), config_mtime, *_cache_fingerprint(client))
+
+    def get(self, step_kind: str, params: Dict[str, Any]) -> Optional[Workbook]:
+        key = self._key(step_kind, params)
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is not None and entry[0] == self._version(params):
+            with self._lock:
+                self._entries.move_to_end(key)
+                self.stats["hits"] += 1
+            return entry[1]
+        with self._lock:
+            self.stats["misses"] += 1
+        return None
+
+    def put(self, step_kind: str, params: Dict[str, Any], workbook: Workbook) -> None:
+        key = self._key(step_kind, params)
+        version = self._version(params)
+        with self._lock:
+            self._entries[key] = (version, workbook)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self, client: Optional[str] = None) -> int:
+        with self._lock:
+            if client is None:
+                removed = len(self._entries)
+                self._entries.clear()
+                return removed
+            keys = [key for key, (_, workbook) in self._entries.items() if workbook.path.parent.name == client]
+            for key in keys:
+                del self._entries[key]
+            return len(keys)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+_STEP_MEMO: Optional[StepMemo] = None
+
+
+def set_step_memo(memo: Optional[StepMemo]) -> None:
+    """Включает (или выключает, None) память готовых шагов для run_step."""
+    global _STEP_MEMO
+    _STEP_MEMO = memo
+
+
+def run_step(step_kind: str, params: Dict[str, Any], persist: bool = True) -> Workbook:
+    """
+    Выполняет шаг плана по его kind.
+
+    Параметры, которых у шага нет (например, CLI-шный format), отбрасываются.
+    Если включён StepMemo (serve), повторный шаг с теми же параметрами
+    отдаётся из памяти, пока не изменился кэш данных клиента. Без refresh
+    workbook не пересчитывается, если его входы и код не менялись с прошлого
+    расчёта (build_graph): он читается с диска.
+    """
+    memo = _STEP_MEMO if persist and not params.get("refresh") else None
+    if memo is not None:
+        cached = memo.get(step_kind, params)
+        if cached is not None:
+            return cached
+    runner = STEP_RUNNERS.get(step_kind)
+    if runner is None:
+        raise StepError(f"Unsupported planned step kind: {step_kind}")
+    # Выгрузка индексации и есть кэш (path — norm-файл), пересчитывать в ней нечего.
+    incremental = persist and step_kind not in LISTING_KINDS
+    if incremental and not params.get("refresh"):
+        with tracing.span("step.reuse", kind=step_kind) as span:
+            reused = _reuse_workbook(step_kind, params)
+            span.set("reused", reused is not None)
+        if reused is not None:
+            if memo is not None:
+                memo.put(step_kind, params, reused)
+            return reused
+    signature = inspect.signature(runner)
+    if any(p.kind is inspect.Parameter.VAR_KEYWORD for p in signature.parameters.values()):
+        kwargs = dict(params)
+    else:
+        kwargs = {name: value for name, value in params.items() if name in signature.parameters}
+    kwargs["persist"] = persist
+    with tracing.span("step.run", kind=step_kind) as span, record_touched() as touched:
+        workbook = runner(**kwargs)
+        span.set("rows", len(workbook.rows))
+    workbook = replace(workbook, inputs=[path for path in touched if path != str(workbook.path)])
+    if incremental and workbook.persisted:
+        _record_workbook(step_kind, params, workbook)
+    if memo is not None:
+        memo.put(step_kind, params, workbook)
+    return workbook
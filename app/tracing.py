@@ -0,0 +1,244 @@
+"""Лёгкая трассировка: вложенные span-ы с таймингами без внешних зависимостей.
+
+Текущий tracer и span живут в contextvars. В пул потоков контекст сам не
+переходит, поэтому задачи отправляются через in_context(). Без start_trace()
+span() почти ничего не стоит и возвращает заглушку.
+
+Экспорт: список span-ов (evidence.json), Chrome trace-event JSON
+(chrome://tracing, Perfetto) и OTLP/HTTP JSON в локальный коллектор.
+"""
+
+from __future__ import annotations
+
+import contextvars
+import json
+import secrets
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+SERVICE_NAME = "analyzer-machine"
+OTLP_TIMEOUT = 5
+
+
+@dataclass
+class Span:
+    name: str
+    trace_id: str
+    span_id: str
+    parent_id: Optional[str]
+    start_ns: int
+    thread_id: int
+    attributes: Dict[str, Any] = field(default_factory=dict)
+    end_ns: int = 0
+    status: str = "ok"
+    error: str = ""
+
+    def set(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    @property
+    def duration_ms(self) -> float:
+        return (self.end_ns - self.start_ns) / 1e6 if self.end_ns else 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start_ns": self.start_ns,
+            "duration_ms": round(self.duration_ms, 3),
+            "thread_id": self.thread_id,
+            "status": self.status,
+            "error": self.error,
+            "attributes": self.attributes,
+        }
+
+
+class _NoopSpan:
+    def set(self, key: str, value: Any) -> None:
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class Tracer:
+    def __init__(self) -> None:
+        self.trace_id = secrets.token_hex(16)
+        self.spans: List[Span] = []
+        self._lock = threading.Lock()
+
+    def finish(self, span: Span) -> None:
+        with self._lock:
+            self.spans.append(span)
+
+    def finished(self) -> List[Span]:
+        with self._lock:
+            return sorted(self.spans, key=lambda item: item.start_ns)
+
+    def summary(self) -> List[Dict[str, Any]]:
+        """Суммарное время по имени span-а, самые дорогие сверху."""
+        by_name: Dict[str, Dict[str, Any]] = {}
+        for span in self.finished():
+            item = by_name.setdefault(span.name, {"name": span.name, "count": 0, "total_ms": 0.0, "max_ms": 0.0})
+            item["count"] += 1
+            item["total_ms"] += span.duration_ms
+            item["max_ms"] = max(item["max_ms"], span.duration_ms)
+        rows = sorted(by_name.values(), key=lambda item: -item["total_ms"])
+        for item in rows:
+            item["total_ms"] = round(item["total_ms"], 3)
+            item["max_ms"] = round(item["max_ms"], 3)
+        return rows
+
+    def export(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "summary": self.summary(),
+            "spans": [span.to_dict() for span in self.finished()],
+        }
+
+
+_TRACER: contextvars.ContextVar[Optional[Tracer]] = contextvars.ContextVar("tracer", default=None)
+_CURRENT: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar("current_span", default=None)
+
+
+def current_tracer() -> Optional[Tracer]:
+    return _TRACER.get()
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Any]:
+    tracer = _TRACER.get()
+    if tracer is None:
+        yield _NOOP_SPAN
+        return
+    parent = _CURRENT.get()
+    item = Span(
+        name=name,
+        trace_id=tracer.trace_id,
+        span_id=secrets.token_hex(8),
+        parent_id=parent.span_id if parent is not None else None,
+        start_ns=time.time_ns(),
+        thread_id=threading.get_ident(),
+        attributes=dict(attributes),
+    )
+    token = _CURRENT.set(item)
+    try:
+        yield item
+    except BaseException as exc:
+        item.status = "error"
+        item.error = str(exc)[:500]
+        raise
+    finally:
+        _CURRENT.reset(token)
+        item.end_ns = time.time_ns()
+        tracer.finish(item)
+
+
+@contextmanager
+def start_trace(name: str, **attributes: Any) -> Iterator[Tracer]:
+    """Новый trace с корневым span-ом; вложенный вызов открывает отдельный trace."""
+    tracer = Tracer()
+    tracer_token = _TRACER.set(tracer)
+    span_token = _CURRENT.set(None)
+    try:
+        with span(name, **attributes):
+            yield tracer
+    finally:
+        _CURRENT.reset(span_token)
+        _TRACER.reset(tracer_token)
+
+
+def in_context(fn: Callable[..., Any]) -> Callable[..., Any]:
+    """Обёртка для pool.submit: задача увидит текущие tracer и span."""
+    context = contextvars.copy_context()
+    return lambda *args, **kwargs: context.run(fn, *args, **kwargs)
+
+
+def to_chrome_trace(tracer: Tracer) -> Dict[str, Any]:
+    spans = tracer.finished()
+    origin = min((item.start_ns for item in spans), default=0)
+    thread_numbers: Dict[int, int] = {}
+    events = []
+    for item in spans:
+        tid = thread_numbers.setdefault(item.thread_id, len(thread_numbers) + 1)
+        events.append(
+            {
+                "name": item.name,
+                "cat": item.name.split(".")[0],
+                "ph": "X",
+                "ts": (item.start_ns - origin) / 1000,
+                "dur": (item.end_ns - item.start_ns) / 1000,
+                "pid": 1,
+                "tid": tid,
+                "args": {**item.attributes, **({"error": item.error} if item.error else {})},
+            }
+        )
+    return {"traceEvents": events, "displayTimeUnit": "ms", "otherData": {"trace_id": tracer.trace_id}}
+
+
+def write_chrome_trace(tracer: Tracer, path: Path) -> Path:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(to_chrome_trace(tracer), ensure_ascii=False, default=str), encoding="utf-8")
+    return path
+
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def to_otlp(tracer: Tracer) -> Dict[str, Any]:
+    """Тело запроса OTLP/HTTP JSON (POST <endpoint>/v1/traces)."""
+    spans = []
+    for item in tracer.finished():
+        otlp_span: Dict[str, Any] = {
+            "traceId": item.trace_id,
+            "spanId": item.span_id,
+            "name": item.name,
+            "kind": 1,
+            "startTimeUnixNano": str(item.start_ns),
+            "endTimeUnixNano": str(item.end_ns),
+            "attributes": [{"key": key, "value": _otlp_value(value)} for key, value in item.attributes.items()],
+            "status": {"code": 2, "message": item.error} if item.status == "error" else {"code": 1},
+        }
+        if item.parent_id:
+            otlp_span["parentSpanId"] = item.parent_id
+        spans.append(otlp_span)
+    return {
+        "resourceSpans": [
+            {
+                "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": SERVICE_NAME}}]},
+                "scopeSpans": [{"scope": {"name": "app.tracing"}, "spans": spans}],
+            }
+        ]
+    }
+
+
+def export_otlp(tracer: Tracer, endpoint: str) -> Optional[str]:
+    """
+    Отправляет trace в OTLP-коллектор (например, http://localhost:4318).
+
+    Returns: текст ошибки или None. Недоступный коллектор не должен ронять расследование.
+    """
+    import requests  # только для экспорта: tracing импортируется везде, requests тяжёлый
+
+    url = endpoint.rstrip("/")
+    if not url.endswith("/v1/traces"):
+        url += "/v1/traces"
+    try:
+        r = requests.post(url, json=to_otlp(tracer), timeout=OTLP_TIMEOUT)
+    except requests.RequestException as e:
+        return f"OTLP export failed: {e}"
+    if r.status_code >= 400:
+        return f"OTLP export failed: {r.status_code} {r.text[:200]}"
+    return None
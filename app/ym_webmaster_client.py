@@ -4,7 +4,9 @@ import json
 from dataclasses import dataclass, field
 from typing import Any, Dict, List, Optional
 
+from app import tracing
 from app.http_client import get_default_session
+from app.rate_limit import acquire as acquire_rate_limit
 
 
 @dataclass(frozen=True)
@@ -18,14 +20,20 @@ class YMWebmasterClient:
         return {"Authorization": f"OAuth {self.token}"}
 
     def _get(self, url: str, params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
-        r = self._session.get(url, headers=self._headers(), params=params or {})
+        with tracing.span("api.ym_webmaster", url=url) as span:
+            span.set("rate_limit_wait_s", acquire_rate_limit("ym_webmaster"))
+            r = self._session.get(url, headers=self._headers(), params=params or {})
+            span.set("status_code", r.status_code)
         if r.status_code >= 400:
             raise RuntimeError(f"YM Webmaster API error {r.status_code}: {r.text[:500]} | url={url}")
         return r.json()
 
     def _post(self, url: str, payload: Dict[str, Any]) -> Dict[str, Any]:
         headers = {**self._headers(), "Content-Type": "application/json"}
-        r = self._session.post(url, headers=headers, data=json.dumps(payload))
+        with tracing.span("api.ym_webmaster", url=url) as span:
+            span.set("rate_limit_wait_s", acquire_rate_limit("ym_webmaster"))
+            r = self._session.post(url, headers=headers, data=json.dumps(payload))
+            span.set("status_code", r.status_code)
         if r.status_code >= 400:
             raise RuntimeError(f"YM Webmaster API error {r.status_code}: {r.text[:500]} | url={url}")
         return r.json()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Замер времени старта CLI: `python -m app.cli --help` и импорт app.cli.
+
+    python scripts/bench_cli_startup.py                  # 10 прогонов, медиана и минимум
+    python scripts/bench_cli_startup.py --top 15         # + самые дорогие модули по -X importtime
+    python scripts/bench_cli_startup.py --max-ms 600     # код выхода 1, если медиана выше порога
+    python scripts/bench_cli_startup.py --record bench/cli_startup.jsonl   # дописать результат для истории
+
+Запускать из корня репозитория.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+COMMANDS: Dict[str, List[str]] = {
+    "help": [sys.executable, "-m", "app.cli", "--help"],
+    "import": [sys.executable, "-c", "import app.cli"],
+}
+
+
+def measure(cmd: List[str], runs: int) -> List[float]:
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        timings.append((time.perf_counter() - started) * 1000)
+    return timings
+
+
+def import_profile(top: int) -> List[Tuple[str, int]]:
+    """Модули с наибольшим кумулятивным временем импорта (мкс)."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app.cli"],
+        check=True,
+        capture_output=True,
+        text=True,
+    )
+    rows = []
+    for line in proc.stderr.splitlines():
+        parts = line.split("|")
+        if len(parts) != 3 or not parts[1].strip().isdigit():
+            continue
+        rows.append((parts[2].strip(), int(parts[1])))
+    return sorted(rows, key=lambda row: -row[1])[:top]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--top", type=int, default=0, help="Показать N самых дорогих импортов")
+    parser.add_argument("--max-ms", type=float, default=0.0, help="Порог медианы `--help`, мс (0 = без проверки)")
+    parser.add_argument("--record", default="", help="JSONL-файл, куда дописать результат")
+    args = parser.parse_args()
+
+    result: Dict[str, object] = {"at": datetime.now(timezone.utc).isoformat(timespec="seconds"), "python": sys.version.split()[0]}
+    for name, cmd in COMMANDS.items():
+        measure(cmd, 1)  # прогрев: .pyc и кэш ФС
+        timings = measure(cmd, args.runs)
+        result[name] = {"median_ms": round(statistics.median(timings), 1), "min_ms": round(min(timings), 1)}
+        print(f"{name:>7}: median {statistics.median(timings):7.1f} ms, min {min(timings):7.1f} ms ({args.runs} runs)")
+
+    if args.top:
+        print("\nimport app.cli, кумулятивно:")
+        for module, micros in import_profile(args.top):
+            print(f"  {micros / 1000:8.1f} ms  {module}")
+
+    if args.record:
+        path = Path(args.record)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with path.open("a", encoding="utf-8") as f:
+            f.write(json.dumps(result, ensure_ascii=False) + "\n")
+
+    median_help = result["help"]["median_ms"]  # type: ignore[index]
+    if args.max_ms and median_help > args.max_ms:
+        print(f"\n--help медиана {median_help} ms выше порога {args.max_ms} ms", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
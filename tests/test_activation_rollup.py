@@ -0,0 +1,117 @@
+import json
+import sqlite3
+from datetime import date
+
+from app.activation_rollup import build_rollup, query_rollup, read_watermark, update_rollup
+
+ORGANIC = json.dumps({"firstTouchSource": "organic", "landingPage": "/pricing/"})
+
+
+def _db(events):
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE user_event (athlete_id TEXT, event_type TEXT, created_at TEXT, metadata TEXT)")
+    _insert(conn, events)
+    return conn
+
+
+def _insert(conn, events):
+    with conn:
+        conn.executemany("INSERT INTO user_event VALUES (?, ?, ?, ?)", events)
+
+
+def _rollup(conn):
+    with conn:
+        return update_rollup(conn, batch_size=2)
+
+
+def test_rollup_is_incremental_and_matches_full_window_query():
+    conn = _db(
+        [
+            ("a1", "signup", "2026-05-01 10:00:00", ORGANIC),
+            ("a1", "oauth_start", "2026-05-01 10:05:00", "{}"),
+            ("a1", "intervals_connected", "2026-05-03 09:00:00", "{}"),
+            ("a2", "signup", "2026-05-02 12:00:00", json.dumps({"signupSource": "en_organic", "landingPage": "/blog/x"})),
+            ("a2", "gpt_data_requested", "2026-05-02 13:00:00", "{}"),
+            ("a2", "claude_data_requested", "2026-05-02 12:30:00", "{}"),
+            ("a3", "signup", "2026-05-02 08:00:00", json.dumps({"source": "ads", "landingPage": "/pricing"})),
+            ("a3", "oauth_start", "2026-05-02 08:10:00", "{}"),
+            ("a4", "oauth_start", "2026-05-02 07:00:00", "{}"),
+            ("a4", "signup", "2026-05-02 09:00:00", ORGANIC),
+        ]
+    )
+
+    stats = _rollup(conn)
+    assert stats["events"] == 10 and stats["watermark"] == "2026-05-03 09:00:00"
+
+    rows = {row["landingPage"]: row for row in query_rollup(conn, "2026-05-01", "2026-05-07")}
+    # a3 — не органика; oauth_start a4 был до регистрации.
+    assert rows["/pricing"]["signups"] == 2
+    assert rows["/pricing"]["oauth_start"] == 1
+    assert rows["/pricing"]["intervals_connected"] == 1
+    assert rows["/blog/x"]["first_data_request"] == 1
+    # Окно до 2026-05-02: подключение a1 случилось позже конца окна.
+    assert query_rollup(conn, "2026-05-01", "2026-05-02")[0]["intervals_connected"] == 0
+    assert query_rollup(conn, "2026-05-02", "2026-05-02")[0]["signups"] == 1
+
+    # Новые события: читаются только с (watermark − 1 день); повторно прочитанные ничего не меняют.
+    _insert(
+        conn,
+        [
+            ("a4", "oauth_start", "2026-05-04 11:00:00", "{}"),
+            ("a4", "training_processed", "2026-05-05 11:00:00", "{}"),
+            ("a5", "signup", "2026-05-05 11:00:00", ORGANIC),
+            # Опоздавшее событие внутри перечитываемого дня: a1 подключил intervals раньше.
+            ("a1", "intervals_connected", "2026-05-02 23:00:00", "{}"),
+        ],
+    )
+    stats = _rollup(conn)
+    assert stats["since"] == "2026-05-02"
+    assert stats["events"] == 12
+    assert stats["athletes"] == 3
+
+    rows = {row["landingPage"]: row for row in query_rollup(conn, "2026-05-01", "2026-05-07")}
+    assert rows["/pricing"]["signups"] == 3
+    assert rows["/pricing"]["oauth_start"] == 2
+    assert rows["/pricing"]["training_processed"] == 1
+    assert rows["/pricing"]["intervals_connected"] == 1
+    assert query_rollup(conn, "2026-05-01", "2026-05-02")[0]["intervals_connected"] == 1
+
+    # Без новых событий — ни одного изменения, rollup тот же.
+    before = conn.execute("SELECT * FROM activation_rollup ORDER BY 1, 2, 3, 4").fetchall()
+    assert _rollup(conn)["athletes"] == 0
+    assert conn.execute("SELECT * FROM activation_rollup ORDER BY 1, 2, 3, 4").fetchall() == before
+
+
+def test_build_rollup_bootstraps_in_committed_windows_and_resumes():
+    events = [
+        ("a1", "signup", "2026-05-01 10:00:00", ORGANIC),
+        ("a1", "oauth_start", "2026-05-03 10:05:00", "{}"),
+        ("a2", "signup", "2026-05-04 12:00:00", ORGANIC),
+        ("a2", "training_processed", "2026-05-06 13:00:00", "{}"),
+    ]
+    conn = _db(events)
+    reference = _db(events)
+    _rollup(reference)
+
+    stats = build_rollup(conn, days_per_batch=2, batch_size=2, today=date(2026, 5, 7))
+    # Окна [..05-03), [..05-05), [..05-07) и открытое — каждое закоммичено.
+    assert stats["batches"] == 4
+    assert stats["watermark"] == "2026-05-06 13:00:00"
+    assert not conn.in_transaction
+    assert query_rollup(conn, "2026-05-01", "2026-05-07") == query_rollup(reference, "2026-05-01", "2026-05-07")
+
+    # Bootstrap прервался после первого окна: следующий запуск продолжает с его watermark.
+    partial = _db(events)
+    with partial:
+        update_rollup(partial, until="2026-05-04")
+    assert read_watermark(partial) == "2026-05-03 10:05:00"
+    _insert(partial, [("a3", "signup", "2026-05-08 09:00:00", ORGANIC)])
+    stats = build_rollup(partial, days_per_batch=2, today=date(2026, 5, 9))
+    assert stats["watermark"] == "2026-05-08 09:00:00"
+    assert query_rollup(partial, "2026-05-01", "2026-05-09")[0]["signups"] == 3
+    assert query_rollup(partial, "2026-05-01", "2026-05-07") == query_rollup(reference, "2026-05-01", "2026-05-07")
+
+
+def test_build_rollup_without_events_is_a_no_op():
+    conn = _db([])
+    assert build_rollup(conn) == {"events": 0, "athletes": 0, "batches": 0, "watermark": None}
@@ -0,0 +1,36 @@
+from app import analysis_bootstrap
+from app.analysis_bootstrap import bootstrap_contributions
+from app.analysis_sources import calculate_contributions, compare_sources_periods
+
+
+def _rows():
+    p1 = [{"source": "organic", "visits": 10000}, {"source": "direct", "visits": 5}, {"source": "ads", "visits": 2000}]
+    p2 = [{"source": "organic", "visits": 8000}, {"source": "direct", "visits": 6}, {"source": "ads", "visits": 2010}]
+    return calculate_contributions(compare_sources_periods(p1, p2))
+
+
+def test_bootstrap_marks_dominant_driver_and_noise():
+    rows = _rows()
+    summary = bootstrap_contributions(rows, value_field="visits", replicates=300, seed=7)
+    by_source = {row["source"]: row for row in rows}
+
+    organic = by_source["organic"]
+    assert organic["contribution_ci_low"] <= organic["contribution_pct"] <= organic["contribution_ci_high"]
+    assert organic["contribution_is_noise"] is False
+    assert by_source["direct"]["contribution_is_noise"] is True
+    assert summary["replicates"] == 300
+    assert summary["total_delta_ci_low"] < -1900 < summary["total_delta_ci_high"]
+
+
+def test_bootstrap_is_deterministic_and_independent_of_pool(monkeypatch):
+    serial = _rows()
+    parallel = _rows()
+    bootstrap_contributions(serial, value_field="visits", replicates=50, seed=1, workers=1)
+    monkeypatch.setattr(analysis_bootstrap, "CHUNK_SIZE", 1)
+    summary = bootstrap_contributions(parallel, value_field="visits", replicates=50, seed=1, workers=2, parallel_threshold=0)
+
+    assert summary["parallel"] is True
+
+    assert [(r["contribution_ci_low"], r["contribution_ci_high"]) for r in serial] == [
+        (r["contribution_ci_low"], r["contribution_ci_high"]) for r in parallel
+    ]
@@ -0,0 +1,105 @@
+import json
+
+import pytest
+import yaml
+from typer.testing import CliRunner
+
+from app.analysis_changepoints import binary_segmentation, build_series, date_range, detect_changepoints, load_or_fetch_daily
+from app.cli import app
+from app.gsc_client import GSCClient
+from app.metrika_client import MetrikaClient
+
+
+runner = CliRunner()
+
+
+def test_binary_segmentation_finds_level_shift_and_ignores_flat_series():
+    stepped = [100.0, 104.0, 97.0, 101.0, 99.0, 103.0, 98.0, 100.0, 51.0, 49.0, 53.0, 48.0, 50.0, 52.0]
+    flat = [100.0, 104.0, 97.0, 101.0, 99.0, 103.0, 98.0, 100.0, 102.0, 96.0, 101.0, 99.0, 103.0, 100.0]
+
+    assert binary_segmentation(stepped) == [8]
+    assert binary_segmentation(flat) == []
+
+
+def test_detect_changepoints_ranks_keys_by_impact():
+    dates = date_range("2024-03-01", "2024-03-14")
+    rows = []
+    for i, day in enumerate(dates):
+        rows.append({"date": day, "landingPage": "/big", "visits": 200.0 if i < 7 else 100.0})
+        rows.append({"date": day, "landingPage": "/small", "visits": 20.0 if i < 10 else 10.0})
+        rows.append({"date": day, "landingPage": "/stable", "visits": 50.0})
+
+    result = detect_changepoints(build_series(rows, "landingPage", "visits", dates), dates, "landingPage")
+
+    assert [row["landingPage"] for row in result] == ["/big", "/small"]
+    assert result[0]["change_date"] == "2024-03-08"
+    assert result[0]["change_impact"] == -700.0
+
+
+def test_detect_changepoints_cli_writes_workbook(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("YANDEX_METRIKA_TOKEN", "token")
+    client_dir = tmp_path / "clients" / "demo"
+    client_dir.mkdir(parents=True)
+    (client_dir / "config.yaml").write_text(
+        yaml.safe_dump({"site": {"name": "example.com"}, "metrika": {"counter_id": 123456}}),
+        encoding="utf-8",
+    )
+    dates = date_range("2024-03-01", "2024-03-10")
+    payload = {
+        "data": [
+            {"dimensions": [{"name": day}, {"name": "/pricing"}], "metrics": [80 if i < 5 else 20]}
+            for i, day in enumerate(dates)
+        ]
+    }
+    monkeypatch.setattr(MetrikaClient, "daily_visits", lambda self, date1, date2, dimension, limit=100000: payload)
+
+    result = runner.invoke(app, ["detect-changepoints", "demo", "2024-03-01", "2024-03-10"])
+    assert result.exit_code == 0, result.stdout
+
+    workbook = json.loads((tmp_path / "data_cache" / "demo" / "analysis_changepoints_pages_20240301__20240310.json").read_text(encoding="utf-8"))
+    assert workbook["totals"]["series_with_changes"] == 1
+    assert workbook["rows"][0]["landingPage"] == "/pricing"
+    assert workbook["rows"][0]["change_date"] == "2024-03-06"
+
+
+def test_load_or_fetch_daily_pages_through_metrika_and_gsc(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    dates = date_range("2024-03-01", "2024-03-10")
+    metrika_rows = [
+        {"dimensions": [{"name": day}, {"name": f"/p{k}"}], "metrics": [10]} for day in dates for k in range(5)
+    ]
+    offsets = []
+
+    def fake_get(self, url, params):
+        offsets.append(params["offset"])
+        start = int(params["offset"]) - 1
+        return {"data": metrika_rows[start:start + int(params["limit"])], "total_rows": len(metrika_rows)}
+
+    monkeypatch.setattr(MetrikaClient, "_get", fake_get)
+    rows = load_or_fetch_daily("demo", "pages", "2024-03-01", "2024-03-10", 20, False, metrika_client=MetrikaClient(token="t", counter_id=1))
+    assert len(rows) == 50
+    assert offsets == ["1", "21", "41"]
+
+    gsc_rows = [{"keys": [day, f"q{k}"], "clicks": 1, "impressions": 10, "ctr": 0.1, "position": 3} for day in dates for k in range(7)]
+    start_rows = []
+
+    def fake_search(self, date1, date2, dimensions, row_limit=1000, start_row=0, dimension_filter_groups=None, data_state="final"):
+        start_rows.append(start_row)
+        return {"rows": gsc_rows[start_row:start_row + row_limit]}
+
+    monkeypatch.setattr(GSCClient, "search_analytics", fake_search)
+    gsc = GSCClient(client_id="id", client_secret="secret", refresh_token="token", site_url="sc-domain:example.com")
+    rows = load_or_fetch_daily("demo", "gsc_queries", "2024-03-01", "2024-03-10", 30, False, gsc_client=gsc)
+    assert len(rows) == 70
+    assert start_rows == [0, 30, 60]
+
+
+def test_load_or_fetch_daily_refuses_truncated_metrika_series(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    page = [{"dimensions": [{"name": "2024-03-01"}, {"name": "/a"}], "metrics": [10]}]
+    monkeypatch.setattr(MetrikaClient, "_get", lambda self, url, params: {"data": page if params["offset"] == "1" else [], "total_rows": 5})
+
+    with pytest.raises(RuntimeError, match="1 строк из 5"):
+        load_or_fetch_daily("demo", "pages", "2024-03-01", "2024-03-10", 1, False, metrika_client=MetrikaClient(token="t", counter_id=1))
+    assert not list((tmp_path / "data_cache" / "demo").glob("*_norm_*"))
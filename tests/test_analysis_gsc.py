@@ -1,10 +1,13 @@
 import json
 
 from app.analysis_gsc import load_or_fetch_gsc
+from app.gsc_client import GSCClient
 
 
 class FakeGSCClient:
-    def search_analytics(self, date1, date2, dimensions, row_limit):
+    search_analytics_all = GSCClient.search_analytics_all
+
+    def search_analytics(self, date1, date2, dimensions, row_limit, start_row=0, dimension_filter_groups=None, data_state="final"):
         assert date1 == "2026-04-01"
         assert date2 == "2026-04-25"
         assert dimensions == ["query", "page"]
@@ -49,3 +52,48 @@ def test_load_or_fetch_gsc_query_page(tmp_path, monkeypatch):
 
     norm_file = tmp_path / "data_cache" / "stasrun" / "gsc_query_page_norm_2026-04-01_2026-04-25.json"
     assert json.loads(norm_file.read_text(encoding="utf-8")) == rows
+
+
+class PagedGSCClient:
+    search_analytics_all = GSCClient.search_analytics_all
+
+    def __init__(self, total):
+        self.total = total
+        self.calls = []
+
+    def search_analytics(self, date1, date2, dimensions, row_limit, start_row=0, dimension_filter_groups=None, data_state="final"):
+        self.calls.append((start_row, row_limit))
+        stop = min(self.total, start_row + row_limit)
+        return {"rows": [{"keys": [f"/p{i}"], "clicks": 1, "impressions": 10, "ctr": 0.1, "position": 3} for i in range(start_row, stop)]}
+
+
+def test_load_or_fetch_gsc_pages_past_one_request(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    gsc = PagedGSCClient(total=30000)
+
+    rows, _ = load_or_fetch_gsc("c", "pages", "2026-04-01", "2026-04-25", limit=0, refresh=False, gsc_client=gsc)
+
+    assert len(rows) == 30000
+    assert gsc.calls == [(0, 25000), (25000, 25000)]
+
+
+def test_load_or_fetch_gsc_reuses_complete_cache_below_limit(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    gsc = PagedGSCClient(total=7)
+
+    first, _ = load_or_fetch_gsc("c", "pages", "2026-04-01", "2026-04-25", limit=10000, refresh=False, gsc_client=gsc)
+    second, _ = load_or_fetch_gsc("c", "pages", "2026-04-01", "2026-04-25", limit=10000, refresh=False, gsc_client=gsc)
+
+    assert len(first) == 7
+    assert second == first
+    assert gsc.calls == [(0, 10000)]
+
+
+def test_load_or_fetch_gsc_stops_at_limit(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    gsc = PagedGSCClient(total=30000)
+
+    rows, _ = load_or_fetch_gsc("c", "pages", "2026-04-01", "2026-04-25", limit=100, refresh=False, gsc_client=gsc)
+
+    assert len(rows) == 100
+    assert gsc.calls == [(0, 100)]
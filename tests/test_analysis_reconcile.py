@@ -0,0 +1,72 @@
+from app.analysis_pages import load_or_fetch_pages_by_source
+from app.analysis_reconcile import normalize_url, reconcile_pages
+from app.metrika_client import MetrikaClient
+
+
+def test_normalize_url_joins_gsc_and_metrika_spellings():
+    assert normalize_url("https://www.Site.ru/catalog/?utm_source=x#top") == "site.ru/catalog"
+    assert normalize_url("http://site.ru/catalog") == "site.ru/catalog"
+    assert normalize_url("site.ru/%D0%BA%D0%B0%D1%82/") == "site.ru/кат"
+    assert normalize_url("https://site.ru/") == "site.ru/"
+
+
+def test_reconcile_pages_flags_tracking_breaks_against_site_trend():
+    healthy = [f"https://site.ru/ok-{i}" for i in range(5)]
+    gsc = [{"page": url, "clicks_p1": 50.0, "clicks_p2": 60.0} for url in healthy] + [
+        {"page": "https://site.ru/stable", "clicks_p1": 100.0, "clicks_p2": 100.0},
+        {"page": "https://site.ru/broken", "clicks_p1": 80.0, "clicks_p2": 90.0},
+        {"page": "https://site.ru/untracked", "clicks_p1": 30.0, "clicks_p2": 30.0},
+        {"page": "https://site.ru/dropped", "clicks_p1": 100.0, "clicks_p2": 100.0},
+        {"page": "https://site.ru/excluded", "clicks_p1": 100.0, "clicks_p2": 100.0},
+        {"page": "https://site.ru/tiny", "clicks_p1": 5.0, "clicks_p2": 5.0},
+    ]
+    metrika = [{"landingPage": url, "visits_p1": 100.0, "visits_p2": 120.0} for url in healthy] + [
+        {"landingPage": "https://www.site.ru/stable/", "visits_p1": 200.0, "visits_p2": 200.0},
+        {"landingPage": "https://site.ru/broken", "visits_p1": 150.0, "visits_p2": 0.0},
+        {"landingPage": "https://site.ru/dropped", "visits_p1": 200.0, "visits_p2": 60.0},
+        {"landingPage": "https://site.ru/excluded", "visits_p1": 200.0, "visits_p2": 50.0},
+        {"landingPage": "https://site.ru/tiny", "visits_p1": 10.0, "visits_p2": 0.0},
+        {"landingPage": "https://site.ru/yandex-only", "visits_p1": 40.0, "visits_p2": 45.0},
+    ]
+    indexing = [{"url": "https://site.ru/excluded", "search_url_status": "NOTHING_FOUND"}]
+
+    rows, totals = reconcile_pages(gsc, metrika, indexing, min_clicks=20.0, threshold=2.0)
+    by_url = {row["url"]: row for row in rows}
+
+    assert by_url["site.ru/stable"]["flag"] == ""
+    assert by_url["site.ru/broken"]["flag"] == "tracking_break"
+    assert by_url["site.ru/untracked"]["flag"] == "not_tracked"
+    assert by_url["site.ru/dropped"]["flag"] == "metrika_down"
+    assert by_url["site.ru/excluded"]["flag"] == "yandex_excluded"
+    assert by_url["site.ru/excluded"]["ymw_status"] == "NOTHING_FOUND"
+    assert by_url["site.ru/tiny"]["flag"] == ""
+    assert by_url["site.ru/yandex-only"]["clicks_p1"] == 0.0
+    assert by_url["site.ru/stable"]["visits_per_click_p1"] == 2.0
+
+    assert [row["flag"] for row in rows[:4]] == ["tracking_break", "not_tracked", "metrika_down", "yandex_excluded"]
+    assert totals["pages"] == 12
+    assert totals["pages_matched"] == 10
+    assert totals["pages_flagged"] == 4
+    assert totals["flags"]["metrika_up"] == 0
+
+
+def test_organic_pages_are_paged_and_complete_cache_is_reused(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    calls = []
+
+    def fake_get(self, url, params):
+        calls.append((params["offset"], params["limit"]))
+        start = int(params["offset"]) - 1
+        stop = min(150000, start + int(params["limit"]))
+        data = [{"dimensions": [{"name": f"https://site.ru/p{i}"}], "metrics": [1, 1, 0, 1, 10]} for i in range(start, stop)]
+        return {"data": data, "total_rows": 150000}
+
+    monkeypatch.setattr(MetrikaClient, "_get", fake_get)
+    metrika = MetrikaClient(token="t", counter_id=1)
+
+    first = load_or_fetch_pages_by_source("c", "2026-04-01", "2026-04-25", "Search engine traffic", 0, False, metrika)
+    second = load_or_fetch_pages_by_source("c", "2026-04-01", "2026-04-25", "Search engine traffic", 0, False, metrika)
+
+    assert len(first) == 150000
+    assert second == first
+    assert calls == [("1", "100000"), ("100001", "100000")]
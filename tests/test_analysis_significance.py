@@ -0,0 +1,80 @@
+from app.analysis_goals import compare_goals_periods, sort_rows
+from app.analysis_significance import annotate_goals_significance, poisson_delta_p_values, signal_rows, two_proportion_p_values
+from app.orchestrator.analyzer import _rule_goals_page
+
+
+def test_small_pages_are_flagged_as_noise_and_large_shifts_are_not():
+    p1 = [
+        {"landingPage": "/tiny", "visits": 3, "goal_visits": 1, "goal_cr_pct": 33.3},
+        {"landingPage": "/big", "visits": 5000, "goal_visits": 500, "goal_cr_pct": 10.0},
+    ]
+    p2 = [
+        {"landingPage": "/tiny", "visits": 3, "goal_visits": 0, "goal_cr_pct": 0.0},
+        {"landingPage": "/big", "visits": 5000, "goal_visits": 250, "goal_cr_pct": 5.0},
+    ]
+
+    rows = annotate_goals_significance(compare_goals_periods(p1, p2, key_field="landingPage"))
+    by_page = {row["landingPage"]: row for row in rows}
+
+    assert by_page["/tiny"]["cr_is_noise"] is True
+    assert by_page["/big"]["cr_is_noise"] is False
+    assert by_page["/big"]["cr_p_value"] < 0.001
+    assert by_page["/big"]["cr_ci_high_pp"] < 0
+    # shrinkage тянет маленькую страницу к общему CR
+    assert abs(by_page["/tiny"]["cr_delta_pp_shrunk"]) < abs(by_page["/tiny"]["delta_cr_pp"])
+
+    assert [row["landingPage"] for row in signal_rows(rows)] == ["/big"]
+
+
+def test_demote_noise_moves_noisy_rows_after_signal_rows():
+    rows = [
+        {"landingPage": "/noisy", "delta_goal_visits_abs": -10.0, "volume_is_noise": True},
+        {"landingPage": "/real", "delta_goal_visits_abs": -5.0, "volume_is_noise": False},
+    ]
+
+    assert [row["landingPage"] for row in sort_rows(rows, "landingPage")] == ["/noisy", "/real"]
+    assert [row["landingPage"] for row in sort_rows(rows, "landingPage", demote_noise=True)] == ["/real", "/noisy"]
+
+
+def test_p_values_without_observations_are_neutral():
+    assert two_proportion_p_values([0, 5], [0, 100], [1, 5], [10, 100]) == [1.0, 1.0]
+
+
+def test_volume_drop_at_stable_rate_is_signal_not_noise():
+    p1 = [
+        {"landingPage": "/big", "visits": 10000, "goal_visits": 1000, "goal_cr_pct": 10.0},
+        {"landingPage": "/small", "visits": 200, "goal_visits": 40, "goal_cr_pct": 20.0},
+    ]
+    p2 = [
+        {"landingPage": "/big", "visits": 5000, "goal_visits": 500, "goal_cr_pct": 10.0},
+        {"landingPage": "/small", "visits": 200, "goal_visits": 10, "goal_cr_pct": 5.0},
+    ]
+
+    rows = annotate_goals_significance(compare_goals_periods(p1, p2, key_field="landingPage"))
+    by_page = {row["landingPage"]: row for row in rows}
+
+    # CR у /big не изменился, но 1000 -> 500 конверсий — не шум.
+    assert by_page["/big"]["cr_is_noise"] is True
+    assert by_page["/big"]["volume_is_noise"] is False
+    assert [row["landingPage"] for row in sort_rows(rows, "landingPage", demote_noise=True)] == ["/big", "/small"]
+
+    driver = _rule_goals_page("goals.json", {"rows": rows}).drivers[0]
+    assert driver["title"] == "Главная просевшая страница по конверсиям"
+    assert driver["value"].startswith("/big:")
+
+
+def test_poisson_delta_p_values():
+    small, big, empty = poisson_delta_p_values([1, 1000, 0], [0, 500, 0])
+    assert small > 0.05
+    assert big < 1e-6
+    assert empty == 1.0
+
+
+def test_poisson_delta_p_values_account_for_period_length():
+    # 31 день против 15 при одинаковом дневном темпе (10 в день) — не сигнал.
+    (same_rate,) = poisson_delta_p_values([310], [150], days_p1=31, days_p2=15)
+    (equal_days,) = poisson_delta_p_values([310], [150])
+    (real_drop,) = poisson_delta_p_values([310], [75], days_p1=31, days_p2=15)
+    assert same_rate > 0.5
+    assert equal_days < 1e-6
+    assert real_drop < 1e-6
@@ -0,0 +1,65 @@
+import gzip
+import json
+
+from app.artifact_store import ArtifactStore
+from app.orchestrator.models import ExecutedStep
+from app.orchestrator.snapshots import execution_records
+
+
+def _executed(step_id: str, artifacts, inputs, payloads=None) -> ExecutedStep:
+    return ExecutedStep(
+        id=step_id,
+        title=step_id,
+        kind="analyze_sources",
+        success=True,
+        exit_code=0,
+        stdout="Workbook: analysis_sources.json (строк: 2)\n",
+        stderr="",
+        artifacts=artifacts,
+        source="metrika",
+        params={"client": "demo"},
+        inputs=inputs,
+        payloads=payloads or {},
+    )
+
+
+def test_store_dedupes_across_runs_and_keeps_old_content(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    cache_dir = tmp_path / "data_cache" / "demo"
+    cache_dir.mkdir(parents=True)
+    norm = cache_dir / "metrika_sources_norm.json"
+    workbook = cache_dir / "analysis_sources.json"
+    norm.write_text(json.dumps({"rows": [1, 2]}), encoding="utf-8")
+    workbook.write_text(json.dumps({"totals": {"visits": 3}}), encoding="utf-8")
+    step = _executed("s1", [str(workbook)], [str(norm)])
+
+    first_run = list(execution_records([step], ArtifactStore()))
+    second_store = ArtifactStore()
+    second_run = list(execution_records([step], second_store))
+
+    assert first_run[0]["snapshots"] == second_run[0]["snapshots"]
+    assert second_store.stats["stored"] == 0
+    assert second_store.stats["deduplicated"] == 3  # workbook, вход и stdout
+    assert "stdout" not in first_run[0] and first_run[0]["logs"]["stdout"]["chars"] == len(step.stdout)
+    blobs = list((tmp_path / "reports" / "_store").rglob("*.gz"))
+    assert len(blobs) == 3
+    # обычный gzip, читается и без кода проекта
+    contents = {gzip.decompress(blob.read_bytes()).decode("utf-8") for blob in blobs}
+    assert workbook.read_text(encoding="utf-8") in contents
+
+    # --refresh переписал кэш: старое evidence по-прежнему указывает на старые данные.
+    old_digest = first_run[0]["snapshots"][str(norm)]
+    norm.write_text(json.dumps({"rows": [9]}), encoding="utf-8")
+    refreshed = list(execution_records([step], ArtifactStore()))
+    assert refreshed[0]["snapshots"][str(norm)] != old_digest
+    assert json.loads(ArtifactStore().get_text(old_digest)) == {"rows": [1, 2]}
+
+
+def test_unsaved_workbook_is_snapshotted_from_payload(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    path = "data_cache/demo/analysis_sources.json"
+    step = _executed("s1", [path], [], payloads={path: {"rows": []}})
+
+    [record] = execution_records([step], ArtifactStore())
+
+    assert json.loads(ArtifactStore().get_text(record["snapshots"][path])) == {"rows": []}
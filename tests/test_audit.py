@@ -1,3 +1,4 @@
+import pytest
 from pathlib import Path
 
 from app.audit import AuditEngine, DataPoint
@@ -52,3 +53,196 @@ def test_verify_data_source_accepts_absolute_path(tmp_path):
     )
 
     assert result.status == "passed"
+
+
+def test_batch_claims_parse_each_source_once(tmp_path, monkeypatch):
+    import json
+
+    from typer.testing import CliRunner
+
+    from app import audit
+    from app.cli import app
+
+    monkeypatch.chdir(tmp_path)
+    cache_dir = tmp_path / "data_cache" / "acme"
+    cache_dir.mkdir(parents=True)
+    workbook = {
+        "totals": {"visits": 300},
+        "rows": [{"source": "Search", "visits": 200}, {"source": "Direct", "visits": 100}],
+    }
+    (cache_dir / "analysis_sources.json").write_text(json.dumps(workbook), encoding="utf-8")
+    claims = ["metric,value,source,period"]
+    claims += ["totals.visits,300,analysis_sources.json,2026-03"] * 500
+    claims += ["rows[1].visits,100,,", "visits,100,,", "rows[0].visits,999,,"]
+    (tmp_path / "claims.csv").write_text("\n".join(claims) + "\n", encoding="utf-8")
+
+    loads = []
+    original_load = audit.json.load
+    monkeypatch.setattr(audit.json, "load", lambda f: loads.append(f.name) or original_load(f))
+
+    result = CliRunner().invoke(
+        app,
+        ["audit-metric", "--batch", "claims.csv", "--client", "acme", "--source", "analysis_sources.json", "--out", "out.csv"],
+    )
+
+    assert result.exit_code == 1, result.stdout
+    assert len(loads) == 1
+    assert "PASSED: 501" in result.stdout and "FAILED: 2" in result.stdout
+    out = (tmp_path / "out.csv").read_text(encoding="utf-8")
+    # Ключ visits неоднозначен: проверяется первое вхождение (totals.visits), подсказан путь с заявленным значением.
+    assert "source has 300 at totals.visits; claimed value is at rows[1].visits" in out
+    assert "source has 200 at rows[0].visits" in out
+
+
+def test_audit_report_checks_every_number_and_caches_results(tmp_path, monkeypatch):
+    import json
+
+    from app import report_audit
+    from app.report_audit import load_report
+
+    monkeypatch.chdir(tmp_path)
+    cache_dir = tmp_path / "data_cache" / "acme"
+    cache_dir.mkdir(parents=True)
+    # Процента в источнике нет: он проверяется пересчётом из total_visits_p1/p2.
+    sources = {"totals": {"total_visits_p1": 1150, "total_visits_p2": 130}, "rows": [{"source": "Search", "delta_abs": -1030}]}
+    pages = {"rows": [{"landingPage": "https://example.com/2024/", "delta_abs": -30.04}]}
+    (cache_dir / "analysis_sources.json").write_text(json.dumps(sources), encoding="utf-8")
+    (cache_dir / "analysis_pages.json").write_text(json.dumps(pages), encoding="utf-8")
+    run_dir = tmp_path / "reports" / "acme" / "20260301-120000"
+    run_dir.mkdir(parents=True)
+    markdown = "\n".join(
+        [
+            "## Что произошло",
+            "",
+            "- **Общий трафик**: 1 150 -> 130.0 (-88.7%)  ",
+            "  Evidence: `data_cache/acme/analysis_sources.json`",
+            "- **Наиболее просевшая страница**: https://example.com/2024/: -30.0  ",
+            "  Evidence: `data_cache/acme/analysis_pages.json`",
+            "- **Даты сдвигов у топ-10 ключей**: 2024-01-15, 2024-02-01  ",
+            "  Evidence: `data_cache/acme/analysis_pages.json`",
+            "",
+            "## Главные причины",
+            "",
+            "- **Главное падение по источникам**: Search: -1 030  ",
+            "  Evidence: `data_cache/acme/analysis_sources.json`",
+        ]
+    )
+    (run_dir / "report.md").write_text(markdown + "\n", encoding="utf-8")
+
+    engine = AuditEngine("acme", reports_dir=tmp_path / "reports")
+    summary = engine.audit_report(load_report(run_dir), workers=2)
+    # Даты и цифры в URL/метках — не утверждения.
+    assert summary["total_checks"] == 3 and summary["passed"] == 3, summary
+    assert summary["sources"] == 2 and summary["cached"] == 0
+    assert "data_cache/acme/analysis_sources.json#totals.total_visits_p1" in engine.audit_log[0].evidence
+
+    # Неизменный отчёт — целиком из кэша, источники не читаются.
+    monkeypatch.setattr(report_audit, "check_source", lambda *args: pytest.fail("source re-read"))
+    assert engine.audit_report(load_report(run_dir))["cached"] == 3
+    monkeypatch.undo()
+    monkeypatch.chdir(tmp_path)
+
+    # Неверный процент и цифра, которой нет в источнике.
+    tampered = markdown.replace("(-88.7%)", "(-80.0%)").replace("-1 030", "-1 300")
+    (run_dir / "report.md").write_text(tampered + "\n", encoding="utf-8")
+    summary = engine.audit_report(load_report(run_dir), workers=1)
+    assert summary["failed"] == 2
+    issues = [issue for detail in summary["details"] for issue in detail["issues"]]
+    assert "Calculation error: expected -88.70, got -80.00" in issues
+    assert any(issue.startswith("-1300 not found") for issue in issues)
+
+
+def test_audit_report_ties_claims_to_their_fields(tmp_path, monkeypatch):
+    import json
+
+    from app.report_audit import load_report
+
+    monkeypatch.chdir(tmp_path)
+    cache_dir = tmp_path / "data_cache" / "acme"
+    cache_dir.mkdir(parents=True)
+    sources = {
+        "totals": {"total_visits_p1": 1000, "total_visits_p2": 900},
+        "rows": [{"source": "Search", "delta_abs": -1030}, {"source": "Direct", "delta_abs": 1030}],
+    }
+    (cache_dir / "analysis_sources.json").write_text(json.dumps(sources), encoding="utf-8")
+    run_dir = tmp_path / "reports" / "acme" / "20260301-120000"
+    run_dir.mkdir(parents=True)
+    evidence = "  Evidence: `data_cache/acme/analysis_sources.json`"
+    # Все цифры есть в источнике, но не в своих полях: P1 и P2 переставлены, у драйвера другой знак.
+    markdown = "\n".join(
+        [
+            "- **Общий трафик**: 900 -> 1 000 (11.1%)  ",
+            evidence,
+            "- **Главное падение по источникам**: Search: 1 030  ",
+            evidence,
+            "- **Главный рост по источникам**: Direct: 1 030  ",
+            evidence,
+        ]
+    )
+    (run_dir / "report.md").write_text(markdown + "\n", encoding="utf-8")
+
+    engine = AuditEngine("acme", reports_dir=tmp_path / "reports")
+    summary = engine.audit_report(load_report(run_dir), workers=1)
+
+    assert summary["total_checks"] == 3 and summary["passed"] == 1 and summary["failed"] == 2
+    issues = summary["details"][0]["issues"]
+    assert any("totals.total_visits_p1 = 1000" in issue for issue in issues)
+    assert "Calculation error: expected -10.00, got 11.10" in issues
+    assert summary["details"][1]["issues"] == [
+        "1030 not found in source data_cache/acme/analysis_sources.json: rows[0].delta_abs = -1030"
+    ]
+
+
+def test_audit_all_sweeps_every_client_and_skips_unchanged_files(tmp_path, monkeypatch):
+    import json
+
+    from typer.testing import CliRunner
+
+    from app import data_audit
+    from app.cli import app
+
+    monkeypatch.chdir(tmp_path)
+    acme = tmp_path / "data_cache" / "acme"
+    beta = tmp_path / "data_cache" / "beta"
+    acme.mkdir(parents=True)
+    beta.mkdir(parents=True)
+    meta = {"p1_start": "2024-01-01", "p1_end": "2024-01-31", "p2_start": "2024-02-01", "p2_end": "2024-02-29", "limit": 50}
+    rows = [{"source": "Search", "visits_p1": 200.0, "visits_p2": 150.0}, {"source": "Direct", "visits_p1": 100.0, "visits_p2": 90.0}]
+    good = {"meta": meta, "totals": {"total_visits_p1": 300.0, "total_visits_p2": 240.0, "total_delta_pct": -20.0}, "rows": rows}
+    broken = {**good, "totals": {"total_visits_p1": 300.0, "total_visits_p2": 999.0}}
+    truncated = {**good, "meta": {**meta, "limit": 2}, "totals": {"total_visits_p1": 1000.0, "total_visits_p2": 800.0}}
+    (acme / "analysis_sources_good.json").write_text(json.dumps(good), encoding="utf-8")
+    (acme / "analysis_sources_broken.json").write_text(json.dumps(broken), encoding="utf-8")
+    (acme / "analysis_pages_truncated.json").write_text(json.dumps(truncated), encoding="utf-8")
+    (acme / "gsc_pages_raw_2024-02-01_2024-02-29.json").write_text(json.dumps({"rows": [{}] * 1000}), encoding="utf-8")
+    (acme / "build_manifest.json").write_text("{}", encoding="utf-8")
+    (beta / "metrika_sources_norm_2024-02-01_2024-02-29.json").write_text(
+        json.dumps([{"source": "Search", "visits": 10.0}, {"source": "Direct", "visits": "n/a"}]), encoding="utf-8"
+    )
+    (beta / "metrika_sources_raw_2024-02-01_2024-02-29.json").write_text(
+        json.dumps({"data": [{}] * 100, "total_rows": 350}), encoding="utf-8"
+    )
+
+    result = CliRunner().invoke(app, ["audit-all", "--workers", "2", "--out", "sweep.json"])
+
+    assert result.exit_code == 1, result.stdout
+    summary = json.loads((tmp_path / "sweep.json").read_text(encoding="utf-8"))
+    by_name = {Path(entry["path"]).name: entry for entry in summary["files"]}
+    assert len(by_name) == 6 and summary["checked"] == 6 and summary["cached"] == 0
+    assert by_name["analysis_sources_good.json"]["issues"] == []
+    assert by_name["analysis_sources_broken.json"]["issues"] == ["totals.total_visits_p2 = 999, а сумма rows.visits_p2 = 240"]
+    assert by_name["analysis_pages_truncated.json"]["issues"] == []
+    assert by_name["analysis_pages_truncated.json"]["warnings"] == ["rows обрезаны до 2 (limit/top)"]
+    assert "rowLimit" in by_name["gsc_pages_raw_2024-02-01_2024-02-29.json"]["warnings"][0]
+    assert "visits: ожидалось число" in by_name["metrika_sources_norm_2024-02-01_2024-02-29.json"]["issues"][0]
+    assert by_name["metrika_sources_raw_2024-02-01_2024-02-29.json"]["warnings"] == ["ответ Метрики обрезан: 100 строк из 350"]
+    assert summary["clients"]["beta"]["files"] == 2
+
+    # Повторный проход: неизменённые файлы не читаются, изменённый — проверяется заново.
+    (acme / "analysis_sources_broken.json").write_text(json.dumps(good), encoding="utf-8")
+    checked = []
+    original = data_audit.check_artifact
+    monkeypatch.setattr(data_audit, "check_artifact", lambda path: checked.append(path) or original(path))
+    summary = data_audit.sweep(["acme"], workers=1)
+    assert checked == [str(Path("data_cache") / "acme" / "analysis_sources_broken.json")]
+    assert summary["cached"] == 3 and summary["issues"] == 0
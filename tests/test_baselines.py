@@ -0,0 +1,87 @@
+import json
+from datetime import datetime
+
+from app.audit import AuditEngine, DataPoint
+from app.baselines import annotate_expected, fit_baselines, load_baselines, save_baselines
+from app.analysis_changepoints import date_range
+
+
+def _write_history(tmp_path):
+    rows = []
+    for day in date_range("2024-01-01", "2024-03-31"):
+        weekend = datetime.strptime(day, "%Y-%m-%d").weekday() >= 5
+        rows.append({"date": day, "source": "Search engine traffic", "visits": 50.0 if weekend else 100.0})
+        rows.append({"date": day, "source": "Direct traffic", "visits": 10.0})
+    cache_dir = tmp_path / "data_cache" / "demo"
+    cache_dir.mkdir(parents=True)
+    (cache_dir / "metrika_daily_sources_norm_2024-01-01_2024-03-31.json").write_text(json.dumps(rows), encoding="utf-8")
+
+
+def test_weekly_profile_explains_weekend_heavy_period(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    _write_history(tmp_path)
+
+    baselines = fit_baselines("demo", "sources")
+    save_baselines("demo", "sources", baselines)
+    model = load_baselines("demo", "sources")["models"]["Search engine traffic"]
+    assert model["weekday"][5] < 0.7 < model["weekday"][0]
+    assert load_baselines("demo", "sources")["meta"]["yearly"] is False
+
+    # P1: пн-пт (5 будней), P2: пт-вт с выходными — падение ожидаемо.
+    rows = [
+        {"source": "Search engine traffic", "visits_p1": 500.0, "visits_p2": 400.0},
+        {"source": "Direct traffic", "visits_p1": 50.0, "visits_p2": 50.0},
+    ]
+    summary = annotate_expected(rows, baselines, "2024-04-01", "2024-04-05", "2024-04-05", "2024-04-09")
+
+    assert abs(rows[0]["expected_p2"] - 400.0) < 1.0
+    assert abs(summary["delta_vs_expected_pct"]) < 1.0
+
+
+def _write_flat(cache_dir, date1, date2, visits=100.0):
+    rows = [{"date": day, "source": "Search engine traffic", "visits": visits} for day in date_range(date1, date2)]
+    (cache_dir / f"metrika_daily_sources_norm_{date1}_{date2}.json").write_text(json.dumps(rows), encoding="utf-8")
+
+
+def test_gaps_between_cached_windows_are_not_zero_traffic(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    cache_dir = tmp_path / "data_cache" / "demo"
+    cache_dir.mkdir(parents=True)
+    _write_flat(cache_dir, "2024-01-01", "2024-01-31")
+    _write_flat(cache_dir, "2025-01-01", "2025-01-31")
+
+    baselines = fit_baselines("demo", "sources")
+    model = baselines["models"]["Search engine traffic"]
+    assert baselines["meta"]["days"] == 62
+    assert model["level"] == 100.0
+    assert all(abs(factor - 1.0) < 1e-9 for factor in model["month"] + model["weekday"])
+
+
+def test_month_without_enough_observed_days_keeps_neutral_factor(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    cache_dir = tmp_path / "data_cache" / "demo"
+    cache_dir.mkdir(parents=True)
+    _write_flat(cache_dir, "2024-01-01", "2024-01-31")
+    _write_flat(cache_dir, "2024-02-10", "2024-02-12", visits=300.0)
+    _write_flat(cache_dir, "2024-03-01", "2025-01-31")
+
+    baselines = fit_baselines("demo", "sources")
+    month = baselines["models"]["Search engine traffic"]["month"]
+    assert baselines["meta"]["yearly"] is True
+    assert month[1] == 1.0
+    assert all(abs(factor - 1.0) < 0.05 for factor in month)
+
+
+def test_audit_alternatives_use_baseline():
+    engine = AuditEngine("demo")
+    point = [DataPoint(metric="visits", value=1, source_file="x.json", period="p2", context={})]
+
+    explained = engine._generate_alternative_hypotheses(
+        "Падение трафика", point, {"baseline": {"expected_total_p2": 90, "actual_total_p2": 88, "delta_vs_expected_pct": -2.2}}
+    )
+    ruled_out = engine._generate_alternative_hypotheses(
+        "Падение трафика", point, {"baseline": {"expected_total_p2": 100, "actual_total_p2": 60, "delta_vs_expected_pct": -40.0}}
+    )
+
+    assert explained[0].startswith("Сезонность: ожидалось 90")
+    assert not any("Сезон" in alt for alt in ruled_out)
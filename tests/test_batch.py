@@ -0,0 +1,136 @@
+import json
+import time
+
+import yaml
+from typer.testing import CliRunner
+
+from app import rate_limit
+from app.cli import app
+from app.orchestrator import agent_loop
+from app.orchestrator.batch import BatchJob, load_spec, run_client_jobs
+from app.orchestrator.models import InvestigationReport
+from app.orchestrator.report_generator import _allocate_report_dir
+
+runner = CliRunner()
+
+PERIOD = {"p1_start": "2024-01-01", "p1_end": "2024-01-31", "p2_start": "2025-01-01", "p2_end": "2025-01-31"}
+
+
+def test_spec_expands_all_clients_and_dedupes_jobs(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    for client in ("alpha", "beta"):
+        (tmp_path / "clients" / client).mkdir(parents=True)
+        (tmp_path / "clients" / client / "config.yaml").write_text("metrika: {counter_id: 1}\n", encoding="utf-8")
+    spec_path = tmp_path / "batch.yaml"
+    spec_path.write_text(
+        yaml.safe_dump(
+            {
+                "clients": "all",
+                "queries": ["Почему упал трафик", "Почему упал трафик"],
+                "periods": [PERIOD, PERIOD],
+                "rate_limits": {"gsc": 5},
+            },
+            allow_unicode=True,
+        ),
+        encoding="utf-8",
+    )
+
+    spec = load_spec(spec_path)
+
+    assert [(job.client, job.query) for job in spec.jobs] == [("alpha", "Почему упал трафик"), ("beta", "Почему упал трафик")]
+    assert spec.jobs[0].period == PERIOD
+    assert spec.rate_limits["gsc"] == 5.0
+    assert spec.rate_limits["metrika"] == 3.0
+
+
+def test_shared_rate_limit_spaces_calls():
+    rate_limit.install(rate_limit.create_shared_limits({"metrika": 20}))
+    try:
+        started = time.perf_counter()
+        for _ in range(4):
+            rate_limit.acquire("metrika")
+        elapsed = time.perf_counter() - started
+        assert rate_limit.acquire("gsc") == 0.0
+    finally:
+        rate_limit.uninstall()
+    assert elapsed >= 0.14
+
+
+def test_report_dirs_do_not_collide(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr("app.orchestrator.report_generator._run_id", lambda: "20250101-000000")
+
+    first, _ = _allocate_report_dir("demo")
+    second, second_dir = _allocate_report_dir("demo")
+
+    assert first == "20250101-000000"
+    assert second == "20250101-000000-2"
+    assert second_dir.is_dir()
+
+
+def test_investigate_batch_writes_summary(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    calls = []
+
+    def fake_investigate(**kwargs):
+        calls.append(kwargs)
+        if kwargs["client"] == "broken":
+            raise RuntimeError("нет конфига")
+        report = InvestigationReport(
+            run_id="r1",
+            report_dir=f"reports/{kwargs['client']}/r1",
+            markdown_path=f"reports/{kwargs['client']}/r1/report.md",
+            html_path="",
+            evidence_json_path="",
+            evidence_txt_path="",
+            summary=f"итог {kwargs['query']}",
+        )
+        return report, {"root_cause_status": "partial"}, []
+
+    monkeypatch.setattr(agent_loop, "investigate", fake_investigate)
+    spec_path = tmp_path / "batch.yaml"
+    spec_path.write_text(
+        yaml.safe_dump({"clients": ["demo", "broken"], "queries": ["q1", "q2"], "refresh": True}),
+        encoding="utf-8",
+    )
+
+    result = runner.invoke(app, ["investigate-batch", str(spec_path), "--workers", "1"])
+
+    assert result.exit_code == 0, result.stdout
+    assert "Успешно: 2" in result.stdout
+    # Оба запроса без периода разрешаются в один период: второй берёт обновлённый кэш.
+    assert [call["refresh"] for call in calls if call["client"] == "demo"] == [True, False]
+    summary_files = list((tmp_path / "reports" / "_batch").glob("*/summary.json"))
+    assert len(summary_files) == 1
+    summary = json.loads(summary_files[0].read_text(encoding="utf-8"))
+    assert [(entry["job"]["client"], entry["success"]) for entry in summary["results"]] == [
+        ("demo", True),
+        ("demo", True),
+        ("broken", False),
+        ("broken", False),
+    ]
+    assert (summary_files[0].parent / "summary.md").exists()
+
+
+def test_refresh_covers_every_distinct_period_of_a_client(monkeypatch):
+    calls = []
+
+    def fake_investigate(**kwargs):
+        calls.append(kwargs)
+        raise RuntimeError("stop")
+
+    monkeypatch.setattr(agent_loop, "investigate", fake_investigate)
+    other = {**PERIOD, "p2_start": "2025-02-01", "p2_end": "2025-02-28"}
+    jobs = [
+        BatchJob(client="demo", query="Почему упал трафик", period=PERIOD),
+        BatchJob(client="demo", query="Почему упал трафик", period=other),
+        BatchJob(client="demo", query="Почему упали заявки", period=PERIOD),
+        BatchJob(client="demo", query="Почему упал трафик", period=PERIOD),
+    ]
+
+    run_client_jobs("demo", jobs, refresh=True)
+
+    # Второй период — своя выгрузка; цели по первому — тоже; повтор — уже из свежего кэша.
+    assert [call["refresh"] for call in calls] == [True, True, True, False]
+    run_client_jobs("demo", jobs[:2], refresh=False)
+    assert [call["refresh"] for call in calls[4:]] == [False, False]
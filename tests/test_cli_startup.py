@@ -0,0 +1,41 @@
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+
+# Тяжёлые модули грузятся только командами, которым они нужны.
+HEAVY_MODULES = [
+    "requests",
+    "app.orchestrator",
+    "app.steps",
+    "app.server",
+    "app.seo_activation_funnel",
+    "app.en_seo_report",
+    "app.gsc_client",
+    "app.metrika_client",
+    "app.http_client",
+    "app.rate_limit",
+    "app.tracing",
+    "app.cache_io",
+    "app.analysis_changepoints",
+    "app.monitoring",
+]
+
+
+def test_cli_import_does_not_load_heavy_modules():
+    code = (
+        "import json, sys; import app.cli; "
+        f"print(json.dumps([name for name in {HEAVY_MODULES!r} if name in sys.modules]))"
+    )
+    proc = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True)
+
+    assert json.loads(proc.stdout.strip().splitlines()[-1]) == []
+
+
+def test_cli_help_lists_lazily_imported_commands():
+    proc = subprocess.run([sys.executable, "-m", "app.cli", "--help"], cwd=ROOT, capture_output=True, text=True, check=True)
+
+    for command in ("investigate", "investigate-batch", "serve", "analyze-sources", "watch"):
+        assert command in proc.stdout
@@ -0,0 +1,81 @@
+from pathlib import Path
+
+import yaml
+from typer.testing import CliRunner
+
+from app.cli import app
+from app.metrika_client import MetrikaClient
+from app.orchestrator.cost_model import CostModel
+from app.orchestrator.models import ExecutedStep, PlannedStep
+
+runner = CliRunner()
+
+PERIOD = {"p1_start": "2024-01-01", "p1_end": "2024-01-31", "p2_start": "2025-01-01", "p2_end": "2025-01-31"}
+
+
+def _step(step_id: str, kind: str, source: str = "metrika") -> PlannedStep:
+    return PlannedStep(
+        id=step_id,
+        title=step_id,
+        kind=kind,
+        params={"client": "demo", **PERIOD, "limit": 50},
+        source=source,
+        expected_artifacts=[],
+    )
+
+
+def test_cached_steps_rank_first_and_budget_rejects_expensive_ones(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    cache_dir = tmp_path / "data_cache" / "demo"
+    cache_dir.mkdir(parents=True)
+    for d1, d2 in [("2024-01-01", "2024-01-31"), ("2025-01-01", "2025-01-31")]:
+        (cache_dir / f"metrika_pages_norm_{d1}_{d2}.json").write_text("[]", encoding="utf-8")
+
+    model = CostModel("demo", budgets={"metrika": 2, "gsc": 1})
+    steps = [_step("sources", "analyze_sources"), _step("pages", "analyze_pages"), _step("gsc", "analyze_gsc_queries", "gsc")]
+    selected, estimates = model.select(steps, {"analyze_sources": 3.0, "analyze_pages": 2.0})
+
+    assert [step.id for step in selected] == ["pages", "sources"]
+    assert estimates[0].api_calls == 0 and estimates[0].cache_hit_prob == 1.0
+    assert estimates[1].api_calls == 2
+    assert model.spent["metrika"] == 2
+    assert [item["kind"] for item in model.rejected] == ["analyze_gsc_queries"]
+
+    executed = ExecutedStep(
+        id="sources", title="", kind="analyze_sources", success=True, exit_code=0, stdout="", stderr="",
+        artifacts=[], source="metrika", params={}, duration_s=7.0, payloads={"x.json": {"rows": [{}] * 12}},
+    )
+    model.observe([executed])
+    model.save()
+
+    reloaded = CostModel("demo")
+    estimate = reloaded.estimate(_step("sources", "analyze_sources"))
+    assert estimate.expected_seconds == 7.0
+    assert estimate.p90_seconds == 10.0
+    assert estimate.expected_rows == 12
+
+
+def test_investigate_explain_prints_plan_without_running_steps(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("YANDEX_METRIKA_TOKEN", "token")
+    client_dir = tmp_path / "clients" / "demo"
+    client_dir.mkdir(parents=True)
+    (client_dir / "config.yaml").write_text(
+        yaml.safe_dump({"site": {"name": "example.com"}, "metrika": {"counter_id": 1, "goal_id": 0}}), encoding="utf-8"
+    )
+
+    def fail(*args, **kwargs):
+        raise AssertionError("API must not be called in --explain")
+
+    monkeypatch.setattr(MetrikaClient, "traffic_sources", fail)
+    monkeypatch.setattr(MetrikaClient, "landing_pages", fail)
+
+    result = runner.invoke(
+        app,
+        ["investigate", "demo", "--explain", "--query", "Почему упал трафик 2024-01-01 2024-01-31 2025-01-01 2025-01-31"],
+    )
+    assert result.exit_code == 0, result.stdout
+    assert "План раунда 1" in result.stdout
+    assert "metrika: 4/40" in result.stdout  # sources + pages, по 2 вызова на шаг
+    assert "Бюджет вызовов API" in result.stdout
+    assert not Path("reports").exists()
@@ -0,0 +1,148 @@
+import sys
+import threading
+import time
+from pathlib import Path
+
+import app.steps as steps
+from app.orchestrator.executor import execute_plan
+from app.orchestrator.prefetch import Prefetcher
+from app.orchestrator.models import PlannedStep
+
+
+def _step(step_id: str, kind: str, source: str = "metrika", depends_on=None) -> PlannedStep:
+    return PlannedStep(
+        id=step_id,
+        title=step_id,
+        kind=kind,
+        params={"client": step_id, "format": "insights"},
+        source=source,
+        expected_artifacts=[],
+        depends_on=depends_on or [],
+    )
+
+
+def _workbook(kind: str, client: str) -> steps.Workbook:
+    return steps.Workbook(
+        kind=kind,
+        data={"meta": {"client": client}, "totals": {}, "rows": [{"key": client}]},
+        path=Path("data_cache") / client / f"{kind}.json",
+        persisted=False,
+    )
+
+
+def test_independent_steps_run_concurrently_with_isolated_output(monkeypatch):
+    barrier = threading.Barrier(3, timeout=5)
+
+    def slow_step(kind):
+        def run(client: str, persist: bool = True):
+            print(f"start {client}")
+            barrier.wait()  # упадёт по таймауту, если шаги идут последовательно
+            print(f"end {client}")
+            return _workbook(kind, client)
+
+        return run
+
+    for kind in ["analyze_sources", "analyze_pages", "analyze_goals_by_source"]:
+        monkeypatch.setitem(steps.STEP_RUNNERS, kind, slow_step(kind))
+
+    plan = [_step("a", "analyze_sources"), _step("b", "analyze_pages"), _step("c", "analyze_goals_by_source")]
+    original_stdout = sys.stdout
+    results = execute_plan(plan)
+
+    assert sys.stdout is original_stdout
+    assert [step.id for step in results] == ["a", "b", "c"]
+    assert all(step.success for step in results)
+    for step in results:
+        assert step.stdout.startswith(f"start {step.id}\nend {step.id}\n")
+        # workbook доступен из памяти, без записи и чтения файла
+        artifact = str(Path("data_cache") / step.id / f"{step.kind}.json")
+        assert step.artifacts == [artifact]
+        assert step.payloads[artifact]["rows"] == [{"key": step.id}]
+
+
+def test_dependencies_and_source_caps_are_respected(monkeypatch):
+    order = []
+    active = {"ym_webmaster": 0}
+    peak = {"ym_webmaster": 0}
+    lock = threading.Lock()
+
+    def ym_step(client: str, **kwargs):
+        with lock:
+            active["ym_webmaster"] += 1
+            peak["ym_webmaster"] = max(peak["ym_webmaster"], active["ym_webmaster"])
+        time.sleep(0.05)
+        with lock:
+            active["ym_webmaster"] -= 1
+            order.append(client)
+        return _workbook("ym", client)
+
+    def failing_step(client: str, **kwargs):
+        order.append(client)
+        raise steps.StepError("YANDEX_METRIKA_TOKEN не задан в окружении")
+
+    monkeypatch.setitem(steps.STEP_RUNNERS, "analyze_ym_webmaster_queries", ym_step)
+    monkeypatch.setitem(steps.STEP_RUNNERS, "ym_webmaster_indexing", ym_step)
+    monkeypatch.setitem(steps.STEP_RUNNERS, "analyze_sources", failing_step)
+    monkeypatch.setitem(steps.STEP_RUNNERS, "analyze_pages", ym_step)
+
+    plan = [
+        _step("idx", "ym_webmaster_indexing", "ym_webmaster", depends_on=["queries"]),
+        _step("queries", "analyze_ym_webmaster_queries", "ym_webmaster"),
+        _step("sources", "analyze_sources"),
+        _step("pages", "analyze_pages", depends_on=["sources", "round-0-step"]),
+    ]
+    results = {step.id: step for step in execute_plan(plan)}
+
+    assert order.index("queries") < order.index("idx")
+    assert peak["ym_webmaster"] == 1
+    assert results["sources"].exit_code == 1
+    assert "YANDEX_METRIKA_TOKEN" in results["sources"].stderr
+    assert results["pages"].success is False and "зависимость" in results["pages"].stderr
+    assert "pages" not in order
+
+
+def test_prefetch_shares_source_caps_with_executor(monkeypatch):
+    active = {"gsc": 0}
+    peak = {"gsc": 0}
+    lock = threading.Lock()
+
+    def gsc_step(client: str, **kwargs):
+        with lock:
+            active["gsc"] += 1
+            peak["gsc"] = max(peak["gsc"], active["gsc"])
+        time.sleep(0.05)
+        with lock:
+            active["gsc"] -= 1
+        return _workbook("gsc", client)
+
+    monkeypatch.setitem(steps.STEP_RUNNERS, "analyze_gsc_queries", gsc_step)
+    prefetched = [_step(f"pre{i}", "analyze_gsc_queries", "gsc") for i in range(2)]
+    prefetcher = Prefetcher()
+    prefetcher.submit(prefetched)
+    plan = [_step(f"run{i}", "analyze_gsc_queries", "gsc") for i in range(3)] + [prefetched[0]]
+
+    results = execute_plan(plan, prefetcher=prefetcher)
+    prefetcher.close()
+
+    assert all(step.success for step in results)
+    assert results[-1].prefetched
+    # Слоты GSC (2) общие: фоновые выборки их не превышают.
+    assert peak["gsc"] == 2
+
+
+def test_step_output_is_capped_to_the_latest_characters(monkeypatch):
+    def noisy(client: str, persist: bool = True):
+        for index in range(1000):
+            print(f"line {index:04d}")
+        return _workbook("analyze_sources", client)
+
+    monkeypatch.setitem(steps.STEP_RUNNERS, "analyze_sources", noisy)
+
+    [result] = execute_plan([_step("a", "analyze_sources")], capture_limit=200)
+
+    assert result.success
+    header, _, kept = result.stdout.partition("\n")
+    assert header.startswith("[... отброшено символов:")
+    assert len(kept) == 200
+    assert kept.endswith("Workbook: analyze_sources.json (строк: 1)\n")
+    assert "line 0999" in kept and "line 0000" not in kept
@@ -1,12 +1,17 @@
 import json
+import shutil
 from pathlib import Path
 
+import pytest
 import yaml
 from typer.testing import CliRunner
 
+from app.artifact_store import ArtifactStore
 from app.cli import app
 from app.gsc_client import GSCClient
 from app.metrika_client import MetrikaClient
+from app.orchestrator import agent_loop, executor
+from app.orchestrator.snapshots import read_step_log
 from app.ym_webmaster_client import YMWebmasterClient
 
 
@@ -116,6 +121,11 @@ def test_investigate_generates_reports_for_metrika_only(tmp_path, monkeypatch):
     assert evidence["analysis"]["availability_notes"]
     assert any("GSC недоступен" in note for note in evidence["analysis"]["availability_notes"])
 
+    span_names = {span["name"] for span in evidence["trace"]["spans"]}
+    assert {"intake.parse_intent", "executor.step", "step.run", "cache.write", "analyzer"} <= span_names
+    trace = json.loads((report_dir / "trace.json").read_text(encoding="utf-8"))
+    assert any(event["name"] == "report.write" for event in trace["traceEvents"])
+
 
 def test_investigate_runs_seo_sources_when_available(tmp_path, monkeypatch):
     monkeypatch.chdir(tmp_path)
@@ -195,6 +205,21 @@ def test_investigate_runs_seo_sources_when_available(tmp_path, monkeypatch):
     assert round1_kinds == {"analyze_sources", "analyze_pages"}
     assert "analyze_pages_by_source" in round2_kinds
     assert "analyze_gsc_queries" in round2_kinds
+    # SEO-шаги раунда 2 были заранее прогреты во время раунда 1
+    assert evidence["analysis"]["loop"]["prefetch"]["hits"] >= 2
+    gsc_step = next(step for step in evidence["executions"] if step["kind"] == "analyze_gsc_queries")
+    assert "stdout" not in gsc_step
+    store = ArtifactStore(tmp_path / evidence["artifact_store"])
+    assert "из prefetch" in read_step_log(store, gsc_step["logs"]["stdout"])
+    # Workbook и входной кэш шага сняты в хранилище: --refresh не изменит смысл evidence.
+    workbook_path = gsc_step["artifacts"][0]
+    assert json.loads(store.get_text(gsc_step["snapshots"][workbook_path])) == json.loads(Path(workbook_path).read_text(encoding="utf-8"))
+    assert any("gsc" in path and path != workbook_path for path in gsc_step["snapshots"])
+    # Каждый workbook разобран и проанализирован один раз, в следующих раундах выводы переиспользуются.
+    analyzer_cache = evidence["analysis"]["loop"]["analyzer_cache"]
+    successful = [step for step in evidence["executions"] if step["success"] and step["artifacts"]]
+    assert analyzer_cache["rules_evaluated"] == len(successful)
+    assert analyzer_cache["rules_reused"] > 0
 
 
 def test_investigate_auto_resolves_goal_when_query_is_about_conversions(tmp_path, monkeypatch):
@@ -269,3 +294,131 @@ def test_investigate_auto_resolves_goal_when_query_is_about_conversions(tmp_path
     round2_kinds = {step["kind"] for step in rounds[1]["planned_steps"]}
     assert "analyze_goals_by_source" in round1_kinds
     assert "analyze_goals_by_page" in round2_kinds
+
+
+def test_investigate_resumes_from_checkpoint_without_rerunning_steps(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("YANDEX_METRIKA_TOKEN", "token")
+    _write_client(tmp_path, with_gsc=False, with_ym=False)
+
+    monkeypatch.setattr(
+        MetrikaClient,
+        "traffic_sources",
+        lambda self, date1, date2, limit=50: _sources_payload(100, 50) if date1 == "2024-01-01" else _sources_payload(70, 60),
+    )
+    monkeypatch.setattr(
+        MetrikaClient,
+        "landing_pages",
+        lambda self, date1, date2, limit=50: _pages_payload(80, 20) if date1 == "2024-01-01" else _pages_payload(50, 10),
+    )
+    monkeypatch.setattr(
+        MetrikaClient,
+        "landing_pages_by_source",
+        lambda self, date1, date2, source, limit=50: _pages_payload(60, 10) if date1 == "2024-01-01" else _pages_payload(30, 5),
+    )
+    executed_kinds = []
+    original_run_step = executor.run_step
+
+    def counting_run_step(step_kind, params, persist=True):
+        executed_kinds.append(step_kind)
+        return original_run_step(step_kind, params, persist=persist)
+
+    monkeypatch.setattr(executor, "run_step", counting_run_step)
+    original_analyze = agent_loop.analyze_results
+
+    def broken_analyze(**kwargs):
+        raise ConnectionError("сеть пропала")
+
+    monkeypatch.setattr(agent_loop, "analyze_results", broken_analyze)
+    query = "Разберись, почему упал трафик 2024-01-01 2024-01-31 2025-01-01 2025-01-31"
+
+    result = runner.invoke(app, ["investigate", "demo", "--query", query, "--no-prefetch"])
+    assert result.exit_code == 1
+    assert "--resume" in result.stdout
+    run_dir = next((tmp_path / "reports" / "demo").iterdir())
+    checkpoint = json.loads((run_dir / "checkpoint.json").read_text(encoding="utf-8"))
+    assert checkpoint["status"] == "running"
+    assert checkpoint["round"] == 1
+    round1_kinds = sorted(step["kind"] for step in checkpoint["round_executions"])
+    assert sorted(executed_kinds) == round1_kinds
+
+    monkeypatch.setattr(agent_loop, "analyze_results", original_analyze)
+    executed_kinds.clear()
+    result = runner.invoke(app, ["investigate", "demo", "--resume", run_dir.name, "--no-prefetch"])
+    assert result.exit_code == 0, result.stdout
+    assert f"run_id: {run_dir.name}" in result.stdout
+
+    # Шаги раунда 1 взяты из checkpoint, заново выполнялись только новые раунды.
+    assert not set(round1_kinds) & set(executed_kinds)
+    evidence = json.loads((run_dir / "evidence.json").read_text(encoding="utf-8"))
+    assert evidence["query"] == query
+    assert evidence["analysis"]["loop"]["resumed_from_round"] == 1
+    assert {"analyze_sources", "analyze_pages"} <= {step["kind"] for step in evidence["executions"]}
+    assert json.loads((run_dir / "checkpoint.json").read_text(encoding="utf-8"))["status"] == "completed"
+
+    result = runner.invoke(app, ["investigate", "demo", "--resume", run_dir.name])
+    assert result.exit_code == 1
+    assert "уже завершено" in result.stdout
+
+    # Те же входы и код: новое расследование не создаёт папку, а отдаёт прошлый отчёт.
+    result = runner.invoke(app, ["investigate", "demo", "--query", query, "--no-prefetch"])
+    assert result.exit_code == 0, result.stdout
+    assert f"run_id: {run_dir.name}" in result.stdout
+    assert "не перерисовывался" in result.stdout
+    assert [path.name for path in (tmp_path / "reports" / "demo").iterdir()] == [run_dir.name]
+
+
+def test_investigate_replay_and_backtest_work_offline(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("YANDEX_METRIKA_TOKEN", "token")
+    _write_client(tmp_path, with_gsc=False, with_ym=False)
+    monkeypatch.setattr(
+        MetrikaClient,
+        "traffic_sources",
+        lambda self, date1, date2, limit=50: _sources_payload(100, 50) if date1 == "2024-01-01" else _sources_payload(70, 60),
+    )
+    monkeypatch.setattr(
+        MetrikaClient,
+        "landing_pages",
+        lambda self, date1, date2, limit=50: _pages_payload(80, 20) if date1 == "2024-01-01" else _pages_payload(50, 10),
+    )
+    query = "Разберись, почему упал трафик 2024-01-01 2024-01-31 2025-01-01 2025-01-31"
+    result = runner.invoke(app, ["investigate", "demo", "--query", query, "--no-prefetch"])
+    assert result.exit_code == 0, result.stdout
+    [run_dir] = (tmp_path / "reports" / "demo").iterdir()
+    original = json.loads((run_dir / "evidence.json").read_text(encoding="utf-8"))["analysis"]
+
+    # Ни кэша, ни токена, ни сети: повтор берёт всё из evidence и хранилища.
+    shutil.rmtree(tmp_path / "data_cache")
+    monkeypatch.delenv("YANDEX_METRIKA_TOKEN")
+    monkeypatch.setattr(MetrikaClient, "traffic_sources", lambda *args, **kwargs: pytest.fail("API вызван при replay"))
+    monkeypatch.setattr(MetrikaClient, "landing_pages", lambda *args, **kwargs: pytest.fail("API вызван при replay"))
+
+    result = runner.invoke(app, ["investigate", "demo", "--replay", run_dir.name])
+    assert result.exit_code == 0, result.stdout
+    [replay_dir] = [path for path in (tmp_path / "reports" / "demo").iterdir() if path != run_dir]
+    evidence = json.loads((replay_dir / "evidence.json").read_text(encoding="utf-8"))
+    assert evidence["replay_of"] == run_dir.name
+    assert evidence["analysis"]["facts"] == original["facts"]
+    assert evidence["analysis"]["hypotheses"] == original["hypotheses"]
+
+    (tmp_path / "strict_rules.py").write_text(
+        "from app.orchestrator.analyzer import analyze_results\n\n"
+        "def analyze(**kwargs):\n"
+        "    analysis = analyze_results(**kwargs)\n"
+        "    analysis['hypotheses'] = []\n"
+        "    analysis['root_cause_status'] = 'insufficient'\n"
+        "    return analysis\n",
+        encoding="utf-8",
+    )
+    monkeypatch.syspath_prepend(str(tmp_path))
+    result = runner.invoke(app, ["investigate-backtest", "--analyzer", "strict_rules:analyze", "--workers", "1"])
+    assert result.exit_code == 0, result.stdout
+    [summary_path] = (tmp_path / "reports" / "_backtest").glob("*/summary.json")
+    summary = json.loads(summary_path.read_text(encoding="utf-8"))
+    # Повтор (replay_of) в backtest не входит.
+    assert summary["runs"] == 1 and summary["changed"] == 1
+    [entry] = summary["results"]
+    assert entry["run_id"] == run_dir.name
+    assert entry["root_cause_status"][1] == "insufficient"
+    assert entry["hypotheses_removed"] == [item["title"] for item in original["hypotheses"]]
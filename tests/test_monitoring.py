@@ -0,0 +1,108 @@
+import json
+from types import SimpleNamespace
+
+import yaml
+from typer.testing import CliRunner
+
+from app import orchestrator
+from app.cli import app
+from app.metrika_client import MetrikaClient
+from app.monitoring import days_to_ingest, load_state, update_stream, watch_client
+
+
+runner = CliRunner()
+
+
+def _snapshot(search_visits: int) -> dict:
+    return {
+        "data": [
+            {"dimensions": [{"name": "Search engine traffic"}, {"name": "/"}], "metrics": [search_visits]},
+            {"dimensions": [{"name": "Direct traffic"}, {"name": "/"}], "metrics": [100]},
+        ]
+    }
+
+
+def test_update_stream_alerts_only_after_warmup():
+    stats = {}
+    for _ in range(10):
+        assert update_stream(stats, {"organic": 500.0}) == []
+
+    anomalies = update_stream(stats, {"organic": 200.0})
+    assert [key for key, *_ in anomalies] == ["organic"]
+    assert anomalies[0][3] < -3
+    assert stats["organic"]["n"] == 11
+
+
+def test_days_to_ingest_catches_up_without_refetching():
+    assert days_to_ingest("2024-03-08", "2024-03-10") == ["2024-03-09", "2024-03-10"]
+    assert days_to_ingest("2024-03-10", "2024-03-10") == []
+    assert days_to_ingest("", "2024-03-10") == ["2024-03-10"]
+
+
+def test_watch_ingests_incrementally_and_opens_investigation(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("YANDEX_METRIKA_TOKEN", "token")
+    client_dir = tmp_path / "clients" / "demo"
+    client_dir.mkdir(parents=True)
+    (client_dir / "config.yaml").write_text(yaml.safe_dump({"metrika": {"counter_id": 123456}}), encoding="utf-8")
+
+    fetched = []
+
+    def fake_snapshot(self, day, goal_id=0, limit=100000):
+        fetched.append(day)
+        return _snapshot(100 if day == "2024-03-20" else 1000)
+
+    investigations = []
+
+    def fake_investigate(**kwargs):
+        investigations.append(kwargs)
+        return SimpleNamespace(markdown_path="report.md"), {"summary": "ok"}, []
+
+    monkeypatch.setattr(MetrikaClient, "daily_snapshot", fake_snapshot)
+    monkeypatch.setattr(orchestrator, "investigate", fake_investigate)
+
+    for day in ["2024-03-05", "2024-03-12", "2024-03-19"]:
+        result = runner.invoke(app, ["watch", "--once", "--date", day])
+        assert result.exit_code == 0, result.stdout
+    assert investigations == []
+    # 05, затем догрузка 06..12 и 13..19 — по одному запросу на день
+    assert len(fetched) == 15
+
+    result = runner.invoke(app, ["watch", "--once", "--date", "2024-03-20"])
+    assert result.exit_code == 0, result.stdout
+    assert fetched[-1] == "2024-03-20" and len(fetched) == 16
+    assert len(investigations) == 1
+    assert investigations[0]["p2_start"] == "2024-03-20"
+    assert investigations[0]["p1_start"] == "2024-03-13"
+    assert "упал трафик" in investigations[0]["query"]
+
+    state = json.loads((tmp_path / "data_cache" / "demo" / "monitor_state.json").read_text(encoding="utf-8"))
+    assert state["last_ingested"] == "2024-03-20"
+    assert any(alert["key"] == "Search engine traffic" for alert in state["alerts"])
+
+
+def test_watch_ingests_final_gsc_with_lag_and_own_watermark(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    metrika_days, gsc_calls = [], []
+
+    class FakeMetrika:
+        def daily_snapshot(self, day, goal_id=0):
+            metrika_days.append(day)
+            return _snapshot(1000)
+
+    class FakeGSC:
+        def search_analytics_all(self, **kwargs):
+            gsc_calls.append(kwargs)
+            return {"rows": [{"keys": ["/"], "clicks": 50, "impressions": 500, "ctr": 0.1, "position": 3}]}
+
+    watch_client("demo", "2024-03-20", metrika=FakeMetrika(), gsc=FakeGSC())
+    watch_client("demo", "2024-03-21", metrika=FakeMetrika(), gsc=FakeGSC())
+
+    assert metrika_days == ["2024-03-20", "2024-03-21"]
+    assert [call["date1"] for call in gsc_calls] == ["2024-03-18", "2024-03-19"]
+    # final-данные: data_state не передаётся, страницы — через пейджер без row_limit.
+    assert all(set(call) == {"date1", "date2", "dimensions"} for call in gsc_calls)
+    state = load_state("demo")
+    assert state["last_ingested"] == "2024-03-21"
+    assert state["last_ingested_gsc"] == "2024-03-19"
+    assert state["stats"]["gsc_clicks"]["__total__"]["n"] == 2
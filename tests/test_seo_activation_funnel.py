@@ -2,6 +2,7 @@ import json
 
 from app.seo_activation_funnel import (
     create_seo_activation_funnel_report,
+    empty_product_db_status,
     load_product_activation_by_landing_page,
     normalize_landing_page,
     report_filename,
@@ -158,3 +159,59 @@ def test_normalize_landing_page_is_stable_for_sources():
     assert normalize_landing_page("https://stas.run/en/guides/test?x=1#top") == "/en/guides/test"
     assert normalize_landing_page("/en/guides/test/") == "/en/guides/test"
     assert normalize_landing_page("") == "(unknown)"
+
+
+def test_cli_runs_product_db_query_while_apis_are_fetched(tmp_path, monkeypatch):
+    import threading
+
+    import yaml
+    from typer.testing import CliRunner
+
+    from app import analysis_goals, analysis_gsc, analysis_pages, seo_activation_funnel, steps
+    from app.cli import app
+
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("YANDEX_METRIKA_TOKEN", "token")
+    client_dir = tmp_path / "clients" / "demo"
+    client_dir.mkdir(parents=True)
+    (client_dir / "config.yaml").write_text(
+        yaml.safe_dump(
+            {
+                "site": {"name": "example.com"},
+                "metrika": {"counter_id": 123456, "goal_id": 7},
+                "gsc": {"site_url": "https://example.com/"},
+            }
+        ),
+        encoding="utf-8",
+    )
+
+    db_started = threading.Event()
+    apis_done = threading.Event()
+
+    def product_db(*, date1, date2, env_var, statement_timeout_ms, rollup):
+        db_started.set()
+        # Ждёт конца выгрузок: при последовательном запуске сюда бы не дошли до их окончания.
+        assert apis_done.wait(5)
+        rows = [{"landingPage": "/pricing", "signups": 3}]
+        return empty_product_db_status(env_var=env_var, available=True, reason="ok", rows=rows)
+
+    def gsc_pages(**kwargs):
+        assert db_started.wait(5), "запрос к БД не запущен до выгрузки GSC"
+        return [{"page": "https://example.com/pricing", "clicks": 10.0, "impressions": 100.0, "position": 3.0}], ["page"]
+
+    def goals(**kwargs):
+        apis_done.set()
+        return []
+
+    monkeypatch.setattr(seo_activation_funnel, "load_product_activation_by_landing_page", product_db)
+    monkeypatch.setattr(steps, "gsc_client_from_config", lambda cfg: object())
+    monkeypatch.setattr(analysis_gsc, "load_or_fetch_gsc", gsc_pages)
+    monkeypatch.setattr(analysis_pages, "load_or_fetch_pages_by_source", lambda **kwargs: [{"landingPage": "/pricing", "visits": 8.0}])
+    monkeypatch.setattr(analysis_goals, "load_or_fetch_goals_by_source_page", goals)
+
+    result = CliRunner().invoke(app, ["seo-activation-funnel", "demo", "2026-05-01", "2026-05-07", "--format", "json"])
+
+    assert result.exit_code == 0, result.stdout
+    report = json.loads((tmp_path / "data_cache" / "demo" / "seo_activation_funnel_2026-05-01_2026-05-07.json").read_text(encoding="utf-8"))
+    assert report["totals"]["product_signups"] == 3
+    assert report["totals"]["gsc_clicks"] == 10.0
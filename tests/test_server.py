@@ -0,0 +1,167 @@
+import threading
+import time
+
+import yaml
+
+from app import remote
+from app.metrika_client import MetrikaClient
+from app.server import Coalescer, ServerApp, create_server
+
+PARAMS = {"client": "demo", "p1_start": "2024-01-01", "p1_end": "2024-01-31", "p2_start": "2025-01-01", "p2_end": "2025-01-31"}
+
+
+def _write_client_config(base_dir, client="demo"):
+    client_dir = base_dir / "clients" / client
+    client_dir.mkdir(parents=True, exist_ok=True)
+    config = {"site": {"name": "example.com"}, "metrika": {"counter_id": 123456, "goal_id": 0}}
+    (client_dir / "config.yaml").write_text(yaml.safe_dump(config), encoding="utf-8")
+
+
+def _sources_payload(search_visits, direct_visits):
+    return {
+        "data": [
+            {"dimensions": [{"name": "Search engine traffic"}], "metrics": [search_visits, 0.0, 30.0, 2.5, 60.0]},
+            {"dimensions": [{"name": "Direct traffic"}], "metrics": [direct_visits, 0.0, 25.0, 2.0, 45.0]},
+        ]
+    }
+
+
+def test_step_memo_serves_repeats_until_cache_changes(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("YANDEX_METRIKA_TOKEN", "test-token")
+    _write_client_config(tmp_path)
+    calls = []
+    payloads = {"2024-01-01": _sources_payload(100, 40), "2025-01-01": _sources_payload(130, 20)}
+
+    def traffic_sources(self, date1, date2, limit=50):
+        calls.append(date1)
+        return payloads[date1]
+
+    monkeypatch.setattr(MetrikaClient, "traffic_sources", traffic_sources)
+    server_app = ServerApp()
+    try:
+        status, first = server_app.handle("POST", "/step", {"kind": "analyze_sources", "params": PARAMS})
+        assert status == 200
+        assert first["from_memo"] is False
+        assert first["workbook"]["totals"]["total_visits_p2"] == 150
+        assert len(calls) == 2
+
+        status, second = server_app.handle("POST", "/step", {"kind": "analyze_sources", "params": PARAMS})
+        assert status == 200
+        assert second["from_memo"] is True
+        assert second["workbook"] == first["workbook"]
+
+        # Новый файл во входном кэше клиента делает запись памяти устаревшей.
+        time.sleep(0.01)
+        (tmp_path / "data_cache" / "demo" / "extra.json").write_text("{}", encoding="utf-8")
+        status, third = server_app.handle("POST", "/step", {"kind": "analyze_sources", "params": PARAMS})
+        assert third["from_memo"] is False
+        assert len(calls) == 2  # пересчитано из файлового кэша, без API
+
+        status, cleared = server_app.handle("POST", "/cache/clear", {"client": "demo"})
+        assert cleared["cleared_memo_entries"] == 1
+
+        status, cache = server_app.handle("GET", "/cache?client=demo")
+        assert "extra.json" in {item["name"] for item in cache["files"]}
+        assert cache["memo"]["hits"] == 1
+
+        status, error = server_app.handle("POST", "/step", {"kind": "nope", "params": PARAMS})
+        assert status == 400
+        assert "nope" in error["error"]
+    finally:
+        server_app.close()
+
+
+def test_coalescer_runs_identical_inflight_requests_once():
+    coalescer = Coalescer()
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+    results = []
+
+    def slow():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return {"value": 42}
+
+    def worker():
+        results.append(coalescer.run("same", slow))
+
+    leader = threading.Thread(target=worker)
+    leader.start()
+    started.wait(5)
+    follower = threading.Thread(target=worker)
+    follower.start()
+    time.sleep(0.05)
+    release.set()
+    leader.join(5)
+    follower.join(5)
+
+    assert len(calls) == 1
+    assert sorted(coalesced for _, coalesced in results) == [False, True]
+    assert all(result == {"value": 42} for result, _ in results)
+    assert coalescer.run("same", lambda: {"value": 7}) == ({"value": 7}, False)
+
+
+def test_http_round_trip_with_thin_client(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    server_app = ServerApp()
+    server = create_server(server_app, port=0)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    url = f"http://127.0.0.1:{server.server_address[1]}"
+    try:
+        status, health = remote.request("GET", "/health", url=url)
+        assert status == 200
+        assert health["ok"] is True
+
+        status, error = remote.request("POST", "/investigate", {"client": "demo"}, url=url)
+        assert status == 400
+
+        status, missing = remote.request("GET", "/nope", url=url)
+        assert status == 404
+    finally:
+        server.shutdown()
+        server.server_close()
+        server_app.close()
+
+
+def test_overlapping_investigations_keep_their_output_while_server_runs(monkeypatch):
+    import sys
+    from pathlib import Path
+
+    from app import steps
+    from app.orchestrator.executor import execute_plan
+    from app.orchestrator.models import PlannedStep
+
+    first_done = threading.Event()
+
+    def step(client: str, **kwargs):
+        if client == "slow":
+            assert first_done.wait(5)
+        print(f"output of {client}")
+        return steps.Workbook(kind="k", data={"meta": {}, "totals": {}, "rows": []}, path=Path(f"{client}.json"), persisted=False)
+
+    monkeypatch.setitem(steps.STEP_RUNNERS, "analyze_sources", step)
+
+    def plan(client):
+        return [PlannedStep(id=client, title=client, kind="analyze_sources", params={"client": client}, source="metrika", expected_artifacts=[])]
+
+    original_stdout = sys.stdout
+    server_app = ServerApp()
+    try:
+        results = {}
+        slow = threading.Thread(target=lambda: results.update(slow=execute_plan(plan("slow"))[0]))
+        slow.start()
+        results["fast"] = execute_plan(plan("fast"))[0]
+        first_done.set()
+        slow.join(5)
+
+        # Первый завершившийся план не снял подмену: вывод второго остался в его шаге.
+        assert "output of slow" in results["slow"].stdout
+        assert "output of fast" in results["fast"].stdout
+        assert sys.stdout is not original_stdout
+    finally:
+        server_app.close()
+    assert sys.stdout is original_stdout
@@ -0,0 +1,106 @@
+from pathlib import Path
+
+import pytest
+import yaml
+
+from app.metrika_client import MetrikaClient
+from app.steps import StepError, run_analyze_sources, run_step
+
+
+def _write_client_config(base_dir: Path, client: str = "demo") -> None:
+    client_dir = base_dir / "clients" / client
+    client_dir.mkdir(parents=True, exist_ok=True)
+    config = {"site": {"name": "example.com"}, "metrika": {"counter_id": 123456, "goal_id": 0}}
+    (client_dir / "config.yaml").write_text(yaml.safe_dump(config), encoding="utf-8")
+
+
+def _sources_payload(search_visits: int, direct_visits: int) -> dict:
+    return {
+        "data": [
+            {"dimensions": [{"name": "Search engine traffic"}], "metrics": [search_visits, 0.0, 30.0, 2.5, 60.0]},
+            {"dimensions": [{"name": "Direct traffic"}], "metrics": [direct_visits, 0.0, 25.0, 2.0, 45.0]},
+        ]
+    }
+
+
+def test_run_step_returns_workbook_in_memory(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("YANDEX_METRIKA_TOKEN", "test-token")
+    _write_client_config(tmp_path)
+    payloads = {"2024-01-01": _sources_payload(100, 40), "2025-01-01": _sources_payload(130, 20)}
+    monkeypatch.setattr(MetrikaClient, "traffic_sources", lambda self, date1, date2, limit=50: payloads[date1])
+
+    params = {
+        "client": "demo",
+        "p1_start": "2024-01-01",
+        "p1_end": "2024-01-31",
+        "p2_start": "2025-01-01",
+        "p2_end": "2025-01-31",
+        "format": "insights",  # CLI-параметр, шаг его игнорирует
+    }
+    workbook = run_step("analyze_sources", params, persist=False)
+
+    assert workbook.kind == "analyze_sources"
+    assert workbook.path.name == "analysis_sources_2024010120240131__2025010120250131.json"
+    assert not workbook.path.exists()
+    assert workbook.totals["total_visits_p1"] == 140
+    assert workbook.totals["total_visits_p2"] == 150
+    assert {row["source"] for row in workbook.rows} == {"Search engine traffic", "Direct traffic"}
+
+    saved = run_analyze_sources("demo", "2024-01-01", "2024-01-31", "2025-01-01", "2025-01-31")
+    assert saved.path.exists()
+
+
+def test_step_errors_are_raised_without_secrets(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    _write_client_config(tmp_path)
+
+    monkeypatch.delenv("YANDEX_METRIKA_TOKEN", raising=False)
+    with pytest.raises(StepError, match="YANDEX_METRIKA_TOKEN"):
+        run_analyze_sources("demo", "2024-01-01", "2024-01-31", "2025-01-01", "2025-01-31")
+
+    monkeypatch.setenv("YANDEX_METRIKA_TOKEN", "secret-token")
+
+    def fail(self, date1, date2, limit=50):
+        raise RuntimeError("401 for token secret-token")
+
+    monkeypatch.setattr(MetrikaClient, "traffic_sources", fail)
+    with pytest.raises(StepError) as excinfo:
+        run_analyze_sources("demo", "2024-01-01", "2024-01-31", "2025-01-01", "2025-01-31")
+    assert "secret-token" not in str(excinfo.value)
+
+    with pytest.raises(StepError, match="p1_end"):
+        run_analyze_sources("demo", "2024-02-01", "2024-01-31", "2025-01-01", "2025-01-31")
+
+
+def test_run_step_reuses_workbook_until_inputs_change(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("YANDEX_METRIKA_TOKEN", "test-token")
+    _write_client_config(tmp_path)
+    calls = []
+
+    def traffic_sources(self, date1, date2, limit=50):
+        calls.append(date1)
+        return _sources_payload(100, 40)
+
+    monkeypatch.setattr(MetrikaClient, "traffic_sources", traffic_sources)
+    params = {"client": "demo", "p1_start": "2024-01-01", "p1_end": "2024-01-31", "p2_start": "2025-01-01", "p2_end": "2025-01-31"}
+
+    first = run_step("analyze_sources", params)
+    second = run_step("analyze_sources", params)
+    assert not first.reused and second.reused
+    assert second.rows == first.rows and second.totals == first.totals
+    assert len(calls) == 2
+
+    # Переписали нормализованную выгрузку — workbook пересчитывается из кэша.
+    norm = Path("data_cache/demo/metrika_sources_norm_2025-01-01_2025-01-31.json")
+    assert str(norm) in first.inputs
+    norm.write_text(norm.read_text(encoding="utf-8").replace("Direct traffic", "Direct"), encoding="utf-8")
+    rebuilt = run_step("analyze_sources", params)
+    assert not rebuilt.reused and rebuilt.rows != first.rows
+    assert run_step("analyze_sources", params).reused
+
+    # Изменился конфиг клиента — тоже.
+    config_path = tmp_path / "clients" / "demo" / "config.yaml"
+    config_path.write_text(config_path.read_text(encoding="utf-8") + "# comment\n", encoding="utf-8")
+    assert not run_step("analyze_sources", params).reused
@@ -0,0 +1,42 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from app import tracing
+
+
+def _inner():
+    with tracing.span("inner"):
+        pass
+
+
+def test_spans_nest_across_threads_and_export_to_chrome_trace():
+    with tracing.start_trace("root") as tracer:
+        with tracing.span("outer", kind="analyze_sources") as outer:
+            with ThreadPoolExecutor(max_workers=2) as pool:
+                pool.submit(tracing.in_context(_inner)).result()
+            outer.set("rows", 3)
+        try:
+            with tracing.span("broken"):
+                raise ValueError("boom")
+        except ValueError:
+            pass
+
+    spans = {span.name: span for span in tracer.finished()}
+    assert spans["outer"].parent_id == spans["root"].span_id
+    assert spans["inner"].parent_id == spans["outer"].span_id
+    assert spans["inner"].thread_id != spans["outer"].thread_id
+    assert spans["outer"].attributes == {"kind": "analyze_sources", "rows": 3}
+    assert spans["broken"].status == "error" and spans["broken"].error == "boom"
+    assert tracer.summary()[0]["name"] == "root"
+
+    chrome = tracing.to_chrome_trace(tracer)
+    assert {event["name"] for event in chrome["traceEvents"]} == {"root", "outer", "inner", "broken"}
+    assert all(event["ph"] == "X" and event["dur"] >= 0 for event in chrome["traceEvents"])
+
+    otlp_spans = tracing.to_otlp(tracer)["resourceSpans"][0]["scopeSpans"][0]["spans"]
+    assert {span["traceId"] for span in otlp_spans} == {tracer.trace_id}
+    assert next(span for span in otlp_spans if span["name"] == "broken")["status"]["code"] == 2
+
+    # Вне trace span-ы ничего не записывают.
+    with tracing.span("orphan") as orphan:
+        orphan.set("ignored", True)
+    assert tracing.current_tracer() is None